@@ -164,10 +164,12 @@ async def get_ai_service_status(current_user: User = Depends(get_current_user)):
         
         # Check Stability AI service
         try:
-            from app.services.fb_stability_service import stability_service
+            from app.services.stability_service import stability_service
             stability_available = stability_service.is_configured()
+            image_cache_stats = stability_service.get_cache_stats()
         except ImportError:
             stability_available = False
+            image_cache_stats = None
         
         return {
             "groq_service": {
@@ -178,8 +180,10 @@ async def get_ai_service_status(current_user: User = Depends(get_current_user)):
             "stability_ai_service": {
                 "available": stability_available,
                 "status": "healthy" if stability_available else "unavailable",
-                "model": "stable-diffusion-v1-6",
-                "features": ["text-to-image", "facebook-optimized-dimensions"]
+                "model": "stable-diffusion-xl-1024-v1-0",
+                "facebook_model": "stable-diffusion-v1-6",
+                "features": ["text-to-image", "facebook-optimized-dimensions", "multi-image-batches", "prompt-result-cache"],
+                "image_cache": image_cache_stats
             },
             "supported_platforms": ["facebook", "instagram", "twitter"],
             "supported_content_types": ["post", "comment", "reply", "story"],
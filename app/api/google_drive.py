@@ -1,138 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request as FastAPIRequest
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request as FastAPIRequest
 from fastapi.responses import StreamingResponse, HTMLResponse
 from typing import Optional, List
 import io
 import base64
 import logging
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow, Flow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+from google_auth_oauthlib.flow import Flow
+from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
 import os
 import json
 import tempfile
+import time
+import uuid
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
 
 from ..database import get_db
 from ..models.user import User
 from ..api.auth import get_current_user
 from ..config import get_settings
+from ..services.cloudinary_service import cloudinary_service
+from ..services.local_media_store import local_media_store
+from ..services.media_handle_service import media_handle_service
+from ..services.google_drive_service import google_drive_client, SCOPES
+from ..utils.uploads import spool_upload, remove_spooled_file
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/google-drive", tags=["Google Drive"])
 
-# Google Drive API scopes
-SCOPES = [
-    'https://www.googleapis.com/auth/drive.file',
-    'https://www.googleapis.com/auth/drive.readonly'
-]
+# Chunk size for streamed Drive downloads
+DRIVE_DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
 
 # Get settings
 settings = get_settings()
 
 def get_google_drive_service():
-    """Get authenticated Google Drive service."""
-    creds = None
-    
-    # First, try to use environment variables for tokens
-    if settings.google_drive_access_token and settings.google_drive_refresh_token:
-        try:
-            creds = Credentials(
-                token=settings.google_drive_access_token,
-                refresh_token=settings.google_drive_refresh_token,
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=settings.google_drive_client_id,
-                client_secret=settings.google_drive_client_secret,
-                scopes=SCOPES
-            )
-            logger.info("Using Google Drive credentials from environment variables")
-        except Exception as e:
-            logger.warning(f"Failed to create credentials from environment variables: {e}")
-            creds = None
-    
-    # If no environment credentials, try token.json file
-    if not creds and os.path.exists("token.json"):
-        try:
-            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-            logger.info("Loaded existing credentials from token.json")
-        except Exception as e:
-            logger.warning(f"Failed to load existing credentials: {e}")
-            # Remove invalid token file
-            if os.path.exists("token.json"):
-                os.remove("token.json")
-            creds = None
-    
-    # If no valid credentials available, let the user log in
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                logger.info("Refreshed expired credentials")
-            except Exception as e:
-                logger.warning(f"Failed to refresh credentials: {e}")
-                creds = None
-        
-        if not creds:
-            # Check if we have environment variables configured
-            if not settings.google_drive_client_id or not settings.google_drive_client_secret:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Google Drive credentials not configured. Please set GOOGLE_DRIVE_CLIENT_ID and GOOGLE_DRIVE_CLIENT_SECRET environment variables."
-                )
-            
-            # Create client config from environment variables
-            client_config = {
-                "installed": {
-                    "client_id": settings.google_drive_client_id,
-                    "client_secret": settings.google_drive_client_secret,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-                    "redirect_uris": ["urn:ietf:wg:oauth:2.0:oob", "http://localhost:8000/"]
-                }
-            }
-            
-            flow = InstalledAppFlow.from_client_config(client_config, SCOPES)
-            logger.info("Starting OAuth flow on port 8000...")
-            creds = flow.run_local_server(port=8000)
-            logger.info("OAuth flow completed successfully")
-            
-            # Save the credentials for the next run
-            try:
-                with open("token.json", 'w') as token:
-                    token.write(creds.to_json())
-                logger.info("Saved credentials to token.json")
-            except Exception as e:
-                logger.error(f"Failed to save credentials: {e}")
-    
-    return build('drive', 'v3', credentials=creds)
+    """Get the cached, authenticated Google Drive service for the current thread (blocking)."""
+    return google_drive_client.get_service()
 
 @router.get("/auth")
 async def get_auth_token(current_user: User = Depends(get_current_user)):
     """Get Google Drive authentication token."""
     try:
         logger.info("Attempting to authenticate with Google Drive...")
-        service = get_google_drive_service()
-        logger.info("Google Drive service created successfully")
         
         # Test the connection
-        about = service.about().get(fields="user").execute()
+        about = await google_drive_client.run(lambda service: service.about().get(fields="user").execute())
         logger.info("Successfully connected to Google Drive API")
         
         user_email = about.get("user", {}).get("emailAddress", "Unknown")
         logger.info(f"Authenticated as: {user_email}")
         
-        # Get the current access token
-        access_token = None
-        if settings.google_drive_access_token:
-            access_token = settings.google_drive_access_token
-        elif os.path.exists("token.json"):
-            try:
-                token_creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-                access_token = token_creds.token
-            except Exception as token_err:
-                logger.warning(f"Unable to load access token from token.json: {token_err}")
+        # Get the current (proactively refreshed) access token
+        creds = await run_in_threadpool(google_drive_client.get_credentials, False)
+        access_token = creds.token if creds else None
         
         return {
             "success": True,
@@ -152,18 +73,18 @@ async def get_auth_token(current_user: User = Depends(get_current_user)):
 async def debug_google_drive(current_user: User = Depends(get_current_user)):
     """Debug endpoint to test Google Drive connectivity."""
     try:
-        service = get_google_drive_service()
-        
         # Test basic connectivity
-        about = service.about().get(fields="user,storageQuota").execute()
+        about = await google_drive_client.run(
+            lambda service: service.about().get(fields="user,storageQuota").execute()
+        )
         user_info = about.get("user", {})
         storage_info = about.get("storageQuota", {})
         
         # Try to list ALL files (without filters)
-        all_files = service.files().list(
+        all_files = await google_drive_client.run(lambda service: service.files().list(
             pageSize=50,  # Increased to see more files
             fields="files(id, name, mimeType, owners, shared, size)"
-        ).execute()
+        ).execute())
         
         files_list = all_files.get('files', [])
         
@@ -213,54 +134,57 @@ async def debug_google_drive(current_user: User = Depends(get_current_user)):
             "message": "Google Drive connection failed"
         }
 
+FILE_LIST_FIELDS = "id, name, mimeType, size, modifiedTime, thumbnailLink, owners, shared, parents, webViewLink"
+
+def _build_files_query(mime_type: Optional[str]) -> str:
+    # Build query - be more inclusive for readonly scope
+    query_parts = ["trashed=false"]
+    
+    # Add MIME type filter if specified
+    if mime_type:
+        if mime_type == 'image/*':
+            query_parts.append("(mimeType contains 'image/')")
+        elif mime_type == 'video/*':
+            query_parts.append("(mimeType contains 'video/')")
+        else:
+            query_parts.append(f"mimeType contains '{mime_type}'")
+    
+    # For readonly scope, we can access all files the user has access to
+    # Remove the restrictive owner filter that was causing issues
+    # query_parts.append("(owners in me or sharedWithMe=true)")
+    
+    return " and ".join(query_parts)
+
 @router.get("/files")
 async def list_files(
     mime_type: Optional[str] = None,
+    page_token: Optional[str] = None,
+    page_size: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(get_current_user)
 ):
-    """List files from Google Drive."""
+    """
+    List one page of files from Google Drive.
+    
+    Pass the returned next_page_token back as page_token to fetch the next
+    page, or use /files/stream to receive every page as it arrives.
+    """
     try:
-        service = get_google_drive_service()
-        
-        # Build query - be more inclusive for readonly scope
-        query_parts = ["trashed=false"]
-        
-        # Add MIME type filter if specified
-        if mime_type:
-            if mime_type == 'image/*':
-                query_parts.append("(mimeType contains 'image/')")
-            elif mime_type == 'video/*':
-                query_parts.append("(mimeType contains 'video/')")
-            else:
-                query_parts.append(f"mimeType contains '{mime_type}'")
-        
-        # For readonly scope, we can access all files the user has access to
-        # Remove the restrictive owner filter that was causing issues
-        # query_parts.append("(owners in me or sharedWithMe=true)")
-        
-        query = " and ".join(query_parts)
-        
+        query = _build_files_query(mime_type)
         logger.info(f"Google Drive query: {query}")
         
-        results = service.files().list(
-            q=query,
-            pageSize=100,  # Increased page size
-            fields="nextPageToken, files(id, name, mimeType, size, modifiedTime, thumbnailLink, owners, shared, parents, webViewLink)",
-            orderBy="modifiedTime desc"  # Show most recent files first
-        ).execute()
-        
-        files = results.get('files', [])
-        logger.info(f"Found {len(files)} files in Google Drive")
-        
-        # Log some file details for debugging
-        for i, file in enumerate(files[:5]):  # Log first 5 files
-            logger.info(f"File {i+1}: {file.get('name')} ({file.get('mimeType')}) - Owners: {file.get('owners')}")
+        page = await google_drive_client.list_files_page(
+            query, FILE_LIST_FIELDS, page_size=page_size, page_token=page_token,
+            order_by="modifiedTime desc"  # Show most recent files first
+        )
+        files = page["files"]
+        logger.info(f"Found {len(files)} files in Google Drive page")
         
         return {
             "success": True,
             "files": files,
             "query": query,
-            "total_files": len(files)
+            "total_files": len(files),
+            "next_page_token": page["next_page_token"]
         }
     except Exception as e:
         logger.error(f"Error listing Google Drive files: {e}")
@@ -269,31 +193,62 @@ async def list_files(
             detail=f"Failed to list Google Drive files: {str(e)}"
         )
 
+@router.get("/files/stream")
+async def stream_files(
+    mime_type: Optional[str] = None,
+    page_size: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stream every matching file as newline-delimited JSON.
+    
+    Pages are fetched from Drive only as the client consumes the stream.
+    """
+    query = _build_files_query(mime_type)
+    logger.info(f"Google Drive streamed query: {query}")
+
+    async def generate():
+        try:
+            async for files in google_drive_client.iter_files(
+                query, FILE_LIST_FIELDS, page_size=page_size, order_by="modifiedTime desc"
+            ):
+                for file in files:
+                    yield json.dumps(file) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming Google Drive files: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @router.get("/download/{file_id}")
 async def download_file(
     file_id: str,
     current_user: User = Depends(get_current_user)
 ):
-    """Download a file from Google Drive."""
+    """
+    Download a file from Google Drive as base64.
+    
+    Prefer POST /import/{file_id}, which hosts the file server-side and
+    returns a media handle instead of sending the bytes to the client.
+    """
     try:
-        service = get_google_drive_service()
-        
-        # Get file metadata
-        file_metadata = service.files().get(fileId=file_id).execute()
-        
-        # Download the file
-        request = service.files().get_media(fileId=file_id)
-        file_content = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
-        
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
+        def download(service):
+            # Get file metadata
+            file_metadata = service.files().get(fileId=file_id).execute()
+            
+            # Download the file
+            request = service.files().get_media(fileId=file_id)
+            file_content = io.BytesIO()
+            downloader = MediaIoBaseDownload(file_content, request, chunksize=DRIVE_DOWNLOAD_CHUNK_SIZE)
+            
+            done = False
+            while done is False:
+                status, done = downloader.next_chunk()
+            return file_metadata, file_content.getvalue()
         
-        file_content.seek(0)
+        file_metadata, file_data = await google_drive_client.run(download)
         
         # Return the file content as base64
-        file_data = file_content.read()
         file_base64 = base64.b64encode(file_data).decode('utf-8')
         
         return {
@@ -310,18 +265,129 @@ async def download_file(
             detail=f"Failed to download file from Google Drive: {str(e)}"
         )
 
+def _download_drive_file_to_staging(service, file_id: str) -> dict:
+    """
+    Stream a Drive file in chunks into the local media staging directory.
+    
+    Blocking; run it in the thread pool. Only one chunk is held in memory at
+    a time. Returns the staged file path and the file's metadata.
+    """
+    file_metadata = service.files().get(fileId=file_id, fields="id, name, mimeType, size").execute()
+    mime_type = file_metadata.get('mimeType', 'application/octet-stream')
+    if not mime_type.startswith(("image/", "video/")):
+        raise HTTPException(status_code=400, detail=f"Only image and video files can be imported (got {mime_type})")
+    declared_size = int(file_metadata.get('size') or 0)
+    if declared_size > settings.max_upload_bytes:
+        raise HTTPException(status_code=413, detail="File exceeds the maximum media size")
+
+    fd, staging_path = tempfile.mkstemp(dir=local_media_store.staging_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            request = service.files().get_media(fileId=file_id)
+            downloader = MediaIoBaseDownload(f, request, chunksize=DRIVE_DOWNLOAD_CHUNK_SIZE)
+            done = False
+            while done is False:
+                status, done = downloader.next_chunk()
+                if f.tell() > settings.max_upload_bytes:
+                    raise HTTPException(status_code=413, detail="File exceeds the maximum media size")
+    except BaseException:
+        os.unlink(staging_path)
+        raise
+
+    return {
+        "file_path": staging_path,
+        "name": file_metadata.get('name', 'unknown'),
+        "mime_type": mime_type,
+        "size": os.path.getsize(staging_path)
+    }
+
+@router.post("/import/{file_id}")
+async def import_file(
+    file_id: str,
+    instagram_transform: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import a Drive image or video server-side and return a media handle.
+    
+    The file is streamed from Drive to disk and from disk to Cloudinary
+    (chunked for videos) in the thread pool, so it never crosses the client
+    link or sits fully in memory. If Cloudinary is unavailable the file is
+    kept in the local media store and the handle points at it. Pass the
+    media_handle to the create-post endpoints instead of base64 content.
+    """
+    started = time.monotonic()
+    staged = None
+    try:
+        staged = await google_drive_client.run(lambda service: _download_drive_file_to_staging(service, file_id))
+        download_seconds = time.monotonic() - started
+        file_info = {key: staged[key] for key in ("name", "mime_type", "size")}
+        media_type = "video" if staged["mime_type"].startswith("video/") else "image"
+
+        if media_type == "video":
+            uploader = (cloudinary_service.upload_video_with_instagram_transform if instagram_transform
+                        else cloudinary_service.upload_video)
+        else:
+            uploader = (cloudinary_service.upload_image_with_instagram_transform if instagram_transform
+                        else cloudinary_service.upload_image)
+        upload_result = await run_in_threadpool(uploader, staged["file_path"])
+
+        public_url = None
+        local_path = None
+        if upload_result["success"]:
+            public_url = upload_result["url"]
+        else:
+            logger.warning(f"Cloudinary upload of Drive file {file_id} failed ({upload_result.get('error')}), "
+                           f"keeping it in the local media store")
+            extension = os.path.splitext(staged["name"])[1] or (".mp4" if media_type == "video" else ".jpg")
+            local_path = await run_in_threadpool(
+                local_media_store.commit_file, staged["file_path"], f"drive_{uuid.uuid4().hex}{extension}"
+            )
+            staged = None
+
+        handle = media_handle_service.create_handle(
+            user_id=current_user.id,
+            public_url=public_url,
+            local_path=local_path,
+            media_type=media_type,
+            size_bytes=file_info["size"],
+            source="google_drive"
+        )
+        logger.info(f"📥 Imported Drive file {file_id} ({media_type}) in {time.monotonic() - started:.2f}s "
+                    f"(download {download_seconds:.2f}s, hosted={'cloudinary' if public_url else 'local'})")
+
+        return {
+            "success": True,
+            "media_handle": handle["media_handle"],
+            "expires_at": handle["expires_at"],
+            "url": public_url,
+            "fileName": file_info["name"],
+            "mimeType": file_info["mime_type"],
+            "mediaType": media_type,
+            "size": file_info["size"]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing Google Drive file {file_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to import file from Google Drive: {str(e)}"
+        )
+    finally:
+        if staged and os.path.exists(staged["file_path"]):
+            os.remove(staged["file_path"])
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
     folder_id: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user)
 ):
-    """Upload a file to Google Drive."""
+    """Upload a file to Google Drive (spooled to disk, then sent with a resumable upload)."""
+    spooled = None
     try:
-        service = get_google_drive_service()
-        
-        # Read file content
-        file_content = await file.read()
+        spooled = await spool_upload(file)
         
         # Prepare file metadata
         file_metadata = {
@@ -332,19 +398,22 @@ async def upload_file(
         if folder_id:
             file_metadata['parents'] = [folder_id]
         
-        # Create media upload
-        media = MediaIoBaseUpload(
-            io.BytesIO(file_content),
-            mimetype=file.content_type,
-            resumable=True
-        )
+        def upload(service):
+            # Create media upload
+            media = MediaFileUpload(
+                spooled["file_path"],
+                mimetype=file.content_type,
+                chunksize=DRIVE_DOWNLOAD_CHUNK_SIZE,
+                resumable=True
+            )
+            return service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id,name,webViewLink'
+            ).execute()
         
         # Upload the file
-        uploaded_file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id,name,webViewLink'
-        ).execute()
+        uploaded_file = await google_drive_client.run(upload)
         
         return {
             "success": True,
@@ -352,24 +421,27 @@ async def upload_file(
             "fileName": uploaded_file.get('name'),
             "webViewLink": uploaded_file.get('webViewLink')
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading file to Google Drive: {e}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to upload file to Google Drive: {str(e)}"
         )
+    finally:
+        if spooled:
+            remove_spooled_file(spooled["file_path"])
 
 @router.get("/folders")
 async def list_folders(current_user: User = Depends(get_current_user)):
     """List folders from Google Drive."""
     try:
-        service = get_google_drive_service()
-        
-        results = service.files().list(
+        results = await google_drive_client.run(lambda service: service.files().list(
             q="mimeType='application/vnd.google-apps.folder' and trashed=false",
             pageSize=50,
             fields="nextPageToken, files(id, name, modifiedTime)"
-        ).execute()
+        ).execute())
         
         folders = results.get('files', [])
         
@@ -390,32 +462,8 @@ async def google_drive_status(current_user: User = Depends(get_current_user)):
     Lightweight check: returns authenticated: true/false.
     NEVER triggers the OAuth flow.    
     """
-    creds_ok = False
-    
-    # Check environment variables first
-    if settings.google_drive_access_token and settings.google_drive_refresh_token:
-        try:
-            creds = Credentials(
-                token=settings.google_drive_access_token,
-                refresh_token=settings.google_drive_refresh_token,
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=settings.google_drive_client_id,
-                client_secret=settings.google_drive_client_secret,
-                scopes=SCOPES
-            )
-            creds_ok = creds.valid and not creds.expired
-        except Exception:
-            pass
-    
-    # Check token.json file if environment variables not available
-    if not creds_ok and os.path.exists("token.json"):
-        try:
-            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-            creds_ok = creds.valid and not creds.expired
-        except Exception:
-            # corrupted token.json – treat as unauthenticated
-            pass
-
+    # Expired tokens with a refresh token count: the background refresher renews them
+    creds_ok = await run_in_threadpool(google_drive_client.is_authenticated)
     return {"authenticated": creds_ok}
 
 @router.get("/authorize")
@@ -426,30 +474,8 @@ async def get_google_drive_authorize_url(current_user: User = Depends(get_curren
     """
     try:
         # Check if already authenticated
-        if settings.google_drive_access_token and settings.google_drive_refresh_token:
-            try:
-                creds = Credentials(
-                    token=settings.google_drive_access_token,
-                    refresh_token=settings.google_drive_refresh_token,
-                    token_uri="https://oauth2.googleapis.com/token",
-                    client_id=settings.google_drive_client_id,
-                    client_secret=settings.google_drive_client_secret,
-                    scopes=SCOPES
-                )
-                if creds and creds.valid and not creds.expired:
-                    return {"consent_url": None, "already_authenticated": True}
-            except Exception:
-                # Invalid environment tokens, continue with auth flow
-                pass
-        
-        if os.path.exists("token.json"):
-            try:
-                creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-                if creds and creds.valid and not creds.expired:
-                    return {"consent_url": None, "already_authenticated": True}
-            except Exception:
-                # Invalid token file, continue with auth flow
-                pass
+        if await run_in_threadpool(google_drive_client.is_authenticated):
+            return {"consent_url": None, "already_authenticated": True}
 
         # Check if we have environment variables configured
         if not settings.google_drive_client_id or not settings.google_drive_client_secret:
@@ -536,6 +562,7 @@ async def oauth2callback(request: FastAPIRequest):
         # Save credentials
         with open("token.json", 'w') as token:
             token.write(creds.to_json())
+        google_drive_client.invalidate()
         
         logger.info(f"Google Drive credentials saved successfully")
 
@@ -577,6 +604,7 @@ async def disconnect_google_drive(current_user: User = Depends(get_current_user)
             settings.google_drive_access_token = None
         if hasattr(settings, 'google_drive_refresh_token'):
             settings.google_drive_refresh_token = None
+        google_drive_client.invalidate()
         
         return {
             "success": True,
@@ -593,55 +621,26 @@ async def disconnect_google_drive(current_user: User = Depends(get_current_user)
 async def get_google_drive_token(current_user: User = Depends(get_current_user)):
     """Get a fresh access token for Google Drive API."""
     try:
-        service = get_google_drive_service()
-        
-        # Get the current credentials
-        creds = None
-        if settings.google_drive_access_token and settings.google_drive_refresh_token:
-            try:
-                creds = Credentials(
-                    token=settings.google_drive_access_token,
-                    refresh_token=settings.google_drive_refresh_token,
-                    token_uri="https://oauth2.googleapis.com/token",
-                    client_id=settings.google_drive_client_id,
-                    client_secret=settings.google_drive_client_secret,
-                    scopes=SCOPES
-                )
-            except Exception:
-                creds = None
-        
-        if not creds and os.path.exists("token.json"):
-            try:
-                creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-            except Exception:
-                creds = None
-        
-        if not creds:
+        # Cached credentials, refreshed ahead of expiry by the background refresher
+        creds = await run_in_threadpool(google_drive_client.get_credentials)
+        if not creds or not creds.valid:
             raise HTTPException(
                 status_code=401,
                 detail="Google Drive not authenticated"
             )
         
-        # Refresh token if needed
-        if creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                # Save updated credentials
-                with open("token.json", 'w') as token:
-                    token.write(creds.to_json())
-            except Exception as e:
-                logger.error(f"Failed to refresh token: {e}")
-                raise HTTPException(
-                    status_code=401,
-                    detail="Failed to refresh Google Drive token"
-                )
+        expires_in = 3600  # Google tokens typically expire in 1 hour
+        if creds.expiry:
+            expires_in = max(0, int((creds.expiry - datetime.utcnow()).total_seconds()))
         
         return {
             "success": True,
             "access_token": creds.token,
             "token_type": "Bearer",
-            "expires_in": 3600  # Google tokens typically expire in 1 hour
+            "expires_in": expires_in
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting Google Drive token: {e}")
         raise HTTPException(
@@ -653,23 +652,21 @@ async def get_google_drive_token(current_user: User = Depends(get_current_user))
 async def test_image_files(current_user: User = Depends(get_current_user)):
     """Test endpoint to specifically list image and video files."""
     try:
-        service = get_google_drive_service()
-        
         # Test for image files
         image_query = "trashed=false and (mimeType contains 'image/')"
-        image_results = service.files().list(
+        image_results = await google_drive_client.run(lambda service: service.files().list(
             q=image_query,
             pageSize=10,
             fields="files(id, name, mimeType, size, modifiedTime)"
-        ).execute()
+        ).execute())
         
         # Test for video files
         video_query = "trashed=false and (mimeType contains 'video/')"
-        video_results = service.files().list(
+        video_results = await google_drive_client.run(lambda service: service.files().list(
             q=video_query,
             pageSize=10,
             fields="files(id, name, mimeType, size, modifiedTime)"
-        ).execute()
+        ).execute())
         
         return {
             "success": True,
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Body, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Body, Query, BackgroundTasks, Request
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.database import get_db
 from app.api.auth import get_current_user
 from app.models.user import User
@@ -18,9 +19,21 @@ from app.schemas.social_media import (
     LinkedInConnectRequest
 )
 from pydantic import BaseModel, Field, model_validator
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import httpx
 import logging
+import time
 from app.services.instagram_service import instagram_service
+from app.services.media_handle_service import media_handle_service
+from app.services.media_hosting_service import media_hosting_service
+from app.services.token_health_service import token_health_service, account_snapshot
+from app.services.social_account_service import social_account_service
+from app.services.upsert_index_service import MissingUpsertIndexError
+from app.utils.uploads import spool_upload, remove_spooled_file
+from app.utils.concurrency import run_bounded
+from app.services.local_media_store import local_media_store
+from starlette.concurrency import run_in_threadpool
 from app.services.cloudinary_service import cloudinary_service
 from uuid import uuid4
 from app.services.linkedin_service import LinkedInService
@@ -35,6 +48,7 @@ class ImageGenerationRequest(BaseModel):
     """Request model for image generation."""
     image_prompt: str = Field(..., min_length=1, max_length=500, description="Prompt for image generation")
     post_type: str = Field(default="feed", description="Type of post for sizing (feed, story, square, etc.)")
+    seed: Optional[int] = Field(None, ge=1, le=4294967295, description="Seed returned by an earlier generation; regenerates that image from the image cache")
 
 
 class UnifiedFacebookPostRequest(BaseModel):
@@ -45,6 +59,7 @@ class UnifiedFacebookPostRequest(BaseModel):
     image_prompt: Optional[str] = Field(None, description="Prompt for AI image generation")
     image_url: Optional[str] = Field(None, description="URL of existing image to use")
     video_url: Optional[str] = Field(None, description="URL of existing video to use (base64 data URL)")
+    media_handle: Optional[str] = Field(None, description="Handle of a previewed image from /social/facebook/generate-image or of media imported via /api/google-drive/import")
     post_type: str = Field(default="feed", description="Type of post for sizing")
     use_ai_text: bool = Field(default=False, description="Whether to generate text using AI")
     use_ai_image: bool = Field(default=False, description="Whether to generate image using AI")
@@ -57,11 +72,12 @@ class UnifiedFacebookPostRequest(BaseModel):
             self.content_prompt and self.content_prompt.strip(),
             self.image_url and self.image_url.strip(),
             self.image_prompt and self.image_prompt.strip(),
-            self.video_url and self.video_url.strip()
+            self.video_url and self.video_url.strip(),
+            self.media_handle and self.media_handle.strip()
         ])
         
         if not has_content:
-            raise ValueError("At least one of text_content, content_prompt, image_url, image_prompt, or video_url must be provided")
+            raise ValueError("At least one of text_content, content_prompt, image_url, image_prompt, video_url, or media_handle must be provided")
         
         return self
 
@@ -85,7 +101,7 @@ class BulkComposerPost(BaseModel):
     caption: str = Field(..., description="Post caption")
     scheduled_date: str = Field(..., description="Scheduled date (YYYY-MM-DD)")
     scheduled_time: str = Field(..., description="Scheduled time (HH:MM)")
-    media_file: Optional[str] = Field(None, description="Base64 encoded media file")
+    media_file: Optional[str] = Field(None, description="Media URL from /social/bulk-composer/upload-media (base64 still accepted)")
     media_filename: Optional[str] = Field(None, description="Media filename")
 
 
@@ -104,12 +120,14 @@ class UnifiedInstagramPostRequest(BaseModel):
     image_url: Optional[str] = Field(None, description="URL of existing image to use")
     video_url: Optional[str] = Field(None, description="URL of existing video to use (base64 data URL)")
     video_filename: Optional[str] = Field(None, description="Filename of existing video")
-    media_file: Optional[str] = Field(None, description="Base64 encoded media file (for video uploads)")
+    media_file: Optional[str] = Field(None, description="Base64 encoded media file (deprecated: stream via /social/instagram/upload-video and pass video_filename)")
     media_filename: Optional[str] = Field(None, description="Media filename (for video uploads)")
     post_type: str = Field(default="feed", description="Type of post for sizing")
     use_ai_text: bool = Field(default=False, description="Whether to generate text using AI")
     use_ai_image: bool = Field(default=False, description="Whether to generate image using AI")
     media_type: str = Field(default="image", description="Type of media (image, video, carousel)")
+    media_handle: Optional[str] = Field(None, description="Handle of a previewed image from /social/instagram/generate-image")
+    media_handles: Optional[List[str]] = Field(None, description="Handles of previewed carousel images from /social/instagram/generate-carousel")
     thumbnail_url: Optional[str] = None
     thumbnail_filename: Optional[str] = None
     thumbnail_file: Optional[str] = None
@@ -125,11 +143,13 @@ class UnifiedInstagramPostRequest(BaseModel):
             self.video_url and self.video_url.strip(),
             self.video_filename and self.video_filename.strip(),
             self.media_file and self.media_file.strip(),
-            self.media_filename and self.media_filename.strip()
+            self.media_filename and self.media_filename.strip(),
+            self.media_handle and self.media_handle.strip(),
+            self.media_handles
         ])
         
         if not has_content:
-            raise ValueError("At least one of caption, content_prompt, image_url, image_prompt, video_url, video_filename, media_file, or media_filename must be provided")
+            raise ValueError("At least one of caption, content_prompt, image_url, image_prompt, video_url, video_filename, media_file, media_filename, or media_handle must be provided")
         
         return self
 
@@ -159,6 +179,7 @@ class InstagramImageGenerationRequest(BaseModel):
     """Request model for Instagram image generation."""
     image_prompt: str = Field(..., min_length=1, max_length=500, description="Prompt for image generation")
     post_type: str = Field(default="feed", description="Type of post for sizing (feed, story, square, etc.)")
+    seed: Optional[int] = Field(None, ge=1, le=4294967295, description="Seed returned by an earlier generation; regenerates that image from the image cache")
 
 
 class InstagramCarouselGenerationRequest(BaseModel):
@@ -185,18 +206,29 @@ async def get_social_accounts(
 ):
     """Get all connected social accounts for the current user."""
     try:
-        accounts = db.query(SocialAccount).filter(
+        # Published post counts are aggregated in the same query (one query for any number of accounts)
+        published_counts = db.query(
+            Post.social_account_id.label("social_account_id"),
+            func.count(Post.id).label("media_count")
+        ).filter(
+            Post.social_account_id.in_(
+                db.query(SocialAccount.id).filter(SocialAccount.user_id == current_user.id)
+            ),
+            Post.status == PostStatus.PUBLISHED
+        ).group_by(Post.social_account_id).subquery()
+        
+        rows = db.query(
+            SocialAccount,
+            func.coalesce(published_counts.c.media_count, 0)
+        ).outerjoin(
+            published_counts, published_counts.c.social_account_id == SocialAccount.id
+        ).filter(
             SocialAccount.user_id == current_user.id,
             SocialAccount.is_connected == True
         ).all()
         result = []
-        for acc in accounts:
+        for acc, media_count in rows:
             try:
-                media_count = db.query(Post).filter(
-                    Post.social_account_id == acc.id,
-                    Post.status == PostStatus.PUBLISHED
-                ).count()
-                
                 # Create a clean dict with proper defaults for None values
                 acc_dict = {
                     "id": acc.id,
@@ -273,29 +305,37 @@ async def get_facebook_status(
     personal_accounts = [acc for acc in facebook_accounts if acc.account_type == "personal"]
     page_accounts = [acc for acc in facebook_accounts if acc.account_type == "page"]
 
-    # --- Ensure AUTO_REPLY rule is present and enabled for each page ---
-    for acc in page_accounts:
-        # Fetch latest page info from Facebook
+    # Fetch latest page info from Facebook for all pages concurrently
+    async def fetch_page_info(client, acc):
+        if not acc.access_token:
+            return None
         try:
-            page_info = None
-            if acc.access_token:
-                async with __import__('httpx').AsyncClient() as client:
-                    resp = await client.get(
-                        f"https://graph.facebook.com/v23.0/{acc.platform_user_id}",
-                        params={
-                            "fields": "fan_count,name,picture",
-                            "access_token": acc.access_token
-                        }
-                    )
-                    if resp.status_code == 200:
-                        page_info = resp.json()
-            if page_info:
-                acc.follower_count = page_info.get("fan_count", acc.follower_count)
-                acc.display_name = page_info.get("name", acc.display_name)
-                acc.profile_picture_url = page_info.get("picture", {}).get("data", {}).get("url", acc.profile_picture_url)
-                db.commit()
+            resp = await client.get(
+                f"https://graph.facebook.com/v23.0/{acc.platform_user_id}",
+                params={
+                    "fields": "fan_count,name,picture",
+                    "access_token": acc.access_token
+                }
+            )
+            if resp.status_code == 200:
+                return resp.json()
         except Exception as e:
             logger.warning(f"Could not update follower count for page {acc.platform_user_id}: {e}")
+        return None
+    
+    async with httpx.AsyncClient() as client:
+        page_infos = await asyncio.gather(*(fetch_page_info(client, acc) for acc in page_accounts))
+    
+    # Token health answers from its cache; accounts without a fresh result are validated in the background
+    token_health_service.schedule(account_snapshot(acc) for acc in facebook_accounts)
+    
+    # --- Ensure AUTO_REPLY rule is present and enabled for each page ---
+    for acc, page_info in zip(page_accounts, page_infos):
+        if page_info:
+            acc.follower_count = page_info.get("fan_count", acc.follower_count)
+            acc.display_name = page_info.get("name", acc.display_name)
+            acc.profile_picture_url = page_info.get("picture", {}).get("data", {}).get("url", acc.profile_picture_url)
+            db.commit()
         # Ensure AUTO_REPLY rule
         auto_reply_rule = db.query(AutomationRule).filter(
             AutomationRule.user_id == current_user.id,
@@ -337,7 +377,8 @@ async def get_facebook_status(
                 "platform_id": acc.platform_user_id,
                 "name": acc.display_name or "Personal Profile",
                 "profile_picture": acc.profile_picture_url,
-                "connected_at": acc.connected_at.isoformat() if acc.connected_at else None
+                "connected_at": acc.connected_at.isoformat() if acc.connected_at else None,
+                **token_health_service.get_status(acc.id, acc.access_token)
             } for acc in personal_accounts],
             "pages": [{
                 "id": acc.id,
@@ -348,7 +389,8 @@ async def get_facebook_status(
                 "follower_count": acc.follower_count or 0,
                 "can_post": acc.platform_data.get("can_post", True) if acc.platform_data else True,
                 "can_comment": acc.platform_data.get("can_comment", True) if acc.platform_data else True,
-                "connected_at": acc.connected_at.isoformat() if acc.connected_at else None
+                "connected_at": acc.connected_at.isoformat() if acc.connected_at else None,
+                **token_health_service.get_status(acc.id, acc.access_token)
             } for acc in page_accounts]
         },
         "total_accounts": len(facebook_accounts),
@@ -415,9 +457,13 @@ async def connect_facebook(
         logger.info(f"Facebook connect request for user {current_user.id}: {request.user_id}")
         logger.info(f"Pages data received: {len(request.pages or [])} pages")
         
+        timings = {}
+        
         # Exchange short-lived token for long-lived token
         logger.info("Exchanging short-lived token for long-lived token...")
+        phase_start = time.monotonic()
         token_exchange_result = await facebook_service.exchange_for_long_lived_token(request.access_token)
+        timings["exchange"] = time.monotonic() - phase_start
         
         if not token_exchange_result["success"]:
             logger.error(f"Token exchange failed: {token_exchange_result.get('error')}")
@@ -431,8 +477,16 @@ async def connect_facebook(
         
         logger.info(f"Successfully got long-lived token, expires at: {expires_at}")
         
-        # Validate the new long-lived token
-        validation_result = await facebook_service.validate_access_token(long_lived_token)
+        # Validate the new long-lived token and fetch long-lived page tokens concurrently
+        phase_start = time.monotonic()
+        lookups = [facebook_service.validate_access_token(long_lived_token)]
+        if request.pages:
+            lookups.append(facebook_service.get_long_lived_page_tokens(long_lived_token))
+        lookup_results = await asyncio.gather(*lookups)
+        validation_result = lookup_results[0]
+        long_lived_pages = lookup_results[1] if request.pages else []
+        timings["validate_and_pages"] = time.monotonic() - phase_start
+        
         if not validation_result["valid"]:
             raise HTTPException(
                 status_code=400,
@@ -440,6 +494,7 @@ async def connect_facebook(
             )
         
         # Check if account already exists
+        phase_start = time.monotonic()
         existing_account = db.query(SocialAccount).filter(
             SocialAccount.user_id == current_user.id,
             SocialAccount.platform == "facebook",
@@ -474,17 +529,18 @@ async def connect_facebook(
             db.commit()
             db.refresh(account)
         
-        # Handle pages if provided - get long-lived page tokens
+        # Seed token health so the fresh token is not revalidated right away
+        token_health_service.record(account.id, long_lived_token, validation_result, expires_at)
+        
+        # Persist all pages with one upsert, then their auto-reply rules with one lookup
         connected_pages = []
         if request.pages:
             logger.info(f"Processing {len(request.pages)} Facebook pages with long-lived tokens")
             
-            # Get long-lived page tokens
-            long_lived_pages = await facebook_service.get_long_lived_page_tokens(long_lived_token)
-            
             # Create a mapping of page IDs to long-lived tokens
             page_token_map = {page["id"]: page["access_token"] for page in long_lived_pages}
             
+            page_rows = []
             for page_data in request.pages:
                 # Ensure we have a dict so we can use .get safely
                 if hasattr(page_data, "dict"):
@@ -497,129 +553,49 @@ async def connect_facebook(
                     logger.warning(f"No access token found for page {page_id}")
                     continue
                 
-                # Check if page account already exists
-                existing_page = db.query(SocialAccount).filter(
-                    SocialAccount.user_id == current_user.id,
-                    SocialAccount.platform == "facebook",
-                    SocialAccount.platform_user_id == page_id
-                ).first()
-                
-                if existing_page:
-                    # Update existing page account
-                    existing_page.access_token = page_access_token
-                    existing_page.token_expires_at = None  # Page tokens don't expire
-                    existing_page.display_name = page_data.get("name", existing_page.display_name)
-                    existing_page.profile_picture_url = page_data.get("picture", {}).get("data", {}).get("url", existing_page.profile_picture_url)
-                    existing_page.follower_count = page_data.get("fan_count", existing_page.follower_count)
-                    existing_page.is_connected = True
-                    existing_page.last_sync_at = datetime.utcnow()
-                    existing_page.platform_data = {
+                tasks = page_data.get("tasks") or []
+                page_rows.append({
+                    "user_id": current_user.id,
+                    "platform": "facebook",
+                    "platform_user_id": page_id,
+                    "username": (page_data.get("name") or "").replace(" ", "").lower(),
+                    "display_name": page_data.get("name"),
+                    "access_token": page_access_token,
+                    "token_expires_at": None,  # Page tokens don't expire
+                    "profile_picture_url": (page_data.get("picture") or {}).get("data", {}).get("url"),
+                    "follower_count": page_data.get("fan_count"),
+                    "account_type": "page",
+                    "platform_data": {
                         "category": page_data.get("category"),
-                        "tasks": page_data.get("tasks", []),
-                        "can_post": "CREATE_CONTENT" in page_data.get("tasks", []),
-                        "can_comment": "MODERATE" in page_data.get("tasks", [])
-                    }
-                    page_account = existing_page
-                else:
-                    # Create new page account
-                    page_account = SocialAccount(
-                        user_id=current_user.id,
-                        platform="facebook",
-                        platform_user_id=page_id,
-                        username=page_data.get("name", "").replace(" ", "").lower(),
-                        display_name=page_data.get("name"),
-                        access_token=page_access_token,
-                        token_expires_at=None,  # Page tokens don't expire
-                        profile_picture_url=page_data.get("picture", {}).get("data", {}).get("url"),
-                        follower_count=page_data.get("fan_count", 0),
-                        account_type="page",
-                        platform_data={
-                            "category": page_data.get("category"),
-                            "tasks": page_data.get("tasks", []),
-                            "can_post": "CREATE_CONTENT" in page_data.get("tasks", []),
-                            "can_comment": "MODERATE" in page_data.get("tasks", [])
-                        },
-                        is_connected=True,
-                        last_sync_at=datetime.utcnow()
-                    )
-                    db.add(page_account)
-                
-                if not hasattr(page_account, 'id') or page_account.id is None:
-                    logger.error(f"Page account for page_id={page_id} has no id after creation. Skipping automation rule creation for this page.")
-                    continue
-                # --- Ensure auto-reply rule is created and enabled for this page ---
-                from app.models.automation_rule import AutomationRule, RuleType, TriggerType
-                auto_reply_rule = db.query(AutomationRule).filter(
-                    AutomationRule.user_id == current_user.id,
-                    AutomationRule.social_account_id == page_account.id,
-                    AutomationRule.rule_type == RuleType.AUTO_REPLY
-                ).first()
-                if auto_reply_rule:
-                    auto_reply_rule.is_active = True
-                    # Set to all posts by default
-                    auto_reply_rule.actions = auto_reply_rule.actions or {}
-                    auto_reply_rule.actions["ai_enabled"] = True
-                    auto_reply_rule.actions["selected_facebook_post_ids"] = []  # Empty means all posts
-                else:
-                    auto_reply_rule = AutomationRule(
-                        user_id=current_user.id,
-                        social_account_id=page_account.id,
-                        name=f"Auto Reply - {page_account.display_name}",
-                        rule_type=RuleType.AUTO_REPLY,
-                        trigger_type=TriggerType.ENGAGEMENT_BASED,
-                        trigger_conditions={
-                            "event": "comment",
-                            "selected_posts": []  # Empty means all posts
-                        },
-                        actions={
-                            "ai_enabled": True,
-                            "selected_facebook_post_ids": []  # Empty means all posts
-                        },
-                        is_active=True
-                    )
-                    db.add(auto_reply_rule)
-                # --- End auto-reply rule logic ---
-                
-                # --- Ensure auto-reply MESSAGE rule is created and enabled for this page ---
-                auto_reply_msg_rule = db.query(AutomationRule).filter(
-                    AutomationRule.user_id == current_user.id,
-                    AutomationRule.social_account_id == page_account.id,
-                    AutomationRule.rule_type == RuleType.AUTO_REPLY_MESSAGE.value
-                ).first()
-                if auto_reply_msg_rule:
-                    auto_reply_msg_rule.is_active = True
-                    auto_reply_msg_rule.actions = auto_reply_msg_rule.actions or {}
-                    auto_reply_msg_rule.actions["ai_enabled"] = True
-                    auto_reply_msg_rule.actions["message_template"] = "Thank you for your message! We'll get back to you soon."
-                else:
-                    auto_reply_msg_rule = AutomationRule(
-                        user_id=current_user.id,
-                        social_account_id=page_account.id,
-                        name=f"Auto Reply Message - {page_account.display_name}",
-                        rule_type=RuleType.AUTO_REPLY_MESSAGE.value,
-                        trigger_type=TriggerType.ENGAGEMENT_BASED,
-                        trigger_conditions={
-                            "event": "message"
-                        },
-                        actions={
-                            "ai_enabled": True,
-                            "message_template": "Thank you for your message! We'll get back to you soon."
-                        },
-                        is_active=True
-                    )
-                    db.add(auto_reply_msg_rule)
-                # --- End auto-reply MESSAGE rule logic ---
-                
+                        "tasks": tasks,
+                        "can_post": "CREATE_CONTENT" in tasks,
+                        "can_comment": "MODERATE" in tasks
+                    },
+                    "is_connected": True,
+                    "last_sync_at": datetime.utcnow()
+                })
                 connected_pages.append({
                     "id": page_id,
                     "name": page_data.get("name"),
                     "category": page_data.get("category"),
                     "access_token_type": "long_lived_page_token"
                 })
+            
+            page_accounts = social_account_service.bulk_upsert(
+                db, page_rows,
+                update_columns=["access_token", "token_expires_at", "display_name", "profile_picture_url",
+                                "follower_count", "platform_data", "is_connected", "last_sync_at"],
+                keep_existing_if_null=["display_name", "profile_picture_url", "follower_count"]
+            )
+            social_account_service.ensure_auto_reply_rules(db, current_user.id, page_accounts)
         
         db.commit()
+        timings["persist"] = time.monotonic() - phase_start
         
-        logger.info(f"Successfully connected Facebook account {request.user_id} with {len(connected_pages)} pages")
+        logger.info(
+            f"Successfully connected Facebook account {request.user_id} with {len(connected_pages)} pages: "
+            + ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in timings.items())
+        )
         
         return {
             "success": True,
@@ -636,6 +612,9 @@ async def connect_facebook(
         
     except HTTPException:
         raise
+    except MissingUpsertIndexError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logger.error(f"Error connecting Facebook account: {e}")
         raise HTTPException(
@@ -999,15 +978,26 @@ async def toggle_auto_reply(
         )
 
 
+def _refresh_fallback(account: Dict, error: BaseException) -> Dict:
+    """Result for an account whose validation or refresh timed out or raised."""
+    if isinstance(error, asyncio.TimeoutError):
+        return {"valid": False, "timed_out": True, "error": "Timed out validating token"}
+    return {"valid": False, "error": str(error)}
+
+
 @router.post("/social/facebook/refresh-tokens")
 async def refresh_facebook_tokens(
+    force: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Validate and refresh Facebook tokens for all connected accounts."""
+    """
+    Validate Facebook tokens for all connected accounts.
+    
+    Results come from the token health cache when fresh; pass force=true to
+    revalidate every account against Graph.
+    """
     try:
-        from app.services.facebook_service import facebook_service
-        
         # Get all Facebook accounts for this user
         facebook_accounts = db.query(SocialAccount).filter(
             SocialAccount.user_id == current_user.id,
@@ -1022,56 +1012,49 @@ async def refresh_facebook_tokens(
                 "accounts": []
             }
         
-        refresh_results = []
+        # Validate concurrently with a per-account time limit; fresh cached results
+        # are reused unless force is set
+        from app.config import get_settings
+        validation_results = await run_bounded(
+            [account_snapshot(account) for account in facebook_accounts],
+            lambda snapshot: token_health_service.validate_account(snapshot, force=force),
+            fallback=_refresh_fallback,
+            limit=token_health_service.max_concurrent,
+            timeout=get_settings().account_refresh_timeout_seconds,
+            label=lambda snapshot: f"Facebook account {snapshot['id']}"
+        )
         
-        for account in facebook_accounts:
-            try:
-                logger.info(f"Validating token for account {account.id} ({account.display_name})")
-                
-                validation_result = await facebook_service.validate_and_refresh_token(
-                    account.access_token,
-                    account.token_expires_at
-                )
-                
-                if validation_result["valid"]:
-                    # Token is still valid
-                    account.last_sync_at = datetime.utcnow()
-                    refresh_results.append({
-                        "account_id": account.id,
-                        "platform_user_id": account.platform_user_id,
-                        "name": account.display_name,
-                        "status": "valid",
-                        "message": "Token is valid"
-                    })
-                else:
-                    # Token is invalid or expired
-                    if validation_result.get("expired") or validation_result.get("needs_reconnection"):
-                        account.is_connected = False
-                        refresh_results.append({
-                            "account_id": account.id,
-                            "platform_user_id": account.platform_user_id,
-                            "name": account.display_name,
-                            "status": "expired",
-                            "message": "Token expired - reconnection required",
-                            "needs_reconnection": True
-                        })
-                    else:
-                        refresh_results.append({
-                            "account_id": account.id,
-                            "platform_user_id": account.platform_user_id,
-                            "name": account.display_name,
-                            "status": "error",
-                            "message": validation_result.get("error", "Unknown validation error")
-                        })
-                
-            except Exception as e:
-                logger.error(f"Error validating account {account.id}: {e}")
+        refresh_results = []
+        for account, validation_result in zip(facebook_accounts, validation_results):
+            if validation_result["valid"]:
+                # Token is still valid
+                account.last_sync_at = datetime.utcnow()
+                refresh_results.append({
+                    "account_id": account.id,
+                    "platform_user_id": account.platform_user_id,
+                    "name": account.display_name,
+                    "status": "valid",
+                    "message": "Token is valid",
+                    "cached": validation_result.get("cached", False)
+                })
+            elif validation_result.get("expired") or validation_result.get("needs_reconnection"):
+                # Token is invalid or expired
+                account.is_connected = False
+                refresh_results.append({
+                    "account_id": account.id,
+                    "platform_user_id": account.platform_user_id,
+                    "name": account.display_name,
+                    "status": "expired",
+                    "message": "Token expired - reconnection required",
+                    "needs_reconnection": True
+                })
+            else:
                 refresh_results.append({
                     "account_id": account.id,
                     "platform_user_id": account.platform_user_id,
                     "name": account.display_name,
                     "status": "error",
-                    "message": f"Validation error: {str(e)}"
+                    "message": validation_result.get("error", "Unknown validation error")
                 })
         
         db.commit()
@@ -1121,11 +1104,20 @@ async def generate_facebook_image(
         # Generate image
         result = await facebook_service.generate_image_only(
             image_prompt=request.image_prompt,
-            post_type=request.post_type
+            post_type=request.post_type,
+            seed=request.seed
         )
         
         if result["success"]:
             logger.info(f"Image generated successfully for user {current_user.id}")
+            # Keep the stored image server-side so create-post can publish it by handle
+            handle = media_handle_service.create_handle(
+                user_id=current_user.id,
+                public_url=result["image_url"] if result["is_public_url"] else None,
+                local_path=result["file_path"],
+                size_bytes=result["size"],
+                source="facebook_generate"
+            )
             return {
                 "success": True,
                 "message": "Image generated successfully",
@@ -1133,7 +1125,9 @@ async def generate_facebook_image(
                     "image_url": result["image_url"],
                     "filename": result["filename"],
                     "prompt": result["prompt"],
-                    "image_details": result["image_details"]
+                    "image_details": result["image_details"],
+                    "media_handle": handle["media_handle"],
+                    "media_handle_expires_at": handle["expires_at"]
                 }
             }
         else:
@@ -1156,12 +1150,18 @@ async def generate_facebook_image(
 @router.post("/social/facebook/create-post")
 async def create_unified_facebook_post(
     request: UnifiedFacebookPostRequest,
+    raw_request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Simplified endpoint for creating Facebook posts with enhanced error logging.
+    
+    Pass media_handle from /social/facebook/generate-image (or an imported
+    image or video from /api/google-drive/import) to publish the stored media
+    without sending it back or re-uploading it.
     """
+    started = time.monotonic()
     try:
         from app.services.facebook_service import facebook_service
         
@@ -1214,7 +1214,28 @@ async def create_unified_facebook_post(
         
         # Handle image content
         final_image_url = None
-        if request.use_ai_image or request.image_prompt:
+        final_image_file_path = None
+        final_video_url = None
+        final_video_file_path = None
+        if request.media_handle:
+            media = media_handle_service.resolve(request.media_handle, current_user.id)
+            if not media:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Media handle not found or expired. Please generate or import the media again."
+                )
+            # Handles from /api/google-drive/import may be videos
+            if media["media_type"] == "video":
+                final_video_url = media["public_url"]
+                if not final_video_url:
+                    final_video_file_path = media["local_path"]
+            else:
+                final_image_url = media["public_url"]
+                if not final_image_url:
+                    final_image_file_path = media["local_path"]
+            logger.info(f"Using stored {media['media_type']} for handle: "
+                        f"{media['public_url'] or media['local_path']}")
+        elif request.use_ai_image or request.image_prompt:
             logger.info("Generating AI image content")
             image_result = await facebook_service.generate_image_only(
                 image_prompt=request.image_prompt or request.content_prompt or request.text_content,
@@ -1235,15 +1256,14 @@ async def create_unified_facebook_post(
             logger.info(f"Using provided image URL: {final_image_url[:100] if final_image_url else 'None'}...")
         
         # Handle video content
-        final_video_url = None
-        if request.video_url:
+        if request.video_url and not (final_video_url or final_video_file_path):
             final_video_url = request.video_url
             logger.info(f"Using provided video URL: {final_video_url[:100] if final_video_url else 'None'}...")
         
         # Determine post type
-        if final_video_url:
+        if final_video_url or final_video_file_path:
             post_type = "video"
-        elif final_image_url:
+        elif final_image_url or final_image_file_path:
             post_type = "photo"
         else:
             post_type = "text"
@@ -1264,7 +1284,8 @@ async def create_unified_facebook_post(
             access_token=page_account.access_token,
             message=final_text_content or "Generated with AI",
             media_url=media_url,
-            media_type=post_type
+            media_type=post_type,
+            media_file_path=final_video_file_path or final_image_file_path
         )
         
         logger.info(f"Facebook service result: {result}")
@@ -1278,12 +1299,15 @@ async def create_unified_facebook_post(
                 db_post_type = PostType.TEXT
                 media_urls = []
                 
-                if final_video_url:
+                if final_video_url or final_video_file_path:
                     db_post_type = PostType.VIDEO
-                    media_urls = [final_video_url]
-                elif final_image_url:
+                    stored_url = final_video_url or local_media_store.url_for_path(final_video_file_path)
+                    media_urls = [stored_url] if stored_url else []
+                elif final_image_url or final_image_file_path:
                     db_post_type = PostType.IMAGE
-                    media_urls = [final_image_url]
+                    # Never store the server's filesystem path; the dashboard needs a URL it can load
+                    stored_url = final_image_url or local_media_store.url_for_path(final_image_file_path)
+                    media_urls = [stored_url] if stored_url else []
                 
                 post = Post(
                     user_id=current_user.id,
@@ -1316,6 +1340,7 @@ async def create_unified_facebook_post(
                 logger.warning("Continuing without database save due to error")
             
             logger.info(f"=== FACEBOOK POST SUCCESS ===")
+            _log_publish_request("Facebook create-post", raw_request, int(bool(request.media_handle)), started)
             
             return {
                 "success": True,
@@ -1480,100 +1505,87 @@ async def connect_instagram(
     try:
         logger.info(f"Instagram connect request for user {current_user.id}")
         
+        timings = {}
+        
         # Use the new service to get Instagram accounts with proper error handling
+        phase_start = time.monotonic()
         try:
-            instagram_accounts = instagram_service.get_facebook_pages_with_instagram(request.access_token)
+            instagram_accounts = await run_in_threadpool(
+                instagram_service.get_facebook_pages_with_instagram, request.access_token
+            )
         except Exception as service_error:
             # The service provides detailed troubleshooting messages
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=str(service_error)
             )
+        timings["discover"] = time.monotonic() - phase_start
         
-        # Save Instagram accounts to database
-        connected_accounts = []
+        # Prevent connecting an Instagram account that belongs to a different user
+        phase_start = time.monotonic()
+        owned_by_others = social_account_service.accounts_owned_by_others(
+            db, current_user.id, "instagram", [ig_account["platform_id"] for ig_account in instagram_accounts]
+        )
         for ig_account in instagram_accounts:
-            # Check if account already exists for any user
-            existing_account_any_user = db.query(SocialAccount).filter(
-                SocialAccount.platform == "instagram",
-                SocialAccount.platform_user_id == ig_account["platform_id"]
-            ).first()
-            if existing_account_any_user and existing_account_any_user.user_id != current_user.id:
-                # Prevent connecting the same Instagram account to a different user
+            if ig_account["platform_id"] in owned_by_others:
                 raise HTTPException(
                     status_code=400,
                     detail=f"Instagram account @{ig_account['username']} is already connected to another user."
                 )
-            # Check if account already exists for this user
-            existing_account = db.query(SocialAccount).filter(
-                SocialAccount.user_id == current_user.id,
-                SocialAccount.platform == "instagram",
-                SocialAccount.platform_user_id == ig_account["platform_id"]
-            ).first()
-            if existing_account:
-                # Update existing account
-                existing_account.username = ig_account["username"]
-                existing_account.display_name = ig_account["display_name"] or ig_account["username"]
-                existing_account.is_connected = True
-                existing_account.last_sync_at = datetime.utcnow()
-                existing_account.follower_count = ig_account.get("followers_count", 0)
-                existing_account.profile_picture_url = ig_account.get("profile_picture")
-                existing_account.platform_data = {
-                    "page_id": ig_account.get("page_id"),
-                    "page_name": ig_account.get("page_name"),
-                    "media_count": ig_account.get("media_count", 0),
-                    "page_access_token": ig_account.get("page_access_token")
-                }
-                existing_account.access_token = ig_account.get("page_access_token")
-                db.commit()
-                connected_accounts.append(existing_account)
-                logger.info(f"Updated existing Instagram account: {ig_account['username']} (ID: {ig_account['platform_id']})")
-            else:
-                # Create new account  
-                ig_account_obj = SocialAccount(
-                    user_id=current_user.id,
-                    platform="instagram",
-                    platform_user_id=ig_account["platform_id"],
-                    username=ig_account["username"],
-                    display_name=ig_account["display_name"] or ig_account["username"],
-                    account_type="business",
-                    follower_count=ig_account.get("followers_count", 0),
-                    profile_picture_url=ig_account.get("profile_picture"),
-                    platform_data={
-                        "page_id": ig_account.get("page_id"),
-                        "page_name": ig_account.get("page_name"),
-                        "media_count": ig_account.get("media_count", 0),
-                        "page_access_token": ig_account.get("page_access_token")
-                    },
-                    access_token=ig_account.get("page_access_token"),
-                    is_connected=True,
-                    last_sync_at=datetime.utcnow()
-                )
-                db.add(ig_account_obj)
-                db.commit()
-                db.refresh(ig_account_obj)
-                connected_accounts.append(ig_account_obj)
-                logger.info(f"Created new Instagram account: {ig_account['username']} (ID: {ig_account['platform_id']})")
         
-        logger.info(f"Instagram connection successful. Connected accounts: {len(connected_accounts)}")
+        # Save all Instagram accounts with one upsert
+        account_rows = [{
+            "user_id": current_user.id,
+            "platform": "instagram",
+            "platform_user_id": ig_account["platform_id"],
+            "username": ig_account["username"],
+            "display_name": ig_account["display_name"] or ig_account["username"],
+            "account_type": "business",
+            "follower_count": ig_account.get("followers_count", 0),
+            "profile_picture_url": ig_account.get("profile_picture"),
+            "platform_data": {
+                "page_id": ig_account.get("page_id"),
+                "page_name": ig_account.get("page_name"),
+                "media_count": ig_account.get("media_count", 0),
+                "page_access_token": ig_account.get("page_access_token")
+            },
+            "access_token": ig_account.get("page_access_token"),
+            "is_connected": True,
+            "last_sync_at": datetime.utcnow()
+        } for ig_account in instagram_accounts]
+        social_account_service.bulk_upsert(
+            db, account_rows,
+            update_columns=["username", "display_name", "follower_count", "profile_picture_url",
+                            "platform_data", "access_token", "is_connected", "last_sync_at"]
+        )
+        db.commit()
+        timings["persist"] = time.monotonic() - phase_start
+        
+        logger.info(
+            f"Instagram connection successful. Connected accounts: {len(account_rows)} ("
+            + ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in timings.items()) + ")"
+        )
         
         return SuccessResponse(
-            message=f"Instagram account(s) connected successfully ({len(connected_accounts)} accounts)",
+            message=f"Instagram account(s) connected successfully ({len(account_rows)} accounts)",
             data={
                 "accounts": [{
-                    "platform_id": acc.platform_user_id,
-                    "username": acc.username,
-                    "display_name": acc.display_name,
-                    "page_name": acc.platform_data.get("page_name"),
-                    "followers_count": acc.follower_count or 0,
-                    "media_count": acc.platform_data.get("media_count", 0),
-                    "profile_picture": acc.profile_picture_url
-                } for acc in connected_accounts]
+                    "platform_id": row["platform_user_id"],
+                    "username": row["username"],
+                    "display_name": row["display_name"],
+                    "page_name": row["platform_data"]["page_name"],
+                    "followers_count": row["follower_count"] or 0,
+                    "media_count": row["platform_data"]["media_count"],
+                    "profile_picture": row["profile_picture_url"]
+                } for row in account_rows]
             }
         )
         
     except HTTPException:
         raise
+    except MissingUpsertIndexError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logger.error(f"Error connecting Instagram account: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -1653,7 +1665,7 @@ async def create_instagram_post(
         else:
             # Manual post
             try:
-                post_result = instagram_service.create_post(
+                post_result = await instagram_service.create_post(
                     instagram_user_id=instagram_user_id,
                     page_access_token=page_access_token,
                     caption=caption,
@@ -1713,11 +1725,18 @@ async def create_instagram_post(
 @router.get("/social/instagram/media/{instagram_user_id}")
 async def get_instagram_media(
     instagram_user_id: str,
-    limit: int = 25,
+    limit: int = Query(25, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=400),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get Instagram media for a connected account."""
+    """
+    Get Instagram media for a connected account.
+    
+    Served from a per-account stale-while-revalidate cache; `cache` in the
+    response reports whether the listing was fresh, stale (refreshing in the
+    background) or fetched for this request.
+    """
     try:
         # Find the Instagram account
         account = db.query(SocialAccount).filter(
@@ -1740,19 +1759,21 @@ async def get_instagram_media(
                 detail="Page access token not found. Please reconnect your Instagram account."
             )
         
-        # Get media from Instagram API using new service
-        media_items = instagram_service.get_user_media(
-            instagram_user_id=instagram_user_id,
-            page_access_token=page_access_token,
-            limit=limit
+        from app.services.instagram_media_cache import instagram_media_cache
+        result = await instagram_media_cache.get_media(
+            instagram_user_id, page_access_token, limit=limit, offset=offset
         )
+        media_items = result["media"]
         
         return SuccessResponse(
             message=f"Retrieved {len(media_items)} media items",
             data={
                 "media": media_items,
                 "account_username": account.username,
-                "total_items": len(media_items)
+                "total_items": len(media_items),
+                "offset": offset,
+                "total_cached": result["total_cached"],
+                "cache": result["cache"]
             }
         )
         
@@ -1781,7 +1802,8 @@ async def generate_instagram_image(
         # Generate image using Instagram-optimized Stability AI
         image_result = await instagram_service.generate_instagram_image_with_ai(
             prompt=request.image_prompt,
-            post_type=request.post_type
+            post_type=request.post_type,
+            seed=request.seed
         )
         
         if not image_result["success"]:
@@ -1801,16 +1823,26 @@ async def generate_instagram_image(
                 detail=f"Image upload failed: {upload_result.get('error', 'Unknown error')}"
             )
         
+        handle = media_handle_service.create_handle(
+            user_id=current_user.id,
+            public_url=upload_result["url"],
+            source="instagram_generate"
+        )
+        
         return SuccessResponse(
             message="Instagram image generated successfully",
             data={
+                "media_handle": handle["media_handle"],
+                "media_handle_expires_at": handle["expires_at"],
                 "image_url": upload_result["url"],
                 "filename": f"instagram_generated_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.jpg",
                 "prompt": request.image_prompt,
                 "enhanced_prompt": image_result.get("enhanced_prompt"),
                 "post_type": request.post_type,
                 "width": image_result.get("width"),
-                "height": image_result.get("height")
+                "height": image_result.get("height"),
+                "seed": image_result.get("seed"),
+                "cached": image_result.get("cached", False)
             }
         )
         
@@ -1830,6 +1862,7 @@ async def upload_instagram_image(
     current_user: User = Depends(get_current_user)
 ):
     """Upload an image for Instagram using Cloudinary with Instagram-specific transforms."""
+    spooled = None
     try:
         from app.services.cloudinary_service import cloudinary_service
         
@@ -1840,11 +1873,13 @@ async def upload_instagram_image(
                 detail="Only image files are allowed"
             )
         
-        # Read file content
-        file_content = await file.read()
+        # Stream the upload to a temp file instead of reading it into memory
+        spooled = await spool_upload(file)
         
         # Upload to Cloudinary with Instagram-specific transforms
-        upload_result = cloudinary_service.upload_image_with_instagram_transform(file_content)
+        upload_result = await run_in_threadpool(
+            cloudinary_service.upload_image_with_instagram_transform, spooled["file_path"]
+        )
         
         if not upload_result["success"]:
             raise HTTPException(
@@ -1857,7 +1892,8 @@ async def upload_instagram_image(
             data={
                 "url": upload_result["url"],
                 "filename": file.filename,
-                "size": len(file_content)
+                "size": spooled["size"],
+                "sha256": spooled["sha256"]
             }
         )
         
@@ -1869,6 +1905,9 @@ async def upload_instagram_image(
             status_code=500,
             detail=f"Failed to upload Instagram image: {str(e)}"
         )
+    finally:
+        if spooled:
+            remove_spooled_file(spooled["file_path"])
 
 
 @router.post("/social/instagram/upload-video")
@@ -1876,10 +1915,9 @@ async def upload_instagram_video(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
 ):
-    """Upload a video for Instagram - saves to disk and uploads to Cloudinary."""
+    """Upload a video for Instagram - streams it to disk and uploads the file to Cloudinary."""
     try:
         from app.services.cloudinary_service import cloudinary_service
-        import os
         
         # Validate file type
         if not file.content_type.startswith('video/'):
@@ -1888,35 +1926,23 @@ async def upload_instagram_video(
                 detail="Only video files are allowed"
             )
         
-        # Read file content
-        file_content = await file.read()
-        
-        # Create temp_images directory if it doesn't exist
-        os.makedirs("temp_images", exist_ok=True)
-        
-        # Save file to temp_images directory for later use (like Facebook service)
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1], dir="temp_images") as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
-        
-        # Get just the filename for database storage
-        saved_filename = os.path.basename(temp_file_path)
+        # Stream into the local media store for later file-based posting (like Facebook service)
+        spooled = await spool_upload(file, directory=local_media_store.staging_dir)
+        saved_filename = spooled["filename"]
+        temp_file_path = local_media_store.commit_file(spooled["file_path"], saved_filename)
         
         logger.info(f"Video file saved to disk: {temp_file_path}")
-        logger.info(f"File size: {len(file_content)} bytes")
-        logger.info(f"Saved filename: {saved_filename}")
+        logger.info(f"File size: {spooled['size']} bytes, sha256: {spooled['sha256']}")
         
-        # Upload to Cloudinary with Instagram-specific transforms
-        upload_result = cloudinary_service.upload_video_with_instagram_transform(file_content)
+        # Upload the file to Cloudinary with Instagram-specific transforms (chunked from disk)
+        upload_result = await run_in_threadpool(
+            cloudinary_service.upload_video_with_instagram_transform, temp_file_path
+        )
         
         if not upload_result["success"]:
             # Clean up temp file if upload failed
-            try:
-                os.unlink(temp_file_path)
-                logger.warning(f"Cleaned up temp file after failed upload: {temp_file_path}")
-            except:
-                pass
+            local_media_store.delete(saved_filename)
+            logger.warning(f"Cleaned up temp file after failed upload: {temp_file_path}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Video upload failed: {upload_result.get('error', 'Unknown error')}"
@@ -1930,7 +1956,8 @@ async def upload_instagram_video(
                 "url": upload_result["url"],  # Cloudinary URL for immediate use
                 "filename": saved_filename,   # Saved filename for later file-based posting
                 "original_filename": file.filename,
-                "size": len(file_content),
+                "size": spooled["size"],
+                "sha256": spooled["sha256"],
                 "cloudinary_url": upload_result["url"],
                 "file_path": temp_file_path  # Full path for backend use
             }
@@ -1954,7 +1981,6 @@ async def upload_instagram_thumbnail(
     """Upload a thumbnail image for Instagram reels using Cloudinary with Instagram-specific transforms."""
     try:
         from app.services.cloudinary_service import cloudinary_service
-        import os
         
         # Validate file type
         if not file.content_type.startswith('image/'):
@@ -1963,35 +1989,23 @@ async def upload_instagram_thumbnail(
                 detail="Only image files are allowed for thumbnails"
             )
         
-        # Read file content
-        file_content = await file.read()
-        
-        # Create temp_images directory if it doesn't exist
-        os.makedirs("temp_images", exist_ok=True)
-        
-        # Save file to temp_images directory for later use
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1], dir="temp_images") as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
-        
-        # Get just the filename for database storage
-        saved_filename = os.path.basename(temp_file_path)
+        # Stream into the local media store for later use
+        spooled = await spool_upload(file, directory=local_media_store.staging_dir)
+        saved_filename = spooled["filename"]
+        temp_file_path = local_media_store.commit_file(spooled["file_path"], saved_filename)
         
         logger.info(f"Thumbnail file saved to disk: {temp_file_path}")
-        logger.info(f"File size: {len(file_content)} bytes")
-        logger.info(f"Saved filename: {saved_filename}")
+        logger.info(f"File size: {spooled['size']} bytes, sha256: {spooled['sha256']}")
         
         # Upload to Cloudinary with Instagram-specific transforms for thumbnails
-        upload_result = cloudinary_service.upload_thumbnail_with_instagram_transform(file_content)
+        upload_result = await run_in_threadpool(
+            cloudinary_service.upload_thumbnail_with_instagram_transform, temp_file_path
+        )
         
         if not upload_result["success"]:
             # Clean up temp file if upload failed
-            try:
-                os.unlink(temp_file_path)
-                logger.warning(f"Cleaned up temp file after failed upload: {temp_file_path}")
-            except:
-                pass
+            local_media_store.delete(saved_filename)
+            logger.warning(f"Cleaned up temp file after failed upload: {temp_file_path}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Thumbnail upload failed: {upload_result.get('error', 'Unknown error')}"
@@ -2005,7 +2019,8 @@ async def upload_instagram_thumbnail(
                 "url": upload_result["url"],  # Cloudinary URL for immediate use
                 "filename": saved_filename,   # Saved filename for later file-based posting
                 "original_filename": file.filename,
-                "size": len(file_content),
+                "size": spooled["size"],
+                "sha256": spooled["sha256"],
                 "cloudinary_url": upload_result["url"],
                 "file_path": temp_file_path  # Full path for backend use
             }
@@ -2165,9 +2180,15 @@ async def generate_instagram_carousel(
                 detail=f"Carousel generation failed: {result.get('error', 'Unknown error')}"
             )
         
+        handles = [
+            media_handle_service.create_handle(user_id=current_user.id, public_url=url, source="instagram_carousel")
+            for url in result["image_urls"]
+        ]
+        
         return {
             "success": True,
             "image_urls": result["image_urls"],
+            "media_handles": [h["media_handle"] for h in handles],
             "caption": result["caption"],
             "count": result["count"],
             "prompt": result["prompt"],
@@ -2189,10 +2210,12 @@ async def generate_instagram_carousel(
 @router.post("/social/instagram/post-carousel")
 async def create_instagram_carousel_post(
     request: InstagramCarouselPostRequest,
+    raw_request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create an Instagram carousel post."""
+    started = time.monotonic()
     try:
         logger.info(f"Starting Instagram carousel post creation for user {current_user.id}")
         logger.info(f"Request data: instagram_user_id={request.instagram_user_id}, caption_length={len(request.caption)}, image_count={len(request.image_urls)}")
@@ -2246,6 +2269,7 @@ async def create_instagram_carousel_post(
         db.add(post)
         db.commit()
         db.refresh(post)
+        _log_publish_request("Instagram post-carousel", raw_request, 0, started)
         
         return SuccessResponse(
             message="Instagram carousel post created successfully",
@@ -2272,15 +2296,56 @@ async def create_instagram_carousel_post(
         )
 
 
+def _log_publish_request(label: str, raw_request: Request, media_handles: int, started: float) -> None:
+    """Log the create-post request body size and publish latency (handles keep bodies small)."""
+    logger.info(f"📦 {label}: body={raw_request.headers.get('content-length', '?')} bytes, "
+                f"media_handles={media_handles}, published in {time.monotonic() - started:.2f}s")
+
+
+async def _resolve_instagram_media_handle(handle: str, user_id: int) -> Dict[str, str]:
+    """
+    Return {"url", "media_type"} for a media handle.
+    
+    Local-only media (generated or imported while Cloudinary was unavailable)
+    is uploaded to Cloudinary once, off the event loop, and the hosted URL is
+    saved on the handle so republishing it does not upload again.
+    """
+    media = media_handle_service.resolve(handle, user_id)
+    if not media:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Media handle not found or expired. Please generate or import the media again."
+        )
+    if media["public_url"]:
+        return {"url": media["public_url"], "media_type": media["media_type"]}
+    if media["media_type"] == "video":
+        upload_result = await run_in_threadpool(
+            cloudinary_service.upload_video_with_instagram_transform, media["local_path"]
+        )
+    else:
+        upload_result = await run_in_threadpool(
+            cloudinary_service.upload_image_with_instagram_transform, media["local_path"]
+        )
+    if not upload_result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Media upload failed: {upload_result.get('error', 'Unknown error')}"
+        )
+    await run_in_threadpool(media_handle_service.set_public_url, handle, user_id, upload_result["url"])
+    return {"url": upload_result["url"], "media_type": media["media_type"]}
+
+
 @router.post("/social/instagram/create-post")
 async def create_unified_instagram_post(
     request: UnifiedInstagramPostRequest,
+    raw_request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     print("=== API: /instagram/create-post endpoint called ===")
     print("Incoming Instagram post request:", request.dict())
     """Create an Instagram post with unified options (AI generation, file upload, etc.)."""
+    started = time.monotonic()
     try:
         # Debug logging
         logger.info(f"Received Instagram post request: {request}")
@@ -2307,8 +2372,24 @@ async def create_unified_instagram_post(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Page access token not found. Please reconnect your Instagram account."
             )
+        # Resolve previewed media handles to their already-hosted URLs
+        image_url = request.image_url
+        image_urls = getattr(request, 'image_urls', None)
+        video_url = request.video_url
+        handle_is_video = False
+        if request.media_handle:
+            media = await _resolve_instagram_media_handle(request.media_handle, current_user.id)
+            handle_is_video = media["media_type"] == "video"
+            if handle_is_video:
+                video_url = media["url"]
+            else:
+                image_url = media["url"]
+        if request.media_handles:
+            image_urls = [
+                (await _resolve_instagram_media_handle(h, current_user.id))["url"] for h in request.media_handles
+            ]
         # Determine post type
-        is_reel = (request.media_type == "video" or request.post_type == "reel")
+        is_reel = (request.media_type == "video" or request.post_type == "reel" or handle_is_video)
         is_carousel = (request.post_type == "carousel")
         is_photo = not is_reel and not is_carousel
         # --- Add thumbnail fields ---
@@ -2323,7 +2404,7 @@ async def create_unified_instagram_post(
                     instagram_user_id=request.instagram_user_id,
                     page_access_token=page_access_token,
                     caption=request.caption,
-                    video_url=request.video_url,
+                    video_url=video_url,
                     is_reel=True,
                     thumbnail_url=final_thumbnail_url,
                     thumbnail_filename=final_thumbnail_filename,
@@ -2337,7 +2418,7 @@ async def create_unified_instagram_post(
                     social_account_id=account.id,
                     content=request.caption,
                     post_type=PostPostType.REEL.value,
-                    media_urls=[request.video_url],
+                    media_urls=[video_url],
                     status=PostStatus.PUBLISHED,
                     platform_post_id=post_result.get("post_id"),
                     error_message=None,
@@ -2347,6 +2428,7 @@ async def create_unified_instagram_post(
                 db.add(new_post)
                 db.commit()
                 db.refresh(new_post)
+                _log_publish_request("Instagram reel", raw_request, int(bool(request.media_handle)), started)
                 return {"success": True, "post_id": new_post.id, "reel_thumbnail_url": actual_thumbnail_url, "reel_thumbnail_filename": actual_thumbnail_filename}
             elif is_carousel:
                 # CAROUSEL: Store in Post only (should use /post-carousel endpoint, but handle here for safety)
@@ -2354,14 +2436,14 @@ async def create_unified_instagram_post(
                     instagram_user_id=request.instagram_user_id,
                     page_access_token=page_access_token,
                     caption=request.caption,
-                    image_urls=request.image_urls
+                    image_urls=image_urls
                 )
                 new_post = Post(
                     user_id=current_user.id,
                     social_account_id=account.id,
                     content=request.caption,
                     post_type=PostPostType.CAROUSEL.value,
-                    media_urls=request.image_urls,
+                    media_urls=image_urls,
                     status=PostStatus.PUBLISHED,
                     platform_post_id=post_result.get("post_id"),
                     error_message=None
@@ -2369,6 +2451,7 @@ async def create_unified_instagram_post(
                 db.add(new_post)
                 db.commit()
                 db.refresh(new_post)
+                _log_publish_request("Instagram carousel", raw_request, len(request.media_handles or []), started)
                 return {"success": True, "post_id": new_post.id}
             else:
                 # PHOTO: Store in SingleInstagramPost only
@@ -2376,14 +2459,14 @@ async def create_unified_instagram_post(
                     instagram_user_id=request.instagram_user_id,
                     page_access_token=page_access_token,
                     caption=request.caption,
-                    image_url=request.image_url,
+                    image_url=image_url,
                     is_reel=False
                 )
                 new_single_post = SingleInstagramPost(
                     user_id=current_user.id,
                     social_account_id=account.id,
                     post_type="photo",
-                    media_url=[request.image_url],
+                    media_url=[image_url],
                     caption=request.caption,
                     use_ai_image=request.use_ai_image,
                     use_ai_text=request.use_ai_text,
@@ -2394,6 +2477,7 @@ async def create_unified_instagram_post(
                 db.add(new_single_post)
                 db.commit()
                 db.refresh(new_single_post)
+                _log_publish_request("Instagram photo", raw_request, int(bool(request.media_handle)), started)
                 return {"success": True, "post_id": new_single_post.id}
         except Exception as service_error:
             logger.error(f"Error posting to Instagram: {service_error}")
@@ -2403,7 +2487,7 @@ async def create_unified_instagram_post(
                     social_account_id=account.id,
                     content=request.caption,
                     post_type=PostPostType.REEL.value if is_reel else PostPostType.CAROUSEL.value,
-                    media_urls=[request.video_url] if is_reel else request.image_urls,
+                    media_urls=[video_url] if is_reel else image_urls,
                     status=PostStatus.FAILED,
                     platform_post_id=None,
                     error_message=str(service_error),
@@ -2419,7 +2503,7 @@ async def create_unified_instagram_post(
                     user_id=current_user.id,
                     social_account_id=account.id,
                     post_type="photo",
-                    media_url=[request.image_url],
+                    media_url=[image_url],
                     caption=request.caption,
                     use_ai_image=request.use_ai_image,
                     use_ai_text=request.use_ai_text,
@@ -2533,6 +2617,70 @@ async def update_post(
     return post
 
 
+@router.get("/social/posts/{post_id}/metrics")
+async def get_post_metrics(
+    post_id: int,
+    days: int = Query(30, ge=1, le=365),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Latest ingested engagement metrics for a post and their history (no live Graph calls)."""
+    post = db.query(Post).filter(
+        Post.id == post_id,
+        Post.user_id == current_user.id
+    ).first()
+    
+    if not post:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+    
+    from app.services.post_metrics_service import post_metrics_service
+    history = await run_in_threadpool(
+        post_metrics_service.get_post_history, post.id, datetime.now(timezone.utc) - timedelta(days=days)
+    )
+    return {
+        "success": True,
+        "post_id": post.id,
+        "metrics": {
+            "likes_count": post.likes_count or 0,
+            "comments_count": post.comments_count or 0,
+            "shares_count": post.shares_count or 0,
+            "views_count": post.views_count or 0,
+            "engagement_rate": post.engagement_rate,
+            "updated_at": post.metrics_updated_at.isoformat() if post.metrics_updated_at else None
+        },
+        "history": history
+    }
+
+
+@router.get("/social/analytics/daily")
+async def get_daily_analytics(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    social_account_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Per-account, per-day publishing, failure, reply and engagement counts.
+    
+    Served from the account_daily_stats rollup (defaults to the last 30 days).
+    """
+    end_date = end_date or datetime.now(timezone.utc).date()
+    start_date = start_date or end_date - timedelta(days=29)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+    if (end_date - start_date).days > 366:
+        raise HTTPException(status_code=400, detail="Date range cannot exceed 366 days")
+    
+    from app.services.analytics_rollup_service import analytics_rollup_service
+    result = await run_in_threadpool(
+        analytics_rollup_service.get_range, current_user.id, start_date, end_date, social_account_id
+    )
+    return {"success": True, **result}
+
+
 # Automation Rules Management
 @router.get("/social/automation-rules", response_model=List[AutomationRuleResponse])
 async def get_automation_rules(
@@ -2753,6 +2901,66 @@ async def delete_bulk_composer_content(
         )
 
 
+@router.post("/social/bulk-composer/upload-media")
+async def upload_bulk_composer_media(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload bulk composer media as multipart and return its Cloudinary URL.
+    
+    The returned URL goes into the post's media_file when scheduling, instead
+    of sending the media base64-encoded inside the schedule request.
+    """
+    spooled = None
+    try:
+        content_type = file.content_type or ""
+        if not content_type.startswith(("image/", "video/")):
+            raise HTTPException(
+                status_code=400,
+                detail="Only image and video files are allowed"
+            )
+        
+        spooled = await spool_upload(file)
+        if content_type.startswith("video/"):
+            upload_result = await run_in_threadpool(
+                cloudinary_service.upload_video_with_instagram_transform, spooled["file_path"]
+            )
+        else:
+            upload_result = await run_in_threadpool(
+                cloudinary_service.upload_image_with_instagram_transform, spooled["file_path"]
+            )
+        
+        if not upload_result["success"]:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Media upload failed: {upload_result.get('error', 'Unknown error')}"
+            )
+        
+        return SuccessResponse(
+            message="Media uploaded successfully",
+            data={
+                "media_file": upload_result["url"],
+                "media_filename": file.filename,
+                "media_type": "video" if content_type.startswith("video/") else "image",
+                "size": spooled["size"],
+                "sha256": spooled["sha256"]
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error uploading bulk composer media: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to upload media: {str(e)}"
+        )
+    finally:
+        if spooled:
+            remove_spooled_file(spooled["file_path"])
+
+
 @router.post("/social/bulk-composer/schedule")
 async def schedule_bulk_composer_posts(
     request: BulkComposerRequest,
@@ -2986,7 +3194,7 @@ async def debug_imgbb_test(
         test_image_b64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChAGAWqemowAAAABJRU5ErkJggg=="
         
         # Test IMGBB upload
-        result = image_service.save_base64_image(
+        result = await image_service.save_base64_image(
             base64_data=test_image_b64,
             filename="debug_test.png",
             format="png"
@@ -2996,7 +3204,8 @@ async def debug_imgbb_test(
             "success": result["success"],
             "imgbb_configured": True,
             "imgbb_api_key_length": len(settings.imgbb_api_key) if settings.imgbb_api_key else 0,
-            "upload_result": result
+            "upload_result": result,
+            "media_hosting": media_hosting_service.get_stats()
         }
         
     except Exception as e:
@@ -3446,6 +3655,22 @@ async def debug_instagram_auto_reply_status(
         }
 
 
+@router.get("/social/debug/instagram-auto-reply-batch-stats")
+async def debug_instagram_auto_reply_batch_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Debug endpoint reporting LLM calls and tokens per 1,000 batched webhook comments."""
+    from app.services.instagram_auto_reply_service import comment_reply_batcher
+    from app.services.replied_comment_index import replied_comment_index
+    from app.services.instagram_auto_reply_poller import global_auto_reply_poller
+    return {
+        "success": True,
+        "stats": comment_reply_batcher.get_stats(),
+        "replied_index": replied_comment_index.get_stats(),
+        "poller": global_auto_reply_poller.get_status()
+    }
+
+
 @router.post("/social/debug/test-instagram-comment")
 async def debug_test_instagram_comment(
     instagram_user_id: str,
@@ -3554,10 +3779,16 @@ async def debug_get_instagram_comments(
 @router.post("/social/instagram/sync-posts/{instagram_user_id}")
 async def sync_instagram_posts(
     instagram_user_id: str,
+    full: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Sync all Instagram posts from the API into the local Post table for auto-reply."""
+    """
+    Sync Instagram posts from the API into the local Post table for auto-reply.
+    
+    Incremental by default (media newer than the newest synced post); pass
+    full=true to walk the whole media history and refresh existing rows.
+    """
     try:
         logger.info(f"Starting Instagram sync for user {current_user.id}, instagram_user_id: {instagram_user_id}")
         
@@ -3579,49 +3810,21 @@ async def sync_instagram_posts(
         
         logger.info(f"Found Instagram account: {account.username} (ID: {account.id})")
         
-        # Fetch all media from Instagram API
-        from app.services.instagram_service import instagram_service
-        import asyncio
-        
-        # Run the synchronous method in a thread pool since it's not async
-        loop = asyncio.get_event_loop()
-        media_items = await loop.run_in_executor(
-            None, 
-            instagram_service.get_user_media, 
-            instagram_user_id, 
-            page_access_token, 
-            100
+        from app.services.instagram_media_sync_service import instagram_media_sync_service
+        result = await instagram_media_sync_service.sync_account(
+            user_id=current_user.id,
+            social_account_id=account.id,
+            instagram_user_id=instagram_user_id,
+            page_access_token=page_access_token,
+            full=full
         )
-        
-        synced = 0
-        for media in media_items:
-            # Check if post already exists in DB
-            existing = db.query(Post).filter(
-                Post.platform_post_id == media["id"],
-                Post.social_account_id == account.id
-            ).first()
-            if existing:
-                continue  # Skip if already exists
-            # Create new Post row
-            post = Post(
-                user_id=current_user.id,
-                social_account_id=account.id,
-                content=media.get("caption", ""),
-                post_type=PostType.IMAGE if media.get("media_type") == "IMAGE" else (PostType.VIDEO if media.get("media_type") == "VIDEO" else PostType.TEXT),
-                status=PostStatus.PUBLISHED,
-                platform_post_id=media["id"],
-                published_at=media.get("timestamp"),
-                media_urls=[media.get("media_url")] if media.get("media_url") else None
-            )
-            db.add(post)
-            synced += 1
-        
-        db.commit()
-        logger.info(f"Successfully synced {synced} posts out of {len(media_items)} total media items")
-        return {"success": True, "synced": synced, "total": len(media_items)}
+        return {"success": True, "synced": result["inserted"], "total": result["fetched"], **result}
         
     except HTTPException:
         raise
+    except MissingUpsertIndexError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logger.error(f"Error syncing Instagram posts: {str(e)}")
         raise HTTPException(
@@ -3741,8 +3944,9 @@ async def debug_instagram_api_test(
         # Test 1: Basic account info
         try:
             from app.services.instagram_service import instagram_service
-            account_info = instagram_service._get_enhanced_instagram_details(
-                instagram_user_id, 
+            account_info = await run_in_threadpool(
+                instagram_service._get_enhanced_instagram_details,
+                instagram_user_id,
                 page_access_token
             )
             account_test = {
@@ -3757,9 +3961,10 @@ async def debug_instagram_api_test(
         
         # Test 2: Get media (read permission)
         try:
-            media_items = instagram_service.get_user_media(
-                instagram_user_id, 
-                page_access_token, 
+            media_items = await run_in_threadpool(
+                instagram_service.get_user_media,
+                instagram_user_id,
+                page_access_token,
                 5
             )
             media_test = {
@@ -3917,7 +4122,8 @@ async def debug_facebook_message_auto_reply_endpoint(
         
         return {
             "success": True,
-            "message": "Facebook message auto-reply test completed successfully"
+            "message": "Facebook message auto-reply test completed successfully",
+            "conversation_memory": facebook_message_auto_reply_service.get_memory_stats()
         }
         
     except Exception as e:
@@ -4073,8 +4279,14 @@ async def refresh_linkedin_tokens(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Refresh LinkedIn access tokens."""
+    """
+    Refresh and validate LinkedIn access tokens for all connected accounts.
+    
+    Accounts are processed concurrently with a per-account time limit and
+    the results are committed in one transaction.
+    """
     try:
+        from app.config import get_settings
         from app.services.linkedin_service import linkedin_service
         
         linkedin_accounts = db.query(SocialAccount).filter(
@@ -4083,21 +4295,74 @@ async def refresh_linkedin_tokens(
             SocialAccount.is_connected == True
         ).all()
         
-        refreshed_count = 0
-        for account in linkedin_accounts:
-            if account.refresh_token:
-                refresh_result = await linkedin_service.refresh_access_token(account.refresh_token)
+        async def refresh_account(snapshot: Dict) -> Dict:
+            result = {"refreshed": False}
+            access_token = snapshot["access_token"]
+            if snapshot["refresh_token"]:
+                refresh_result = await linkedin_service.refresh_access_token(snapshot["refresh_token"])
                 if refresh_result["success"]:
-                    account.access_token = refresh_result["access_token"]
-                    if refresh_result.get("refresh_token"):
-                        account.refresh_token = refresh_result["refresh_token"]
-                    refreshed_count += 1
+                    access_token = refresh_result["access_token"]
+                    result.update(refreshed=True, token=refresh_result)
+                else:
+                    result["refresh_error"] = refresh_result.get("error")
+            result.update(await linkedin_service.validate_access_token(access_token))
+            return result
+        
+        snapshots = [{
+            "id": account.id,
+            "access_token": account.access_token,
+            "refresh_token": account.refresh_token
+        } for account in linkedin_accounts]
+        results = await run_bounded(
+            snapshots,
+            refresh_account,
+            fallback=_refresh_fallback,
+            timeout=get_settings().account_refresh_timeout_seconds,
+            label=lambda snapshot: f"LinkedIn account {snapshot['id']}"
+        )
+        
+        refresh_results = []
+        now = datetime.utcnow()
+        for account, result in zip(linkedin_accounts, results):
+            token = result.get("token")
+            if token:
+                account.access_token = token["access_token"]
+                if token.get("refresh_token"):
+                    account.refresh_token = token["refresh_token"]
+                if token.get("expires_in"):
+                    account.token_expires_at = now + timedelta(seconds=token["expires_in"])
+            if result.get("valid"):
+                account.last_sync_at = now
+                status_name = "refreshed" if result["refreshed"] else "valid"
+                message = "Token refreshed" if result["refreshed"] else "Token is valid"
+            elif result.get("expired"):
+                account.is_connected = False
+                status_name = "expired"
+                message = "Token expired - reconnection required"
+            else:
+                status_name = "error"
+                message = result.get("error", "Unknown validation error")
+            refresh_results.append({
+                "account_id": account.id,
+                "platform_user_id": account.platform_user_id,
+                "name": account.display_name,
+                "status": status_name,
+                "message": message,
+                "needs_reconnection": status_name == "expired"
+            })
         
         db.commit()
         
+        refreshed_count = len([r for r in refresh_results if r["status"] == "refreshed"])
         return {
             "success": True,
-            "message": f"LinkedIn tokens refreshed successfully ({refreshed_count}/{len(linkedin_accounts)} accounts)"
+            "message": f"LinkedIn tokens refreshed successfully ({refreshed_count}/{len(linkedin_accounts)} accounts)",
+            "summary": {
+                "total_accounts": len(refresh_results),
+                **{name: len([r for r in refresh_results if r["status"] == name])
+                   for name in ("refreshed", "valid", "expired", "error")}
+            },
+            "accounts": refresh_results
         }
         
     except Exception as e:
@@ -4190,21 +4455,18 @@ async def get_instagram_dm_auto_reply_status(
 @router.post("/social/instagram/auto_reply/global/enable")
 async def enable_instagram_global_auto_reply(
     instagram_user_id: str, 
-    user: User = Depends(get_current_user), 
-    background_tasks: BackgroundTasks = None
+    user: User = Depends(get_current_user)
 ):
-    """Enable global auto-reply for Instagram account."""
+    """Enable global auto-reply for Instagram account and start the backfill job."""
     try:
         from app.services.instagram_auto_reply_service import enable_global_auto_reply
         
-        if background_tasks:
-            background_tasks.add_task(enable_global_auto_reply, instagram_user_id, user)
-        else:
-            await enable_global_auto_reply(instagram_user_id, user)
+        progress = await enable_global_auto_reply(instagram_user_id, user)
         
         return {
             "success": True,
-            "message": "Global auto-reply enabled successfully"
+            "message": "Global auto-reply enabled successfully",
+            "backfill": progress
         }
         
     except Exception as e:
@@ -4261,9 +4523,46 @@ async def get_instagram_global_auto_reply_status(
         )
 
 @router.get("/social/instagram/auto_reply/global/progress")
-async def get_global_instagram_auto_reply_progress(instagram_user_id: str):
-    # Dummy implementation: always return 100% complete
-    return {"progress": 100, "status": "completed"}
+async def get_global_instagram_auto_reply_progress(
+    instagram_user_id: str,
+    user: User = Depends(get_current_user)
+):
+    """Get progress of the global auto-reply backfill job for Instagram account."""
+    try:
+        from app.services.instagram_auto_reply_service import get_global_auto_reply_progress
+        
+        return await get_global_auto_reply_progress(instagram_user_id, user)
+        
+    except Exception as e:
+        logger.error(f"Error getting global auto-reply progress: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get global auto-reply progress: {str(e)}"
+        )
+
+@router.post("/social/instagram/auto_reply/global/cancel")
+async def cancel_global_instagram_auto_reply_backfill(
+    instagram_user_id: str,
+    user: User = Depends(get_current_user)
+):
+    """Cancel the running global auto-reply backfill job for Instagram account."""
+    try:
+        from app.services.instagram_auto_reply_service import cancel_global_auto_reply_backfill
+        
+        cancelled = await cancel_global_auto_reply_backfill(instagram_user_id, user)
+        
+        return {
+            "success": True,
+            "cancelled": cancelled,
+            "message": "Backfill cancellation requested" if cancelled else "No backfill in progress"
+        }
+        
+    except Exception as e:
+        logger.error(f"Error cancelling global auto-reply backfill: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to cancel global auto-reply backfill: {str(e)}"
+        )
 
 @router.get("/social/scheduled-posts")
 def get_scheduled_posts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
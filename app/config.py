@@ -41,6 +41,8 @@ class Settings(BaseSettings):
 
     # Stability AI Integration
     stability_api_key: str | None = os.getenv("STABILITY_API_KEY")
+    image_cache_dir: str = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+    image_cache_max_bytes: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
 
     # IMGBB Integration
     imgbb_api_key: str | None = os.getenv("IMGBB_API_KEY")
@@ -51,6 +53,22 @@ class Settings(BaseSettings):
     cloudinary_api_secret: str | None = os.getenv("CLOUDINARY_API_SECRET")
     cloudinary_upload_preset: str | None = os.getenv("CLOUDINARY_UPLOAD_PRESET")
 
+    # Public hosting for generated images: remote providers in preference order
+    # (local serving is always the last resort) and the delay before hedging to the next one
+    media_hosting_order: str = os.getenv("MEDIA_HOSTING_ORDER", "imgbb,cloudinary")
+    media_hosting_hedge_ms: int = int(os.getenv("MEDIA_HOSTING_HEDGE_MS", "1500"))
+
+    # Local media store served at /temp_images
+    local_media_max_bytes: int = int(os.getenv("LOCAL_MEDIA_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+    local_media_max_files: int = int(os.getenv("LOCAL_MEDIA_MAX_FILES", "5000"))
+    local_media_max_age_hours: int = int(os.getenv("LOCAL_MEDIA_MAX_AGE_HOURS", "72"))
+
+    # Largest accepted multipart media upload
+    max_upload_bytes: int = int(os.getenv("MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+
+    # Per-account time limit for the bulk token refresh endpoints
+    account_refresh_timeout_seconds: float = float(os.getenv("ACCOUNT_REFRESH_TIMEOUT_SECONDS", "20"))
+
     # Google Drive Integration
     google_drive_client_id: str | None = os.getenv("GOOGLE_DRIVE_CLIENT_ID")
     google_drive_client_secret: str | None = os.getenv("GOOGLE_DRIVE_CLIENT_SECRET")
@@ -65,6 +83,11 @@ class Settings(BaseSettings):
     smtp_password: str | None = os.getenv("SMTP_PASSWORD")
     from_email: str | None = os.getenv("FROM_EMAIL")
 
+    # Messenger auto-reply conversation memory ("memory" or "database")
+    conversation_context_backend: str = os.getenv("CONVERSATION_CONTEXT_BACKEND", "memory")
+    conversation_context_max_bytes: int = int(os.getenv("CONVERSATION_CONTEXT_MAX_BYTES", str(8 * 1024 * 1024)))
+    conversation_context_ttl_hours: int = int(os.getenv("CONVERSATION_CONTEXT_TTL_HOURS", "24"))
+
     # Backend base URL for OAuth callbacks
     backend_base_url: str = os.getenv("BACKEND_BASE_URL", "https://localhost:8000")
 
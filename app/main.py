@@ -1,18 +1,19 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 from app.config import get_settings
 from app.database import init_db, verify_db_connection
 from app.api import auth, social_media, ai, google_drive, webhook, google_oauth
+from app.api.auth import get_current_user
+from app.models.user import User
 from app.middleware.rate_limiter import rate_limit_middleware
+from app.services.local_media_store import local_media_store, CachedStaticFiles
 import logging
 import asyncio
 import os
 import signal
 import sys
-from pathlib import Path
 import time
 
 if sys.platform == "win32":
@@ -36,10 +37,8 @@ app = FastAPI(
     redoc_url="/redoc" if settings.debug else None,
 )
 
-temp_images_path = Path("temp_images")
-temp_images_path.mkdir(exist_ok=True)
-
-app.mount("/temp_images", StaticFiles(directory="temp_images"), name="temp_images")
+# Managed, sharded media store; stored filenames are unique so responses are cacheable
+app.mount("/temp_images", CachedStaticFiles(directory=local_media_store.root), name="temp_images")
 
 @app.middleware("http")
 async def log_requests_and_handle_concurrency(request: Request, call_next):
@@ -155,6 +154,22 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Database initialization error: {e}")
         # Don't fail startup for database issues
+
+    # Unique indexes the bulk upserts conflict on (merges duplicate rows on first run)
+    try:
+        from app.services.upsert_index_service import upsert_index_service
+        upsert_index_service.ensure()
+        logger.info("Upsert indexes verified")
+    except Exception as e:
+        logger.error(f"Failed to create upsert indexes; account connects and media sync will fail until they exist: {e}")
+
+    # Maintain analytics rollups from post status changes
+    try:
+        from app.services.analytics_rollup_service import analytics_rollup_service
+        analytics_rollup_service.install()
+        logger.info("Analytics rollup hooks installed")
+    except Exception as e:
+        logger.error(f"Failed to install analytics rollup hooks: {e}")
     
 
     
@@ -169,13 +184,15 @@ async def startup_event():
     # Start auto-reply scheduler for Facebook comments
     try:
         from app.services.auto_reply_service import auto_reply_service
+        from app.services.graph_rate_governor import graph_priority, POLL
         from app.database import get_db
         async def auto_reply_scheduler():
             while True:
                 db = None
                 try:
                     db = next(get_db())
-                    await auto_reply_service.process_auto_replies(db)
+                    with graph_priority(POLL):
+                        await auto_reply_service.process_auto_replies(db)
                 except Exception as e:
                     logger.error(f"Error in auto-reply scheduler: {e}")
                 finally:
@@ -195,6 +212,53 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to start Instagram scheduler service: {e}")
 
+    # Start auto-reply backfill service (resumes jobs orphaned by a restart or crashed worker)
+    try:
+        from app.services.auto_reply_backfill_service import auto_reply_backfill_service
+        asyncio.create_task(auto_reply_backfill_service.start())
+        logger.info("Auto-reply backfill service started")
+    except Exception as e:
+        logger.error(f"Failed to start auto-reply backfill service: {e}")
+
+    # Start Instagram global auto-reply poller (restores enabled accounts from the database)
+    try:
+        from app.services.instagram_auto_reply_poller import global_auto_reply_poller
+        asyncio.create_task(global_auto_reply_poller.start())
+        logger.info("Instagram global auto-reply poller started")
+    except Exception as e:
+        logger.error(f"Failed to start Instagram global auto-reply poller: {e}")
+
+    # Start local media store janitor (expiry and size/count budget for /temp_images)
+    try:
+        asyncio.create_task(local_media_store.start())
+        logger.info("Local media store janitor started")
+    except Exception as e:
+        logger.error(f"Failed to start local media store janitor: {e}")
+
+    # Start token health service (scheduled revalidation of Facebook account tokens)
+    try:
+        from app.services.token_health_service import token_health_service
+        asyncio.create_task(token_health_service.start())
+        logger.info("Token health service started")
+    except Exception as e:
+        logger.error(f"Failed to start token health service: {e}")
+
+    # Start post metrics ingestion (engagement counts for published posts)
+    try:
+        from app.services.post_metrics_service import post_metrics_service
+        asyncio.create_task(post_metrics_service.start())
+        logger.info("Post metrics ingestion started")
+    except Exception as e:
+        logger.error(f"Failed to start post metrics ingestion: {e}")
+
+    # Start Google Drive token refresher (renews the cached access token before it expires)
+    try:
+        from app.services.google_drive_service import google_drive_client
+        asyncio.create_task(google_drive_client.start())
+        logger.info("Google Drive token refresher started")
+    except Exception as e:
+        logger.error(f"Failed to start Google Drive token refresher: {e}")
+
     # Start connection manager
     try:
         from app.services.connection_manager import connection_manager
@@ -260,6 +324,86 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"Error stopping Instagram scheduler service: {e}")
     
+    # Stop auto-reply backfill service
+    try:
+        from app.services.auto_reply_backfill_service import auto_reply_backfill_service
+        auto_reply_backfill_service.stop()
+        logger.info("Auto-reply backfill service stopped")
+    except Exception as e:
+        logger.error(f"Error stopping auto-reply backfill service: {e}")
+    
+    # Stop Instagram global auto-reply poller
+    try:
+        from app.services.instagram_auto_reply_poller import global_auto_reply_poller
+        global_auto_reply_poller.stop()
+        logger.info("Instagram global auto-reply poller stopped")
+    except Exception as e:
+        logger.error(f"Error stopping Instagram global auto-reply poller: {e}")
+
+    # Cancel pending comment reply batches
+    try:
+        from app.services.instagram_auto_reply_service import comment_reply_batcher
+        comment_reply_batcher.stop()
+        logger.info("Comment reply batcher stopped")
+    except Exception as e:
+        logger.error(f"Error stopping comment reply batcher: {e}")
+
+    # Stop local media store janitor
+    try:
+        local_media_store.stop()
+        logger.info("Local media store janitor stopped")
+    except Exception as e:
+        logger.error(f"Error stopping local media store janitor: {e}")
+
+    # Stop token health service
+    try:
+        from app.services.token_health_service import token_health_service
+        token_health_service.stop()
+        logger.info("Token health service stopped")
+    except Exception as e:
+        logger.error(f"Error stopping token health service: {e}")
+
+    # Stop post metrics ingestion and close its HTTP client
+    try:
+        from app.services.post_metrics_service import post_metrics_service
+        post_metrics_service.stop()
+        await post_metrics_service.close()
+        logger.info("Post metrics ingestion stopped")
+    except Exception as e:
+        logger.error(f"Error stopping post metrics ingestion: {e}")
+
+    # Close the LinkedIn HTTP client
+    try:
+        from app.services.linkedin_service import linkedin_service
+        await linkedin_service.close()
+        logger.info("LinkedIn client closed")
+    except Exception as e:
+        logger.error(f"Error closing LinkedIn client: {e}")
+
+    # Stop Google Drive token refresher
+    try:
+        from app.services.google_drive_service import google_drive_client
+        google_drive_client.stop()
+        logger.info("Google Drive token refresher stopped")
+    except Exception as e:
+        logger.error(f"Error stopping Google Drive token refresher: {e}")
+
+    # Close media hosting HTTP clients
+    try:
+        from app.services.media_hosting_service import media_hosting_service
+        await media_hosting_service.close()
+        logger.info("Media hosting clients closed")
+    except Exception as e:
+        logger.error(f"Error closing media hosting clients: {e}")
+
+    # Close Stability AI HTTP client
+    try:
+        from app.services.stability_service import stability_service
+        await stability_service.close()
+        logger.info("Stability AI client closed")
+    except Exception as e:
+        logger.error(f"Error closing Stability AI client: {e}")
+
     # Final cleanup
     try:
         from app.database import cleanup_connections
@@ -285,12 +429,25 @@ async def root():
 async def health_check():
     """Detailed health check."""
     from app.database import get_pool_status
+    from app.services.token_health_service import token_health_service
+    from app.services.post_metrics_service import post_metrics_service
+    from app.services.analytics_rollup_service import analytics_rollup_service
+    from app.services.instagram_media_cache import instagram_media_cache
+    from app.utils.memoize import get_memo_stats
+    from app.services.graph_rate_governor import graph_rate_governor
     return {
         "status": "healthy",
         "environment": settings.environment,
         "debug": settings.debug,
         "database": "connected",
-        "connection_pool": get_pool_status()
+        "connection_pool": get_pool_status(),
+        "local_media": local_media_store.get_stats(),
+        "token_health": token_health_service.get_stats(),
+        "post_metrics": post_metrics_service.get_stats(),
+        "analytics_rollups": analytics_rollup_service.get_stats(),
+        "instagram_media_cache": instagram_media_cache.get_stats(),
+        "service_caches": get_memo_stats(),
+        "graph_rate": graph_rate_governor.get_stats()
     }
 
 @app.post("/api/admin/cleanup-connections")
@@ -322,6 +479,34 @@ async def cleanup_database_connections():
         }
 
 
+def require_superuser(current_user: User = Depends(get_current_user)) -> User:
+    """Dependency for the admin endpoints below: the caller must be a superuser."""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+
+@app.get("/api/admin/providers")
+async def provider_status(current_user: User = Depends(require_superuser)):
+    """Circuit breaker state, retry usage and recent error rate for each external provider. Superusers only."""
+    from app.utils.resilience import get_resilience_stats
+    providers = get_resilience_stats()
+    return {
+        "providers": providers,
+        "open_circuits": [name for name, stats in providers.items() if stats["circuit"]["state"] != "closed"]
+    }
+
+
+@app.post("/api/admin/providers/{provider}/reset")
+async def reset_provider_circuit(provider: str, current_user: User = Depends(require_superuser)):
+    """Close a provider's circuit by hand, e.g. after fixing its credentials. Superusers only."""
+    from app.utils.resilience import reset_provider
+    if not reset_provider(provider):
+        return {"success": False, "error": f"Unknown provider: {provider}"}
+    logger.info(f"🔌 Circuit for {provider} reset manually by user {current_user.id}")
+    return {"success": True, "provider": provider}
+
+
 @app.get("/api/debug/cors")
 async def cors_debug():
     """Debug endpoint to test CORS without authentication."""
@@ -10,4 +10,9 @@ from .dm_auto_reply_status import DmAutoReplyStatus
 from .instagram_auto_reply_log import InstagramAutoReplyLog
 from app.database import Base
 from .single_instagram_post import SingleInstagramPost
-from .notification import Notification, NotificationPreferences
\ No newline at end of file
+from .notification import Notification, NotificationPreferences
+from .auto_reply_backfill_job import AutoReplyBackfillJob, BackfillJobStatus
+from .conversation_context import ConversationContext
+from .media_handle import MediaHandle
+from .post_metric_snapshot import PostMetricSnapshot
+from .account_daily_stat import AccountDailyStat
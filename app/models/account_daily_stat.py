@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class AccountDailyStat(Base):
+    """Per-account, per-day analytics rollup (UTC days), maintained incrementally."""
+    __tablename__ = "account_daily_stats"
+    __table_args__ = (
+        Index("uq_account_daily_stats_account_day", "social_account_id", "day", unique=True),
+        Index("ix_account_daily_stats_user_day", "user_id", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    social_account_id = Column(Integer, ForeignKey('social_accounts.id'), nullable=False)
+    day = Column(Date, nullable=False)
+    posts_published = Column(Integer, nullable=False, default=0)
+    posts_failed = Column(Integer, nullable=False, default=0)
+    replies_sent = Column(Integer, nullable=False, default=0)
+    engagement_total = Column(Integer, nullable=False, default=0)  # Likes + comments + shares of posts published that day
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<AccountDailyStat(social_account_id={self.social_account_id}, day='{self.day}')>"
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy.sql import func
+from app.database import Base
+import enum
+
+
+class BackfillJobStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class AutoReplyBackfillJob(Base):
+    __tablename__ = "auto_reply_backfill_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    instagram_user_id = Column(String(255), nullable=False, index=True)
+
+    # Status and checkpoint
+    status = Column(String(20), default=BackfillJobStatus.PENDING.value, index=True)
+    total_media = Column(Integer, default=0)
+    completed_media_ids = Column(JSON, nullable=True)  # Media IDs fully processed so far
+    processed_comments = Column(Integer, default=0)
+    replied_comments = Column(Integer, default=0)
+    cancel_requested = Column(Boolean, default=False)
+    error_message = Column(Text, nullable=True)
+
+    # Worker ownership; a stale heartbeat means the owning worker died
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<AutoReplyBackfillJob(id={self.id}, instagram_user_id='{self.instagram_user_id}', status={self.status})>"
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ConversationContext(Base):
+    __tablename__ = "conversation_contexts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_key = Column(String(255), unique=True, nullable=False, index=True)  # "{page_id}:{user_id}"
+    lines = Column(JSON, nullable=False)  # List of [role, text] pairs, oldest first
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+
+    def __repr__(self):
+        return f"<ConversationContext(id={self.id}, conversation_key='{self.conversation_key}')>"
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class MediaHandle(Base):
+    """Opaque reference to generated media stored server-side for preview-then-publish."""
+    __tablename__ = "media_handles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    handle = Column(String(64), unique=True, nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    media_type = Column(String(20), nullable=False, default="image")
+    public_url = Column(String(1000), nullable=True)  # Hosted URL (Cloudinary/IMGBB) if already uploaded
+    local_path = Column(String(500), nullable=True)  # Server-side file, if kept locally
+    size_bytes = Column(Integer, nullable=True)
+    source = Column(String(50), nullable=True)  # e.g. "facebook_generate", "instagram_generate"
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<MediaHandle(handle='{self.handle}', user_id={self.user_id}, media_type='{self.media_type}')>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -22,8 +22,16 @@ class PostType(str, enum.Enum):
     CAROUSEL = "carousel"
 
 
+# platform_response["source"] of rows imported by the Instagram media sync rather than published from the app
+MEDIA_SYNC_SOURCE = "instagram_media_sync"
+
+
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # Conflict target for media sync upserts; rows without a platform ID (drafts) are unaffected
+        Index("uq_posts_social_account_platform_post", "social_account_id", "platform_post_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -52,6 +60,7 @@ class Post(Base):
     shares_count = Column(Integer, default=0)
     views_count = Column(Integer, default=0)
     engagement_rate = Column(String, nullable=True)
+    metrics_updated_at = Column(DateTime(timezone=True), nullable=True)  # Last metrics ingestion for this post
     
     # Auto-posting configuration
     is_auto_post = Column(Boolean, default=False)
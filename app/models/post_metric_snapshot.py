@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class PostMetricSnapshot(Base):
+    """Engagement counts of a published post at one point in time (written only when they change)."""
+    __tablename__ = "post_metric_snapshots"
+    __table_args__ = (
+        Index("ix_post_metric_snapshots_post_captured", "post_id", "captured_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey('posts.id', ondelete="CASCADE"), nullable=False)
+    social_account_id = Column(Integer, ForeignKey('social_accounts.id'), nullable=False, index=True)
+    likes_count = Column(Integer, nullable=False, default=0)
+    comments_count = Column(Integer, nullable=False, default=0)
+    shares_count = Column(Integer, nullable=False, default=0)
+    views_count = Column(Integer, nullable=False, default=0)
+    engagement_rate = Column(String(20), nullable=True)
+    captured_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<PostMetricSnapshot(post_id={self.post_id}, captured_at='{self.captured_at}')>"
@@ -0,0 +1,315 @@
+"""
+Per-account, per-day analytics rollups.
+
+account_daily_stats holds one row per social account and UTC day, with the
+posts published, publish failures, auto-replies sent and the engagement
+(likes + comments + shares) of that day's posts. Rows are maintained
+incrementally as events happen:
+
+- publishes and failures: a session after_flush hook watches Post and
+  SingleInstagramPost rows whose status becomes published/failed, and writes
+  the increments in the same transaction;
+- replies: recorded by the Facebook auto-reply service and the Instagram
+  replied-comment index;
+- engagement: metric deltas from the post metrics ingestion.
+
+A post counts as published once, on the UTC day of its published_at: a
+before_flush hook stamps published_at on rows published without one, media
+imported by the Instagram media sync (which bypasses the session) is not
+counted, and a posts row for media also stored as a SingleInstagramPost is
+counted only through the latter. Both the flush hook and `backfill()` apply
+this definition, so they agree.
+
+Every increment is one INSERT ... ON CONFLICT DO UPDATE. Range queries read
+at most one row per account and day. `backfill()` rebuilds a window from
+the source tables:
+
+    python -m app.services.analytics_rollup_service --days 90
+"""
+
+import argparse
+import logging
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, event, exists, func, inspect
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.account_daily_stat import AccountDailyStat
+from app.models.instagram_auto_reply_log import InstagramAutoReplyLog
+from app.models.post import MEDIA_SYNC_SOURCE, Post, PostStatus
+from app.models.single_instagram_post import SingleInstagramPost
+from app.models.social_account import SocialAccount
+
+logger = logging.getLogger(__name__)
+
+COUNTER_COLUMNS = ("posts_published", "posts_failed", "replies_sent", "engagement_total")
+PUBLISH_STATUS_COLUMNS = {"published": "posts_published", "failed": "posts_failed"}
+
+# (user_id, social_account_id, day) -> column increments
+Increments = Dict[Tuple[int, int, date], Counter]
+
+
+def _utc_day(value: Optional[datetime]) -> date:
+    if value is None:
+        return datetime.now(timezone.utc).date()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def _status_value(status) -> Optional[str]:
+    return getattr(status, "value", status)
+
+
+class AnalyticsRollupService:
+    """Incremental maintenance, backfill and range reads of account_daily_stats."""
+
+    def __init__(self):
+        self._instagram_accounts: Dict[str, Tuple[int, int]] = {}  # instagram_user_id -> (user_id, account_id)
+        self._installed = False
+        self.stats = {"increments_written": 0, "flush_events": 0, "backfills": 0, "errors": 0}
+
+    # ---- writing ----
+
+    def _upsert(self, connection, increments: Increments, replace: bool = False):
+        rows = [
+            {"user_id": user_id, "social_account_id": account_id, "day": day,
+             **{column: counts.get(column, 0) for column in COUNTER_COLUMNS}}
+            for (user_id, account_id, day), counts in increments.items()
+            if account_id is not None and user_id is not None
+        ]
+        if not rows:
+            return
+        stmt = insert(AccountDailyStat).values(rows)
+        table = AccountDailyStat.__table__
+        set_ = {
+            column: (stmt.excluded[column] if replace else table.c[column] + stmt.excluded[column])
+            for column in COUNTER_COLUMNS
+        }
+        set_["updated_at"] = func.now()
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[AccountDailyStat.social_account_id, AccountDailyStat.day],
+            set_=set_
+        ))
+        self.stats["increments_written"] += len(rows)
+
+    def record(self, user_id: int, social_account_id: int, day: Optional[date] = None, **counts: int):
+        """Add counts (e.g. replies_sent=1) to an account's row for a day (today by default)."""
+        increments: Increments = {(user_id, social_account_id, day or _utc_day(None)): Counter(counts)}
+        self.record_many(increments)
+
+    def record_many(self, increments: Increments):
+        if not increments:
+            return
+        try:
+            with SessionLocal() as db:
+                self._upsert(db.connection(), increments)
+                db.commit()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Failed to update analytics rollups: {e}")
+
+    def record_instagram_replies(self, instagram_user_id: str, count: int):
+        """Record auto-replies for an Instagram account identified by its platform user ID."""
+        if count <= 0:
+            return
+        account = self._instagram_accounts.get(instagram_user_id)
+        if account is None:
+            with SessionLocal() as db:
+                row = db.query(SocialAccount.user_id, SocialAccount.id).filter(
+                    SocialAccount.platform == "instagram",
+                    SocialAccount.platform_user_id == instagram_user_id
+                ).first()
+            if row is None:
+                return
+            account = self._instagram_accounts[instagram_user_id] = (row[0], row[1])
+        self.record(account[0], account[1], replies_sent=count)
+
+    # ---- publish events ----
+
+    def install(self):
+        """Register the flush hooks that turn publish status changes into rollup increments."""
+        if not self._installed:
+            event.listen(Session, "before_flush", self._before_flush)
+            event.listen(Session, "after_flush", self._after_flush)
+            self._installed = True
+
+    @staticmethod
+    def _before_flush(session: Session, flush_context, instances):
+        """Stamp published_at on rows published without one, so the flush hook and backfill agree on the day."""
+        for obj in (*session.new, *session.dirty):
+            if isinstance(obj, (Post, SingleInstagramPost)) and obj.published_at is None \
+                    and _status_value(obj.status) == "published":
+                # single_instagram_posts timestamps are naive UTC
+                now = datetime.now(timezone.utc)
+                obj.published_at = now if isinstance(obj, Post) else now.replace(tzinfo=None)
+
+    def _after_flush(self, session: Session, flush_context):
+        increments: Increments = defaultdict(Counter)
+        for obj in session.new:
+            if isinstance(obj, (Post, SingleInstagramPost)):
+                column = PUBLISH_STATUS_COLUMNS.get(_status_value(obj.status))
+                if column:
+                    increments[self._publish_key(obj, column)][column] += 1
+        for obj in session.dirty:
+            if isinstance(obj, (Post, SingleInstagramPost)):
+                history = inspect(obj).attrs.status.history
+                if not history.has_changes():
+                    continue
+                old = _status_value(history.deleted[0]) if history.deleted else None
+                new = _status_value(obj.status)
+                column = PUBLISH_STATUS_COLUMNS.get(new)
+                if column and new != old:
+                    increments[self._publish_key(obj, column)][column] += 1
+        if increments:
+            self.stats["flush_events"] += 1
+            connection = session.connection()
+            try:
+                # Same transaction as the flush that changed the post, inside a SAVEPOINT: a failed
+                # upsert (e.g. missing account_daily_stats table) must not abort the publisher's
+                # transaction and fail its commit
+                with connection.begin_nested():
+                    self._upsert(connection, increments)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Failed to update analytics rollups on flush: {e}")
+
+    @staticmethod
+    def _publish_key(obj, column: str) -> Tuple[int, int, date]:
+        when = obj.published_at if column == "posts_published" else None
+        return obj.user_id, obj.social_account_id, _utc_day(when)
+
+    # ---- backfill ----
+
+    def backfill(self, days: int = 90) -> Dict[str, Any]:
+        """Recompute the last `days` days of rollups from posts, single Instagram posts and reply logs."""
+        start = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+        start_at = datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc)
+        increments: Increments = defaultdict(Counter)
+
+        with SessionLocal() as db:
+            published_day = func.date(func.timezone("UTC", Post.published_at))
+            for user_id, account_id, day, published, engagement in db.query(
+                Post.user_id, Post.social_account_id, published_day, func.count(Post.id),
+                func.coalesce(func.sum(
+                    func.coalesce(Post.likes_count, 0) + func.coalesce(Post.comments_count, 0)
+                    + func.coalesce(Post.shares_count, 0)
+                ), 0)
+            ).filter(
+                Post.status == PostStatus.PUBLISHED,
+                Post.published_at >= start_at,
+                func.coalesce(Post.platform_response["source"].as_string(), "") != MEDIA_SYNC_SOURCE,
+                ~exists().where(and_(
+                    SingleInstagramPost.social_account_id == Post.social_account_id,
+                    SingleInstagramPost.platform_post_id == Post.platform_post_id
+                ))
+            ).group_by(Post.user_id, Post.social_account_id, published_day):
+                increments[(user_id, account_id, day)]["posts_published"] += published
+                increments[(user_id, account_id, day)]["engagement_total"] += engagement
+
+            failed_day = func.date(func.timezone("UTC", Post.updated_at))
+            for user_id, account_id, day, failed in db.query(
+                Post.user_id, Post.social_account_id, failed_day, func.count(Post.id)
+            ).filter(
+                Post.status == PostStatus.FAILED,
+                Post.updated_at >= start_at
+            ).group_by(Post.user_id, Post.social_account_id, failed_day):
+                increments[(user_id, account_id, day)]["posts_failed"] += failed
+
+            # single_instagram_posts timestamps are naive UTC
+            single_day = func.date(func.coalesce(SingleInstagramPost.published_at, SingleInstagramPost.updated_at))
+            for user_id, account_id, day, post_status, count in db.query(
+                SingleInstagramPost.user_id, SingleInstagramPost.social_account_id, single_day,
+                SingleInstagramPost.status, func.count(SingleInstagramPost.id)
+            ).filter(
+                SingleInstagramPost.status.in_(list(PUBLISH_STATUS_COLUMNS)),
+                func.coalesce(SingleInstagramPost.published_at, SingleInstagramPost.updated_at) >= start_at.replace(tzinfo=None)
+            ).group_by(
+                SingleInstagramPost.user_id, SingleInstagramPost.social_account_id, single_day, SingleInstagramPost.status
+            ):
+                increments[(user_id, account_id, day)][PUBLISH_STATUS_COLUMNS[post_status]] += count
+
+            reply_day = func.date(func.timezone("UTC", InstagramAutoReplyLog.replied_at))
+            for user_id, account_id, day, replies in db.query(
+                SocialAccount.user_id, SocialAccount.id, reply_day, func.count(InstagramAutoReplyLog.id)
+            ).join(
+                SocialAccount, (SocialAccount.platform_user_id == InstagramAutoReplyLog.instagram_user_id)
+                & (SocialAccount.platform == "instagram")
+            ).filter(
+                InstagramAutoReplyLog.replied_at >= start_at
+            ).group_by(SocialAccount.user_id, SocialAccount.id, reply_day):
+                increments[(user_id, account_id, day)]["replies_sent"] += replies
+
+            # Facebook auto-replies are not persisted per reply, so existing counts for them are kept
+            existing_fb_replies = {
+                (row.user_id, row.social_account_id, row.day): row.replies_sent
+                for row in db.query(AccountDailyStat).join(
+                    SocialAccount, SocialAccount.id == AccountDailyStat.social_account_id
+                ).filter(SocialAccount.platform == "facebook", AccountDailyStat.day >= start)
+            }
+            for key, replies in existing_fb_replies.items():
+                increments[key]["replies_sent"] += replies
+
+            db.query(AccountDailyStat).filter(AccountDailyStat.day >= start).delete(synchronize_session=False)
+            self._upsert(db.connection(), increments, replace=True)
+            db.commit()
+
+        self.stats["backfills"] += 1
+        logger.info(f"📈 Backfilled analytics rollups for {days} days ({len(increments)} account-days)")
+        return {"days": days, "start": start.isoformat(), "account_days": len(increments)}
+
+    # ---- reads ----
+
+    def get_range(self, user_id: int, start: date, end: date,
+                  social_account_id: Optional[int] = None) -> Dict[str, Any]:
+        """Daily rows and totals for a user's accounts between start and end (inclusive)."""
+        with SessionLocal() as db:
+            query = db.query(AccountDailyStat).filter(
+                AccountDailyStat.user_id == user_id,
+                AccountDailyStat.day >= start,
+                AccountDailyStat.day <= end
+            )
+            if social_account_id is not None:
+                query = query.filter(AccountDailyStat.social_account_id == social_account_id)
+            rows = query.order_by(AccountDailyStat.day.asc(), AccountDailyStat.social_account_id.asc()).all()
+
+            days = []
+            totals = Counter()
+            for row in rows:
+                counts = {column: getattr(row, column) or 0 for column in COUNTER_COLUMNS}
+                totals.update(counts)
+                days.append({
+                    "day": row.day.isoformat(),
+                    "social_account_id": row.social_account_id,
+                    **counts,
+                    "average_engagement": round(counts["engagement_total"] / counts["posts_published"], 2)
+                    if counts["posts_published"] else None
+                })
+
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days": days,
+            "totals": {
+                **{column: totals.get(column, 0) for column in COUNTER_COLUMNS},
+                "average_engagement": round(totals["engagement_total"] / totals["posts_published"], 2)
+                if totals.get("posts_published") else None
+            }
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "installed": self._installed}
+
+
+# Create a singleton instance
+analytics_rollup_service = AnalyticsRollupService()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild per-account daily analytics rollups.")
+    parser.add_argument("--days", type=int, default=90, help="Number of days (ending today, UTC) to rebuild")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(analytics_rollup_service.backfill(args.days))
@@ -0,0 +1,269 @@
+"""
+Background backfill jobs for Instagram global auto-reply.
+
+Enabling global auto-reply replies to the existing comments on an account's
+recent media. That work runs here instead of inside the HTTP request: every job
+is persisted in auto_reply_backfill_jobs, checkpoints after each media item,
+processes a few media concurrently, and can be cancelled, inspected or resumed
+from any worker.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+from sqlalchemy import or_
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.models.auto_reply_backfill_job import AutoReplyBackfillJob, BackfillJobStatus
+from app.services.instagram_service import instagram_service, get_access_token_for_user
+from app.services.graph_rate_governor import graph_priority, POLL
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (BackfillJobStatus.PENDING.value, BackfillJobStatus.RUNNING.value)
+
+
+class AutoReplyBackfillService:
+    """Runs, checkpoints and resumes global auto-reply backfill jobs."""
+
+    def __init__(self):
+        self.is_running = False
+        self.check_interval = 60  # Seconds between scans for orphaned jobs
+        self.heartbeat_interval = 30
+        self.stale_after = timedelta(minutes=3)  # Heartbeat age after which a job is considered orphaned
+        self.max_parallel_media = 3
+        self.media_limit = 100
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._checkpoint_lock = asyncio.Lock()
+
+    async def start(self):
+        """Resume orphaned jobs now and keep watching for workers that die mid-job."""
+        self.is_running = True
+        logger.info("🚀 Starting auto-reply backfill service...")
+
+        while self.is_running:
+            try:
+                self.resume_stale_jobs()
+            except Exception as e:
+                logger.error(f"Error resuming backfill jobs: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def stop(self):
+        """Stop watching for orphaned jobs. Running jobs stay resumable from their checkpoint."""
+        self.is_running = False
+        logger.info("🛑 Stopping auto-reply backfill service...")
+
+    def start_job(self, user_id: int, instagram_user_id: str) -> Dict[str, Any]:
+        """Create a backfill job for the account, or return the one already in progress."""
+        with SessionLocal() as db:
+            job = db.query(AutoReplyBackfillJob).filter(
+                AutoReplyBackfillJob.instagram_user_id == instagram_user_id,
+                AutoReplyBackfillJob.status.in_(ACTIVE_STATUSES)
+            ).order_by(AutoReplyBackfillJob.id.desc()).first()
+            if job:
+                logger.info(f"Backfill job {job.id} already in progress for {instagram_user_id}")
+                return self._to_progress(job)
+
+            job = AutoReplyBackfillJob(
+                user_id=user_id,
+                instagram_user_id=instagram_user_id,
+                status=BackfillJobStatus.RUNNING.value,
+                completed_media_ids=[],
+                heartbeat_at=datetime.now(timezone.utc)
+            )
+            db.add(job)
+            db.commit()
+            job_id = job.id
+            progress = self._to_progress(job)
+
+        self._launch(job_id)
+        return progress
+
+    def cancel_job(self, user_id: int, instagram_user_id: str) -> bool:
+        """Request cancellation; the owning worker stops before its next media item."""
+        with SessionLocal() as db:
+            updated = db.query(AutoReplyBackfillJob).filter(
+                AutoReplyBackfillJob.user_id == user_id,
+                AutoReplyBackfillJob.instagram_user_id == instagram_user_id,
+                AutoReplyBackfillJob.status.in_(ACTIVE_STATUSES)
+            ).update({AutoReplyBackfillJob.cancel_requested: True}, synchronize_session=False)
+            db.commit()
+        return updated > 0
+
+    def get_progress(self, user_id: int, instagram_user_id: str) -> Dict[str, Any]:
+        """Return progress of the latest job for the account, readable from any worker."""
+        with SessionLocal() as db:
+            job = db.query(AutoReplyBackfillJob).filter(
+                AutoReplyBackfillJob.user_id == user_id,
+                AutoReplyBackfillJob.instagram_user_id == instagram_user_id
+            ).order_by(AutoReplyBackfillJob.id.desc()).first()
+            if not job:
+                return {"status": "idle", "progress": 0, "details": "No processing in progress."}
+            return self._to_progress(job)
+
+    def resume_stale_jobs(self):
+        """Claim and restart active jobs whose owning worker stopped heartbeating."""
+        now = datetime.now(timezone.utc)
+        stale = or_(
+            AutoReplyBackfillJob.heartbeat_at == None,
+            AutoReplyBackfillJob.heartbeat_at < now - self.stale_after
+        )
+        with SessionLocal() as db:
+            job_ids = [row.id for row in db.query(AutoReplyBackfillJob.id).filter(
+                AutoReplyBackfillJob.status.in_(ACTIVE_STATUSES), stale
+            ).all()]
+            for job_id in job_ids:
+                task = self._tasks.get(job_id)
+                if task and not task.done():
+                    continue
+                # Conditional update so only one worker wins the claim
+                claimed = db.query(AutoReplyBackfillJob).filter(
+                    AutoReplyBackfillJob.id == job_id, stale
+                ).update({
+                    AutoReplyBackfillJob.heartbeat_at: now,
+                    AutoReplyBackfillJob.status: BackfillJobStatus.RUNNING.value
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    logger.info(f"♻️ Resuming backfill job {job_id} from checkpoint")
+                    self._launch(job_id)
+
+    def _launch(self, job_id: int):
+        with graph_priority(POLL):  # The job task inherits the priority
+            self._tasks[job_id] = asyncio.create_task(self._run_job(job_id))
+
+    async def _run_job(self, job_id: int):
+        from app.services.instagram_auto_reply_service import comment_reply_batcher
+
+        with SessionLocal() as db:
+            job = db.get(AutoReplyBackfillJob, job_id)
+            if not job:
+                return
+            instagram_user_id = job.instagram_user_id
+            done_media_ids = set(job.completed_media_ids or [])
+
+        cancel_event = asyncio.Event()
+        heartbeat_task = asyncio.create_task(self._heartbeat(job_id, cancel_event))
+        try:
+            page_access_token = get_access_token_for_user(instagram_user_id)
+            if not page_access_token:
+                self._finish(job_id, BackfillJobStatus.FAILED, "No page access token found")
+                return
+
+            # run_in_threadpool carries the context, so the media listing keeps the POLL priority
+            posts = await run_in_threadpool(
+                instagram_service.get_user_media, instagram_user_id, page_access_token, limit=self.media_limit
+            )
+            remaining = [p["id"] for p in posts if p.get("id") and p["id"] not in done_media_ids]
+            self._update(job_id, total_media=len(posts))
+            logger.info(f"Backfill job {job_id}: {len(remaining)}/{len(posts)} media left for {instagram_user_id}")
+
+            semaphore = asyncio.Semaphore(self.max_parallel_media)
+
+            async def process_media(media_id: str):
+                async with semaphore:
+                    if cancel_event.is_set():
+                        return
+                    comments = await instagram_service.get_comments(
+                        instagram_user_id, page_access_token, media_id=media_id, limit=100
+                    )
+                    comments = [c for c in comments if c.get("from", {}).get("id") != instagram_user_id]
+                    replied = await comment_reply_batcher.reply_to_batch(instagram_user_id, page_access_token, comments)
+                    await self._checkpoint(job_id, media_id, len(comments), replied)
+
+            # Every media runs to completion before the job is finished, so no reply or checkpoint
+            # lands after the final status; failed media are not checkpointed
+            results = await asyncio.gather(*(process_media(media_id) for media_id in remaining),
+                                           return_exceptions=True)
+            failures = {}
+            for media_id, result in zip(remaining, results):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                if isinstance(result, Exception):
+                    logger.error(f"Backfill job {job_id}: media {media_id} failed: {result}")
+                    failures[media_id] = result
+
+            if cancel_event.is_set():
+                self._finish(job_id, BackfillJobStatus.CANCELLED)
+            elif failures:
+                media_id, error = next(iter(failures.items()))
+                self._finish(job_id, BackfillJobStatus.FAILED,
+                             f"{len(failures)} of {len(remaining)} media failed (first: {media_id}: {error})")
+            else:
+                self._finish(job_id, BackfillJobStatus.COMPLETED)
+        except asyncio.CancelledError:
+            # Worker shutting down: leave the job active so it resumes from its checkpoint
+            raise
+        except Exception as e:
+            logger.error(f"Backfill job {job_id} failed: {e}")
+            self._finish(job_id, BackfillJobStatus.FAILED, str(e))
+        finally:
+            heartbeat_task.cancel()
+            self._tasks.pop(job_id, None)
+
+    async def _heartbeat(self, job_id: int, cancel_event: asyncio.Event):
+        """Keep ownership of the job fresh and pick up cancel requests from other workers."""
+        while True:
+            try:
+                with SessionLocal() as db:
+                    job = db.get(AutoReplyBackfillJob, job_id)
+                    if job:
+                        job.heartbeat_at = datetime.now(timezone.utc)
+                        if job.cancel_requested:
+                            cancel_event.set()
+                        db.commit()
+            except Exception as e:
+                logger.error(f"Backfill job {job_id} heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def _checkpoint(self, job_id: int, media_id: str, comment_count: int, replied: int):
+        async with self._checkpoint_lock:
+            with SessionLocal() as db:
+                job = db.get(AutoReplyBackfillJob, job_id)
+                job.completed_media_ids = (job.completed_media_ids or []) + [media_id]
+                job.processed_comments = (job.processed_comments or 0) + comment_count
+                job.replied_comments = (job.replied_comments or 0) + replied
+                job.heartbeat_at = datetime.now(timezone.utc)
+                db.commit()
+
+    def _update(self, job_id: int, **fields):
+        with SessionLocal() as db:
+            db.query(AutoReplyBackfillJob).filter(AutoReplyBackfillJob.id == job_id).update(
+                fields, synchronize_session=False
+            )
+            db.commit()
+
+    def _finish(self, job_id: int, status: BackfillJobStatus, error_message: Optional[str] = None):
+        self._update(
+            job_id,
+            status=status.value,
+            error_message=error_message,
+            finished_at=datetime.now(timezone.utc)
+        )
+        logger.info(f"Backfill job {job_id} finished with status {status.value}")
+
+    def _to_progress(self, job: AutoReplyBackfillJob) -> Dict[str, Any]:
+        completed = len(job.completed_media_ids or [])
+        total = job.total_media or 0
+        if job.status == BackfillJobStatus.COMPLETED.value:
+            percent = 100
+        else:
+            percent = int(completed * 100 / total) if total else 0
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "progress": percent,
+            "current_post": completed,
+            "total_posts": total,
+            "processed_comments": job.processed_comments or 0,
+            "replied_comments": job.replied_comments or 0,
+            "cancel_requested": bool(job.cancel_requested),
+            "error": job.error_message,
+            "started_at": job.created_at.isoformat() if job.created_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None
+        }
+
+
+# Create a singleton instance
+auto_reply_backfill_service = AutoReplyBackfillService()
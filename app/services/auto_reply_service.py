@@ -9,6 +9,9 @@ from app.models.post import Post, PostStatus
 from app.services.facebook_service import facebook_service
 from app.services.groq_service import groq_service
 from app.services.facebook_message_auto_reply_service import facebook_message_auto_reply_service
+from app.services.analytics_rollup_service import analytics_rollup_service
+from app.services.graph_rate_governor import graph_rate_governor
+from app.utils.resilience import resilient_transport
 
 logger = logging.getLogger(__name__)
 
@@ -73,7 +76,8 @@ class AutoReplyService:
             logger.info(f"✅ Found connected social account: {social_account.display_name}")
             
             # Fetch all posts from Facebook for this page
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 fb_posts_resp = await client.get(
                     f"{self.graph_api_base}/{social_account.platform_user_id}/posts",
                     params={
@@ -138,7 +142,8 @@ class AutoReplyService:
         try:
             since_param = int(last_check.timestamp())
             
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 # Get comments on this post since last check
                 comments_resp = await client.get(
                     f"{self.graph_api_base}/{post_id}/comments",
@@ -253,7 +258,8 @@ class AutoReplyService:
             parent_id = latest_comment["parent"]["id"]
             
             # Get the parent comment to see who it's from
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 parent_resp = await client.get(
                     f"{self.graph_api_base}/{parent_id}",
                     params={
@@ -324,7 +330,8 @@ class AutoReplyService:
     async def _has_replied_to_comment(self, comment_id: str, access_token: str) -> bool:
         """Check if we already replied to a comment."""
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 # Get replies to this comment
                 replies_resp = await client.get(
                     f"{self.graph_api_base}/{comment_id}/comments",
@@ -387,7 +394,8 @@ class AutoReplyService:
             )
             
             # Post reply to Facebook
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 reply_resp = await client.post(
                     f"{self.graph_api_base}/{comment_id}/comments",
                     data={
@@ -405,6 +413,7 @@ class AutoReplyService:
                     # Update rule statistics
                     rule.success_count += 1
                     rule.last_success_at = datetime.utcnow()
+                    analytics_rollup_service.record(rule.user_id, rule.social_account_id, replies_sent=1)
                     
                 else:
                     logger.error(f"❌ Failed to post auto-reply: {reply_resp.text}")
@@ -495,7 +504,8 @@ class AutoReplyService:
         Returns a summary of the conversation thread.
         """
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 # Get the comment and its replies
                 comment_resp = await client.get(
                     f"{self.graph_api_base}/{comment_id}",
@@ -2,13 +2,20 @@ import requests
 import logging
 from typing import Dict
 from app.config import get_settings
+from app.utils.resilience import get_provider, is_provider_failure
 import cloudinary
+import cloudinary.exceptions
 import cloudinary.uploader
 import os
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+
+def _is_cloudinary_failure(error: Exception) -> bool:
+    # The SDK reports 5xx and socket errors as GeneralError; other API errors are the request's fault
+    return isinstance(error, cloudinary.exceptions.GeneralError) or is_provider_failure(error)
+
 class CloudinaryService:
     """Helper for authenticated uploads to Cloudinary with Instagram transforms."""
 
@@ -16,6 +23,8 @@ class CloudinaryService:
         self.cloud_name = settings.cloudinary_cloud_name
         self.api_key = settings.cloudinary_api_key
         self.api_secret = settings.cloudinary_api_secret
+        self.video_chunk_size = 20 * 1024 * 1024  # Chunk size for streamed video uploads
+        self.resilience = get_provider("cloudinary")
         if not (self.cloud_name and self.api_key and self.api_secret):
             logger.warning("Cloudinary credentials not fully configured. Uploads will fail.")
         cloudinary.config(
@@ -27,12 +36,18 @@ class CloudinaryService:
     def is_configured(self) -> bool:
         return bool(self.cloud_name and self.api_key and self.api_secret)
 
+    def _upload(self, uploader, *args, **kwargs) -> Dict:
+        """Run an upload behind the shared Cloudinary circuit breaker (never resent; uploads create assets)."""
+        return self.resilience.call_sync(lambda: uploader(*args, **kwargs), idempotent=False,
+                                         is_failure=_is_cloudinary_failure)
+
     def upload_image_with_instagram_transform(self, image_data):
         """Upload an image to Cloudinary with Instagram-specific transforms."""
         if not self.is_configured():
             return {"success": False, "error": "Cloudinary not configured"}
         try:
-            result = cloudinary.uploader.upload(
+            result = self._upload(
+                cloudinary.uploader.upload,
                 image_data,
                 transformation=[
                     {"width": 1080, "height": 1080, "crop": "fill", "gravity": "auto"}
@@ -47,12 +62,50 @@ class CloudinaryService:
             logger.error(f"Cloudinary image upload failed: {e}")
             return {"success": False, "error": str(e)}
 
+    def upload_image(self, image_data, folder: str = "generated") -> Dict:
+        """Upload an image to Cloudinary as-is (no crop), for general media hosting."""
+        if not self.is_configured():
+            return {"success": False, "error": "Cloudinary not configured"}
+        try:
+            result = self._upload(cloudinary.uploader.upload, image_data, folder=folder, resource_type="image")
+            return {"success": True, "url": result["secure_url"]}
+        except Exception as e:
+            logger.error(f"Cloudinary image upload failed: {e}")
+            return {"success": False, "error": str(e)}
+
+    def upload_video(self, file_path: str, folder: str = "imported") -> Dict:
+        """Upload a local video file as-is with Cloudinary's chunked upload."""
+        if not self.is_configured():
+            return {"success": False, "error": "Cloudinary not configured"}
+        try:
+            result = self._upload(
+                cloudinary.uploader.upload_large,
+                file_path,
+                resource_type="video",
+                folder=folder,
+                chunk_size=self.video_chunk_size
+            )
+            return {"success": True, "url": result["secure_url"]}
+        except Exception as e:
+            logger.error(f"Cloudinary video upload failed: {e}")
+            return {"success": False, "error": str(e)}
+
     def upload_video_with_instagram_transform(self, file_or_base64) -> Dict:
-        """Upload a video (file or base64) to Cloudinary with Instagram-specific transforms."""
+        """
+        Upload a video (file or base64) to Cloudinary with Instagram-specific transforms.
+        
+        Local file paths are sent with Cloudinary's chunked upload so the video
+        is streamed from disk instead of being read into memory.
+        """
         if not self.is_configured():
             return {"success": False, "error": "Cloudinary not configured"}
         try:
-            result = cloudinary.uploader.upload(
+            is_file_path = isinstance(file_or_base64, str) and not file_or_base64.startswith("data:") \
+                and os.path.isfile(file_or_base64)
+            uploader = cloudinary.uploader.upload_large if is_file_path else cloudinary.uploader.upload
+            extra = {"chunk_size": self.video_chunk_size} if is_file_path else {}
+            result = self._upload(
+                uploader,
                 file_or_base64,
                 resource_type="video",
                 transformation=[
@@ -61,7 +114,8 @@ class CloudinaryService:
                     {"quality": "auto"},
                     {"fetch_format": "mp4"}
                 ],
-                format="mp4"
+                format="mp4",
+                **extra
             )
             return {"success": True, "url": result["secure_url"]}
         except Exception as e:
@@ -78,7 +132,8 @@ class CloudinaryService:
             # - Minimum resolution: 420x654 pixels
             # - Recommended resolution: 1080x1920 pixels
             # - Format: JPG or PNG
-            result = cloudinary.uploader.upload(
+            result = self._upload(
+                cloudinary.uploader.upload,
                 image_data,
                 transformation=[
                     {"width": 1080, "height": 1920, "crop": "fill", "gravity": "auto"},
@@ -0,0 +1,237 @@
+"""
+Conversation context store for Messenger auto-replies.
+
+Keeps the last few exchanges per conversation under a global memory budget
+with LRU and TTL eviction. Lines are stored as (role, text) tuples with interned
+role tags in fixed-size ring buffers. An optional database backend makes the
+conversation_contexts table the source of truth, so contexts survive restarts
+and are shared across workers: reads reload the stored context, and appends
+merge into the stored row under a row lock instead of overwriting it with
+this worker's copy. Memory then acts as a fallback when the database is
+unreachable.
+"""
+
+import logging
+import sys
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional, Tuple, Any
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ROLE_USER = sys.intern("User")
+ROLE_AI = sys.intern("AI")
+_ROLES = {ROLE_USER: ROLE_USER, ROLE_AI: ROLE_AI}
+
+# Approximate fixed cost of one stored line (tuple + str headers) in bytes
+LINE_OVERHEAD_BYTES = 120
+
+
+class _Conversation:
+    __slots__ = ("lines", "size", "touched_at")
+
+    def __init__(self, max_lines: int):
+        self.lines: Deque[Tuple[str, str]] = deque(maxlen=max_lines)
+        self.size = 0
+        self.touched_at = time.time()
+
+
+class DatabaseContextBackend:
+    """Write-through persistence for conversation contexts."""
+
+    def load(self, key: str) -> Optional[List[Tuple[str, str]]]:
+        from app.database import SessionLocal
+        from app.models.conversation_context import ConversationContext
+
+        with SessionLocal() as db:
+            row = db.query(ConversationContext).filter_by(conversation_key=key).first()
+            if not row:
+                return None
+            return [(role, text) for role, text in row.lines]
+
+    def append(self, key: str, new_lines: List[Tuple[str, str]], max_lines: int) -> List[Tuple[str, str]]:
+        """
+        Append lines to the stored context and return the merged context (last max_lines).
+
+        The row is locked while merging, so exchanges appended concurrently by
+        other workers are kept.
+        """
+        from sqlalchemy.exc import IntegrityError
+        from app.database import SessionLocal
+        from app.models.conversation_context import ConversationContext
+
+        for attempt in range(2):
+            with SessionLocal() as db:
+                row = db.query(ConversationContext).filter_by(conversation_key=key).with_for_update().first()
+                stored = [(role, text) for role, text in row.lines] if row else []
+                merged = (stored + list(new_lines))[-max_lines:]
+                if row:
+                    row.lines = [list(line) for line in merged]
+                    row.updated_at = datetime.now(timezone.utc)
+                else:
+                    db.add(ConversationContext(conversation_key=key, lines=[list(line) for line in merged]))
+                try:
+                    db.commit()
+                    return merged
+                except IntegrityError:
+                    # Another worker created the row first; merge into theirs
+                    db.rollback()
+                    if attempt:
+                        raise
+        return merged
+
+    def purge_older_than(self, cutoff: datetime) -> int:
+        from app.database import SessionLocal
+        from app.models.conversation_context import ConversationContext
+
+        with SessionLocal() as db:
+            deleted = db.query(ConversationContext).filter(
+                ConversationContext.updated_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+
+
+class ConversationContextStore:
+    """Bounded, TTL-evicted conversation memory keyed by conversation."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: int, max_lines: int = 20, backend=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_lines = max_lines
+        self.backend = backend
+        self.purge_interval = 3600  # Seconds between backend TTL purges
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._bytes_used = 0
+        self._last_purge = time.time()
+        self.stats = {"hits": 0, "misses": 0, "lru_evictions": 0, "ttl_evictions": 0, "backend_loads": 0}
+
+    @staticmethod
+    def _line_size(text: str) -> int:
+        return len(text.encode("utf-8")) + LINE_OVERHEAD_BYTES
+
+    def _drop(self, key: str):
+        conversation = self._conversations.pop(key, None)
+        if conversation:
+            self._bytes_used -= conversation.size
+
+    def _get_conversation(self, key: str) -> Optional[_Conversation]:
+        conversation = self._conversations.get(key)
+        if conversation and time.time() - conversation.touched_at > self.ttl_seconds:
+            self._drop(key)
+            self.stats["ttl_evictions"] += 1
+            conversation = None
+
+        if self.backend is not None:
+            # Other workers may have appended since we cached it; memory is only the fallback
+            try:
+                lines = self.backend.load(key)
+            except Exception as e:
+                logger.error(f"Error loading conversation context {key}: {e}")
+            else:
+                self.stats["backend_loads"] += 1
+                if lines:
+                    return self._replace(key, lines)
+                self._drop(key)
+                self.stats["misses"] += 1
+                return None
+
+        if conversation:
+            self.stats["hits"] += 1
+            self._conversations.move_to_end(key)
+            return conversation
+        self.stats["misses"] += 1
+        return None
+
+    def _replace(self, key: str, lines: List[Tuple[str, str]]) -> _Conversation:
+        """Cache `lines` as the conversation's full context."""
+        self._drop(key)
+        conversation = self._new_conversation(key)
+        for role, text in lines:
+            self._append_line(conversation, role, text)
+        self._enforce_budget()
+        return conversation
+
+    def _new_conversation(self, key: str) -> _Conversation:
+        conversation = _Conversation(self.max_lines)
+        self._conversations[key] = conversation
+        return conversation
+
+    def _append_line(self, conversation: _Conversation, role: str, text: str):
+        if len(conversation.lines) == conversation.lines.maxlen:
+            _, oldest_text = conversation.lines[0]
+            removed = self._line_size(oldest_text)
+            conversation.size -= removed
+            self._bytes_used -= removed
+        conversation.lines.append((_ROLES.get(role, ROLE_USER), text))
+        added = self._line_size(text)
+        conversation.size += added
+        self._bytes_used += added
+        conversation.touched_at = time.time()
+
+    def _enforce_budget(self):
+        now = time.time()
+        # Expired entries go first, oldest-touched first
+        while self._conversations:
+            key, conversation = next(iter(self._conversations.items()))
+            if now - conversation.touched_at <= self.ttl_seconds:
+                break
+            self._drop(key)
+            self.stats["ttl_evictions"] += 1
+        while self._bytes_used > self.max_bytes and len(self._conversations) > 1:
+            key = next(iter(self._conversations))
+            self._drop(key)
+            self.stats["lru_evictions"] += 1
+
+    def get_lines(self, key: str) -> List[str]:
+        """Return the stored context as "Role: text" lines, oldest first."""
+        conversation = self._get_conversation(key)
+        if not conversation:
+            return []
+        return [f"{role}: {text}" for role, text in conversation.lines]
+
+    def append_exchange(self, key: str, user_message: str, ai_response: str):
+        """Record one user message and our reply."""
+        exchange = [(ROLE_USER, user_message), (ROLE_AI, ai_response)]
+        if self.backend is not None:
+            try:
+                self._replace(key, self.backend.append(key, exchange, self.max_lines))
+                if time.time() - self._last_purge > self.purge_interval:
+                    self._last_purge = time.time()
+                    cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+                    purged = self.backend.purge_older_than(cutoff)
+                    logger.info(f"🧹 Purged {purged} expired conversation contexts")
+                return
+            except Exception as e:
+                logger.error(f"Error persisting conversation context {key}: {e}")
+
+        conversation = self._conversations.get(key)
+        if conversation is None or time.time() - conversation.touched_at > self.ttl_seconds:
+            self._drop(key)
+            conversation = self._new_conversation(key)
+        self._conversations.move_to_end(key)
+        for role, text in exchange:
+            self._append_line(conversation, role, text)
+        self._enforce_budget()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "conversations": len(self._conversations),
+            "bytes_used": self._bytes_used,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "backend": "database" if self.backend is not None else "memory"
+        }
+
+
+def create_conversation_context_store() -> ConversationContextStore:
+    backend = DatabaseContextBackend() if settings.conversation_context_backend == "database" else None
+    return ConversationContextStore(
+        max_bytes=settings.conversation_context_max_bytes,
+        ttl_seconds=settings.conversation_context_ttl_hours * 3600,
+        backend=backend
+    )
@@ -5,9 +5,21 @@ from email.mime.multipart import MIMEMultipart
 from typing import Optional
 import os
 import logging
+from app.utils.resilience import get_provider
 
 logger = logging.getLogger(__name__)
 
+
+def _is_smtp_failure(error: Exception) -> bool:
+    """Connection trouble and 4xx (transient) replies; auth errors and 5xx rejections are permanent."""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # Other SMTPExceptions (refused recipients, missing STARTTLS) are configuration problems
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
 class EmailService:
     def __init__(self):
         self.smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
@@ -15,6 +27,19 @@ class EmailService:
         self.smtp_username = os.getenv("SMTP_USERNAME")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         self.from_email = os.getenv("FROM_EMAIL", self.smtp_username)
+        self.resilience = get_provider("smtp")
+    
+    def _send(self, to_email: str, message: str):
+        """Deliver one message over STARTTLS."""
+        logger.info("Creating SSL context and connecting to SMTP server...")
+        context = ssl.create_default_context()
+        with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30) as server:
+            logger.info("Starting TLS...")
+            server.starttls(context=context)
+            logger.info("Logging in to SMTP server...")
+            server.login(self.smtp_username, self.smtp_password)
+            logger.info("Sending email...")
+            server.sendmail(self.from_email, to_email, message)
         
     def send_otp_email(self, to_email: str, otp: str, full_name: str = None) -> bool:
         """Send OTP verification email"""
@@ -94,16 +119,9 @@ class EmailService:
             message.attach(text_part)
             message.attach(html_part)
             
-            # Send email
-            logger.info("Creating SSL context and connecting to SMTP server...")
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                logger.info("Starting TLS...")
-                server.starttls(context=context)
-                logger.info("Logging in to SMTP server...")
-                server.login(self.smtp_username, self.smtp_password)
-                logger.info("Sending email...")
-                server.sendmail(self.from_email, to_email, message.as_string())
+            # Send email behind the SMTP circuit breaker; transient failures get one jittered retry
+            self.resilience.call_sync(lambda: self._send(to_email, message.as_string()),
+                                      is_failure=_is_smtp_failure)
             
             logger.info(f"OTP email sent successfully to {to_email}")
             return True
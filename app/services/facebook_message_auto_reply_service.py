@@ -7,6 +7,9 @@ from sqlalchemy.orm import Session
 from app.models.automation_rule import AutomationRule
 from app.models.social_account import SocialAccount
 from app.services.groq_service import groq_service
+from app.services.conversation_context_store import create_conversation_context_store
+from app.services.graph_rate_governor import graph_rate_governor
+from app.utils.resilience import resilient_transport
 import asyncio
 
 logger = logging.getLogger(__name__)
@@ -15,8 +18,9 @@ GRAPH_API_BASE = "https://graph.facebook.com/v23.0"
 
 class FacebookMessageAutoReplyService:
     def __init__(self):
-        self.conversation_sessions = {}  # Store conversation context per user
-        self.http_client = httpx.AsyncClient()  # Reuse this client
+        self.conversation_store = create_conversation_context_store()  # Bounded context per conversation
+        self.http_client = httpx.AsyncClient(timeout=30, event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                             transport=resilient_transport("graph"))  # Shared by all Graph API calls
         
     async def process_page_messages(self, page_id: str, access_token: str, rule: AutomationRule):
         """
@@ -47,58 +51,58 @@ class FacebookMessageAutoReplyService:
         """
         try:
             # Try to get messages using the page's inbox
-            async with httpx.AsyncClient() as client:
-                # First, try to get the page's conversations
-                conv_response = await client.get(
-                    f"{GRAPH_API_BASE}/{page_id}/conversations",
-                    params={
-                        "access_token": access_token,
-                        "fields": "id,updated_time,senders,unread_count",
-                        "limit": 10
-                    }
-                )
+            client = self.http_client
+            # First, try to get the page's conversations
+            conv_response = await client.get(
+                f"{GRAPH_API_BASE}/{page_id}/conversations",
+                params={
+                    "access_token": access_token,
+                    "fields": "id,updated_time,senders,unread_count",
+                    "limit": 10
+                }
+            )
+            
+            if conv_response.status_code == 200:
+                conversations = conv_response.json().get("data", [])
+                messages = []
                 
-                if conv_response.status_code == 200:
-                    conversations = conv_response.json().get("data", [])
-                    messages = []
-                    
-                    for conv in conversations:
-                        # Get messages for each conversation
-                        conv_id = conv["id"]
-                        msg_response = await client.get(
-                            f"{GRAPH_API_BASE}/{conv_id}/messages",
-                            params={
-                                "access_token": access_token,
-                                "fields": "id,from,message,created_time,to",
-                                "limit": 5
-                            }
-                        )
-                        
-                        if msg_response.status_code == 200:
-                            conv_messages = msg_response.json().get("data", [])
-                            for msg in conv_messages:
-                                # Only process messages from users (not from the page)
-                                if msg.get("from", {}).get("id") != page_id:
-                                    messages.append({
-                                        "conversation_id": conv_id,
-                                        "message_id": msg["id"],
-                                        "from_user": msg["from"],
-                                        "message": msg.get("message", ""),
-                                        "created_time": msg.get("created_time"),
-                                        "conversation": conv
-                                    })
-                    
-                    return messages
-                    
-                elif conv_response.status_code == 403:
-                    # Permission denied - try alternative approach
-                    logger.warning(f"Permission denied for conversations. Trying alternative approach...")
-                    return await self._get_messages_alternative(page_id, access_token)
-                    
-                else:
-                    logger.warning(f"Could not fetch conversations: {conv_response.status_code} - {conv_response.text}")
-                    return []
+                for conv in conversations:
+                    # Get messages for each conversation
+                    conv_id = conv["id"]
+                    msg_response = await client.get(
+                        f"{GRAPH_API_BASE}/{conv_id}/messages",
+                        params={
+                            "access_token": access_token,
+                            "fields": "id,from,message,created_time,to",
+                            "limit": 5
+                        }
+                    )
                     
+                    if msg_response.status_code == 200:
+                        conv_messages = msg_response.json().get("data", [])
+                        for msg in conv_messages:
+                            # Only process messages from users (not from the page)
+                            if msg.get("from", {}).get("id") != page_id:
+                                messages.append({
+                                    "conversation_id": conv_id,
+                                    "message_id": msg["id"],
+                                    "from_user": msg["from"],
+                                    "message": msg.get("message", ""),
+                                    "created_time": msg.get("created_time"),
+                                    "conversation": conv
+                                })
+                
+                return messages
+                
+            elif conv_response.status_code == 403:
+                # Permission denied - try alternative approach
+                logger.warning(f"Permission denied for conversations. Trying alternative approach...")
+                return await self._get_messages_alternative(page_id, access_token)
+                
+            else:
+                logger.warning(f"Could not fetch conversations: {conv_response.status_code} - {conv_response.text}")
+                return []
+                
         except Exception as e:
             logger.error(f"Error getting page messages: {e}")
             return []
@@ -109,41 +113,41 @@ class FacebookMessageAutoReplyService:
         This uses different endpoints that might be available.
         """
         try:
-            async with httpx.AsyncClient() as client:
-                # Try to get the page's feed and look for comments
-                feed_response = await client.get(
-                    f"{GRAPH_API_BASE}/{page_id}/feed",
-                    params={
-                        "access_token": access_token,
-                        "fields": "id,message,comments{id,message,from,created_time}",
-                        "limit": 5
-                    }
-                )
+            client = self.http_client
+            # Try to get the page's feed and look for comments
+            feed_response = await client.get(
+                f"{GRAPH_API_BASE}/{page_id}/feed",
+                params={
+                    "access_token": access_token,
+                    "fields": "id,message,comments{id,message,from,created_time}",
+                    "limit": 5
+                }
+            )
+            
+            if feed_response.status_code == 200:
+                feed_data = feed_response.json().get("data", [])
+                messages = []
+                
+                for post in feed_data:
+                    comments = post.get("comments", {}).get("data", [])
+                    for comment in comments:
+                        # Only process comments from users (not from the page)
+                        if comment.get("from", {}).get("id") != page_id:
+                            messages.append({
+                                "conversation_id": f"post_{post['id']}",
+                                "message_id": comment["id"],
+                                "from_user": comment["from"],
+                                "message": comment.get("message", ""),
+                                "created_time": comment.get("created_time"),
+                                "type": "comment"
+                            })
+                
+                return messages
+                
+            else:
+                logger.warning(f"Alternative approach also failed: {feed_response.status_code}")
+                return []
                 
-                if feed_response.status_code == 200:
-                    feed_data = feed_response.json().get("data", [])
-                    messages = []
-                    
-                    for post in feed_data:
-                        comments = post.get("comments", {}).get("data", [])
-                        for comment in comments:
-                            # Only process comments from users (not from the page)
-                            if comment.get("from", {}).get("id") != page_id:
-                                messages.append({
-                                    "conversation_id": f"post_{post['id']}",
-                                    "message_id": comment["id"],
-                                    "from_user": comment["from"],
-                                    "message": comment.get("message", ""),
-                                    "created_time": comment.get("created_time"),
-                                    "type": "comment"
-                                })
-                    
-                    return messages
-                    
-                else:
-                    logger.warning(f"Alternative approach also failed: {feed_response.status_code}")
-                    return []
-                    
         except Exception as e:
             logger.error(f"Error in alternative message retrieval: {e}")
             return []
@@ -192,7 +196,7 @@ class FacebookMessageAutoReplyService:
             
             if success:
                 # Update conversation session
-                self._update_conversation_session(user_id, message_text, ai_response)
+                self._update_conversation_session(page_id, user_id, message_text, ai_response)
                 logger.info(f"✅ Sent AI response to {user_name}: {ai_response[:50]}...")
             else:
                 logger.error(f"❌ Failed to send response to {user_name}")
@@ -214,30 +218,30 @@ class FacebookMessageAutoReplyService:
                 return not await self._has_replied_to_comment(message["message_id"], access_token)
             
             # For messages, check if we've already responded
-            async with httpx.AsyncClient() as client:
-                # Get recent messages in this conversation
-                msg_response = await client.get(
-                    f"{GRAPH_API_BASE}/{conversation_id}/messages",
-                    params={
-                        "access_token": access_token,
-                        "fields": "id,from,message,created_time",
-                        "limit": 10
-                    }
-                )
+            client = self.http_client
+            # Get recent messages in this conversation
+            msg_response = await client.get(
+                f"{GRAPH_API_BASE}/{conversation_id}/messages",
+                params={
+                    "access_token": access_token,
+                    "fields": "id,from,message,created_time",
+                    "limit": 10
+                }
+            )
+            
+            if msg_response.status_code == 200:
+                messages = msg_response.json().get("data", [])
+                
+                # Check if our page has already responded after this user's message
+                user_message_time = message["created_time"]
+                
+                for msg in messages:
+                    if (msg["from"]["id"] == page_id and 
+                        msg["created_time"] > user_message_time):
+                        return False  # We've already responded
+                
+                return True
                 
-                if msg_response.status_code == 200:
-                    messages = msg_response.json().get("data", [])
-                    
-                    # Check if our page has already responded after this user's message
-                    user_message_time = message["created_time"]
-                    
-                    for msg in messages:
-                        if (msg["from"]["id"] == page_id and 
-                            msg["created_time"] > user_message_time):
-                            return False  # We've already responded
-                    
-                    return True
-                    
             return True
             
         except Exception as e:
@@ -249,27 +253,27 @@ class FacebookMessageAutoReplyService:
         Check if we've already replied to a comment.
         """
         try:
-            async with httpx.AsyncClient() as client:
-                # Get the comment and its replies
-                comment_response = await client.get(
-                    f"{GRAPH_API_BASE}/{comment_id}",
-                    params={
-                        "access_token": access_token,
-                        "fields": "comments{id,from,created_time}"
-                    }
-                )
+            client = self.http_client
+            # Get the comment and its replies
+            comment_response = await client.get(
+                f"{GRAPH_API_BASE}/{comment_id}",
+                params={
+                    "access_token": access_token,
+                    "fields": "comments{id,from,created_time}"
+                }
+            )
+            
+            if comment_response.status_code == 200:
+                comment_data = comment_response.json()
+                replies = comment_data.get("comments", {}).get("data", [])
+                
+                # Check if any reply is from our page
+                for reply in replies:
+                    if reply.get("from", {}).get("id") == comment_id.split("_")[0]:  # Page ID
+                        return True
+                
+                return False
                 
-                if comment_response.status_code == 200:
-                    comment_data = comment_response.json()
-                    replies = comment_data.get("comments", {}).get("data", [])
-                    
-                    # Check if any reply is from our page
-                    for reply in replies:
-                        if reply.get("from", {}).get("id") == comment_id.split("_")[0]:  # Page ID
-                            return True
-                    
-                    return False
-                    
             return False
             
         except Exception as e:
@@ -282,32 +286,32 @@ class FacebookMessageAutoReplyService:
         """
         try:
             # Get conversation session for this user
-            session = self.conversation_sessions.get(user_id, [])
+            session = self.conversation_store.get_lines(f"{page_id}:{user_id}")
             
             # Also get recent messages from Facebook
-            async with httpx.AsyncClient() as client:
-                msg_response = await client.get(
-                    f"{GRAPH_API_BASE}/{conversation_id}/messages",
-                    params={
-                        "access_token": access_token,
-                        "fields": "id,from,message,created_time",
-                        "limit": 10
-                    }
-                )
+            client = self.http_client
+            msg_response = await client.get(
+                f"{GRAPH_API_BASE}/{conversation_id}/messages",
+                params={
+                    "access_token": access_token,
+                    "fields": "id,from,message,created_time",
+                    "limit": 10
+                }
+            )
+            
+            if msg_response.status_code == 200:
+                messages = msg_response.json().get("data", [])
+                context_messages = []
                 
-                if msg_response.status_code == 200:
-                    messages = msg_response.json().get("data", [])
-                    context_messages = []
-                    
-                    for msg in messages:
-                        if msg["from"]["id"] == user_id:
-                            context_messages.append(f"User: {msg.get('message', '')}")
-                        elif msg["from"]["id"] == page_id:
-                            context_messages.append(f"AI: {msg.get('message', '')}")
-                    
-                    # Combine with session data
-                    full_context = session + context_messages[-5:]  # Last 5 messages
-                    return " | ".join(full_context)
+                for msg in messages:
+                    if msg["from"]["id"] == user_id:
+                        context_messages.append(f"User: {msg.get('message', '')}")
+                    elif msg["from"]["id"] == page_id:
+                        context_messages.append(f"AI: {msg.get('message', '')}")
+                
+                # Combine with session data
+                full_context = session + context_messages[-5:]  # Last 5 messages
+                return " | ".join(full_context)
             
             return " | ".join(session)
             
@@ -374,36 +378,36 @@ class FacebookMessageAutoReplyService:
         """
         try:
             # Fetch the latest message to get the user ID
-            async with httpx.AsyncClient() as client:
-                msg_response = await client.get(
-                    f"{GRAPH_API_BASE}/{conversation_id}/messages",
-                    params={
-                        "access_token": access_token,
-                        "fields": "id,from,message,created_time",
-                        "limit": 1
-                    }
-                )
-                if msg_response.status_code == 200:
-                    messages = msg_response.json().get("data", [])
-                    if messages:
-                        user_id = messages[0]["from"]["id"]
-                        # Now send the message using /me/messages
-                        send_response = await client.post(
-                            f"{GRAPH_API_BASE}/me/messages",
-                            params={"access_token": access_token},
-                            json={
-                                "recipient": {"id": user_id},
-                                "message": {"text": message}
-                            }
-                        )
-                        if send_response.status_code == 200:
-                            logger.info(f"✅ Message sent successfully to user {user_id}")
-                            return True
-                        else:
-                            logger.error(f"❌ Failed to send message: {send_response.status_code} - {send_response.text}")
-                            return False
-                logger.error("❌ Could not fetch user ID from conversation.")
-                return False
+            client = self.http_client
+            msg_response = await client.get(
+                f"{GRAPH_API_BASE}/{conversation_id}/messages",
+                params={
+                    "access_token": access_token,
+                    "fields": "id,from,message,created_time",
+                    "limit": 1
+                }
+            )
+            if msg_response.status_code == 200:
+                messages = msg_response.json().get("data", [])
+                if messages:
+                    user_id = messages[0]["from"]["id"]
+                    # Now send the message using /me/messages
+                    send_response = await client.post(
+                        f"{GRAPH_API_BASE}/me/messages",
+                        params={"access_token": access_token},
+                        json={
+                            "recipient": {"id": user_id},
+                            "message": {"text": message}
+                        }
+                    )
+                    if send_response.status_code == 200:
+                        logger.info(f"✅ Message sent successfully to user {user_id}")
+                        return True
+                    else:
+                        logger.error(f"❌ Failed to send message: {send_response.status_code} - {send_response.text}")
+                        return False
+            logger.error("❌ Could not fetch user ID from conversation.")
+            return False
         except Exception as e:
             logger.error(f"❌ Exception while sending message: {e}")
             return False
@@ -413,42 +417,36 @@ class FacebookMessageAutoReplyService:
         Send a comment response to a post comment.
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{GRAPH_API_BASE}/{comment_id}/comments",
-                    data={
-                        "access_token": access_token,
-                        "message": message
-                    }
-                )
+            client = self.http_client
+            response = await client.post(
+                f"{GRAPH_API_BASE}/{comment_id}/comments",
+                data={
+                    "access_token": access_token,
+                    "message": message
+                }
+            )
+            
+            if response.status_code == 200:
+                logger.info(f"✅ Comment reply sent successfully to {comment_id}")
+                return True
+            else:
+                logger.error(f"❌ Failed to send comment reply: {response.status_code} - {response.text}")
+                return False
                 
-                if response.status_code == 200:
-                    logger.info(f"✅ Comment reply sent successfully to {comment_id}")
-                    return True
-                else:
-                    logger.error(f"❌ Failed to send comment reply: {response.status_code} - {response.text}")
-                    return False
-                    
         except Exception as e:
             logger.error(f"Error sending comment response: {e}")
             return False
     
-    def _update_conversation_session(self, user_id: str, user_message: str, ai_response: str):
+    def _update_conversation_session(self, page_id: str, user_id: str, user_message: str, ai_response: str):
         """
         Update the conversation session for this user.
         """
-        if user_id not in self.conversation_sessions:
-            self.conversation_sessions[user_id] = []
-        
-        # Add the exchange to the session
-        self.conversation_sessions[user_id].extend([
-            f"User: {user_message}",
-            f"AI: {ai_response}"
-        ])
-        
-        # Keep only the last 10 exchanges to manage memory
-        if len(self.conversation_sessions[user_id]) > 20:
-            self.conversation_sessions[user_id] = self.conversation_sessions[user_id][-20:]
+        # The store keeps the last 10 exchanges per conversation within a global memory budget
+        self.conversation_store.append_exchange(f"{page_id}:{user_id}", user_message, ai_response)
+
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """Report conversation memory use and eviction counts."""
+        return self.conversation_store.get_stats()
 
 # Create a singleton instance
 facebook_message_auto_reply_service = FacebookMessageAutoReplyService() 
\ No newline at end of file
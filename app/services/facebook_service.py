@@ -3,11 +3,14 @@ import httpx
 import os
 import aiohttp
 from typing import Optional, Dict, Any, List
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from app.config import get_settings
 from app.services.groq_service import groq_service
-from app.services.fb_stability_service import stability_service
+from app.services.stability_service import stability_service
 from app.services.image_service import image_service
+from app.utils.memoize import memoize, token_key
+from app.services.graph_rate_governor import graph_rate_governor
+from app.utils.resilience import resilient_transport
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -21,6 +24,8 @@ class FacebookService:
         self.app_id = settings.facebook_app_id
         self.app_secret = settings.facebook_app_secret
     
+    @memoize("facebook.exchange_token", ttl=3600, is_negative=lambda result: not result.get("success"),
+             key=lambda self, short_lived_token: token_key(short_lived_token))
     async def exchange_for_long_lived_token(self, short_lived_token: str) -> Dict[str, Any]:
         """
         Exchange a short-lived access token for a long-lived token.
@@ -32,7 +37,8 @@ class FacebookService:
             Dict containing the long-lived token and expiration info
         """
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 response = await client.get(
                     f"{self.graph_api_base}/oauth/access_token",
                     params={
@@ -81,6 +87,9 @@ class FacebookService:
         """
         try:
             # Check if token is expired based on stored expiration time
+            # (stored values are timezone-aware UTC; compare as naive UTC)
+            if expires_at and expires_at.tzinfo is not None:
+                expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
             if expires_at and expires_at <= datetime.utcnow():
                 logger.info("Token is expired based on stored expiration time")
                 return {
@@ -120,6 +129,8 @@ class FacebookService:
             logger.error(f"Error validating/refreshing token: {e}")
             return {"valid": False, "error": str(e)}
 
+    @memoize("facebook.page_tokens", ttl=300, is_negative=lambda pages: not pages,
+             key=lambda self, long_lived_user_token: token_key(long_lived_user_token))
     async def get_long_lived_page_tokens(self, long_lived_user_token: str) -> List[Dict[str, Any]]:
         """
         Get long-lived page access tokens from a long-lived user token.
@@ -131,29 +142,33 @@ class FacebookService:
             List of pages with long-lived page access tokens
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.graph_api_base}/me/accounts",
-                    params={
-                        "access_token": long_lived_user_token,
-                        "fields": "id,name,category,access_token,picture,fan_count,tasks"
-                    }
-                )
-                
-                if response.status_code == 200:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
+                url = f"{self.graph_api_base}/me/accounts"
+                params = {
+                    "access_token": long_lived_user_token,
+                    "fields": "id,name,category,access_token,picture,fan_count,tasks",
+                    "limit": 100
+                }
+                pages = []
+                while url:
+                    response = await client.get(url, params=params)
+                    if response.status_code != 200:
+                        logger.error(f"Failed to get page tokens: {response.text}")
+                        return []
                     pages_data = response.json()
-                    pages = pages_data.get("data", [])
-                    
-                    # Page access tokens from long-lived user tokens are automatically long-lived
-                    # and don't expire unless the user changes password, revokes permissions, etc.
-                    for page in pages:
-                        page["token_type"] = "long_lived_page_token"
-                        page["expires_at"] = None  # Page tokens don't have explicit expiration
-                    
-                    return pages
-                else:
-                    logger.error(f"Failed to get page tokens: {response.text}")
-                    return []
+                    pages.extend(pages_data.get("data", []))
+                    # The "next" URL already carries the cursor and the original query
+                    url = pages_data.get("paging", {}).get("next")
+                    params = None
+                
+                # Page access tokens from long-lived user tokens are automatically long-lived
+                # and don't expire unless the user changes password, revokes permissions, etc.
+                for page in pages:
+                    page["token_type"] = "long_lived_page_token"
+                    page["expires_at"] = None  # Page tokens don't have explicit expiration
+                
+                return pages
                     
         except Exception as e:
             logger.error(f"Error getting page tokens: {e}")
@@ -170,45 +185,35 @@ class FacebookService:
             Dict containing validation result and user/page info
         """
         try:
-            async with httpx.AsyncClient() as client:
-                # First try to get basic info without email (works for both users and pages)
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
+                # One call for user tokens; Page nodes have no email field, so page
+                # tokens get a (#100) error and are retried without it
                 response = await client.get(
                     f"{self.graph_api_base}/me",
                     params={
                         "access_token": access_token,
-                        "fields": "id,name,picture"
+                        "fields": "id,name,picture,email"
                     }
                 )
+                if response.status_code == 400 and self._graph_error_code(response) == 100:
+                    response = await client.get(
+                        f"{self.graph_api_base}/me",
+                        params={
+                            "access_token": access_token,
+                            "fields": "id,name,picture"
+                        }
+                    )
                 
                 if response.status_code == 200:
                     data = response.json()
-                    
-                    # Try to determine if this is a user or page token
-                    # Pages have different structure and no email
-                    result = {
+                    return {
                         "valid": True,
                         "user_id": data.get("id"),
                         "name": data.get("name"),
-                        "picture": data.get("picture", {}).get("data", {}).get("url") if isinstance(data.get("picture"), dict) else data.get("picture")
+                        "picture": data.get("picture", {}).get("data", {}).get("url") if isinstance(data.get("picture"), dict) else data.get("picture"),
+                        "email": data.get("email")
                     }
-                    
-                    # Try to get email if it's a user token (will fail silently for page tokens)
-                    try:
-                        email_response = await client.get(
-                            f"{self.graph_api_base}/me",
-                            params={
-                                "access_token": access_token,
-                                "fields": "email"
-                            }
-                        )
-                        if email_response.status_code == 200:
-                            email_data = email_response.json()
-                            result["email"] = email_data.get("email")
-                    except:
-                        # Email field not available (probably a page token)
-                        result["email"] = None
-                    
-                    return result
                 else:
                     error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {"error": {"message": response.text}}
                     error_message = error_data.get("error", {}).get("message", "Invalid access token")
@@ -219,6 +224,15 @@ class FacebookService:
             logger.error(f"Error validating Facebook token: {e}")
             return {"valid": False, "error": str(e)}
     
+    @staticmethod
+    def _graph_error_code(response) -> Optional[int]:
+        try:
+            return response.json().get("error", {}).get("code")
+        except Exception:
+            return None
+
+    @memoize("facebook.user_pages", ttl=300, is_negative=lambda pages: not pages,
+             key=lambda self, access_token: token_key(access_token))
     async def get_user_pages(self, access_token: str) -> List[Dict[str, Any]]:
         """
         Get user's Facebook pages.
@@ -230,7 +244,8 @@ class FacebookService:
             List of user's Facebook pages
         """
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 response = await client.get(
                     f"{self.graph_api_base}/me/accounts",
                     params={
@@ -276,7 +291,8 @@ class FacebookService:
             Dict containing post creation result
         """
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with httpx.AsyncClient(timeout=60.0, event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 endpoint = f"{self.graph_api_base}/{page_id}/feed"
                 
                 data = {
@@ -515,9 +531,12 @@ class FacebookService:
                 if response.status_code == 200:
                     result = response.json()
                     logger.info(f"Facebook post created successfully: {result}")
+                    # /photos answers with the photo id plus the page post id ("post_id"); the page
+                    # post is what feed, comment and metrics lookups expect
                     return {
                         "success": True,
-                        "post_id": result.get("id"),
+                        "post_id": result.get("post_id") or result.get("id"),
+                        "media_id": result.get("id"),
                         "message": "Post created successfully"
                     }
                 else:
@@ -540,6 +559,11 @@ class FacebookService:
                             full_error = f"Facebook API Error (Code: {error_code}, Type: {error_type}): {error_message}"
                             logger.error(f"Detailed Facebook error: {full_error}")
                             
+                            if error_code == 190:
+                                # Invalid/expired token: have token health revalidate the account
+                                from app.services.token_health_service import token_health_service
+                                token_health_service.report_auth_error(access_token)
+                            
                             return {
                                 "success": False,
                                 "error": full_error
@@ -697,7 +721,8 @@ class FacebookService:
                 reply_content = reply_result["content"]
             
             # Post reply to Facebook
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 response = await client.post(
                     f"{self.graph_api_base}/{comment_id}/comments",
                     data={
@@ -732,7 +757,8 @@ class FacebookService:
     async def generate_image_only(
         self,
         image_prompt: str,
-        post_type: str = "feed"
+        post_type: str = "feed",
+        seed: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Generate an image without posting to Facebook.
@@ -740,6 +766,7 @@ class FacebookService:
         Args:
             image_prompt: Prompt for image generation
             post_type: Type of post for sizing (feed, story, etc.)
+            seed: Seed from an earlier preview to regenerate the same image (served from the image cache)
             
         Returns:
             Dict containing generation result and image URL
@@ -756,7 +783,8 @@ class FacebookService:
             logger.info(f"Generating image for prompt: {image_prompt}")
             image_result = await stability_service.generate_image_with_facebook_optimization(
                 prompt=image_prompt,
-                post_type=post_type
+                post_type=post_type,
+                seed=seed or 0
             )
             
             if not image_result["success"]:
@@ -766,7 +794,7 @@ class FacebookService:
                 }
             
             # Save the generated image
-            save_result = image_service.save_base64_image(
+            save_result = await image_service.save_base64_image(
                 base64_data=image_result["image_base64"],
                 format="png"
             )
@@ -781,12 +809,16 @@ class FacebookService:
                 "success": True,
                 "image_url": save_result["image_url"],
                 "filename": save_result["filename"],
+                "file_path": save_result["file_path"],
+                "is_public_url": save_result["is_public_url"],
+                "size": save_result["size"],
                 "prompt": image_prompt,
                 "image_details": {
                     "width": image_result["width"],
                     "height": image_result["height"],
                     "seed": image_result.get("seed"),
-                    "finish_reason": image_result.get("finish_reason")
+                    "finish_reason": image_result.get("finish_reason"),
+                    "cached": image_result.get("cached", False)
                 }
             }
             
@@ -843,7 +875,7 @@ class FacebookService:
             
             # Step 2: Save image
             logger.info("Step 2: Saving generated image")
-            save_result = image_service.save_base64_image(
+            save_result = await image_service.save_base64_image(
                 base64_data=image_result["image_base64"],
                 format="png"
             )
@@ -916,7 +948,8 @@ class FacebookService:
         since_param = int(last_checked.timestamp()) if last_checked else int((datetime.utcnow() - timedelta(minutes=10)).timestamp())
 
         # 1. Get recent posts
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                     transport=resilient_transport("graph")) as client:
             posts_resp = await client.get(
                 f"{self.graph_api_base}/{page_id}/posts",
                 params={"access_token": access_token, "fields": "id,created_time"}
@@ -1056,7 +1089,8 @@ class FacebookService:
         Fetch all conversations for a Facebook Page.
         """
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 response = await client.get(
                     f"{self.graph_api_base}/{page_id}/conversations",
                     params={
@@ -1079,7 +1113,8 @@ class FacebookService:
         Fetch messages in a conversation.
         """
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 response = await client.get(
                     f"{self.graph_api_base}/{conversation_id}/messages",
                     params={
@@ -1102,7 +1137,8 @@ class FacebookService:
         Send a reply to a conversation (Page message).
         """
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                         transport=resilient_transport("graph")) as client:
                 response = await client.post(
                     f"{self.graph_api_base}/{conversation_id}/messages",
                     data={
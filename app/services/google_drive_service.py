@@ -0,0 +1,265 @@
+"""
+Cached Google Drive client.
+
+Credentials are loaded once (environment tokens first, then token.json) and
+kept in memory. Drive service objects are built once per worker thread and
+credential generation: googleapiclient services are not thread-safe, and
+`build` parses the discovery document each time. A background loop refreshes
+the access token before it expires, so request handlers never block on a
+token refresh. All Drive calls go through `run()`, which executes them in the
+thread pool.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from starlette.concurrency import run_in_threadpool
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Google Drive API scopes
+SCOPES = [
+    'https://www.googleapis.com/auth/drive.file',
+    'https://www.googleapis.com/auth/drive.readonly'
+]
+
+TOKEN_FILE = "token.json"
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+class GoogleDriveClient:
+    """Process-wide Drive credentials with per-thread service objects and proactive refresh."""
+
+    def __init__(self):
+        self.refresh_margin = timedelta(minutes=5)  # Refresh this long before the token expires
+        self.refresh_interval = 60  # Seconds between background expiry checks
+        self.is_running = False
+        self._creds: Optional[Credentials] = None
+        self._source: Optional[str] = None  # "environment" or "token_file"
+        self._generation = 0  # Bumped whenever credentials are replaced
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"services_built": 0, "refreshes": 0, "refresh_failures": 0, "calls": 0}
+
+    # ---- credentials ----
+
+    def _load_stored_credentials(self):
+        """Load credentials from the environment or token.json without user interaction."""
+        if settings.google_drive_access_token and settings.google_drive_refresh_token:
+            try:
+                creds = Credentials(
+                    token=settings.google_drive_access_token,
+                    refresh_token=settings.google_drive_refresh_token,
+                    token_uri=TOKEN_URI,
+                    client_id=settings.google_drive_client_id,
+                    client_secret=settings.google_drive_client_secret,
+                    scopes=SCOPES
+                )
+                logger.info("Using Google Drive credentials from environment variables")
+                return creds, "environment"
+            except Exception as e:
+                logger.warning(f"Failed to create credentials from environment variables: {e}")
+
+        if os.path.exists(TOKEN_FILE):
+            try:
+                creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+                logger.info("Loaded existing credentials from token.json")
+                return creds, "token_file"
+            except Exception as e:
+                logger.warning(f"Failed to load existing credentials: {e}")
+                # Remove invalid token file
+                os.remove(TOKEN_FILE)
+        return None, None
+
+    def _run_local_oauth_flow(self) -> Credentials:
+        if not settings.google_drive_client_id or not settings.google_drive_client_secret:
+            raise HTTPException(
+                status_code=500,
+                detail="Google Drive credentials not configured. Please set GOOGLE_DRIVE_CLIENT_ID and GOOGLE_DRIVE_CLIENT_SECRET environment variables."
+            )
+
+        client_config = {
+            "installed": {
+                "client_id": settings.google_drive_client_id,
+                "client_secret": settings.google_drive_client_secret,
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": TOKEN_URI,
+                "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+                "redirect_uris": ["urn:ietf:wg:oauth:2.0:oob", "http://localhost:8000/"]
+            }
+        }
+
+        flow = InstalledAppFlow.from_client_config(client_config, SCOPES)
+        logger.info("Starting OAuth flow on port 8000...")
+        creds = flow.run_local_server(port=8000)
+        logger.info("OAuth flow completed successfully")
+        self._save_token_file(creds)
+        return creds
+
+    def _save_token_file(self, creds: Credentials):
+        try:
+            with open(TOKEN_FILE, 'w') as token:
+                token.write(creds.to_json())
+            logger.info("Saved credentials to token.json")
+        except Exception as e:
+            logger.error(f"Failed to save credentials: {e}")
+
+    def _needs_refresh(self, creds: Credentials) -> bool:
+        if not creds.refresh_token:
+            return False
+        if not creds.token or not creds.expiry:
+            return not creds.valid
+        # Credentials.expiry is a naive UTC datetime
+        return creds.expiry - datetime.utcnow() < self.refresh_margin
+
+    def _refresh(self, creds: Credentials) -> bool:
+        """Refresh credentials in place (one refresh at a time); returns False on failure."""
+        with self._refresh_lock:
+            if not self._needs_refresh(creds):
+                return True
+            try:
+                creds.refresh(Request())
+                self.stats["refreshes"] += 1
+                if self._source == "token_file":
+                    self._save_token_file(creds)
+                logger.info("🔄 Refreshed Google Drive access token")
+                return True
+            except Exception as e:
+                self.stats["refresh_failures"] += 1
+                logger.warning(f"Failed to refresh Google Drive credentials: {e}")
+                return False
+
+    def get_credentials(self, interactive: bool = True) -> Optional[Credentials]:
+        """
+        Return valid cached credentials, loading them on first use.
+
+        With interactive=False no OAuth flow is started and None is returned
+        when no usable stored credentials exist.
+        """
+        with self._lock:
+            if self._creds is None:
+                creds, source = self._load_stored_credentials()
+                if creds is not None:
+                    self._set_credentials(creds, source)
+
+        creds = self._creds
+        if creds is not None and self._needs_refresh(creds) and not self._refresh(creds) and not creds.valid:
+            self.invalidate()
+            creds = None
+
+        if creds is None and interactive:
+            with self._lock:
+                if self._creds is None:
+                    self._set_credentials(self._run_local_oauth_flow(), "token_file")
+                creds = self._creds
+        return creds
+
+    def _set_credentials(self, creds: Credentials, source: str):
+        self._creds = creds
+        self._source = source
+        self._generation += 1
+
+    def invalidate(self):
+        """Drop cached credentials and services (after disconnect or a new OAuth grant)."""
+        with self._lock:
+            self._creds = None
+            self._source = None
+            self._generation += 1
+
+    def is_authenticated(self) -> bool:
+        """Whether usable credentials exist; never starts the OAuth flow or hits the network."""
+        with self._lock:
+            if self._creds is None:
+                creds, source = self._load_stored_credentials()
+                if creds is not None:
+                    self._set_credentials(creds, source)
+            creds = self._creds
+        return bool(creds and (creds.valid or creds.refresh_token))
+
+    # ---- services ----
+
+    def get_service(self):
+        """Drive service for the current thread, built once per credential generation."""
+        creds = self.get_credentials()
+        local = self._local
+        if getattr(local, "service", None) is None or local.generation != self._generation:
+            local.service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+            local.generation = self._generation
+            self.stats["services_built"] += 1
+        return local.service
+
+    async def run(self, fn: Callable[[Any], Any]) -> Any:
+        """Run fn(service) in the thread pool and return its result."""
+        def call():
+            self.stats["calls"] += 1
+            return fn(self.get_service())
+        return await run_in_threadpool(call)
+
+    async def iter_files(self, query: str, fields: str, page_size: int = 100,
+                         order_by: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield pages of files, following nextPageToken only as the consumer asks for more."""
+        page_token = None
+        while True:
+            page = await self.list_files_page(query, fields, page_size, page_token, order_by)
+            yield page["files"]
+            page_token = page["next_page_token"]
+            if not page_token:
+                break
+
+    async def list_files_page(self, query: str, fields: str, page_size: int = 100,
+                              page_token: Optional[str] = None, order_by: Optional[str] = None) -> Dict[str, Any]:
+        """Fetch one page of files; returns {"files", "next_page_token"}."""
+        params = {"q": query, "pageSize": page_size, "fields": f"nextPageToken, files({fields})"}
+        if page_token:
+            params["pageToken"] = page_token
+        if order_by:
+            params["orderBy"] = order_by
+        results = await self.run(lambda service: service.files().list(**params).execute())
+        return {"files": results.get("files", []), "next_page_token": results.get("nextPageToken")}
+
+    # ---- background refresh ----
+
+    async def start(self):
+        """Refresh the access token ahead of expiry so requests never wait on it."""
+        self.is_running = True
+        logger.info("🚀 Starting Google Drive token refresher...")
+        loop = asyncio.get_event_loop()
+        while self.is_running:
+            try:
+                await loop.run_in_executor(None, self.refresh_if_needed)
+            except Exception as e:
+                logger.error(f"Error in Google Drive token refresher: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def stop(self):
+        self.is_running = False
+        logger.info("🛑 Stopping Google Drive token refresher...")
+
+    def refresh_if_needed(self):
+        creds = self._creds
+        if creds is not None and self._needs_refresh(creds):
+            self._refresh(creds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        creds = self._creds
+        return {
+            **self.stats,
+            "credentials_loaded": creds is not None,
+            "source": self._source,
+            "expires_at": creds.expiry.isoformat() if creds is not None and creds.expiry else None
+        }
+
+
+# Create a singleton instance
+google_drive_client = GoogleDriveClient()
@@ -0,0 +1,376 @@
+"""
+Outbound rate governor for Graph API calls.
+
+Every Graph response is observed for Meta's usage headers:
+- X-App-Usage: app-wide percentages;
+- X-Page-Usage: per-page percentages for page tokens;
+- X-Business-Use-Case-Usage: per page / IG user percentages and
+  estimated_time_to_regain_access;
+- rate-limit errors (HTTP 429, codes 4/17/32/613/80001-80006).
+
+Usage is tracked per scope: "app" plus one scope per access token, which
+stands for the page, IG user or Facebook user the token belongs to. Each scope
+also has a local token bucket that smooths bursts.
+
+Before a call, `acquire` admits it by priority:
+- PUBLISH (creating posts and media) may use the whole budget and waits
+  rather than being shed;
+- INTERACTIVE (user-facing requests) stops at a lower utilization;
+- POLL (auto-reply polling, metrics, backfills, token scans) stops earliest
+  and must leave a reserve in the buckets.
+A call that cannot be admitted within its priority's max wait is shed with
+GraphRateLimited.
+
+Background loops declare their priority with `graph_priority(POLL)`. Calls
+without one default to PUBLISH for POSTs to publishing edges and to
+INTERACTIVE otherwise. httpx clients plug in via `httpx_event_hooks()`;
+requests-based code calls `acquire_sync` / `observe` directly from worker
+threads, so scope and bucket state is only touched under a lock.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+PUBLISH = 0
+INTERACTIVE = 1
+POLL = 2
+PRIORITY_NAMES = {PUBLISH: "publish", INTERACTIVE: "interactive", POLL: "poll"}
+
+# Edges whose POSTs create content
+PUBLISH_EDGES = {"feed", "photos", "videos", "media", "media_publish"}
+
+# Graph error codes that mean a throttle is in effect
+RATE_LIMIT_ERROR_CODES = {4, 17, 32, 613} | set(range(80001, 80010))
+
+_priority: ContextVar[Optional[int]] = ContextVar("graph_priority", default=None)
+
+
+@contextmanager
+def graph_priority(priority: int):
+    """Run the enclosed Graph calls (including tasks and threads started from it) at a priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class GraphRateLimited(Exception):
+    """A Graph call was shed because the budget for its priority is exhausted."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _TokenBucket:
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, reserve: float) -> float:
+        """Seconds until a token can be taken while leaving `reserve` (a fraction of capacity)."""
+        self._refill()
+        needed = 1 + reserve * self.capacity - self.tokens
+        return 0.0 if needed <= 0 else needed / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def level(self) -> float:
+        self._refill()
+        return self.tokens / self.capacity
+
+
+def _fingerprint(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
+
+
+def _usage_percent(usage: Dict[str, Any]) -> float:
+    return max(float(usage.get(k) or 0) for k in ("call_count", "total_cputime", "total_time"))
+
+
+class GraphRateGovernor:
+    """Priority-aware admission of Graph API calls per app and per token scope."""
+
+    def __init__(self):
+        # Highest utilization (%) at which each priority is still admitted
+        self.thresholds = {PUBLISH: 95.0, INTERACTIVE: 85.0, POLL: 70.0}
+        # Fraction of each bucket a priority must leave for higher ones
+        self.reserves = {PUBLISH: 0.0, INTERACTIVE: 0.1, POLL: 0.3}
+        # Longest a call waits for budget before it is shed (PUBLISH then proceeds anyway)
+        self.max_wait = {PUBLISH: 60.0, INTERACTIVE: 10.0, POLL: 5.0}
+        self.usage_ttl = 300  # Seconds an observed utilization is trusted
+        self.default_block_seconds = 60  # Back-off after a throttle error without a regain estimate
+        self.app_bucket = (200, 20.0)  # (capacity, refill per second)
+        self.scope_bucket = (40, 2.0)
+        self._scopes: Dict[str, Dict[str, Any]] = {}
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._lock = threading.Lock()  # Guards _scopes, _buckets and stats; helpers below expect it held
+        self.stats = {
+            "admitted": {name: 0 for name in PRIORITY_NAMES.values()},
+            "delayed": {name: 0 for name in PRIORITY_NAMES.values()},
+            "shed": {name: 0 for name in PRIORITY_NAMES.values()},
+            "throttle_errors": 0
+        }
+
+    # ---- scopes ----
+
+    @staticmethod
+    def scope_for(access_token: Optional[str]) -> Optional[str]:
+        return f"token:{_fingerprint(access_token)}" if access_token else None
+
+    def _scope(self, key: str) -> Dict[str, Any]:
+        scope = self._scopes.get(key)
+        if scope is None:
+            scope = self._scopes[key] = {"utilization": 0.0, "observed_at": 0.0, "blocked_until": 0.0, "objects": {}}
+        return scope
+
+    def _bucket(self, key: str) -> _TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            capacity, rate = self.app_bucket if key == "app" else self.scope_bucket
+            bucket = self._buckets[key] = _TokenBucket(capacity, rate)
+        return bucket
+
+    def _utilization(self, key: str) -> float:
+        scope = self._scopes.get(key)
+        if scope is None or time.monotonic() - scope["observed_at"] > self.usage_ttl:
+            return 0.0
+        return scope["utilization"]
+
+    # ---- admission ----
+
+    @staticmethod
+    def resolve_priority(method: str, url: str) -> int:
+        priority = _priority.get()
+        if priority is not None:
+            return priority
+        if method.upper() == "POST":
+            edge = urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+            if edge in PUBLISH_EDGES:
+                return PUBLISH
+        return INTERACTIVE
+
+    def _wait_for(self, keys: Iterable[str], priority: int) -> Tuple[float, str]:
+        """(seconds to wait, reason); 0 means the call may go now."""
+        now = time.monotonic()
+        wait, reason = 0.0, ""
+        for key in keys:
+            scope = self._scopes.get(key)
+            if scope and scope["blocked_until"] > now:
+                if scope["blocked_until"] - now > wait:
+                    wait, reason = scope["blocked_until"] - now, f"{key} throttled"
+            if self._utilization(key) >= self.thresholds[priority]:
+                # Wait for a fresher observation (or the usage to age out)
+                remaining = scope["observed_at"] + self.usage_ttl - now
+                if remaining > wait:
+                    wait, reason = remaining, f"{key} at {scope['utilization']:.0f}%"
+            bucket_wait = self._bucket(key).wait_time(self.reserves[priority])
+            if bucket_wait > wait:
+                wait, reason = bucket_wait, f"{key} burst budget"
+        return wait, reason
+
+    def _admit(self, access_token: Optional[str], priority: int, waited: float) -> float:
+        """Take budget if the call may go; otherwise return how long to sleep. Raises when shedding."""
+        keys = ["app"]
+        scope_key = self.scope_for(access_token)
+        if scope_key:
+            keys.append(scope_key)
+        name = PRIORITY_NAMES[priority]
+        with self._lock:
+            wait, reason = self._wait_for(keys, priority)
+            if wait <= 0 or (priority == PUBLISH and waited >= self.max_wait[PUBLISH]):
+                for key in keys:
+                    self._bucket(key).take()
+                self.stats["admitted"][name] += 1
+                return 0.0
+            if waited + wait > self.max_wait[priority] and priority != PUBLISH:
+                self.stats["shed"][name] += 1
+                raise GraphRateLimited(f"Graph {name} call shed: {reason}", retry_after=wait)
+            if waited == 0:
+                self.stats["delayed"][name] += 1
+        if waited == 0:
+            logger.info(f"⏳ Delaying Graph {name} call: {reason} (~{wait:.1f}s)")
+        return min(wait, 1.0)
+
+    async def acquire(self, access_token: Optional[str], method: str = "GET", url: str = "",
+                      priority: Optional[int] = None):
+        """Wait until the call fits its priority's budget; raises GraphRateLimited when shed."""
+        priority = self.resolve_priority(method, url) if priority is None else priority
+        started = time.monotonic()
+        while True:
+            sleep_for = self._admit(access_token, priority, time.monotonic() - started)
+            if sleep_for <= 0:
+                return
+            await asyncio.sleep(sleep_for)
+
+    def acquire_sync(self, access_token: Optional[str], method: str = "GET", url: str = "",
+                     priority: Optional[int] = None):
+        """Blocking acquire for requests-based callers running in worker threads."""
+        priority = self.resolve_priority(method, url) if priority is None else priority
+        started = time.monotonic()
+        while True:
+            sleep_for = self._admit(access_token, priority, time.monotonic() - started)
+            if sleep_for <= 0:
+                return
+            time.sleep(sleep_for)
+
+    # ---- observation ----
+
+    def observe(self, access_token: Optional[str], status_code: int, headers, body: Optional[bytes] = None):
+        """Record usage headers and throttle errors from a Graph response."""
+        now = time.monotonic()
+        scope_key = self.scope_for(access_token)
+        error_code = self._error_code(body)
+        with self._lock:
+            app_usage = headers.get("x-app-usage")
+            if app_usage:
+                try:
+                    self._record("app", _usage_percent(json.loads(app_usage)), now)
+                except (ValueError, TypeError):
+                    pass
+
+            if scope_key:
+                page_usage = headers.get("x-page-usage")
+                if page_usage:
+                    try:
+                        self._record(scope_key, _usage_percent(json.loads(page_usage)), now)
+                    except (ValueError, TypeError):
+                        pass
+
+                buc_usage = headers.get("x-business-use-case-usage")
+                if buc_usage:
+                    try:
+                        for object_id, entries in json.loads(buc_usage).items():
+                            for entry in entries:
+                                percent = _usage_percent(entry)
+                                scope = self._record(scope_key, percent, now, object_id=object_id)
+                                regain_minutes = float(entry.get("estimated_time_to_regain_access") or 0)
+                                if regain_minutes > 0:
+                                    scope["blocked_until"] = max(scope["blocked_until"], now + regain_minutes * 60)
+                    except (ValueError, TypeError, AttributeError):
+                        pass
+
+            if status_code == 429 or (status_code >= 400 and error_code in RATE_LIMIT_ERROR_CODES):
+                self.stats["throttle_errors"] += 1
+                key = "app" if error_code == 4 or not scope_key else scope_key
+                scope = self._scope(key)
+                scope["blocked_until"] = max(scope["blocked_until"], now + self.default_block_seconds)
+                logger.warning(f"🚦 Graph throttle on {key} (status {status_code}, code {error_code})")
+
+    def _record(self, key: str, percent: float, now: float, object_id: Optional[str] = None) -> Dict[str, Any]:
+        scope = self._scope(key)
+        if object_id is not None:
+            scope["objects"][object_id] = percent
+            percent = max(scope["objects"].values())
+        # Several headers can describe one scope; the most constrained wins
+        if now - scope["observed_at"] > 1:
+            scope["utilization"] = percent
+        else:
+            scope["utilization"] = max(scope["utilization"], percent)
+        scope["observed_at"] = now
+        return scope
+
+    @staticmethod
+    def _error_code(body: Optional[bytes]) -> Optional[int]:
+        if not body:
+            return None
+        try:
+            return json.loads(body).get("error", {}).get("code")
+        except (ValueError, AttributeError):
+            return None
+
+    def retry_after(self, access_token: Optional[str]) -> float:
+        """Seconds until the token's scope (or the app) is expected to accept calls again."""
+        now = time.monotonic()
+        keys = ["app"] + ([self.scope_for(access_token)] if access_token else [])
+        with self._lock:
+            return max([0.0] + [self._scopes[k]["blocked_until"] - now for k in keys if k in self._scopes])
+
+    # ---- httpx integration ----
+
+    @staticmethod
+    def _token_from_request(request) -> Optional[str]:
+        token = request.url.params.get("access_token")
+        if token:
+            return token
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            return authorization[7:]
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            try:
+                values = parse_qs(request.content.decode("utf-8")).get("access_token")
+                return values[0] if values else None
+            except Exception:
+                return None
+        if content_type.startswith("application/json"):
+            try:
+                return json.loads(request.content).get("access_token")
+            except Exception:
+                return None
+        return None
+
+    def httpx_event_hooks(self) -> Dict[str, List]:
+        """Event hooks that govern every request of an httpx.AsyncClient."""
+        async def on_request(request):
+            token = self._token_from_request(request)
+            request.extensions["graph_access_token"] = token
+            await self.acquire(token, request.method, str(request.url))
+
+        async def on_response(response):
+            body = None
+            if response.status_code >= 400:
+                await response.aread()
+                body = response.content
+            self.observe(response.request.extensions.get("graph_access_token"),
+                         response.status_code, response.headers, body)
+
+        return {"request": [on_request], "response": [on_response]}
+
+    # ---- reporting ----
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            scopes = [
+                {"scope": key,
+                 "utilization": round(self._utilization(key), 1),
+                 "blocked_for_seconds": round(max(0.0, scope["blocked_until"] - now), 1),
+                 "objects": dict(scope["objects"]),
+                 "bucket_level": round(self._bucket(key).level(), 2)}
+                for key, scope in self._scopes.items()
+            ]
+            stats = {name: dict(counts) if isinstance(counts, dict) else counts for name, counts in self.stats.items()}
+            app_utilization = self._utilization("app")
+            app_bucket_level = self._bucket("app").level()
+        scopes.sort(key=lambda s: (s["blocked_for_seconds"], s["utilization"]), reverse=True)
+        return {
+            **stats,
+            "app_utilization": round(app_utilization, 1),
+            "app_bucket_level": round(app_bucket_level, 2),
+            "thresholds": {PRIORITY_NAMES[p]: t for p, t in self.thresholds.items()},
+            "scopes": scopes[:20]
+        }
+
+
+# Create a singleton instance
+graph_rate_governor = GraphRateGovernor()
@@ -1,18 +1,30 @@
+import asyncio
 import logging
-from groq import Groq
-from typing import Optional, Dict, Any
+from groq import Groq, APIConnectionError
+from typing import Optional, Dict, Any, List
 from app.config import get_settings
+from app.utils.resilience import get_provider, is_provider_failure
+import json
 import re
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+def _is_groq_failure(error: Exception) -> bool:
+    return isinstance(error, APIConnectionError) or is_provider_failure(error)
+
+
+def _is_groq_retryable(error: Exception) -> bool:
+    return _is_groq_failure(error) or getattr(error, "status_code", None) == 429
+
+
 class GroqService:
     """Service for AI content generation using Groq API."""
     
     def __init__(self):
         self.client = None
+        self.resilience = get_provider("groq")
         self._initialize_client()
     
     def _initialize_client(self):
@@ -22,13 +34,25 @@ class GroqService:
                 logger.warning("Groq API key not configured")
                 return
             
-            self.client = Groq(api_key=settings.groq_api_key)
+            # Retries are left to _complete so they share the Groq retry budget and breaker
+            self.client = Groq(api_key=settings.groq_api_key, max_retries=0)
             logger.info("Groq client initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize Groq client: {e}")
             self.client = None
     
+    async def _complete(self, **kwargs):
+        """
+        Create a chat completion behind the shared Groq circuit breaker, with jittered retries.
+
+        The blocking client call runs in a worker thread and the backoff sleeps on the loop.
+        """
+        return await self.resilience.call(
+            lambda: asyncio.to_thread(self.client.chat.completions.create, **kwargs),
+            is_failure=_is_groq_failure, retry_on=_is_groq_retryable
+        )
+    
     async def generate_facebook_post(
         self, 
         prompt: str, 
@@ -54,7 +78,7 @@ class GroqService:
             system_prompt = self._get_facebook_system_prompt(content_type, max_length)
             
             # Generate content using Groq
-            completion = self.client.chat.completions.create(
+            completion = await self._complete(
                 model="llama3-70b-8192",  # Fast and efficient model
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -180,7 +204,7 @@ Guidelines:
 
 Generate a personalized response to the following comment:"""
             
-            completion = self.client.chat.completions.create(
+            completion = await self._complete(
                 model="llama3-70b-8192",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -209,7 +233,84 @@ Generate a personalized response to the following comment:"""
                 "success": False,
                 "error": str(e)
             }
-    
+
+    async def generate_auto_replies_batch(
+        self,
+        comments: List[Dict[str, str]],
+        context: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate automatic replies for a batch of comments in one completion.
+
+        Args:
+            comments: List of dicts with "id", "text" and optional "username"
+            context: Additional context about the post/brand
+
+        Returns:
+            Dict containing a comment_id -> reply mapping and metadata
+        """
+        if not self.client:
+            return {
+                "replies": {},
+                "model_used": "fallback",
+                "tokens_used": 0,
+                "success": False,
+                "error": "Groq client not initialized"
+            }
+
+        try:
+            system_prompt = """You are a friendly customer service representative responding to Instagram comments.
+
+Guidelines:
+- Be warm, professional, and helpful
+- Keep each response under 200 characters
+- Acknowledge each commenter's input and mention them by username
+- Be conversational but professional
+- Use appropriate emojis sparingly
+- Always be positive and helpful
+
+You will receive a numbered list of comments, each with an id.
+Respond ONLY with a JSON array, one object per comment, in this exact shape:
+[{"id": "<comment id>", "reply": "<your reply>"}]
+Do not add any text before or after the JSON array."""
+
+            lines = [
+                f"{i}. id={c['id']} username={c.get('username') or 'there'}: {c.get('text', '')}"
+                for i, c in enumerate(comments, 1)
+            ]
+            user_prompt = f"Context: {context or 'General social media page'}\n\nComments:\n" + "\n".join(lines)
+
+            completion = await self._complete(
+                model="llama3-70b-8192",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                max_tokens=min(4000, 80 * len(comments) + 50),
+                temperature=0.6,
+                stream=False
+            )
+
+            raw_content = completion.choices[0].message.content.strip()
+            replies = parse_batch_replies(raw_content)
+
+            return {
+                "replies": replies,
+                "model_used": "llama3-70b-8192",
+                "tokens_used": completion.usage.total_tokens if completion.usage else 0,
+                "success": bool(replies)
+            }
+
+        except Exception as e:
+            logger.error(f"Error generating batch auto-replies with Groq: {e}")
+            return {
+                "replies": {},
+                "model_used": "fallback",
+                "tokens_used": 0,
+                "success": False,
+                "error": str(e)
+            }
+
     async def generate_instagram_post(
         self,
         prompt: str,
@@ -272,7 +373,7 @@ Generate a personalized response to the following comment:"""
         """
 
             # Generate content using Groq
-            completion = self.client.chat.completions.create(
+            completion = await self._complete(
                 model="llama3-70b-8192",  # Fast and efficient model
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -352,7 +453,7 @@ Generate a caption that follows the custom strategy template."""
             user_prompt = f"Create a Facebook caption for: {context}" if context else "Create a Facebook caption following the custom strategy."
 
             # Generate content using Groq
-            completion = self.client.chat.completions.create(
+            completion = await self._complete(
                 model="llama-3.1-8b-instant",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -476,7 +577,7 @@ Make sure the caption is engaging, on-brand, and encourages interaction. Keep it
 """
 
             # Generate content using Groq
-            completion = self.client.chat.completions.create(
+            completion = await self._complete(
                 model="llama3-70b-8192",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -518,4 +619,20 @@ groq_service = GroqService()
 
 def strip_outer_quotes(text: str) -> str:
     # Remove leading/trailing single or double quotes, and any leading/trailing whitespace/newlines
-    return re.sub(r'^[\'"]+|[\'"]+$', '', text).strip() 
\ No newline at end of file
+    return re.sub(r'^[\'"]+|[\'"]+$', '', text).strip()
+
+def parse_batch_replies(text: str) -> Dict[str, str]:
+    # Extract the JSON array of {"id", "reply"} objects, tolerating prose or code fences around it
+    match = re.search(r'\[.*\]', text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        logger.warning("Batch auto-reply response was not valid JSON")
+        return {}
+    replies = {}
+    for item in items:
+        if isinstance(item, dict) and item.get("id") and item.get("reply"):
+            replies[str(item["id"])] = strip_outer_quotes(str(item["reply"]))
+    return replies
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Disk-backed cache of generated images.
+
+Entries are keyed on the full generation request (engine, prompts, dimensions,
+cfg, steps, seed, style) so regenerating the same prompt or publishing a
+previewed image reuses the stored PNG instead of paying for another
+generation. The cache is bounded by total size on disk with LRU eviction, and
+tracks its hit rate and the generation time it has saved.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ImageGenerationCache:
+    """Size-bounded LRU cache of generated images stored as files."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes_used = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "generation_seconds_saved": 0.0}
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(**params) -> str:
+        """Hash the generation parameters into a stable cache key."""
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, key)
+        return f"{base}.png", f"{base}.json"
+
+    def _load_index(self):
+        """Rebuild the LRU order from files on disk, least recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            image_path, meta_path = self._paths(key)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                stat = os.stat(image_path)
+            except (OSError, ValueError):
+                continue
+            meta["size"] = stat.st_size
+            entries.append((stat.st_mtime, key, meta))
+
+        for _, key, meta in sorted(entries):
+            self._entries[key] = meta
+            self._bytes_used += meta["size"]
+        if entries:
+            logger.info(f"🗂️ Image generation cache loaded {len(entries)} entries ({self._bytes_used // 1024} KB)")
+        self._evict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return {"image_bytes", "seed", "finish_reason", ...} for a cached image, or None."""
+        with self._lock:
+            meta = self._entries.get(key)
+            if meta is None:
+                self.stats["misses"] += 1
+                return None
+            image_path, _ = self._paths(key)
+            try:
+                with open(image_path, "rb") as f:
+                    image_bytes = f.read()
+                os.utime(image_path)
+            except OSError:
+                self._drop(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["generation_seconds_saved"] += meta.get("generation_seconds", 0.0)
+            return {**meta, "image_bytes": image_bytes}
+
+    def put(self, key: str, image_bytes: bytes, seed: Any = None, finish_reason: Optional[str] = None,
+            generation_seconds: float = 0.0):
+        """Store an image, writing via temp files and atomic renames."""
+        image_path, meta_path = self._paths(key)
+        meta = {"seed": seed, "finish_reason": finish_reason, "generation_seconds": round(generation_seconds, 2)}
+        try:
+            for path, data, mode in ((image_path, image_bytes, "wb"), (meta_path, json.dumps(meta), "w")):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, mode) as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing image generation cache entry {key}: {e}")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes_used -= self._entries[key]["size"]
+            meta["size"] = len(image_bytes)
+            self._entries[key] = meta
+            self._entries.move_to_end(key)
+            self._bytes_used += meta["size"]
+            self.stats["stores"] += 1
+            self._evict()
+
+    def _drop(self, key: str):
+        meta = self._entries.pop(key, None)
+        if meta is None:
+            return
+        self._bytes_used -= meta["size"]
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._bytes_used > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "generation_seconds_saved": round(self.stats["generation_seconds_saved"], 1),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes_used": self._bytes_used,
+            "max_bytes": self.max_bytes
+        }
@@ -1,12 +1,14 @@
+import asyncio
 import logging
 import uuid
 import os
 import base64
-import requests
 from typing import Optional, Dict, Any
 from pathlib import Path
 from app.config import get_settings
 from app.services.cloudinary_service import cloudinary_service
+from app.services.local_media_store import local_media_store
+from app.services.media_hosting_service import media_hosting_service
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -16,43 +18,15 @@ class ImageService:
     """Service for handling image storage and serving."""
     
     def __init__(self):
-        # Create images directory if it doesn't exist
-        self.images_dir = Path("temp_images")
-        self.images_dir.mkdir(exist_ok=True)
+        # Images live in the managed local media store (sharded, size-bounded)
+        self.store = local_media_store
+        self.images_dir = Path(local_media_store.root)
         
         # Base URL for serving images (you may need to adjust this based on your setup)
         self.base_url = "http://localhost:8000/temp_images"
         
-        # IMGBB configuration for public image hosting
-        self.imgbb_api_key = settings.imgbb_api_key.strip() if settings.imgbb_api_key else None
-        self.imgbb_endpoint = "https://api.imgbb.com/1/upload"
     
-    def _upload_to_imgbb(self, base64_data: str) -> Optional[str]:
-        """Upload a base64 image string to IMGBB and return the public URL."""
-        if not self.imgbb_api_key:
-            return None  # IMGBB not configured
-
-        try:
-            response = requests.post(
-                self.imgbb_endpoint,
-                params={"key": self.imgbb_api_key},
-                data={"image": base64_data}
-            )
-
-            if response.status_code == 200:
-                json_resp = response.json()
-                if json_resp.get("success"):
-                    # Use display_url which is direct image URL, better for Facebook
-                    return json_resp["data"].get("display_url")
-                logger.error(f"IMGBB upload returned success=false: {json_resp}")
-            else:
-                logger.error(f"IMGBB upload failed ({response.status_code}): {response.text}")
-        except Exception as e:
-            logger.error(f"Exception during IMGBB upload: {e}")
-
-        return None
-    
-    def save_base64_image(
+    async def save_base64_image(
         self,
         base64_data: str,
         filename: Optional[str] = None,
@@ -61,6 +35,10 @@ class ImageService:
         """
         Save a base64 encoded image to disk and return its URL.
         
+        The image is always kept in the local media store; a public URL comes
+        from the media hosting service (IMGBB/Cloudinary, hedged and
+        circuit-broken), falling back to the local serving URL.
+        
         Args:
             base64_data: Base64 encoded image data
             filename: Optional filename (will generate UUID if not provided)
@@ -76,30 +54,27 @@ class ImageService:
             elif not filename.endswith(f".{format}"):
                 filename = f"{filename}.{format}"
             
-            # Full path for the image
-            file_path = self.images_dir / filename
-            
-            # Decode and save the image
+            # Decode and save the image (atomic write into its shard) off the event loop
             image_data = base64.b64decode(base64_data)
+            loop = asyncio.get_event_loop()
+            file_path = await loop.run_in_executor(None, self.store.write_bytes, image_data, filename)
+            local_image_url = f"{self.base_url}/{self.store.relative_path(filename)}"
             
-            with open(file_path, 'wb') as f:
-                f.write(image_data)
-            
-            # Attempt to upload to IMGBB for a publicly accessible URL
-            public_url = self._upload_to_imgbb(base64_data)
-
-            # Fallback to local serving URL if IMGBB upload not configured or fails
-            image_url = public_url if public_url else f"{self.base_url}/{filename}"
+            # Get a publicly accessible URL (falls back to local serving URL)
+            hosting = await media_hosting_service.host_image(image_data, filename)
+            image_url = hosting["url"] if hosting["success"] else local_image_url
             
-            logger.info(f"Image saved successfully: {filename}")
+            logger.info(f"Image saved successfully: {filename} (hosted via {hosting.get('provider')})")
             
             return {
                 "success": True,
                 "filename": filename,
                 "file_path": str(file_path),
                 "image_url": image_url,
-                "local_image_url": f"{self.base_url}/{filename}",
-                "uploaded_to_imgbb": bool(public_url),
+                "local_image_url": local_image_url,
+                "is_public_url": hosting.get("is_public", False),
+                "hosting_provider": hosting.get("provider"),
+                "uploaded_to_imgbb": hosting.get("provider") == "imgbb",
                 "size": len(image_data)
             }
             
@@ -121,10 +96,7 @@ class ImageService:
             Dict containing deletion result
         """
         try:
-            file_path = self.images_dir / filename
-            
-            if file_path.exists():
-                os.remove(file_path)
+            if self.store.delete(filename):
                 logger.info(f"Image deleted successfully: {filename}")
                 return {
                     "success": True,
@@ -143,30 +115,20 @@ class ImageService:
                 "error": str(e)
             }
     
-    def cleanup_old_images(self, max_age_hours: int = 24) -> Dict[str, Any]:
+    def cleanup_old_images(self) -> Dict[str, Any]:
         """
-        Clean up old temporary images.
+        Run the local media store janitor now.
         
-        Args:
-            max_age_hours: Maximum age of images to keep (in hours)
+        Expiry, size and file-count budgets are configured on the store
+        (LOCAL_MEDIA_* settings) and the janitor also runs in the background.
             
         Returns:
             Dict containing cleanup result
         """
         try:
-            import time
-            
-            current_time = time.time()
-            max_age_seconds = max_age_hours * 3600
-            deleted_count = 0
-            
-            for file_path in self.images_dir.iterdir():
-                if file_path.is_file():
-                    file_age = current_time - file_path.stat().st_mtime
-                    if file_age > max_age_seconds:
-                        os.remove(file_path)
-                        deleted_count += 1
-                        logger.info(f"Deleted old image: {file_path.name}")
+            before = self.store.stats["lru_evictions"] + self.store.stats["expired_evictions"]
+            self.store.run_janitor()
+            deleted_count = self.store.stats["lru_evictions"] + self.store.stats["expired_evictions"] - before
             
             return {
                 "success": True,
@@ -192,7 +154,7 @@ class ImageService:
             Dict containing image information
         """
         try:
-            file_path = self.images_dir / filename
+            file_path = Path(self.store.path_for(filename))
             
             if not file_path.exists():
                 return {
@@ -208,7 +170,7 @@ class ImageService:
                 "size": stat.st_size,
                 "created": stat.st_ctime,
                 "modified": stat.st_mtime,
-                "url": f"{self.base_url}/{filename}"
+                "url": f"{self.base_url}/{self.store.relative_path(filename)}"
             }
             
         except Exception as e:
@@ -0,0 +1,251 @@
+"""
+Supervisor that polls Instagram accounts with global auto-reply enabled.
+
+One supervisor per deployment replaces the old one-task-per-account pollers.
+Accounts sit in a priority queue keyed on their next poll time; accounts that
+keep receiving new comments are polled often, quiet ones back off. Each tick
+resolves enabled status and tokens for all due accounts with a single session,
+and the enabled set is restored from GlobalAutoReplyStatus at startup. Database
+work (leadership, account sync, token lookup) runs in the thread pool.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, List, Tuple, Any, Optional
+from sqlalchemy import and_, create_engine, text
+from sqlalchemy.pool import NullPool
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal, engine
+from app.models.global_auto_reply_status import GlobalAutoReplyStatus
+from app.models.social_account import SocialAccount
+from app.services.instagram_service import instagram_service
+from app.services.graph_rate_governor import graph_priority, POLL
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide key for the poller leader advisory lock
+POLLER_LOCK_KEY = 727001
+
+
+class GlobalAutoReplyPoller:
+    """Priority-queue scheduler for global auto-reply comment polling."""
+
+    def __init__(self):
+        self.is_running = False
+        self.tick_interval = 10  # Seconds between supervisor ticks
+        self.sync_interval = 60  # Seconds between re-reads of the enabled account set
+        self.min_poll_interval = 60  # Hot accounts
+        self.default_poll_interval = 300
+        self.max_poll_interval = 1800  # Quiet accounts
+        self.media_limit = 25  # Recent media scanned per poll; older media are covered by the backfill job
+        self.max_parallel_accounts = 3
+        self._queue: List[Tuple[float, str]] = []
+        self._accounts: Dict[str, Dict[str, Any]] = {}
+        self._last_sync = 0.0
+        self._leader_conn = None
+        self._lock_engine = None  # Unpooled engine for the advisory lock connection
+
+    async def start(self):
+        """Restore enabled accounts and run the supervisor loop."""
+        self.is_running = True
+        logger.info("🚀 Starting Instagram global auto-reply poller...")
+
+        await asyncio.sleep(10)
+
+        while self.is_running:
+            try:
+                if await run_in_threadpool(self._is_leader):
+                    if time.time() - self._last_sync >= self.sync_interval:
+                        self.sync_accounts(await run_in_threadpool(self._load_enabled))
+                    # Polling tasks started by the tick inherit the POLL priority
+                    with graph_priority(POLL):
+                        await self._tick()
+            except Exception as e:
+                logger.error(f"Error in global auto-reply poller: {e}")
+            await asyncio.sleep(self.tick_interval)
+
+    def stop(self):
+        """Stop the supervisor and give up leadership."""
+        self.is_running = False
+        if self._leader_conn is not None:
+            try:
+                # Dropping the DBAPI connection releases the session-level advisory lock
+                self._leader_conn.invalidate()
+            except Exception as e:
+                logger.error(f"Error releasing poller leadership: {e}")
+            self._leader_conn = None
+        logger.info("🛑 Stopping Instagram global auto-reply poller...")
+
+    def add_account(self, instagram_user_id: str, user_id: int, delay: float = 0):
+        """Schedule an account for polling (no-op if already scheduled)."""
+        if instagram_user_id in self._accounts:
+            return
+        state = {
+            "user_id": user_id,
+            "interval": self.default_poll_interval,
+            "next_poll_at": time.time() + delay,
+            "last_new_comments": 0
+        }
+        self._accounts[instagram_user_id] = state
+        heapq.heappush(self._queue, (state["next_poll_at"], instagram_user_id))
+
+    def remove_account(self, instagram_user_id: str):
+        """Stop polling an account; its queue entry is dropped lazily."""
+        self._accounts.pop(instagram_user_id, None)
+
+    @staticmethod
+    def _load_enabled() -> Dict[str, int]:
+        """instagram_user_id -> user_id for every account with global auto-reply enabled (blocking)."""
+        with SessionLocal() as db:
+            rows = db.query(GlobalAutoReplyStatus.instagram_user_id, GlobalAutoReplyStatus.user_id).filter(
+                GlobalAutoReplyStatus.enabled == True
+            ).all()
+        return {row.instagram_user_id: row.user_id for row in rows}
+
+    def sync_accounts(self, enabled: Dict[str, int]):
+        """Align the scheduled set with the enabled accounts from `_load_enabled` (covers restarts and other workers)."""
+        for instagram_user_id in list(self._accounts):
+            if instagram_user_id not in enabled:
+                self.remove_account(instagram_user_id)
+        new_accounts = [i for i in enabled if i not in self._accounts]
+        for n, instagram_user_id in enumerate(new_accounts):
+            # Stagger restored accounts so they don't all poll on the same tick
+            self.add_account(instagram_user_id, enabled[instagram_user_id], delay=n * self.tick_interval)
+
+        if new_accounts:
+            logger.info(f"📋 Global auto-reply poller restored {len(new_accounts)} accounts ({len(self._accounts)} total)")
+        self._last_sync = time.time()
+
+    def _is_leader(self) -> bool:
+        """
+        Only one worker polls; leadership is a Postgres session advisory lock (blocking).
+
+        The lock lives on a connection of its own, outside the app's small
+        connection pool, for as long as this worker leads.
+        """
+        if engine.dialect.name != "postgresql":
+            return True
+
+        if self._leader_conn is not None:
+            try:
+                self._leader_conn.execute(text("SELECT 1"))
+                self._leader_conn.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"Lost poller leader connection: {e}")
+                self._leader_conn = None
+
+        if self._lock_engine is None:
+            self._lock_engine = create_engine(engine.url, poolclass=NullPool, connect_args={"connect_timeout": 3})
+        conn = self._lock_engine.connect()
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": POLLER_LOCK_KEY}).scalar()
+        conn.commit()
+        if acquired:
+            self._leader_conn = conn
+            self._last_sync = 0.0  # Force a full restore on becoming leader
+            logger.info("👑 This worker is now the global auto-reply poller leader")
+            return True
+        conn.close()
+        return False
+
+    def _pop_due(self) -> List[str]:
+        now = time.time()
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            next_poll_at, instagram_user_id = heapq.heappop(self._queue)
+            state = self._accounts.get(instagram_user_id)
+            # Skip stale entries for removed or rescheduled accounts
+            if state and state["next_poll_at"] == next_poll_at:
+                due.append(instagram_user_id)
+        return due
+
+    async def _tick(self):
+        due = self._pop_due()
+        if not due:
+            return
+
+        tokens = await run_in_threadpool(self._load_tokens, due)
+
+        semaphore = asyncio.Semaphore(self.max_parallel_accounts)
+
+        async def run(instagram_user_id: str):
+            page_access_token = tokens.get(instagram_user_id)
+            if not page_access_token:
+                logger.info(f"Global auto-reply disabled or no token for {instagram_user_id}, unscheduling")
+                self.remove_account(instagram_user_id)
+                return
+            async with semaphore:
+                new_comments = await self._poll_account(instagram_user_id, page_access_token)
+            self._reschedule(instagram_user_id, new_comments)
+
+        await asyncio.gather(*(run(instagram_user_id) for instagram_user_id in due))
+
+    @staticmethod
+    def _load_tokens(instagram_user_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Page tokens of the given accounts that still have auto-reply enabled, in one query (blocking)."""
+        with SessionLocal() as db:
+            rows = db.query(SocialAccount.platform_user_id, SocialAccount.platform_data).join(
+                GlobalAutoReplyStatus,
+                and_(
+                    GlobalAutoReplyStatus.instagram_user_id == SocialAccount.platform_user_id,
+                    GlobalAutoReplyStatus.user_id == SocialAccount.user_id
+                )
+            ).filter(
+                SocialAccount.platform == "instagram",
+                SocialAccount.platform_user_id.in_(instagram_user_ids),
+                GlobalAutoReplyStatus.enabled == True
+            ).all()
+        return {row.platform_user_id: (row.platform_data or {}).get("page_access_token") for row in rows}
+
+    async def _poll_account(self, instagram_user_id: str, page_access_token: str) -> Optional[int]:
+        """Reply to new comments on the account's recent media. Returns replies sent, or None on error."""
+        from app.services.instagram_auto_reply_service import comment_reply_batcher
+
+        try:
+            # run_in_threadpool carries the context, so the media listing keeps the POLL priority
+            posts = await run_in_threadpool(
+                instagram_service.get_user_media, instagram_user_id, page_access_token, limit=self.media_limit
+            )
+            replied = 0
+            for post in posts:
+                comments = await instagram_service.get_comments(
+                    instagram_user_id, page_access_token, media_id=post.get("id"), limit=100
+                )
+                comments = [c for c in comments if c.get("from", {}).get("id") != instagram_user_id]
+                replied += await comment_reply_batcher.reply_to_batch(instagram_user_id, page_access_token, comments)
+            return replied
+        except Exception as e:
+            logger.error(f"Polling error for {instagram_user_id}: {e}")
+            return None
+
+    def _reschedule(self, instagram_user_id: str, new_comments: Optional[int]):
+        state = self._accounts.get(instagram_user_id)
+        if not state:
+            return
+        if new_comments:
+            state["interval"] = self.min_poll_interval
+        else:
+            state["interval"] = min(state["interval"] * 2, self.max_poll_interval)
+        state["last_new_comments"] = new_comments or 0
+        state["next_poll_at"] = time.time() + state["interval"]
+        heapq.heappush(self._queue, (state["next_poll_at"], instagram_user_id))
+
+    def get_status(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "is_leader": engine.dialect.name != "postgresql" or self._leader_conn is not None,
+            "accounts": {
+                instagram_user_id: {
+                    "interval_seconds": state["interval"],
+                    "next_poll_in_seconds": max(0, int(state["next_poll_at"] - now)),
+                    "last_new_comments": state["last_new_comments"]
+                }
+                for instagram_user_id, state in self._accounts.items()
+            }
+        }
+
+
+# Create a singleton instance
+global_auto_reply_poller = GlobalAutoReplyPoller()
@@ -1,12 +1,14 @@
 import logging
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set
 from sqlalchemy.orm import Session
 from app.models.automation_rule import AutomationRule, RuleType
 from app.models.social_account import SocialAccount
 from app.models.post import Post
 from app.services.instagram_service import instagram_service, get_access_token_for_user, has_auto_reply, mark_auto_replied
+from app.services.replied_comment_index import replied_comment_index
+from app.services.instagram_auto_reply_poller import global_auto_reply_poller
 from app.services.groq_service import groq_service
 from app.database import get_db
 import random
@@ -16,12 +18,6 @@ from app.models.dm_auto_reply_status import DmAutoReplyStatus
 
 logger = logging.getLogger(__name__)
 
-# Add a global dict to track progress (for demo; use DB for production)
-global_auto_reply_progress = {}
-
-# Add a dict to track polling tasks per user
-polling_tasks = {}
-
 
 class InstagramAutoReplyService:
     """Service for handling automatic replies to Instagram comments."""
@@ -529,6 +525,158 @@ class InstagramAutoReplyService:
         return datetime.fromisoformat(ts)
 
 
+class CommentReplyBatcher:
+    """
+    Coalesces bursts of webhook comments per Instagram account.
+
+    Comments are collected for a short window, replies for the whole batch are
+    generated with one structured LLM call, and the replies are then posted
+    sequentially at a pace that stays within Graph API limits.
+    """
+
+    def __init__(self):
+        self.batch_window = 5  # Seconds to collect comments before flushing
+        self.max_batch_size = 20  # Flush immediately once this many are pending
+        self.reply_interval = 1.0  # Seconds between reply calls per account
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._access_tokens: Dict[str, str] = {}
+        self._flush_tasks: Dict[str, asyncio.Task] = {}  # Window flushes, one per account
+        self._size_flushes: Set[asyncio.Task] = set()  # Flushes triggered by a full batch
+        self._dispatch_locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {
+            "comments": 0,
+            "llm_calls": 0,
+            "tokens_used": 0,
+            "replies_sent": 0,
+            "replies_failed": 0
+        }
+
+    def enqueue(self, instagram_user_id: str, page_access_token: str, comment: Dict[str, Any]):
+        """Add a comment to the account's pending batch and schedule a flush."""
+        pending = self._pending.setdefault(instagram_user_id, [])
+        if any(c.get("id") == comment.get("id") for c in pending):
+            logger.info(f"[BATCH] Comment {comment.get('id')} already queued, skipping duplicate delivery")
+            return
+
+        pending.append(comment)
+        self._access_tokens[instagram_user_id] = page_access_token
+
+        if len(pending) >= self.max_batch_size:
+            # Keep a strong reference: the loop only holds weak ones to running tasks
+            task = asyncio.create_task(self.flush(instagram_user_id))
+            self._size_flushes.add(task)
+            task.add_done_callback(self._size_flushes.discard)
+            return
+
+        task = self._flush_tasks.get(instagram_user_id)
+        if not task or task.done():
+            self._flush_tasks[instagram_user_id] = asyncio.create_task(self._flush_after_window(instagram_user_id))
+
+    def stop(self):
+        """Cancel scheduled and running flushes (on shutdown)."""
+        for task in [*self._flush_tasks.values(), *self._size_flushes]:
+            task.cancel()
+        self._flush_tasks.clear()
+        self._size_flushes.clear()
+
+    async def _flush_after_window(self, instagram_user_id: str):
+        await asyncio.sleep(self.batch_window)
+        await self.flush(instagram_user_id)
+
+    async def flush(self, instagram_user_id: str):
+        """Generate and post replies for everything pending for an account."""
+        batch = self._pending.pop(instagram_user_id, [])
+        page_access_token = self._access_tokens.get(instagram_user_id)
+        if not batch or not page_access_token:
+            return
+
+        try:
+            await self.reply_to_batch(instagram_user_id, page_access_token, batch)
+        except Exception as e:
+            logger.error(f"[BATCH] Error flushing comment batch for {instagram_user_id}: {e}")
+        finally:
+            logger.info(f"[BATCH] Stats: {self.get_stats()}")
+
+    async def reply_to_batch(self, instagram_user_id: str, page_access_token: str,
+                             comments: List[Dict[str, Any]]) -> int:
+        """
+        Reply to every not-yet-replied comment in `comments`.
+
+        Replies are generated max_batch_size comments per LLM call and posted
+        under the account's dispatch lock. Returns the number of replies posted.
+        """
+        from app.database import SessionLocal
+
+        with SessionLocal() as db:
+            comments = replied_comment_index.filter_unreplied(comments, instagram_user_id, db)
+
+        replied = 0
+        for i in range(0, len(comments), self.max_batch_size):
+            batch = comments[i:i + self.max_batch_size]
+            logger.info(f"[BATCH] Generating replies for {len(batch)} comments on account {instagram_user_id}")
+            ai_result = await groq_service.generate_auto_replies_batch([
+                {
+                    "id": c["id"],
+                    "text": c.get("text", ""),
+                    "username": c.get("from", {}).get("username")
+                }
+                for c in batch
+            ])
+            self.stats["comments"] += len(batch)
+            self.stats["llm_calls"] += 1
+            self.stats["tokens_used"] += ai_result.get("tokens_used", 0)
+            replies = ai_result.get("replies", {})
+            if not ai_result["success"]:
+                logger.warning(f"[BATCH] Batch generation failed, using fallback replies: {ai_result.get('error')}")
+
+            lock = self._dispatch_locks.setdefault(instagram_user_id, asyncio.Lock())
+            async with lock:
+                for comment in batch:
+                    if await self._dispatch_reply(instagram_user_id, page_access_token, comment, replies.get(comment["id"])):
+                        replied += 1
+                    await asyncio.sleep(self.reply_interval)
+        return replied
+
+    async def _dispatch_reply(self, instagram_user_id: str, page_access_token: str,
+                              comment: Dict[str, Any], reply: Optional[str]) -> bool:
+        from app.database import SessionLocal
+
+        comment_id = comment["id"]
+        commenter_name = comment.get("from", {}).get("username", "there")
+        if not reply:
+            reply = f"Thank {commenter_name}, we appreciate your comment!"
+        elif commenter_name.lower() not in reply.lower():
+            reply = f"@{commenter_name} {reply}"
+
+        api_response = await instagram_service.reply_to_comment(
+            comment_id=comment_id,
+            page_access_token=page_access_token,
+            message=reply
+        )
+        if api_response.get("success"):
+            with SessionLocal() as db:
+                replied_comment_index.mark_replied([comment_id], instagram_user_id, db)
+            self.stats["replies_sent"] += 1
+            logger.info(f"[BATCH] Replied to comment {comment_id}: {reply}")
+            return True
+        self.stats["replies_failed"] += 1
+        logger.error(f"[BATCH] Failed to post reply to comment {comment_id}: {api_response}")
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return counters plus LLM calls and tokens normalised per 1,000 comments."""
+        comments = self.stats["comments"]
+        per_thousand = 1000 / comments if comments else 0
+        return {
+            **self.stats,
+            "llm_calls_per_1k_comments": round(self.stats["llm_calls"] * per_thousand, 1),
+            "tokens_per_1k_comments": round(self.stats["tokens_used"] * per_thousand, 1)
+        }
+
+
+comment_reply_batcher = CommentReplyBatcher()
+
+
 async def handle_incoming_comment_webhook(data):
     """Process incoming Instagram webhook for new comments and auto-reply if enabled."""
     import traceback
@@ -572,24 +720,13 @@ async def handle_incoming_comment_webhook(data):
                         logger.info(f"[WEBHOOK] Skipping own comment {comment_id} (user_id={commenter_id})")
                         continue
                     try:
-                        logger.info(f"[WEBHOOK] Triggering reply logic for comment_id={comment_id}, media_id={media_id}")
-                        # Extract commenter name from the comment
-                        commenter_name = comment.get("from", {}).get("username", "there")
-                        context = f"Instagram comment by {commenter_name}: {comment_text}"
-                        reply_result = await groq_service.generate_auto_reply(comment_text, context)
-                        reply = reply_result["content"] if reply_result["success"] else f"Thank {commenter_name}, we appreciate your comment!"
-                        logger.info(f"[WEBHOOK] Generated reply: {reply}")
-                        api_response = await instagram_service.reply_to_comment(
-                            comment_id=comment_id,
-                            page_access_token=page_access_token,
-                            message=reply
-                        )
-                        logger.info(f"[WEBHOOK] Instagram API reply response: {api_response}")
-                        if api_response.get("success"):
-                            await mark_auto_replied(comment_id, instagram_user_id, db)
-                            logger.info(f"[WEBHOOK] Marked comment {comment_id} as replied.")
-                        else:
-                            logger.error(f"[WEBHOOK] Failed to post reply to comment {comment_id}: {api_response}")
+                        logger.info(f"[WEBHOOK] Queueing comment_id={comment_id}, media_id={media_id} for batched reply")
+                        comment_reply_batcher.enqueue(instagram_user_id, page_access_token, {
+                            "id": comment_id,
+                            "text": comment_text,
+                            "from": comment.get("from", {}),
+                            "media_id": media_id
+                        })
                     except Exception as e:
                         logger.error(f"[WEBHOOK] Exception during reply logic for comment {comment_id}: {e}")
                         logger.error(traceback.format_exc())
@@ -693,51 +830,24 @@ async def handle_incoming_dm_webhook(data):
 async def enable_global_auto_reply(instagram_user_id: str, user):
     from app.models.global_auto_reply_status import GlobalAutoReplyStatus
     from app.database import SessionLocal
+    from app.services.auto_reply_backfill_service import auto_reply_backfill_service
     with SessionLocal() as db:
         GlobalAutoReplyStatus.set_enabled(user.id, instagram_user_id, True, db)
-    page_access_token = get_access_token_for_user(instagram_user_id)
-    posts = instagram_service.get_user_media(instagram_user_id, page_access_token, limit=100)
-    total_posts = len(posts)
-    global_auto_reply_progress[instagram_user_id] = {"status": "processing", "current_post": 0, "total_posts": total_posts, "current_comment": 0, "total_comments": 0}
-    logger.info(f"Processing {total_posts} posts for auto-reply")
-    for i, post in enumerate(posts, 1):
-        media_id = post.get('id')
-        logger.info(f"Processing post {i}/{total_posts}: {media_id}")
-        comments = await instagram_service.get_comments(instagram_user_id, page_access_token, media_id=media_id, limit=100)
-        logger.info(f"Found {len(comments)} comments for post {media_id}")
-        total_comments = len(comments)
-        global_auto_reply_progress[instagram_user_id].update({"current_post": i, "total_posts": total_posts, "current_comment": 0, "total_comments": total_comments, "current_media_id": media_id})
-        for j, comment in enumerate(comments, 1):
-            logger.info(f"Processing comment {j}/{len(comments)}: {comment.get('id')}")
-            global_auto_reply_progress[instagram_user_id]["current_comment"] = j
-            commenter_id = comment.get('from', {}).get('id')
-            if commenter_id == instagram_user_id:
-                continue  # Don't reply to own comment
-            if not await has_auto_reply(comment['id'], instagram_user_id, next(get_db())):
-                # Extract commenter name and create context
-                commenter_name = comment.get("from", {}).get("username", "there")
-                context = f"Instagram comment by {commenter_name}: {comment['text']}"
-                
-                reply_result = await groq_service.generate_auto_reply(comment['text'], context)
-                reply = reply_result["content"] if reply_result["success"] else f"Thank {commenter_name}, we appreciate your comment!"
-                await instagram_service.reply_to_comment(
-                    comment_id=comment['id'],
-                    page_access_token=page_access_token,
-                    message=reply
-                )
-                await mark_auto_replied(comment['id'], instagram_user_id, next(get_db()))
-    global_auto_reply_progress[instagram_user_id] = {"status": "done", "details": f"Processed {total_posts} posts."}
-    # Start background monitoring (could be a background task, webhook, or polling)
-    # await start_monitoring_comments(instagram_user_id, user) # Removed as per edit hint
-    if instagram_user_id not in polling_tasks or polling_tasks[instagram_user_id].done():
-        polling_tasks[instagram_user_id] = asyncio.create_task(poll_new_posts_and_comments(instagram_user_id, user))
+    # Replying to existing comments runs as a persisted, resumable background job
+    progress = auto_reply_backfill_service.start_job(user.id, instagram_user_id)
+    logger.info(f"Started auto-reply backfill job {progress['job_id']} for {instagram_user_id}")
+    # New comments are picked up by the shared poller (and webhooks)
+    global_auto_reply_poller.add_account(instagram_user_id, user.id)
+    return progress
 
 async def disable_global_auto_reply(instagram_user_id: str, user):
     from app.models.global_auto_reply_status import GlobalAutoReplyStatus
     from app.database import SessionLocal
+    from app.services.auto_reply_backfill_service import auto_reply_backfill_service
     with SessionLocal() as db:
         GlobalAutoReplyStatus.set_enabled(user.id, instagram_user_id, False, db)
-    # await stop_monitoring_comments(instagram_user_id, user) # Removed as per edit hint
+    auto_reply_backfill_service.cancel_job(user.id, instagram_user_id)
+    global_auto_reply_poller.remove_account(instagram_user_id)
 
 async def get_global_auto_reply_status(instagram_user_id: str, user):
     from app.database import SessionLocal
@@ -745,48 +855,14 @@ async def get_global_auto_reply_status(instagram_user_id: str, user):
         return GlobalAutoReplyStatus.is_enabled(user.id, instagram_user_id, db)
 
 async def get_global_auto_reply_progress(instagram_user_id: str, user):
-    # Return the current progress for this user (fast, non-blocking)
-    return global_auto_reply_progress.get(instagram_user_id, {"status": "idle", "details": "No processing in progress."})
+    # Progress is read from the persisted job, so any worker can answer
+    from app.services.auto_reply_backfill_service import auto_reply_backfill_service
+    return auto_reply_backfill_service.get_progress(user.id, instagram_user_id)
 
-# In enable_global_auto_reply, update progress as you process posts/comments:
-# Example:
-# global_auto_reply_progress[instagram_user_id] = {"status": "processing", "current_post": i, "total_posts": total, ...}
-# When done:
-# global_auto_reply_progress[instagram_user_id] = {"status": "done", ...}
+async def cancel_global_auto_reply_backfill(instagram_user_id: str, user):
+    from app.services.auto_reply_backfill_service import auto_reply_backfill_service
+    return auto_reply_backfill_service.cancel_job(user.id, instagram_user_id)
 
 
 # Create a singleton instance
-instagram_auto_reply_service = InstagramAutoReplyService() 
-
-async def poll_new_posts_and_comments(instagram_user_id: str, user, interval: int = 300):
-    """Background polling task to monitor for new posts/comments and auto-reply."""
-    try:
-        db = next(get_db())
-        account = db.query(SocialAccount).filter_by(platform_user_id=instagram_user_id).first()
-        my_ig_user_id = account.platform_user_id if account else None
-        while GlobalAutoReplyStatus.is_enabled(user.id, instagram_user_id, db):
-            page_access_token = await get_access_token_for_user(instagram_user_id)
-            posts = instagram_service.get_user_media(instagram_user_id, page_access_token, limit=100)
-            for post in posts:
-                media_id = post.get('id')
-                comments = await instagram_service.get_comments(instagram_user_id, page_access_token, media_id=media_id, limit=100)
-                for comment in comments:
-                    commenter_id = comment.get('from', {}).get('id')
-                    if commenter_id == my_ig_user_id:
-                        continue  # Don't reply to own comment
-                    if not await has_auto_reply(comment['id'], instagram_user_id, db):
-                        # Extract commenter name and create context
-                        commenter_name = comment.get("from", {}).get("username", "there")
-                        context = f"Instagram comment by {commenter_name}: {comment['text']}"
-                        
-                        reply_result = await groq_service.generate_auto_reply(comment['text'], context)
-                        reply = reply_result["content"] if reply_result["success"] else f"Thank {commenter_name}, we appreciate your comment!"
-                        await instagram_service.reply_to_comment(
-                            comment_id=comment['id'],
-                            page_access_token=page_access_token,
-                            message=reply
-                        )
-                        await mark_auto_replied(comment['id'], instagram_user_id, db)
-            await asyncio.sleep(interval)
-    except Exception as e:
-        logger.error(f"Polling error for {instagram_user_id}: {e}") 
\ No newline at end of file
+instagram_auto_reply_service = InstagramAutoReplyService()
@@ -0,0 +1,132 @@
+"""
+Per-account cache of live Instagram media listings.
+
+Reads are served stale-while-revalidate: a fresh entry is returned as is, a
+stale one is returned immediately while a background task refetches it, and
+only a missing, expired or invalidated entry makes the caller wait for Graph.
+Fetches run in the thread pool and concurrent fetches for an account share one
+task. Publishing through this app invalidates the account's entry (see
+InstagramService.create_post / create_carousel_post), so new media shows up on
+the next read.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List
+from cachetools import LRUCache
+from app.services.instagram_service import instagram_service
+
+logger = logging.getLogger(__name__)
+
+
+class InstagramMediaCache:
+    """Stale-while-revalidate cache of each account's newest media."""
+
+    def __init__(self):
+        self.fresh_ttl = 60  # Seconds an entry is served without revalidation
+        self.max_stale = 3600  # Seconds a stale entry may still be served while refreshing
+        self.default_depth = 100  # Items fetched per account (one Graph page)
+        self.max_depth = 500
+        self._entries: LRUCache = LRUCache(maxsize=500)  # instagram_user_id -> entry
+        self._inflight: Dict[str, asyncio.Task] = {}  # instagram_user_id -> fetch task
+        self._generations: Dict[str, int] = {}  # instagram_user_id -> invalidation count
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "fetches": 0,
+                      "fetch_errors": 0, "invalidations": 0, "stale_discards": 0}
+
+    async def _fetch(self, instagram_user_id: str, page_access_token: str, depth: int) -> List[Dict[str, Any]]:
+        media: List[Dict[str, Any]] = []
+        async for page in instagram_service.iter_user_media_pages(
+            instagram_user_id, page_access_token, page_size=min(depth, 100)
+        ):
+            media.extend(page)
+            if len(media) >= depth:
+                break
+        return media[:depth]
+
+    async def _refresh(self, instagram_user_id: str, page_access_token: str, depth: int) -> Dict[str, Any]:
+        self.stats["fetches"] += 1
+        generation = self._generations.get(instagram_user_id, 0)
+        media = await self._fetch(instagram_user_id, page_access_token, depth)
+        entry = {"media": media, "fetched_at": time.time(), "depth": depth, "invalidated": False}
+        # An invalidation during the fetch means this listing may predate the new media:
+        # hand it to the callers already waiting on it, but don't cache it
+        if self._generations.get(instagram_user_id, 0) == generation:
+            self._entries[instagram_user_id] = entry
+        else:
+            self.stats["stale_discards"] += 1
+        return entry
+
+    def _refresh_task(self, instagram_user_id: str, page_access_token: str, depth: int) -> asyncio.Task:
+        """Start (or join) the account's single in-flight fetch."""
+        task = self._inflight.get(instagram_user_id)
+        if task is None:
+            task = asyncio.create_task(self._refresh(instagram_user_id, page_access_token, depth))
+            self._inflight[instagram_user_id] = task
+
+            def done(t: asyncio.Task):
+                if self._inflight.get(instagram_user_id) is t:
+                    del self._inflight[instagram_user_id]
+                if not t.cancelled() and t.exception() is not None:
+                    self.stats["fetch_errors"] += 1
+                    logger.warning(f"Instagram media refresh failed for {instagram_user_id}: {t.exception()}")
+            task.add_done_callback(done)
+        return task
+
+    async def get_media(self, instagram_user_id: str, page_access_token: str,
+                        limit: int = 25, offset: int = 0) -> Dict[str, Any]:
+        """
+        A limit/offset slice of the account's cached media plus cache freshness.
+
+        Raises if Graph fails and there is no entry that may still be served.
+        """
+        needed = min(offset + limit, self.max_depth)
+        entry = self._entries.get(instagram_user_id)
+        age = time.time() - entry["fetched_at"] if entry else None
+        # An entry that filled its depth may have more media beyond it
+        too_shallow = entry is not None and needed > entry["depth"] and len(entry["media"]) >= entry["depth"]
+
+        if entry is None or entry["invalidated"] or age > self.max_stale or too_shallow:
+            self.stats["misses"] += 1
+            state = "miss"
+            depth = max(self.default_depth, needed, entry["depth"] if entry else 0)
+            entry = await asyncio.shield(self._refresh_task(instagram_user_id, page_access_token, depth))
+            age = 0.0
+        elif age > self.fresh_ttl:
+            self.stats["stale_hits"] += 1
+            state = "stale"
+            self._refresh_task(instagram_user_id, page_access_token, entry["depth"])
+        else:
+            self.stats["hits"] += 1
+            state = "fresh"
+
+        media = entry["media"]
+        return {
+            "media": media[offset:offset + limit],
+            "total_cached": len(media),
+            "cache": {
+                "status": state,
+                "fetched_at": datetime.fromtimestamp(entry["fetched_at"], timezone.utc).isoformat(),
+                "age_seconds": round(age, 1),
+                "refreshing": instagram_user_id in self._inflight
+            }
+        }
+
+    def invalidate(self, instagram_user_id: str):
+        """Force the next read for this account to wait for fresh media (e.g. after publishing)."""
+        entry = self._entries.get(instagram_user_id)
+        if entry is not None:
+            entry["invalidated"] = True
+            self.stats["invalidations"] += 1
+        # A fetch started before the publish may miss the new media: don't let readers join it,
+        # and bump the generation so it doesn't store its result when it completes
+        self._generations[instagram_user_id] = self._generations.get(instagram_user_id, 0) + 1
+        self._inflight.pop(instagram_user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "accounts_cached": len(self._entries), "inflight": len(self._inflight)}
+
+
+# Create a singleton instance
+instagram_media_cache = InstagramMediaCache()
@@ -1,3 +1,5 @@
+import asyncio
+import contextvars
 import requests
 import logging
 from typing import Dict, List, Optional, Tuple, Any
@@ -9,41 +11,26 @@ from app.services.cloudinary_service import cloudinary_service
 import os
 import time
 import functools
-from cachetools import TTLCache
+from urllib.parse import parse_qs, urlparse
 
 # --- Instagram Auto-Reply Utilities ---
 from app.models.social_account import SocialAccount
-from app.database import get_db
-import threading
-from app.models.instagram_auto_reply_log import InstagramAutoReplyLog
-
-# In-memory set for replied comment IDs (thread-safe)
-_replied_comment_ids = set()
-_replied_comment_ids_lock = threading.Lock()
+from app.database import SessionLocal
+from app.services.replied_comment_index import replied_comment_index
+from app.services.local_media_store import local_media_store
+from app.utils.memoize import memoize, token_key
+from app.services.graph_rate_governor import graph_rate_governor, GraphRateLimited
+from app.utils.resilience import (
+    IDEMPOTENT_METHODS, ProviderUnavailable, get_provider, is_connect_error, is_provider_failure
+)
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
+graph_provider = get_provider("graph")
 
-# Cache for API responses (5 minutes TTL)
-_api_cache = TTLCache(maxsize=100, ttl=300)
-
-
-def cache_api_response(func):
-    """Decorator to cache API responses for 5 minutes."""
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        args_str = str(args)
-        kwargs_str = str(sorted(kwargs.items()))
-        cache_key = f"{func.__name__}:{hash(args_str + kwargs_str)}"
-        
-        if cache_key in _api_cache:
-            logger.debug(f"Cache hit for {func.__name__}")
-            return _api_cache[cache_key]
-        
-        result = func(*args, **kwargs)
-        _api_cache[cache_key] = result
-        return result
-    return wrapper
+def _parse_graph_timestamp(value: str) -> datetime:
+    """Parse a Graph API timestamp such as "2024-05-01T12:00:00+0000" (timezone-aware)."""
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z")
 
 
 class InstagramService:
@@ -58,25 +45,45 @@ class InstagramService:
         self._session.timeout = 30
     
     def _make_request(self, method: str, url: str, **kwargs) -> requests.Response:
-        """Make HTTP request with error handling and retries."""
-        max_retries = 3
-        retry_delay = 1
-        
-        for attempt in range(max_retries):
-            try:
-                response = self._session.request(method, url, **kwargs)
-                response.raise_for_status()
-                return response
-            except requests.exceptions.RequestException as e:
-                if attempt == max_retries - 1:
-                    raise e
-                logger.warning(f"Request failed (attempt {attempt + 1}/{max_retries}): {e}")
-                time.sleep(retry_delay)
-                retry_delay *= 2
-        
-        raise requests.exceptions.RequestException("All retry attempts failed")
+        """
+        Make an HTTP request behind the Graph rate governor and circuit breaker.
+
+        Network errors and 5xx responses are retried with jittered backoff while
+        the Graph retry budget allows. Non-idempotent requests (publishing,
+        replies) are only resent when the connection was never established.
+        Blocks while waiting for rate budget or a retry; coroutines use
+        _make_request_async.
+        """
+        # Paging "next" URLs carry the token in the query string instead of params
+        access_token = (
+            (kwargs.get('params') or {}).get('access_token')
+            or (kwargs.get('data') or {}).get('access_token')
+            or (parse_qs(urlparse(url).query).get('access_token') or [None])[0]
+        )
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        def send() -> requests.Response:
+            graph_rate_governor.acquire_sync(access_token, method, url)
+            response = self._session.request(method, url, **kwargs)
+            graph_rate_governor.observe(access_token, response.status_code, response.headers,
+                                        response.content if response.status_code >= 400 else None)
+            response.raise_for_status()
+            return response
+
+        def retry_on(error: Exception) -> bool:
+            if graph_rate_governor.retry_after(access_token) > 0:
+                return False  # Throttled; retrying now would only burn more budget
+            if not is_provider_failure(error):
+                return False
+            return idempotent or is_connect_error(error)
+
+        try:
+            return graph_provider.call_sync(send, retry_on=retry_on)
+        except (GraphRateLimited, ProviderUnavailable) as e:
+            raise requests.exceptions.RequestException(str(e))
     
-    @cache_api_response
+    @memoize("instagram.exchange_token", ttl=3600,
+             key=lambda self, short_lived_token, app_id, app_secret: (token_key(short_lived_token), app_id))
     def exchange_for_long_lived_token(self, short_lived_token: str, app_id: str, app_secret: str) -> Tuple[str, datetime]:
         """Exchange short-lived token for long-lived token (60 days)"""
         try:
@@ -101,7 +108,7 @@ class InstagramService:
             logger.error(f"Token exchange failed: {e}")
             raise Exception(f"Failed to exchange token: {str(e)}")
     
-    @cache_api_response
+    @memoize("instagram.token_permissions", ttl=300, key=lambda self, access_token: token_key(access_token))
     def verify_token_permissions(self, access_token: str) -> Dict:
         """Verify token has required permissions"""
         try:
@@ -145,7 +152,7 @@ class InstagramService:
                 logger.error(f"Permission verification failed: {e}")
                 raise Exception(f"Failed to verify permissions: {str(e)}")
     
-    @cache_api_response
+    @memoize("instagram.pages_with_instagram", ttl=300, key=lambda self, access_token: token_key(access_token))
     def get_facebook_pages_with_instagram(self, access_token: str) -> List[Dict]:
         """Get Facebook Pages with Instagram Business accounts"""
         try:
@@ -154,15 +161,22 @@ class InstagramService:
                 missing = ', '.join(perm_check['missing'])
                 raise Exception(f"Missing required permissions: {missing}. Please re-authorize the app.")
             
+            # Instagram details come from nested field expansion on the page listing,
+            # so any number of pages costs one request per 100 pages
             url = f"{self.graph_url}/me/accounts"
             params = {
                 'access_token': access_token,
-                'fields': 'id,name,access_token,instagram_business_account{id,username,name,profile_picture_url,followers_count,media_count}'
+                'fields': 'id,name,access_token,instagram_business_account{id,username,name,profile_picture_url,followers_count,media_count}',
+                'limit': 100
             }
-            
-            response = self._make_request('GET', url, params=params)
-            pages_data = response.json()
-            pages = pages_data.get('data', [])
+            pages = []
+            while url:
+                response = self._make_request('GET', url, params=params)
+                pages_data = response.json()
+                pages.extend(pages_data.get('data', []))
+                # The "next" URL already carries the cursor and the original query
+                url = pages_data.get('paging', {}).get('next')
+                params = None
             
             if not pages:
                 raise Exception("No Facebook Pages found. You need Admin access to at least one Facebook Page.")
@@ -177,20 +191,15 @@ class InstagramService:
                 if instagram_account:
                     page_token = page.get('access_token')
                     if page_token:
-                        enhanced_account = self._get_enhanced_instagram_details(
-                            instagram_account['id'], 
-                            page_token
-                        )
-                        
                         instagram_accounts.append({
                             'platform_id': instagram_account['id'],
                             'username': instagram_account.get('username', ''),
                             'display_name': instagram_account.get('name', ''),
                             'page_name': page_name,
                             'page_id': page['id'],
-                            'followers_count': enhanced_account.get('followers_count', 0),
-                            'media_count': enhanced_account.get('media_count', 0),
-                            'profile_picture': enhanced_account.get('profile_picture_url', ''),
+                            'followers_count': instagram_account.get('followers_count', 0),
+                            'media_count': instagram_account.get('media_count', 0),
+                            'profile_picture': instagram_account.get('profile_picture_url', ''),
                             'page_access_token': page_token
                         })
                 else:
@@ -269,7 +278,7 @@ class InstagramService:
             logger.info(f"Caption length: {len(caption)} characters")
             
             if video_filename and not video_file_path:
-                video_file_path = os.path.join("temp_images", video_filename)
+                video_file_path = local_media_store.path_for(video_filename)
             
             # Media validation
             if is_reel and not (video_url or video_file_path):
@@ -315,7 +324,7 @@ class InstagramService:
                     if upload_result["success"]:
                         final_thumbnail_url = upload_result["url"]
                 elif thumbnail_filename:
-                    thumb_path = os.path.join("temp_images", thumbnail_filename)
+                    thumb_path = local_media_store.path_for(thumbnail_filename)
                     if os.path.exists(thumb_path):
                         upload_result = cloudinary_service.upload_image_with_instagram_transform(thumb_path)
                         if upload_result["success"]:
@@ -357,7 +366,7 @@ class InstagramService:
             logger.info(f"Media URL: {media_url}")
             
             try:
-                response = self._make_request('POST', media_url, data=media_params)
+                response = await self._make_request_async('POST', media_url, data=media_params)
                 media_result = response.json()
                 logger.info(f"Media creation response: {media_result}")
                 creation_id = media_result.get('id')
@@ -384,17 +393,18 @@ class InstagramService:
             if is_reel:
                 max_attempts = 10
                 for attempt in range(max_attempts):
-                    status_response = self._make_request('GET', f"{self.graph_url}/{creation_id}", 
-                                                      params={'access_token': page_access_token, 'fields': 'status_code'})
+                    status_response = await self._make_request_async('GET', f"{self.graph_url}/{creation_id}",
+                                                                   params={'access_token': page_access_token, 'fields': 'status_code'})
                     status_data = status_response.json()
                     if status_data.get('status_code') in ('FINISHED', 'READY', 'PUBLISHED'):
                         break
-                    time.sleep(3)
+                    await asyncio.sleep(3)
                 else:
                     return {"success": False, "error": "Media not ready to publish after waiting."}
             
-            publish_response = self._make_request('POST', publish_url, data=publish_params)
+            publish_response = await self._make_request_async('POST', publish_url, data=publish_params)
             publish_result = publish_response.json()
+            self._media_published(instagram_user_id)
             
             return {
                 "success": True, 
@@ -410,6 +420,9 @@ class InstagramService:
             logger.error(f"Unexpected error creating Instagram post: {e}")
             return {"success": False, "error": f"Unexpected error: {str(e)}"}
     
+    @memoize("instagram.user_media", ttl=60, negative_ttl=15, is_negative=lambda media: not media,
+             key=lambda self, instagram_user_id, page_access_token, limit=25:
+                 (instagram_user_id, token_key(page_access_token), limit))
     def get_user_media(self, instagram_user_id: str, page_access_token: str, limit: int = 25) -> List[Dict]:
         """Get user's Instagram media"""
         try:
@@ -428,20 +441,63 @@ class InstagramService:
             logger.error(f"Failed to get user media: {e}")
             return []
     
-    async def generate_instagram_image_with_ai(self, prompt: str, post_type: str = "feed") -> Dict[str, Any]:
-        """Generate an image optimized for Instagram using Stability AI."""
+    async def iter_user_media_pages(self, instagram_user_id: str, page_access_token: str,
+                                    page_size: int = 100, since: Optional[datetime] = None):
+        """
+        Yield pages of the user's media, newest first, following Graph paging cursors.
+
+        Each page is fetched in the thread pool only when the consumer asks for
+        it. With since set, paging stops at the first page reaching media at
+        or before that time; older items on that page are dropped.
+        """
+        url = f"{self.graph_url}/{instagram_user_id}/media"
+        params = {
+            'access_token': page_access_token,
+            'fields': 'id,media_type,media_url,thumbnail_url,caption,timestamp,permalink',
+            'limit': page_size
+        }
+        while url:
+            response = await self._make_request_async('GET', url, params=params)
+            payload = response.json()
+            media = payload.get('data', [])
+            if since is not None:
+                fresh = [m for m in media if m.get('timestamp') and _parse_graph_timestamp(m['timestamp']) > since]
+                if len(fresh) < len(media):
+                    if fresh:
+                        yield fresh
+                    return
+            if media:
+                yield media
+            # The "next" URL already carries the cursor and the original query
+            url = payload.get('paging', {}).get('next')
+            params = None
+    
+    # Stability AI dimensions per Instagram post type (SDXL-supported sizes)
+    AI_IMAGE_DIMENSIONS = {
+        "feed": (1024, 1024),
+        "story": (832, 1216),
+        "square": (1024, 1024),
+        "portrait": (896, 1152),
+        "landscape": (1152, 896)
+    }
+    AI_IMAGE_NEGATIVE_PROMPT = "blurry, low quality, distorted, text overlay, watermark, ugly, bad anatomy, low resolution"
+    
+    @staticmethod
+    def _enhance_image_prompt(prompt: str) -> str:
+        return f"High-quality, Instagram-worthy image: {prompt}, vibrant colors, good lighting, visually appealing, social media optimized"
+    
+    async def generate_instagram_image_with_ai(self, prompt: str, post_type: str = "feed",
+                                               seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Generate an image optimized for Instagram using Stability AI.
+
+        Pass the seed returned by an earlier call to regenerate the same image
+        (served from the image cache).
+        """
         try:
-            dimensions = {
-                "feed": (1024, 1024),
-                "story": (832, 1216),
-                "square": (1024, 1024),
-                "portrait": (896, 1152),
-                "landscape": (1152, 896)
-            }
-            
-            width, height = dimensions.get(post_type, dimensions["feed"])
-            enhanced_prompt = f"High-quality, Instagram-worthy image: {prompt}, vibrant colors, good lighting, visually appealing, social media optimized"
-            negative_prompt = "blurry, low quality, distorted, text overlay, watermark, ugly, bad anatomy, low resolution"
+            width, height = self.AI_IMAGE_DIMENSIONS.get(post_type, self.AI_IMAGE_DIMENSIONS["feed"])
+            enhanced_prompt = self._enhance_image_prompt(prompt)
+            negative_prompt = self.AI_IMAGE_NEGATIVE_PROMPT
             
             image_result = await stability_service.generate_image(
                 prompt=enhanced_prompt,
@@ -450,7 +506,9 @@ class InstagramService:
                 height=height,
                 cfg_scale=8.0,
                 steps=40,
-                samples=1
+                samples=1,
+                seed=seed or 0,
+                use_cache=True
             )
             
             if not image_result["success"]:
@@ -462,6 +520,8 @@ class InstagramService:
             return {
                 "success": True,
                 "image_base64": image_result["image_base64"],
+                "seed": image_result.get("seed"),
+                "cached": image_result.get("cached", False),
                 "prompt": prompt,
                 "enhanced_prompt": enhanced_prompt,
                 "width": width,
@@ -473,9 +533,127 @@ class InstagramService:
             logger.error(f"Error generating Instagram image with AI: {e}")
             return {"success": False, "error": str(e)}
     
+    async def generate_instagram_images_with_ai(self, prompt: str, count: int, post_type: str = "feed",
+                                                variations: bool = True) -> Dict[str, Any]:
+        """
+        Generate several Instagram images at once; images are returned as raw bytes.
+        
+        With variations each image gets its own prompt and the requests run
+        concurrently; otherwise one samples=N request covers the whole set.
+        """
+        width, height = self.AI_IMAGE_DIMENSIONS.get(post_type, self.AI_IMAGE_DIMENSIONS["feed"])
+        enhanced_prompt = self._enhance_image_prompt(prompt)
+        prompts = None
+        if variations:
+            prompts = [self._enhance_image_prompt(f"{prompt} - variation {i + 1}") for i in range(count)]
+        
+        result = await stability_service.generate_images(
+            prompt=enhanced_prompt,
+            count=count,
+            negative_prompt=self.AI_IMAGE_NEGATIVE_PROMPT,
+            width=width,
+            height=height,
+            cfg_scale=8.0,
+            steps=40,
+            prompts=prompts
+        )
+        result.update({"prompt": prompt, "width": width, "height": height, "post_type": post_type})
+        return result
+    
+    async def generate_carousel_images_with_ai(self, prompt: str, count: int = 3, post_type: str = "feed") -> Dict[str, Any]:
+        """Generate carousel images and a caption concurrently and upload the images to Cloudinary."""
+        try:
+            images_result, caption_result = await asyncio.gather(
+                self.generate_instagram_images_with_ai(prompt, count, post_type),
+                groq_service.generate_instagram_post(prompt),
+                return_exceptions=True
+            )
+            if isinstance(images_result, Exception):
+                raise images_result
+            if isinstance(caption_result, Exception):
+                logger.warning(f"Carousel caption generation failed: {caption_result}")
+                caption_result = {}
+            if not images_result["success"]:
+                return {"success": False, "error": f"Image generation failed: {images_result.get('error', 'Unknown error')}"}
+            
+            loop = asyncio.get_event_loop()
+            uploads = await asyncio.gather(*[
+                loop.run_in_executor(None, cloudinary_service.upload_image_with_instagram_transform, image["image_bytes"])
+                for image in images_result["images"]
+            ])
+            image_urls = [upload["url"] for upload in uploads if upload["success"]]
+            if not image_urls:
+                return {"success": False, "error": f"Image upload failed: {uploads[0].get('error', 'Unknown error')}"}
+            
+            return {
+                "success": True,
+                "image_urls": image_urls,
+                "caption": caption_result.get("content", ""),
+                "count": len(image_urls),
+                "prompt": prompt,
+                "width": images_result["width"],
+                "height": images_result["height"],
+                "post_type": post_type
+            }
+            
+        except Exception as e:
+            logger.error(f"Error generating Instagram carousel with AI: {e}")
+            return {"success": False, "error": str(e)}
+    
+    @staticmethod
+    def _media_published(instagram_user_id: str):
+        """Invalidate the account's cached media listing after a publish."""
+        from app.services.instagram_media_cache import instagram_media_cache
+        instagram_media_cache.invalidate(instagram_user_id)
+    
+    async def _make_request_async(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Run _make_request in the default thread pool so it doesn't block the event loop."""
+        loop = asyncio.get_event_loop()
+        # Carry the caller's context (e.g. its Graph priority) into the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            None, functools.partial(context.run, self._make_request, method, url, **kwargs)
+        )
+    
+    async def _wait_for_containers(self, container_ids: List[str], page_access_token: str,
+                                   timeout: float = 120, initial_delay: float = 1, max_delay: float = 10) -> Dict[str, Any]:
+        """
+        Poll media containers until every status_code is FINISHED.
+        
+        All pending containers are checked concurrently each round, with an
+        exponential backoff between rounds.
+        """
+        pending = set(container_ids)
+        delay = initial_delay
+        deadline = time.monotonic() + timeout
+        
+        while pending:
+            batch = list(pending)
+            responses = await asyncio.gather(*[
+                self._make_request_async('GET', f"{self.graph_url}/{cid}",
+                                         params={'access_token': page_access_token, 'fields': 'status_code'})
+                for cid in batch
+            ])
+            for cid, response in zip(batch, responses):
+                status_code = response.json().get('status_code')
+                if status_code in ('FINISHED', 'PUBLISHED'):
+                    pending.discard(cid)
+                elif status_code in ('ERROR', 'EXPIRED'):
+                    return {"success": False, "error": f"Media container {cid} failed processing ({status_code})"}
+            
+            if not pending:
+                break
+            if time.monotonic() + delay > deadline:
+                return {"success": False, "error": f"Media containers not ready after {timeout}s: {', '.join(pending)}"}
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+        
+        return {"success": True}
+    
     async def create_carousel_post(self, instagram_user_id: str, page_access_token: str, 
                                   caption: str, image_urls: List[str]) -> Dict[str, Any]:
         """Create an Instagram carousel post with multiple images."""
+        timings = {}
         try:
             if not all([instagram_user_id, page_access_token, caption, image_urls]):
                 return {"success": False, "error": "Missing required parameters"}
@@ -491,18 +669,30 @@ class InstagramService:
                 if not url.startswith(('http://', 'https://')):
                     return {"success": False, "error": f"Image {i+1} URL must be a valid HTTP/HTTPS URL"}
             
-            # Create child media objects
-            children_creation_ids = []
-            for url in image_urls:
-                child_response = self._make_request('POST', f"{self.graph_url}/{instagram_user_id}/media", data={
+            media_url = f"{self.graph_url}/{instagram_user_id}/media"
+            
+            # Create child media objects concurrently (order of children is preserved by gather)
+            phase_start = time.monotonic()
+            child_responses = await asyncio.gather(*[
+                self._make_request_async('POST', media_url, data={
                     'access_token': page_access_token,
                     'image_url': url,
                     'is_carousel_item': 'true'
                 })
-                children_creation_ids.append(child_response.json()['id'])
+                for url in image_urls
+            ])
+            children_creation_ids = [response.json()['id'] for response in child_responses]
+            timings['create_children'] = time.monotonic() - phase_start
+            
+            # Wait until every child has finished processing
+            phase_start = time.monotonic()
+            ready = await self._wait_for_containers(children_creation_ids, page_access_token)
+            timings['children_ready'] = time.monotonic() - phase_start
+            if not ready["success"]:
+                return {"success": False, "error": ready["error"], "timings": timings}
             
             # Create carousel container
-            media_url = f"{self.graph_url}/{instagram_user_id}/media"
+            phase_start = time.monotonic()
             media_params = {
                 'access_token': page_access_token,
                 'caption': caption,
@@ -512,25 +702,42 @@ class InstagramService:
             for idx, cid in enumerate(children_creation_ids):
                 media_params[f'children[{idx}]'] = cid
             
-            media_response = self._make_request('POST', media_url, data=media_params)
+            media_response = await self._make_request_async('POST', media_url, data=media_params)
             media_data = media_response.json()
             creation_id = media_data['id']
+            timings['create_parent'] = time.monotonic() - phase_start
+            
+            phase_start = time.monotonic()
+            ready = await self._wait_for_containers([creation_id], page_access_token)
+            timings['parent_ready'] = time.monotonic() - phase_start
+            if not ready["success"]:
+                return {"success": False, "error": ready["error"], "timings": timings}
             
             # Publish carousel
+            phase_start = time.monotonic()
             publish_url = f"{self.graph_url}/{instagram_user_id}/media_publish"
             publish_params = {
                 'access_token': page_access_token,
                 'creation_id': creation_id
             }
             
-            publish_response = self._make_request('POST', publish_url, data=publish_params)
+            publish_response = await self._make_request_async('POST', publish_url, data=publish_params)
             publish_data = publish_response.json()
+            timings['publish'] = time.monotonic() - phase_start
+            self._media_published(instagram_user_id)
+            
+            logger.info(
+                "Carousel published with %d images: %s",
+                len(image_urls),
+                ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in timings.items())
+            )
             
             return {
                 'success': True,
                 'post_id': publish_data['id'],
                 'creation_id': creation_id,
-                'image_count': len(image_urls)
+                'image_count': len(image_urls),
+                'timings': timings
             }
             
         except requests.exceptions.RequestException as e:
@@ -541,11 +748,11 @@ class InstagramService:
                     error_msg = error_data.get('error', {}).get('message', str(e))
                 except ValueError:
                     error_msg = str(e)
-                return {'success': False, 'error': f"Carousel creation failed: {error_msg}"}
-            return {'success': False, 'error': f"Network error: {str(e)}"}
+                return {'success': False, 'error': f"Carousel creation failed: {error_msg}", 'timings': timings}
+            return {'success': False, 'error': f"Network error: {str(e)}", 'timings': timings}
         except Exception as e:
             logger.error(f"Unexpected error creating Instagram carousel: {e}")
-            return {"success": False, "error": f"Unexpected error: {str(e)}"}
+            return {"success": False, "error": f"Unexpected error: {str(e)}", "timings": timings}
     
     async def get_comments(self, instagram_user_id: str, page_access_token: str, 
                           media_id: str = None, limit: int = 25) -> List[Dict]:
@@ -559,7 +766,7 @@ class InstagramService:
                     'limit': limit
                 }
                 
-                response = self._make_request('GET', url, params=params)
+                response = await self._make_request_async('GET', url, params=params)
                 data = response.json()
                 return data.get('data', [])
             else:
@@ -571,7 +778,7 @@ class InstagramService:
                     'limit': limit
                 }
                 
-                response = self._make_request('GET', url, params=params)
+                response = await self._make_request_async('GET', url, params=params)
                 media_data = response.json()
                 media_list = media_data.get('data', [])
                 
@@ -586,7 +793,7 @@ class InstagramService:
                     }
                     
                     try:
-                        comments_response = self._make_request('GET', comments_url, params=comments_params)
+                        comments_response = await self._make_request_async('GET', comments_url, params=comments_params)
                         comments_data = comments_response.json()
                         comments = comments_data.get('data', [])
                         
@@ -613,7 +820,6 @@ class InstagramService:
                 'message': message
             }
             # Use requests in a thread pool for async compatibility
-            import asyncio
             loop = asyncio.get_event_loop()
             response = await loop.run_in_executor(
                 None,
@@ -636,18 +842,14 @@ instagram_service = InstagramService()
 
 def get_access_token_for_user(instagram_user_id: str):
     """Get the page access token for a given Instagram user ID from the SocialAccount table."""
-    db = next(get_db())
-    account = db.query(SocialAccount).filter_by(platform="instagram", platform_user_id=instagram_user_id).first()
-    if account and account.platform_data:
-        return account.platform_data.get("page_access_token")
+    with SessionLocal() as db:
+        account = db.query(SocialAccount).filter_by(platform="instagram", platform_user_id=instagram_user_id).first()
+        if account and account.platform_data:
+            return account.platform_data.get("page_access_token")
     return None
 
 async def has_auto_reply(comment_id: str, instagram_user_id: str, db) -> bool:
-    return db.query(InstagramAutoReplyLog).filter_by(comment_id=comment_id, instagram_user_id=instagram_user_id).first() is not None
+    return comment_id in replied_comment_index.get_replied([comment_id], instagram_user_id, db)
 
 async def mark_auto_replied(comment_id: str, instagram_user_id: str, db):
-    if not await has_auto_reply(comment_id, instagram_user_id, db):
-        log = InstagramAutoReplyLog(comment_id=comment_id, instagram_user_id=instagram_user_id)
-        db.add(log)
-        db.commit()
-# NOTE: For production, implement persistent storage for replied comment IDs. 
\ No newline at end of file
+    replied_comment_index.mark_replied([comment_id], instagram_user_id, db)
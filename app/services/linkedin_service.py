@@ -1,10 +1,15 @@
-import requests
+import httpx
 import logging
 from typing import Dict, Any, Optional
 from app.config import get_settings
+from app.utils.resilience import resilient_transport
 
 logger = logging.getLogger(__name__)
 
+# Profile fields and picture in one request
+PROFILE_PROJECTION = "(id,localizedFirstName,localizedLastName,profilePicture(displayImage~:playableStreams))"
+
+
 class LinkedInService:
     def __init__(self):
         self.client_id = get_settings().linkedin_client_id
@@ -12,6 +17,17 @@ class LinkedInService:
         self.redirect_uri = get_settings().linkedin_redirect_uri
         self.api_base_url = "https://api.linkedin.com/v2"
         self.auth_base_url = "https://www.linkedin.com/oauth/v2"
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=5.0),
+                                             transport=resilient_transport("linkedin"))
+        return self._client
+    
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
     
     async def validate_access_token(self, access_token: str) -> Dict[str, Any]:
         """Validate LinkedIn access token and get user profile."""
@@ -21,34 +37,27 @@ class LinkedInService:
                 'Content-Type': 'application/json'
             }
             
-            # Get user profile
-            profile_response = requests.get(
-                f"{self.api_base_url}/me",
+            # The Rest.li projection is passed unencoded, as LinkedIn expects
+            response = await self._get_client().get(
+                f"{self.api_base_url}/me?projection={PROFILE_PROJECTION}",
                 headers=headers
             )
             
-            if profile_response.status_code != 200:
-                logger.error(f"LinkedIn profile API error: {profile_response.status_code} - {profile_response.text}")
+            if response.status_code != 200:
+                logger.error(f"LinkedIn profile API error: {response.status_code} - {response.text}")
                 return {
                     "valid": False,
-                    "error": f"LinkedIn API error: {profile_response.status_code}"
+                    "expired": response.status_code == 401,
+                    "error": f"LinkedIn API error: {response.status_code}"
                 }
             
-            profile_data = profile_response.json()
-            
-            # Get profile picture if available
-            picture_response = requests.get(
-                f"{self.api_base_url}/me?projection=(id,firstName,lastName,profilePicture(displayImage~:playableStreams))",
-                headers=headers
-            )
+            profile_data = response.json()
             
             profile_picture = None
-            if picture_response.status_code == 200:
-                picture_data = picture_response.json()
-                if 'profilePicture' in picture_data and 'displayImage~' in picture_data['profilePicture']:
-                    elements = picture_data['profilePicture']['displayImage~']['elements']
-                    if elements:
-                        profile_picture = elements[0]['identifiers'][0]['identifier']
+            display_image = (profile_data.get('profilePicture') or {}).get('displayImage~') or {}
+            elements = display_image.get('elements') or []
+            if elements and elements[0].get('identifiers'):
+                profile_picture = elements[0]['identifiers'][0]['identifier']
             
             return {
                 "valid": True,
@@ -78,7 +87,7 @@ class LinkedInService:
                 'redirect_uri': self.redirect_uri
             }
             
-            response = requests.post(token_url, data=data)
+            response = await self._get_client().post(token_url, data=data)
             response.raise_for_status()
             
             token_data = response.json()
@@ -87,7 +96,7 @@ class LinkedInService:
                 "expires_in": token_data.get("expires_in", 3600),
                 "refresh_token": token_data.get("refresh_token")
             }
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error exchanging code for token: {str(e)}")
             raise Exception(f"Failed to exchange authorization code: {str(e)}")
 
@@ -100,7 +109,7 @@ class LinkedInService:
             }
             
             profile_url = f"{self.api_base_url}/me"
-            response = requests.get(profile_url, headers=headers)
+            response = await self._get_client().get(profile_url, headers=headers)
             response.raise_for_status()
             
             profile_data = response.json()
@@ -110,7 +119,7 @@ class LinkedInService:
                 "lastName": profile_data["localizedLastName"],
                 "profilePicture": None  # LinkedIn API doesn't provide profile picture in basic profile
             }
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error getting user profile: {str(e)}")
             raise Exception(f"Failed to get user profile: {str(e)}")
     
@@ -125,7 +134,7 @@ class LinkedInService:
                 'client_secret': self.client_secret
             }
             
-            response = requests.post(token_url, data=data)
+            response = await self._get_client().post(token_url, data=data)
             
             if response.status_code != 200:
                 logger.error(f"LinkedIn token refresh error: {response.status_code} - {response.text}")
@@ -190,7 +199,7 @@ class LinkedInService:
                     }
                 }]
             
-            response = requests.post(
+            response = await self._get_client().post(
                 f"{self.api_base_url}/ugcPosts",
                 headers=headers,
                 json=post_data
@@ -226,7 +235,7 @@ class LinkedInService:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
+            response = await self._get_client().get(
                 f"{self.api_base_url}/ugcPosts?authors=List({profile_id})&count={limit}",
                 headers=headers
             )
@@ -0,0 +1,300 @@
+"""
+Managed local media store behind the /temp_images static mount.
+
+Generated images and uploaded videos/thumbnails are kept in sharded
+subdirectories (temp_images/<2-hex-shard>/<filename>) so no single directory
+grows large. The store enforces a total-size and file-count budget with LRU
+eviction, expires files past a maximum age, and runs a background janitor.
+Files still referenced by pending scheduled posts or live media handles are
+pinned and never evicted, whatever their age.
+Files are written to a staging directory first and renamed into place, so the
+static mount never serves a partial file.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, Optional, Set
+from fastapi.staticfiles import StaticFiles
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+STAGING_DIRNAME = ".staging"
+
+
+class LocalMediaStore:
+    """Size- and count-bounded LRU store for locally served media."""
+
+    def __init__(self, root: str = "temp_images"):
+        self.root = root
+        self.staging_dir = os.path.join(root, STAGING_DIRNAME)
+        self.max_bytes = settings.local_media_max_bytes
+        self.max_files = settings.local_media_max_files
+        self.max_age_seconds = settings.local_media_max_age_hours * 3600
+        self.min_age_seconds = 600  # Never evict files this fresh, they may be mid-publish
+        self.janitor_interval = 600
+        self.pin_refresh_interval = 60  # Seconds between reloads of the referenced-file set
+        self.is_running = False
+        self._index: "OrderedDict[str, Dict[str, float]]" = OrderedDict()  # filename -> {"size", "touched_at"}
+        self._bytes_used = 0
+        self._lock = threading.Lock()
+        self._pinned: Set[str] = set()
+        self._pinned_at = 0.0
+        self.stats = {"writes": 0, "lru_evictions": 0, "expired_evictions": 0, "bytes_evicted": 0,
+                      "janitor_runs": 0, "last_janitor_at": None}
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self.rescan()
+
+    @staticmethod
+    def _shard(filename: str) -> str:
+        return hashlib.md5(filename.encode("utf-8")).hexdigest()[:2]
+
+    def relative_path(self, filename: str) -> str:
+        """Path under the static mount, e.g. "3f/<filename>"."""
+        return f"{self._shard(filename)}/{filename}"
+
+    def url_for_path(self, path: Optional[str]) -> Optional[str]:
+        """URL the /temp_images mount serves a stored file at, or None for paths outside the store."""
+        if not path:
+            return None
+        root = os.path.abspath(self.root)
+        full_path = os.path.abspath(path)
+        if os.path.commonpath([root, full_path]) != root:
+            return None
+        relative = os.path.relpath(full_path, root).replace(os.sep, "/")
+        return f"{settings.backend_base_url}/temp_images/{relative}"
+
+    def _sharded_path(self, filename: str) -> str:
+        return os.path.join(self.root, self._shard(filename), filename)
+
+    def path_for(self, filename: str) -> str:
+        """Resolve a stored filename to its path (falls back to the legacy flat layout) and mark it used."""
+        filename = os.path.basename(filename)
+        path = self._sharded_path(filename)
+        if not os.path.exists(path):
+            legacy_path = os.path.join(self.root, filename)
+            if os.path.exists(legacy_path):
+                return legacy_path
+            return path
+        self.touch(filename)
+        return path
+
+    def touch(self, filename: str):
+        with self._lock:
+            entry = self._index.get(filename)
+            if entry:
+                entry["touched_at"] = time.time()
+                self._index.move_to_end(filename)
+        try:
+            os.utime(self._sharded_path(filename))
+        except OSError:
+            pass
+
+    def write_bytes(self, data: bytes, filename: str) -> str:
+        """Atomically write data under filename and return its path."""
+        fd, staging_path = tempfile.mkstemp(dir=self.staging_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        except BaseException:
+            os.unlink(staging_path)
+            raise
+        return self.commit_file(staging_path, filename)
+
+    def commit_file(self, staging_path: str, filename: Optional[str] = None) -> str:
+        """Rename a fully written file (ideally in staging_dir) into its shard and account for it."""
+        filename = filename or os.path.basename(staging_path)
+        path = self._sharded_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staging_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            previous = self._index.pop(filename, None)
+            if previous:
+                self._bytes_used -= previous["size"]
+            self._index[filename] = {"size": size, "touched_at": time.time()}
+            self._bytes_used += size
+            self.stats["writes"] += 1
+        self._enforce_budget()
+        return path
+
+    def delete(self, filename: str) -> bool:
+        filename = os.path.basename(filename)
+        with self._lock:
+            entry = self._index.pop(filename, None)
+            if entry:
+                self._bytes_used -= entry["size"]
+        for path in (self._sharded_path(filename), os.path.join(self.root, filename)):
+            try:
+                os.remove(path)
+                return True
+            except OSError:
+                continue
+        return False
+
+    def _evict(self, filename: str, reason: str):
+        size = self._index[filename]["size"]
+        self._index.pop(filename)
+        self._bytes_used -= size
+        self.stats[reason] += 1
+        self.stats["bytes_evicted"] += size
+        for path in (self._sharded_path(filename), os.path.join(self.root, filename)):
+            try:
+                os.remove(path)
+                break
+            except OSError:
+                continue
+
+    @staticmethod
+    def _referenced_filenames(references: Iterable[Optional[str]]) -> Set[str]:
+        """Stored filenames among URLs/paths; references outside the store are ignored."""
+        return {
+            os.path.basename(reference.split("?", 1)[0])
+            for reference in references
+            if isinstance(reference, str) and "temp_images" in reference
+        }
+
+    def load_pinned(self) -> Set[str]:
+        """Filenames referenced by pending scheduled posts, scheduled/draft posts and live media handles."""
+        from app.database import SessionLocal
+        from app.models.media_handle import MediaHandle
+        from app.models.post import Post, PostStatus
+        from app.models.scheduled_post import ScheduledPost
+
+        references = []
+        with SessionLocal() as db:
+            for image_url, media_urls, video_url, thumbnail_url in db.query(
+                ScheduledPost.image_url, ScheduledPost.media_urls, ScheduledPost.video_url,
+                ScheduledPost.reel_thumbnail_url
+            ).filter(ScheduledPost.is_active.is_(True), ScheduledPost.status == "scheduled"):
+                references += [image_url, video_url, thumbnail_url, *(media_urls or [])]
+            for media_urls, thumbnail_url in db.query(Post.media_urls, Post.reel_thumbnail_url).filter(
+                Post.status.in_([PostStatus.SCHEDULED, PostStatus.DRAFT])
+            ):
+                references += [thumbnail_url, *(media_urls or [])]
+            references += [
+                local_path for (local_path,) in db.query(MediaHandle.local_path).filter(
+                    MediaHandle.local_path.isnot(None),
+                    MediaHandle.expires_at > datetime.now(timezone.utc)
+                )
+            ]
+        return self._referenced_filenames(references)
+
+    def _pinned_filenames(self) -> Set[str]:
+        """The referenced-file set, reloaded at most every pin_refresh_interval seconds."""
+        if time.time() - self._pinned_at > self.pin_refresh_interval:
+            try:
+                self._pinned = self.load_pinned()
+            except Exception as e:
+                # Keep the last known set; evicting a referenced file is worse than overshooting the budget
+                logger.error(f"Error loading referenced local media: {e}")
+            self._pinned_at = time.time()
+        return self._pinned
+
+    def _enforce_budget(self):
+        now = time.time()
+        pinned = self._pinned_filenames()
+        with self._lock:
+            for filename, entry in list(self._index.items()):
+                if now - entry["touched_at"] > self.max_age_seconds and filename not in pinned:
+                    self._evict(filename, "expired_evictions")
+            for filename, entry in list(self._index.items()):
+                if self._bytes_used <= self.max_bytes and len(self._index) <= self.max_files:
+                    break
+                if now - entry["touched_at"] < self.min_age_seconds:
+                    break
+                if filename not in pinned:
+                    self._evict(filename, "lru_evictions")
+
+    def rescan(self):
+        """Rebuild the index from disk (covers files written by other workers), oldest first."""
+        entries = []
+        now = time.time()
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if os.path.basename(dirpath) == STAGING_DIRNAME:
+                # Staging leftovers from crashed writes
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        if now - os.path.getmtime(path) > self.max_age_seconds:
+                            os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            for name in filenames:
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name, stat.st_size))
+
+        with self._lock:
+            self._index = OrderedDict(
+                (name, {"size": size, "touched_at": mtime}) for mtime, name, size in sorted(entries)
+            )
+            self._bytes_used = sum(size for _, _, size in entries)
+
+    async def start(self):
+        """Background janitor: rescan, expire and evict on an interval."""
+        self.is_running = True
+        logger.info("🚀 Starting local media store janitor...")
+        loop = asyncio.get_event_loop()
+        while self.is_running:
+            try:
+                await loop.run_in_executor(None, self.run_janitor)
+            except Exception as e:
+                logger.error(f"Error in local media store janitor: {e}")
+            await asyncio.sleep(self.janitor_interval)
+
+    def stop(self):
+        self.is_running = False
+        logger.info("🛑 Stopping local media store janitor...")
+
+    def run_janitor(self):
+        before = self.stats["lru_evictions"] + self.stats["expired_evictions"]
+        self.rescan()
+        self._pinned_at = 0.0  # Always evict against fresh references
+        self._enforce_budget()
+        self.stats["janitor_runs"] += 1
+        self.stats["last_janitor_at"] = time.time()
+        evicted = self.stats["lru_evictions"] + self.stats["expired_evictions"] - before
+        if evicted:
+            logger.info(f"🧹 Local media janitor evicted {evicted} files ({self._bytes_used // (1024 * 1024)} MB in use)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "files": len(self._index),
+            "bytes_used": self._bytes_used,
+            "max_bytes": self.max_bytes,
+            "max_files": self.max_files,
+            "max_age_hours": self.max_age_seconds // 3600,
+            "pinned_files": len(self._pinned)
+        }
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with long-lived cache headers; stored filenames are unique and never rewritten."""
+
+    def __init__(self, *args, max_age: int = 86400, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age}, immutable"
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = self.cache_control
+        return response
+
+
+# Create a singleton instance
+local_media_store = LocalMediaStore()
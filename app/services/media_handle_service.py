@@ -0,0 +1,101 @@
+"""
+Media handles for preview-then-publish.
+
+Generated media is hosted once when it is generated. The generate endpoints
+hand the client an opaque handle instead of image bytes, and the create-post
+endpoints resolve that handle back to the hosted URL or local file, so
+publishing a previewed image neither re-sends nor re-uploads it.
+"""
+
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+from app.database import SessionLocal
+from app.models.media_handle import MediaHandle
+
+logger = logging.getLogger(__name__)
+
+
+class MediaHandleService:
+    """Issues, resolves and expires media handles."""
+
+    def __init__(self):
+        self.ttl = timedelta(hours=24)
+        self.purge_interval = 3600  # Seconds between purges of expired handles
+        self._last_purge = 0.0
+
+    def create_handle(self, user_id: int, public_url: Optional[str] = None, local_path: Optional[str] = None,
+                      media_type: str = "image", size_bytes: Optional[int] = None,
+                      source: Optional[str] = None) -> Dict[str, Any]:
+        """Register already-stored media and return {"media_handle", "expires_at"}."""
+        handle = secrets.token_urlsafe(24)
+        expires_at = datetime.now(timezone.utc) + self.ttl
+        with SessionLocal() as db:
+            db.add(MediaHandle(
+                handle=handle,
+                user_id=user_id,
+                media_type=media_type,
+                public_url=public_url,
+                local_path=local_path,
+                size_bytes=size_bytes,
+                source=source,
+                expires_at=expires_at
+            ))
+            db.commit()
+
+        if time.time() - self._last_purge > self.purge_interval:
+            self.purge_expired()
+        return {"media_handle": handle, "expires_at": expires_at.isoformat()}
+
+    def resolve(self, handle: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Return the stored media for a live handle owned by the user, or None."""
+        with SessionLocal() as db:
+            record = db.query(MediaHandle).filter(
+                MediaHandle.handle == handle,
+                MediaHandle.user_id == user_id,
+                MediaHandle.expires_at > datetime.now(timezone.utc)
+            ).first()
+            if not record:
+                return None
+            local_path = record.local_path if record.local_path and os.path.exists(record.local_path) else None
+            if not record.public_url and not local_path:
+                return None
+            return {
+                "public_url": record.public_url,
+                "local_path": local_path,
+                "media_type": record.media_type,
+                "size_bytes": record.size_bytes
+            }
+
+    def set_public_url(self, handle: str, user_id: int, public_url: str) -> bool:
+        """Record the hosted URL of local-only media so later resolves skip the upload."""
+        with SessionLocal() as db:
+            updated = db.query(MediaHandle).filter(
+                MediaHandle.handle == handle,
+                MediaHandle.user_id == user_id
+            ).update({MediaHandle.public_url: public_url}, synchronize_session=False)
+            db.commit()
+        return bool(updated)
+
+    def purge_expired(self) -> int:
+        """Delete expired handles."""
+        self._last_purge = time.time()
+        try:
+            with SessionLocal() as db:
+                deleted = db.query(MediaHandle).filter(
+                    MediaHandle.expires_at <= datetime.now(timezone.utc)
+                ).delete(synchronize_session=False)
+                db.commit()
+            if deleted:
+                logger.info(f"🧹 Purged {deleted} expired media handles")
+            return deleted
+        except Exception as e:
+            logger.error(f"Error purging expired media handles: {e}")
+            return 0
+
+
+# Create a singleton instance
+media_handle_service = MediaHandleService()
@@ -0,0 +1,199 @@
+"""
+Async public hosting for generated media.
+
+Remote providers (IMGBB, Cloudinary) are tried in the configured order. If
+the current provider has not answered within the hedge delay, the next one is
+started alongside it, and the first public URL wins. Every provider sits
+behind its shared circuit breaker (app.utils.resilience), so one that keeps
+failing is skipped until it recovers. When no remote provider succeeds, the
+image is served from the local media store.
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import time
+from typing import Dict, Any
+import httpx
+from app.config import get_settings
+from app.services.cloudinary_service import cloudinary_service
+from app.services.local_media_store import local_media_store
+from app.utils.resilience import get_provider, resilient_transport
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class ImgbbProvider:
+    name = "imgbb"
+
+    def __init__(self):
+        self.api_key = settings.imgbb_api_key.strip() if settings.imgbb_api_key else None
+        self.endpoint = "https://api.imgbb.com/1/upload"
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0),
+                                        transport=resilient_transport("imgbb"))
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    async def upload(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        response = await self.client.post(
+            self.endpoint,
+            params={"key": self.api_key},
+            data={"image": base64.b64encode(image_bytes).decode("ascii"), "name": filename}
+        )
+        if response.status_code != 200:
+            return {"success": False, "error": f"IMGBB upload failed ({response.status_code}): {response.text[:200]}"}
+        json_resp = response.json()
+        if not json_resp.get("success"):
+            return {"success": False, "error": f"IMGBB upload returned success=false: {json_resp}"}
+        # display_url is a direct image URL, better for Facebook
+        return {"success": True, "url": json_resp["data"].get("display_url")}
+
+
+class CloudinaryProvider:
+    name = "cloudinary"
+
+    def is_configured(self) -> bool:
+        return cloudinary_service.is_configured()
+
+    async def upload(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, cloudinary_service.upload_image, image_bytes)
+
+
+class LocalProvider:
+    name = "local"
+
+    def is_configured(self) -> bool:
+        return True
+
+    async def upload(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        path = local_media_store.path_for(filename)
+        if not os.path.exists(path):
+            loop = asyncio.get_event_loop()
+            path = await loop.run_in_executor(None, local_media_store.write_bytes, image_bytes, filename)
+        return {"success": True, "url": local_media_store.url_for_path(path)}
+
+
+class MediaHostingService:
+    """Hedged, circuit-broken upload of images to the first available public host."""
+
+    def __init__(self):
+        available = {p.name: p for p in (ImgbbProvider(), CloudinaryProvider())}
+        order = [name.strip() for name in settings.media_hosting_order.split(",") if name.strip()]
+        self.providers = [available[name] for name in order if name in available]
+        self.local_provider = LocalProvider()
+        self.hedge_delay = settings.media_hosting_hedge_ms / 1000
+        self.upload_timeout = 45.0
+        # Breakers are recorded by the IMGBB transport and by cloudinary_service, which
+        # also guard uploads made outside this service; here they only decide what to skip
+        self.resilience = {p.name: get_provider(p.name) for p in self.providers}
+        self.stats = {p.name: {"wins": 0, "attempts": 0, "total_latency": 0.0} for p in self.providers}
+        self.stats["local"] = {"wins": 0, "attempts": 0, "total_latency": 0.0}
+        self.stats_hedges = 0
+
+    async def _attempt(self, provider, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        self.stats[provider.name]["attempts"] += 1
+        try:
+            result = await asyncio.wait_for(provider.upload(image_bytes, filename), self.upload_timeout)
+        except asyncio.TimeoutError:
+            result = {"success": False, "error": f"{provider.name} upload timed out after {self.upload_timeout}s"}
+        except Exception as e:
+            result = {"success": False, "error": f"{provider.name} upload failed: {e}"}
+
+        latency = time.monotonic() - started
+        self.stats[provider.name]["total_latency"] += latency
+        if result.get("success") and result.get("url"):
+            return {**result, "provider": provider.name, "latency_seconds": round(latency, 3)}
+        logger.warning(f"⚠️ Media hosting via {provider.name} failed: {result.get('error')}")
+        return {"success": False, "provider": provider.name, "error": result.get("error", "Unknown error")}
+
+    async def _host_remote(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        queue = [p for p in self.providers if p.is_configured()]
+        errors: Dict[str, str] = {}
+        tasks: Dict[asyncio.Task, Any] = {}
+
+        def launch_next() -> bool:
+            # Breakers are consulted only when a provider is actually about to be called
+            while queue:
+                provider = queue.pop(0)
+                if self.resilience[provider.name].is_available():
+                    tasks[asyncio.create_task(self._attempt(provider, image_bytes, filename))] = provider
+                    return True
+                errors[provider.name] = "circuit open"
+            return False
+
+        if not launch_next():
+            errors.setdefault("all", "No remote media host configured or available")
+            return {"success": False, "errors": errors}
+
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=self.hedge_delay if queue else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Current providers are slow: hedge with the next one
+                    if launch_next():
+                        self.stats_hedges += 1
+                    continue
+                for task in done:
+                    provider = tasks.pop(task)
+                    result = task.result()
+                    if result["success"]:
+                        self.stats[provider.name]["wins"] += 1
+                        return result
+                    errors[provider.name] = result["error"]
+                if not tasks:
+                    launch_next()
+        finally:
+            for task in tasks:
+                task.cancel()
+        return {"success": False, "errors": errors}
+
+    async def host_image(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        """
+        Return {"success", "url", "provider", "is_public"} for the first host that accepts the image.
+
+        Falls back to the local media store (is_public False) when every remote host fails.
+        """
+        result = await self._host_remote(image_bytes, filename)
+        if result["success"]:
+            return {**result, "is_public": True}
+
+        logger.warning(f"No remote media host succeeded ({result['errors']}), serving {filename} locally")
+        local = await self._attempt(self.local_provider, image_bytes, filename)
+        if local["success"]:
+            self.stats["local"]["wins"] += 1
+        return {**local, "is_public": False, "remote_errors": result["errors"]}
+
+    async def close(self):
+        """Close the pooled IMGBB client."""
+        for provider in self.providers:
+            client = getattr(provider, "client", None)
+            if client is not None and not client.is_closed:
+                await client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        providers = {}
+        for name, stats in self.stats.items():
+            providers[name] = {
+                "wins": stats["wins"],
+                "attempts": stats["attempts"],
+                "avg_latency_seconds": round(stats["total_latency"] / stats["attempts"], 3) if stats["attempts"] else None
+            }
+            if name in self.resilience:
+                providers[name]["circuit"] = self.resilience[name].breaker.get_status()
+        return {
+            "order": [p.name for p in self.providers] + ["local"],
+            "hedge_delay_seconds": self.hedge_delay,
+            "hedges": self.stats_hedges,
+            "providers": providers
+        }
+
+
+# Create a singleton instance
+media_hosting_service = MediaHostingService()
@@ -0,0 +1,362 @@
+"""
+Engagement metrics ingestion for published posts.
+
+A background loop selects published Facebook/Instagram posts whose metrics are
+due: fresh posts are polled often and older ones progressively less. Their
+counts are fetched with batched Graph multi-ID requests (up to 50 objects
+per call, grouped by access token). The counts are written to the Post rows
+with one bulk update. A row goes into post_metric_snapshots only when a
+post's counts changed, which keeps the time series compact for trend queries.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Set, Tuple
+import httpx
+from sqlalchemy import and_, func, or_
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.models.post import MEDIA_SYNC_SOURCE, Post, PostStatus
+from app.models.post_metric_snapshot import PostMetricSnapshot
+from app.models.social_account import SocialAccount
+from app.services.analytics_rollup_service import analytics_rollup_service
+from app.services.graph_rate_governor import graph_rate_governor, graph_priority, POLL
+from app.services.token_health_service import token_health_service
+from app.utils.resilience import resilient_transport
+
+logger = logging.getLogger(__name__)
+
+GRAPH_API_BASE = "https://graph.facebook.com/v23.0"
+
+# (max post age, polling interval): younger posts are polled more often
+POLL_TIERS = [
+    (timedelta(days=1), timedelta(minutes=15)),
+    (timedelta(days=7), timedelta(hours=2)),
+    (timedelta(days=30), timedelta(hours=12)),
+    (None, timedelta(days=7)),
+]
+
+METRIC_FIELDS = {
+    "instagram": "like_count,comments_count",
+    "facebook": "shares,reactions.summary(total_count).limit(0),comments.summary(total_count).limit(0)",
+    # Photo and Video nodes (posts stored by their media id) have no shares field
+    "facebook_media": "reactions.summary(total_count).limit(0),comments.summary(total_count).limit(0)",
+}
+
+
+# Graph errors about one object (deleted, unsupported or unknown id); other objects in the batch are fine
+OBJECT_ERROR_CODES = {100, 803}
+
+
+class GraphBatchError(Exception):
+    """A metrics batch failed for a reason other than one of its objects; its posts stay due."""
+
+    def __init__(self, code: Optional[int], message: str):
+        super().__init__(f"Graph error {code}: {message}")
+        self.code = code
+
+
+def _is_token_error(code: Optional[int]) -> bool:
+    """Invalid/expired token (102, 190) or missing permission (10, 200-299)."""
+    return code in (10, 102, 190) or (code is not None and 200 <= code <= 299)
+
+
+def _field_set(platform: str, platform_post_id: str) -> str:
+    """METRIC_FIELDS key for an object; page posts have "<page id>_<post id>" ids."""
+    if platform == "facebook" and "_" not in platform_post_id:
+        return "facebook_media"
+    return platform
+
+
+def _parse_metrics(platform: str, data: Dict[str, Any]) -> Dict[str, int]:
+    if platform == "instagram":
+        return {
+            "likes_count": data.get("like_count") or 0,
+            "comments_count": data.get("comments_count") or 0,
+        }
+    return {
+        "likes_count": (data.get("reactions") or {}).get("summary", {}).get("total_count", 0),
+        "comments_count": (data.get("comments") or {}).get("summary", {}).get("total_count", 0),
+        "shares_count": (data.get("shares") or {}).get("count", 0),
+    }
+
+
+class PostMetricsService:
+    """Tiered, batched ingestion of post engagement metrics."""
+
+    def __init__(self):
+        self.is_running = False
+        self.check_interval = 300  # Seconds between ingestion runs
+        self.batch_size = 50  # Graph multi-ID lookup limit
+        self.max_posts_per_run = 2000
+        self.max_concurrent_requests = 4
+        self.unavailable_ttl = 86400  # Seconds an object whose lookup failed is left out of batches
+        self._unavailable: Dict[str, float] = {}  # platform_post_id -> time its single lookup failed
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"runs": 0, "posts_polled": 0, "posts_changed": 0, "graph_requests": 0,
+                      "graph_errors": 0, "unavailable_skipped": 0, "last_run_at": None,
+                      "last_run_seconds": None}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0),
+                                             event_hooks=graph_rate_governor.httpx_event_hooks(),
+                                             transport=resilient_transport("graph"))
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+
+    async def start(self):
+        """Ingest due metrics on an interval."""
+        self.is_running = True
+        logger.info("🚀 Starting post metrics ingestion...")
+        while self.is_running:
+            try:
+                with graph_priority(POLL):
+                    await self.run_once()
+            except Exception as e:
+                logger.error(f"Error in post metrics ingestion: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def stop(self):
+        self.is_running = False
+        logger.info("🛑 Stopping post metrics ingestion...")
+
+    # ---- selection ----
+
+    def _due_posts(self) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        tier_clauses = []
+        newer_than = None
+        for max_age, interval in POLL_TIERS:
+            age_clause = [Post.published_at <= now - newer_than] if newer_than else []
+            if max_age is not None:
+                age_clause.append(Post.published_at > now - max_age)
+            tier_clauses.append(and_(
+                *age_clause,
+                or_(Post.metrics_updated_at.is_(None), Post.metrics_updated_at < now - interval)
+            ))
+            newer_than = max_age
+
+        with SessionLocal() as db:
+            rows = db.query(
+                Post.id, Post.platform_post_id, Post.social_account_id, Post.user_id, Post.published_at,
+                Post.likes_count, Post.comments_count, Post.shares_count, Post.views_count,
+                SocialAccount.platform, SocialAccount.access_token, SocialAccount.platform_data,
+                SocialAccount.follower_count,
+                (func.coalesce(Post.platform_response["source"].as_string(), "") == MEDIA_SYNC_SOURCE).label("synced")
+            ).join(SocialAccount, SocialAccount.id == Post.social_account_id).filter(
+                Post.status == PostStatus.PUBLISHED,
+                Post.platform_post_id.isnot(None),
+                Post.published_at.isnot(None),
+                SocialAccount.is_connected == True,
+                SocialAccount.platform.in_(["facebook", "instagram"]),
+                or_(*tier_clauses)
+            ).order_by(Post.metrics_updated_at.asc().nullsfirst()).limit(self.max_posts_per_run).all()
+
+        posts = []
+        for row in rows:
+            if row.platform == "instagram":
+                token = (row.platform_data or {}).get("page_access_token")
+            else:
+                token = row.access_token
+            if token:
+                posts.append({**row._asdict(), "token": token})
+        return posts
+
+    # ---- fetching ----
+
+    async def _fetch_batch(self, field_set: str, token: str, ids: List[str],
+                           semaphore: asyncio.Semaphore, rejected_tokens: Set[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch metrics for up to batch_size objects.
+
+        Graph fails a whole multi-ID request if any one object is unavailable
+        (e.g. deleted), so a batch failing with an object error is split in
+        halves until the bad objects are isolated: one bad ID in 50 costs about
+        a dozen requests rather than 50. Isolated failures are left out of
+        later batches for unavailable_ttl. Any other error raises
+        GraphBatchError without bisecting; a token or permission error also
+        reports the token to token health and stops every other batch using
+        it this run (rejected_tokens).
+        """
+        if token in rejected_tokens:
+            raise GraphBatchError(190, "access token rejected earlier in this run")
+        async with semaphore:
+            self.stats["graph_requests"] += 1
+            response = await self._get_client().get(
+                f"{GRAPH_API_BASE}/",
+                params={"ids": ",".join(ids), "fields": METRIC_FIELDS[field_set], "access_token": token}
+            )
+        if response.status_code == 200:
+            return response.json()
+
+        self.stats["graph_errors"] += 1
+        try:
+            error = response.json().get("error") or {}
+        except ValueError:
+            error = {}
+        code = error.get("code")
+        if _is_token_error(code):
+            if token not in rejected_tokens:
+                rejected_tokens.add(token)
+                token_health_service.report_auth_error(token)
+            raise GraphBatchError(code, error.get("message", "access token rejected"))
+        if code not in OBJECT_ERROR_CODES:
+            raise GraphBatchError(code, error.get("message") or response.text[:200])
+        if len(ids) == 1:
+            logger.warning(f"Metrics lookup failed for {field_set} object {ids[0]}: {response.text[:200]}")
+            self._unavailable[ids[0]] = time.monotonic()
+            return {}
+        middle = len(ids) // 2
+        halves = await asyncio.gather(
+            self._fetch_batch(field_set, token, ids[:middle], semaphore, rejected_tokens),
+            self._fetch_batch(field_set, token, ids[middle:], semaphore, rejected_tokens)
+        )
+        return {**halves[0], **halves[1]}
+
+    def _is_unavailable(self, platform_post_id: str) -> bool:
+        failed_at = self._unavailable.get(platform_post_id)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at > self.unavailable_ttl:
+            del self._unavailable[platform_post_id]
+            return False
+        return True
+
+    # ---- writing ----
+
+    def _write(self, posts: List[Dict[str, Any]], fetched: Dict[str, Dict[str, Any]],
+               retry_ids: Set[str]) -> int:
+        """Store fetched metrics; posts in retry_ids (batch errored) stay due for the next run."""
+        now = datetime.now(timezone.utc)
+        updates = []
+        snapshots = []
+        engagement_deltas = defaultdict(Counter)
+        for post in posts:
+            if post["platform_post_id"] in retry_ids:
+                continue
+            data = fetched.get(post["platform_post_id"])
+            update = {"id": post["id"], "metrics_updated_at": now}
+            if data:
+                metrics = {
+                    "likes_count": post["likes_count"] or 0,
+                    "comments_count": post["comments_count"] or 0,
+                    "shares_count": post["shares_count"] or 0,
+                    "views_count": post["views_count"] or 0,
+                    **_parse_metrics(post["platform"], data)
+                }
+                interactions = metrics["likes_count"] + metrics["comments_count"] + metrics["shares_count"]
+                engagement_rate = (
+                    f"{interactions / post['follower_count'] * 100:.2f}" if post["follower_count"] else None
+                )
+                update.update(metrics, engagement_rate=engagement_rate)
+                changed = any(metrics[k] != (post[k] or 0) for k in metrics)
+                previous = (post["likes_count"] or 0) + (post["comments_count"] or 0) + (post["shares_count"] or 0)
+                # Rollups only count posts published from the app, not media imported by the sync
+                if interactions != previous and not post["synced"]:
+                    day = post["published_at"].astimezone(timezone.utc).date()
+                    engagement_deltas[(post["user_id"], post["social_account_id"], day)]["engagement_total"] += \
+                        interactions - previous
+                if changed:
+                    snapshots.append({
+                        "post_id": post["id"],
+                        "social_account_id": post["social_account_id"],
+                        **metrics,
+                        "engagement_rate": engagement_rate,
+                        "captured_at": now
+                    })
+            updates.append(update)
+
+        if not updates:
+            return 0
+        with SessionLocal() as db:
+            db.bulk_update_mappings(Post, updates)
+            if snapshots:
+                db.bulk_insert_mappings(PostMetricSnapshot, snapshots)
+            db.commit()
+
+        # Engagement deltas feed the daily rollups of the day each post was published
+        analytics_rollup_service.record_many(engagement_deltas)
+        return len(snapshots)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Poll every due post once; returns a summary."""
+        started = time.monotonic()
+        posts = await run_in_threadpool(self._due_posts)
+        if not posts:
+            return {"polled": 0, "changed": 0}
+
+        groups: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        for post in posts:
+            if self._is_unavailable(post["platform_post_id"]):
+                self.stats["unavailable_skipped"] += 1
+                continue
+            field_set = _field_set(post["platform"], post["platform_post_id"])
+            groups[(field_set, post["token"])].append(post["platform_post_id"])
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        rejected_tokens: Set[str] = set()
+        requests_before = self.stats["graph_requests"]
+        batch_ids = [
+            (field_set, token, ids[i:i + self.batch_size])
+            for (field_set, token), ids in groups.items()
+            for i in range(0, len(ids), self.batch_size)
+        ]
+        results = await asyncio.gather(
+            *(self._fetch_batch(field_set, token, ids, semaphore, rejected_tokens)
+              for field_set, token, ids in batch_ids),
+            return_exceptions=True
+        )
+        fetched: Dict[str, Dict[str, Any]] = {}
+        retry_ids: Set[str] = set()
+        for (_, _, ids), result in zip(batch_ids, results):
+            if isinstance(result, Exception):
+                # Network trouble, an open circuit or a rejected token says nothing about these posts;
+                # poll them next run
+                self.stats["graph_errors"] += 1
+                logger.warning(f"Metrics batch failed: {result}")
+                retry_ids.update(ids)
+                continue
+            fetched.update(result)
+
+        changed = await run_in_threadpool(self._write, posts, fetched, retry_ids)
+        elapsed = time.monotonic() - started
+        self.stats["runs"] += 1
+        self.stats["posts_polled"] += len(posts)
+        self.stats["posts_changed"] += changed
+        self.stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        self.stats["last_run_seconds"] = round(elapsed, 2)
+        requests = self.stats["graph_requests"] - requests_before
+        logger.info(f"📊 Polled metrics for {len(posts)} posts in {requests} Graph requests, "
+                    f"{changed} changed ({elapsed:.2f}s)")
+        return {"polled": len(posts), "changed": changed, "requests": requests}
+
+    # ---- reads ----
+
+    def get_post_history(self, post_id: int, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Metric snapshots for a post, oldest first."""
+        with SessionLocal() as db:
+            query = db.query(PostMetricSnapshot).filter(PostMetricSnapshot.post_id == post_id)
+            if since:
+                query = query.filter(PostMetricSnapshot.captured_at >= since)
+            return [{
+                "captured_at": s.captured_at.isoformat(),
+                "likes_count": s.likes_count,
+                "comments_count": s.comments_count,
+                "shares_count": s.shares_count,
+                "views_count": s.views_count,
+                "engagement_rate": s.engagement_rate
+            } for s in query.order_by(PostMetricSnapshot.captured_at.asc()).all()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+# Create a singleton instance
+post_metrics_service = PostMetricsService()
@@ -0,0 +1,114 @@
+"""
+Replied-comment index for Instagram auto-replies.
+
+Answers "have we already replied to these comments?" for whole batches of
+comment IDs. A bounded in-memory LRU of known-replied IDs sits in front of the
+instagram_auto_reply_log table; misses are resolved with a single
+`WHERE comment_id IN (...)` query per chunk and marks are written with one
+`INSERT ... ON CONFLICT DO NOTHING` per chunk.
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set, Any
+from sqlalchemy.orm import Session
+from app.models.instagram_auto_reply_log import InstagramAutoReplyLog
+
+logger = logging.getLogger(__name__)
+
+
+class RepliedCommentIndex:
+    """Bulk replied-comment lookups backed by an LRU front and the auto-reply log table."""
+
+    def __init__(self, max_cached_ids: int = 50000, chunk_size: int = 500):
+        self.max_cached_ids = max_cached_ids
+        self.chunk_size = chunk_size  # Max IDs per IN (...) / VALUES list
+        self._replied: "OrderedDict[str, None]" = OrderedDict()
+        self.stats = {"cache_hits": 0, "db_lookups": 0, "db_hits": 0, "marked": 0, "evictions": 0}
+
+    def _remember(self, comment_ids: Iterable[str]):
+        for comment_id in comment_ids:
+            self._replied[comment_id] = None
+            self._replied.move_to_end(comment_id)
+        while len(self._replied) > self.max_cached_ids:
+            self._replied.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_replied(self, comment_ids: Iterable[str], instagram_user_id: str, db: Session) -> Set[str]:
+        """Return the subset of comment_ids that already have an auto-reply."""
+        replied = set()
+        misses = []
+        for comment_id in dict.fromkeys(comment_ids):
+            if comment_id in self._replied:
+                self._replied.move_to_end(comment_id)
+                replied.add(comment_id)
+            else:
+                misses.append(comment_id)
+        self.stats["cache_hits"] += len(replied)
+
+        found = []
+        for i in range(0, len(misses), self.chunk_size):
+            chunk = misses[i:i + self.chunk_size]
+            rows = db.query(InstagramAutoReplyLog.comment_id).filter(
+                InstagramAutoReplyLog.instagram_user_id == instagram_user_id,
+                InstagramAutoReplyLog.comment_id.in_(chunk)
+            ).all()
+            self.stats["db_lookups"] += 1
+            found.extend(row[0] for row in rows)
+
+        self.stats["db_hits"] += len(found)
+        self._remember(found)
+        replied.update(found)
+        return replied
+
+    def filter_unreplied(self, comments: List[Dict[str, Any]], instagram_user_id: str, db: Session) -> List[Dict[str, Any]]:
+        """Drop comments (dicts with an "id") that were already replied to."""
+        replied = self.get_replied([c["id"] for c in comments], instagram_user_id, db)
+        return [c for c in comments if c["id"] not in replied]
+
+    def mark_replied(self, comment_ids: Iterable[str], instagram_user_id: str, db: Session):
+        """Record comment_ids as replied, ignoring ones that are already logged."""
+        comment_ids = [c for c in dict.fromkeys(comment_ids) if c not in self._replied]
+        if not comment_ids:
+            return
+
+        dialect = db.bind.dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            insert = None
+
+        newly_logged = 0
+        for i in range(0, len(comment_ids), self.chunk_size):
+            chunk = comment_ids[i:i + self.chunk_size]
+            rows = [{"comment_id": c, "instagram_user_id": instagram_user_id} for c in chunk]
+            if insert is not None:
+                stmt = insert(InstagramAutoReplyLog).values(rows).on_conflict_do_nothing(
+                    index_elements=["comment_id"]
+                )
+                newly_logged += db.execute(stmt).rowcount
+            else:
+                existing = self.get_replied(chunk, instagram_user_id, db)
+                new_rows = [row for row in rows if row["comment_id"] not in existing]
+                db.add_all(InstagramAutoReplyLog(**row) for row in new_rows)
+                newly_logged += len(new_rows)
+        db.commit()
+
+        self.stats["marked"] += len(comment_ids)
+        self._remember(comment_ids)
+
+        from app.services.analytics_rollup_service import analytics_rollup_service
+        analytics_rollup_service.record_instagram_replies(instagram_user_id, newly_logged)
+
+    def reset(self):
+        """Clear the in-memory front (the database log is untouched)."""
+        self._replied.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "cached_ids": len(self._replied), "max_cached_ids": self.max_cached_ids}
+
+
+# Create a singleton instance
+replied_comment_index = RepliedCommentIndex()
@@ -13,6 +13,8 @@ from app.services.auto_reply_service import auto_reply_service
 from app.services.instagram_service import instagram_service
 from app.services.cloudinary_service import cloudinary_service
 from app.services.notification_service import notification_service
+from app.services.graph_rate_governor import graph_rate_governor, graph_priority, POLL
+from app.utils.resilience import jitter
 import pytz
 from pytz import timezone, UTC
 import base64
@@ -182,6 +184,32 @@ class SchedulerService:
             logger.error(f"Error generating and uploading image: {e}")
             return {"success": False, "error": str(e)}
 
+    async def generate_and_upload_images(self, prompt: str, count: int, post_type: str = "feed") -> dict:
+        """Generate prompt variations concurrently and upload them to Cloudinary in parallel"""
+        try:
+            logger.info(f"🎨 Generating {count} AI images for prompt: '{prompt[:50]}...'")
+            images_result = await instagram_service.generate_instagram_images_with_ai(prompt, count, post_type)
+            errors = list(images_result.get("errors", []))
+            
+            loop = asyncio.get_event_loop()
+            uploads = await asyncio.gather(*[
+                loop.run_in_executor(None, cloudinary_service.upload_image_with_instagram_transform, image["image_bytes"])
+                for image in images_result.get("images", [])
+            ])
+            cloudinary_urls = []
+            for upload in uploads:
+                if upload["success"]:
+                    cloudinary_urls.append(upload["url"])
+                else:
+                    errors.append(f"Cloudinary upload failed: {upload.get('error')}")
+            
+            logger.info(f"✅ Generated and uploaded {len(cloudinary_urls)}/{count} images in {images_result.get('elapsed_seconds', 0)}s")
+            return {"success": bool(cloudinary_urls), "cloudinary_urls": cloudinary_urls, "errors": errors}
+            
+        except Exception as e:
+            logger.error(f"Error generating and uploading images: {e}")
+            return {"success": False, "cloudinary_urls": [], "errors": [str(e)]}
+
     async def generate_and_upload_video(self, prompt: str) -> dict:
         """Generate AI video and upload to Cloudinary (placeholder for future implementation)"""
         try:
@@ -260,7 +288,7 @@ class SchedulerService:
                                 scheduled_post.retry_count += 1
                                 retry_delay = 10 * scheduled_post.retry_count  # Exponential backoff
                                 logger.info(f"🔄 AI rate limit detected, rescheduling post {scheduled_post.id} for {retry_delay} minutes later (retry {scheduled_post.retry_count}/5)")
-                                scheduled_post.scheduled_datetime = datetime.utcnow() + timedelta(minutes=retry_delay)
+                                scheduled_post.scheduled_datetime = datetime.utcnow() + timedelta(minutes=jitter(retry_delay))
                                 scheduled_post.last_executed = datetime.utcnow()
                                 db.commit()
                                 return
@@ -283,16 +311,10 @@ class SchedulerService:
                     logger.info(f"🎨 No media URLs found for carousel post, generating AI images...")
                     # Generate 3-5 images for carousel
                     num_images = min(5, max(3, len(scheduled_post.prompt) // 100 + 3))  # Dynamic number based on prompt length
-                    carousel_urls = []
-                    
-                    for i in range(num_images):
-                        # Create variations of the prompt for diversity
-                        variation_prompt = f"{scheduled_post.prompt} - variation {i+1}"
-                        image_result = await self.generate_and_upload_image(variation_prompt, "feed")
-                        if image_result["success"]:
-                            carousel_urls.append(image_result["cloudinary_url"])
-                        else:
-                            logger.error(f"❌ Failed to generate carousel image {i+1}: {image_result.get('error')}")
+                    images_result = await self.generate_and_upload_images(scheduled_post.prompt, num_images, "feed")
+                    carousel_urls = images_result.get("cloudinary_urls", [])
+                    for error in images_result.get("errors", []):
+                        logger.error(f"❌ Failed to generate carousel image: {error}")
                     
                     if len(carousel_urls) >= 3:
                         scheduled_post.media_urls = carousel_urls
@@ -306,7 +328,7 @@ class SchedulerService:
                                 scheduled_post.retry_count += 1
                                 retry_delay = 10 * scheduled_post.retry_count  # Exponential backoff
                                 logger.info(f"🔄 No carousel images generated (likely rate limit), rescheduling post {scheduled_post.id} for {retry_delay} minutes later (retry {scheduled_post.retry_count}/5)")
-                                scheduled_post.scheduled_datetime = datetime.utcnow() + timedelta(minutes=retry_delay)
+                                scheduled_post.scheduled_datetime = datetime.utcnow() + timedelta(minutes=jitter(retry_delay))
                                 scheduled_post.last_executed = datetime.utcnow()
                                 db.commit()
                                 return
@@ -473,8 +495,15 @@ class SchedulerService:
                             if scheduled_post.retry_count < 3:  # Max 3 retries
                                 scheduled_post.retry_count += 1
                                 retry_delay = 15 * scheduled_post.retry_count  # Exponential backoff
+                                # When Graph told us when access returns, retry right after that instead
+                                throttled_for = graph_rate_governor.retry_after(page_access_token)
+                                if throttled_for > 0:
+                                    retry_delay = max(1, int(throttled_for // 60) + 1)
+                                # Jittered so posts that failed together don't all retry in the same minute,
+                                # but never before Graph's throttle window ends
+                                retry_seconds = max(jitter(retry_delay) * 60, throttled_for)
                                 logger.info(f"🔄 Temporary error detected, rescheduling post {scheduled_post.id} for {retry_delay} minutes later (retry {scheduled_post.retry_count}/3)")
-                                scheduled_post.scheduled_datetime = datetime.utcnow() + timedelta(minutes=retry_delay)
+                                scheduled_post.scheduled_datetime = datetime.utcnow() + timedelta(seconds=retry_seconds)
                                 scheduled_post.last_executed = datetime.utcnow()
                                 db.commit()
                                 return
@@ -495,7 +524,7 @@ class SchedulerService:
                                 elif post_type == "reel":
                                     scheduled_post.video_url = None
                                 
-                                scheduled_post.scheduled_datetime = datetime.utcnow() + timedelta(minutes=5)
+                                scheduled_post.scheduled_datetime = datetime.utcnow() + timedelta(minutes=jitter(5))
                                 scheduled_post.last_executed = datetime.utcnow()
                                 db.commit()
                                 return
@@ -606,16 +635,17 @@ class SchedulerService:
             from app.database import SessionLocal
             db = SessionLocal()
             
-            # Process Facebook auto-replies
-            await auto_reply_service.process_auto_replies(db)
-            
-            # Process Instagram auto-replies
-            try:
-                from app.services.instagram_auto_reply_service import instagram_auto_reply_service
-                await instagram_auto_reply_service.process_auto_replies(db)
-            except ImportError:
-                # Instagram auto-reply service might not exist yet
-                pass
+            with graph_priority(POLL):
+                # Process Facebook auto-replies
+                await auto_reply_service.process_auto_replies(db)
+                
+                # Process Instagram auto-replies
+                try:
+                    from app.services.instagram_auto_reply_service import instagram_auto_reply_service
+                    await instagram_auto_reply_service.process_auto_replies(db)
+                except ImportError:
+                    # Instagram auto-reply service might not exist yet
+                    pass
             
         except Exception as e:
             logger.error(f"Error processing auto-replies: {e}")
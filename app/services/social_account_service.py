@@ -0,0 +1,130 @@
+"""
+Bulk persistence for connected social accounts.
+
+The connect flows write every page / Instagram account they discover with one
+INSERT ... ON CONFLICT (user_id, platform, platform_user_id) DO UPDATE, backed
+by the uq_social_accounts_user_platform_account index, and then create or
+re-enable the default automation rules for all of them with one lookup.
+"""
+
+import logging
+from typing import Dict, Any, Iterable, List
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.automation_rule import AutomationRule, RuleType, TriggerType
+from app.models.social_account import SocialAccount
+from app.services.upsert_index_service import upsert_index_service, SOCIAL_ACCOUNTS_INDEX
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MESSAGE_TEMPLATE = "Thank you for your message! We'll get back to you soon."
+
+
+class SocialAccountService:
+    """Bulk upsert of social accounts and their default automation rules."""
+
+    def bulk_upsert(self, db: Session, rows: List[Dict[str, Any]], update_columns: Iterable[str],
+                    keep_existing_if_null: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Insert or update account rows in one statement, within the caller's transaction.
+
+        Columns in update_columns are overwritten on conflict; those also in
+        keep_existing_if_null keep their stored value when the new one is NULL.
+        Returns {"id", "platform_user_id", "display_name"} per row. Raises
+        MissingUpsertIndexError if the conflict target's index does not exist yet.
+        """
+        # A statement may not update the same row twice, so the last duplicate wins
+        rows = list({(row["user_id"], row["platform"], row["platform_user_id"]): row for row in rows}.values())
+        if not rows:
+            return []
+        upsert_index_service.require(SOCIAL_ACCOUNTS_INDEX)
+        stmt = insert(SocialAccount).values(rows)
+        table = SocialAccount.__table__
+        keep = set(keep_existing_if_null)
+        set_ = {
+            column: func.coalesce(stmt.excluded[column], table.c[column]) if column in keep else stmt.excluded[column]
+            for column in update_columns
+        }
+        set_["updated_at"] = func.now()
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SocialAccount.user_id, SocialAccount.platform, SocialAccount.platform_user_id],
+            set_=set_
+        ).returning(SocialAccount.id, SocialAccount.platform_user_id, SocialAccount.display_name)
+        return [row._asdict() for row in db.execute(stmt)]
+
+    def ensure_auto_reply_rules(self, db: Session, user_id: int, accounts: List[Dict[str, Any]]) -> int:
+        """
+        Enable the comment and message auto-reply rules for each account (as returned by bulk_upsert).
+
+        Existing rules are re-activated with AI replies on all posts; missing ones
+        are created. Returns the number of rules created.
+        """
+        if not accounts:
+            return 0
+        account_ids = [account["id"] for account in accounts]
+        existing = {
+            (rule.social_account_id, rule.rule_type): rule
+            for rule in db.query(AutomationRule).filter(
+                AutomationRule.user_id == user_id,
+                AutomationRule.social_account_id.in_(account_ids),
+                AutomationRule.rule_type.in_([RuleType.AUTO_REPLY, RuleType.AUTO_REPLY_MESSAGE])
+            )
+        }
+
+        created = 0
+        for account in accounts:
+            rule = existing.get((account["id"], RuleType.AUTO_REPLY))
+            if rule:
+                rule.is_active = True
+                # Reassign so the JSON column change is detected; empty selection means all posts
+                rule.actions = {**(rule.actions or {}), "ai_enabled": True, "selected_facebook_post_ids": []}
+            else:
+                db.add(AutomationRule(
+                    user_id=user_id,
+                    social_account_id=account["id"],
+                    name=f"Auto Reply - {account['display_name']}",
+                    rule_type=RuleType.AUTO_REPLY,
+                    trigger_type=TriggerType.ENGAGEMENT_BASED,
+                    trigger_conditions={"event": "comment", "selected_posts": []},
+                    actions={"ai_enabled": True, "selected_facebook_post_ids": []},
+                    is_active=True
+                ))
+                created += 1
+
+            rule = existing.get((account["id"], RuleType.AUTO_REPLY_MESSAGE))
+            if rule:
+                rule.is_active = True
+                rule.actions = {**(rule.actions or {}), "ai_enabled": True,
+                                "message_template": DEFAULT_MESSAGE_TEMPLATE}
+            else:
+                db.add(AutomationRule(
+                    user_id=user_id,
+                    social_account_id=account["id"],
+                    name=f"Auto Reply Message - {account['display_name']}",
+                    rule_type=RuleType.AUTO_REPLY_MESSAGE,
+                    trigger_type=TriggerType.ENGAGEMENT_BASED,
+                    trigger_conditions={"event": "message"},
+                    actions={"ai_enabled": True, "message_template": DEFAULT_MESSAGE_TEMPLATE},
+                    is_active=True
+                ))
+                created += 1
+        return created
+
+    def accounts_owned_by_others(self, db: Session, user_id: int, platform: str,
+                                 platform_user_ids: List[str]) -> Dict[str, int]:
+        """platform_user_id -> owner user_id for accounts already connected to a different user."""
+        if not platform_user_ids:
+            return {}
+        return {
+            platform_user_id: owner_id
+            for platform_user_id, owner_id in db.query(SocialAccount.platform_user_id, SocialAccount.user_id).filter(
+                SocialAccount.platform == platform,
+                SocialAccount.platform_user_id.in_(platform_user_ids),
+                SocialAccount.user_id != user_id
+            )
+        }
+
+
+# Create a singleton instance
+social_account_service = SocialAccountService()
@@ -1,34 +1,224 @@
-import requests
+import asyncio
+import base64
+import httpx
 import logging
-from typing import Dict, Optional
+import random
+import time
+from typing import Dict, List, Optional, Any
 from app.config import get_settings
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from app.services.image_generation_cache import ImageGenerationCache
+from app.utils.resilience import ProviderUnavailable, resilient_transport
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 class StabilityService:
-    """Service for Stability AI image generation."""
-    
+    """
+    Service for Stability AI image generation.
+
+    Requests go through one pooled async client. Multi-image generation either
+    asks for samples=N in as few requests as the API allows (same prompt) or
+    issues one request per prompt concurrently under a cap (prompt variations).
+    Rate-limited requests (429) are retried with exponential backoff.
+    Single-image renders with an explicit seed are stored in a disk-backed LRU
+    cache keyed on the full generation request: the preview endpoints return
+    the seed they used, and regenerating with that seed reuses the stored image.
+    """
+
+    # Facebook-optimized dimensions (must be multiples of 64)
+    FACEBOOK_DIMENSIONS = {
+        "feed": (1216, 640),      # Standard Facebook post (close to 1200x630)
+        "story": (1088, 1920),    # Facebook Story (close to 1080x1920)
+        "cover": (1664, 832),     # Facebook Cover Photo (close to 1640x859)
+        "profile": (384, 384),    # Profile picture (close to 400x400)
+        "square": (1088, 1088)    # Square post (close to 1080x1080)
+    }
+
     def __init__(self):
-        self.api_key = os.getenv('STABILITY_API_KEY')
+        self.api_key = settings.stability_api_key.strip() if settings.stability_api_key else None
         self.api_host = "https://api.stability.ai"
         self.engine_id = "stable-diffusion-xl-1024-v1-0"
-        
+        self.facebook_engine_id = "stable-diffusion-v1-6"  # Supports the non-SDXL Facebook dimensions
+        self.max_samples_per_request = 10  # API limit for samples
+        self.max_concurrent_requests = 3
+        self.max_retries = 4  # Retries on 429 before giving up
+        self.initial_backoff = 2.0
+        self.max_backoff = 30.0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self.cache = ImageGenerationCache(settings.image_cache_dir, settings.image_cache_max_bytes)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_host,
+                timeout=httpx.Timeout(120.0, connect=10.0),
+                limits=httpx.Limits(max_connections=self.max_concurrent_requests * 2),
+                transport=resilient_transport("stability")
+            )
+        return self._client
+
+    async def close(self):
+        """Close the pooled HTTP client."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+
+    def _build_payload(self, prompt: str, negative_prompt: Optional[str], width: int, height: int,
+                       cfg_scale: float, steps: int, samples: int, seed: int = 0,
+                       style_preset: Optional[str] = None) -> Dict[str, Any]:
+        text_prompts = [{"text": prompt, "weight": 1.0}]
+        if negative_prompt:
+            text_prompts.append({"text": negative_prompt, "weight": -1.0})
+        payload = {
+            "text_prompts": text_prompts,
+            "cfg_scale": cfg_scale,
+            "height": height,
+            "width": width,
+            "samples": samples,
+            "steps": steps,
+        }
+        if seed:
+            payload["seed"] = seed
+        if style_preset:
+            payload["style_preset"] = style_preset
+        return payload
+
+    async def _post_generation(self, payload: Dict[str, Any], engine_id: Optional[str] = None) -> Dict[str, Any]:
+        """POST one text-to-image request, retrying 429s with backoff. Returns the artifacts or an error."""
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        url = f"/v1/generation/{engine_id or self.engine_id}/text-to-image"
+        delay = self.initial_backoff
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await self._get_client().post(url, headers=headers, json=payload)
+            except ProviderUnavailable as e:
+                logger.warning(f"⚡ Skipping Stability AI request: {e}")
+                return {"success": False, "error": str(e)}
+            except httpx.HTTPError as e:
+                logger.error(f"Stability AI request failed: {e}")
+                return {"success": False, "error": f"Request failed: {str(e)}"}
+
+            if response.status_code == 429:
+                if attempt == self.max_retries:
+                    logger.error("Stability AI rate limit exceeded")
+                    return {
+                        "success": False,
+                        "error": "Rate limit exceeded. Please wait a few minutes before trying again."
+                    }
+                retry_after = response.headers.get("retry-after")
+                # Jitter the backoff so concurrent generations don't retry in lockstep
+                wait = float(retry_after) if retry_after and retry_after.isdigit() else random.uniform(delay / 2, delay)
+                logger.warning(f"⏳ Stability AI rate limited, retrying in {wait:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, self.max_backoff)
+                continue
+
+            if response.status_code == 401:
+                logger.error("Stability AI API key is invalid or expired")
+                return {
+                    "success": False,
+                    "error": "Invalid or expired Stability AI API key. Please check your API key in the .env file."
+                }
+            if response.status_code != 200:
+                logger.error(f"Stability AI API error: {response.status_code} - {response.text}")
+                return {
+                    "success": False,
+                    "error": f"Stability AI API error: {response.status_code} - {response.text}"
+                }
+
+            artifacts = response.json().get("artifacts") or []
+            if not artifacts:
+                return {"success": False, "error": "No image generated"}
+            return {"success": True, "artifacts": artifacts}
+
+        return {"success": False, "error": "Rate limit exceeded. Please wait a few minutes before trying again."}
+
+    @staticmethod
+    def _decode_artifacts(artifacts: List[Dict[str, Any]], prompt: str) -> List[Dict[str, Any]]:
+        """Decode artifacts to raw bytes, dropping each base64 string as soon as it is decoded."""
+        images = []
+        for artifact in artifacts:
+            encoded = artifact.pop("base64")
+            images.append({
+                "image_bytes": base64.b64decode(encoded),
+                "seed": artifact.get("seed"),
+                "finish_reason": artifact.get("finishReason"),
+                "prompt": prompt
+            })
+            del encoded
+        artifacts.clear()
+        return images
+
+    async def _generate_one(self, prompt: str, negative_prompt: Optional[str], width: int, height: int,
+                            cfg_scale: float, steps: int, seed: int = 0, style_preset: Optional[str] = None,
+                            engine_id: Optional[str] = None, use_cache: bool = False) -> Dict[str, Any]:
+        """
+        Generate a single image, served from the image cache when the same request was made before.
+
+        Seed 0 asks Stability for a random seed, so such a request is never
+        served from the cache; its render is stored under the seed Stability
+        picked, so regenerating with the returned seed is a cache hit.
+        """
+        engine_id = engine_id or self.engine_id
+
+        def cache_key(render_seed: int) -> str:
+            return self.cache.make_key(
+                engine_id=engine_id, prompt=prompt, negative_prompt=negative_prompt, width=width, height=height,
+                cfg_scale=cfg_scale, steps=steps, seed=render_seed, style_preset=style_preset
+            )
+
+        loop = asyncio.get_event_loop()
+        if use_cache and seed:
+            cached = await loop.run_in_executor(None, self.cache.get, cache_key(seed))
+            if cached:
+                logger.info(f"🗂️ Image cache hit for prompt: {prompt[:50]}...")
+                return {"success": True, "cached": True, **cached}
+
+        started = time.monotonic()
+        payload = self._build_payload(prompt, negative_prompt, width, height, cfg_scale, steps, 1, seed, style_preset)
+        result = await self._post_generation(payload, engine_id)
+        if not result["success"]:
+            return result
+
+        image = self._decode_artifacts(result["artifacts"], prompt)[0]
+        if use_cache and image.get("seed"):
+            key = cache_key(image["seed"])
+            await loop.run_in_executor(
+                None,
+                lambda: self.cache.put(key, image["image_bytes"], image["seed"], image["finish_reason"],
+                                       time.monotonic() - started)
+            )
+        return {"success": True, "cached": False, **image}
+
     async def generate_image(
-        self, 
-        prompt: str, 
+        self,
+        prompt: str,
         negative_prompt: str = None,
         width: int = 1024,
         height: int = 1024,
         cfg_scale: float = 7.0,
         steps: int = 30,
-        samples: int = 1
+        samples: int = 1,
+        seed: int = 0,
+        style_preset: Optional[str] = None,
+        engine_id: Optional[str] = None,
+        use_cache: bool = False
     ) -> Dict:
-        """Generate an image using Stability AI."""
+        """
+        Generate an image using Stability AI.
+
+        Returns the image as base64 (image_base64) and the seed it was rendered
+        with. With use_cache=True the render is cached under that seed, and
+        repeating the request with it reuses the cached image; seed 0 always
+        generates a fresh one. `samples` is kept
+        for compatibility; use generate_images() for several images.
+        """
         try:
             # Check if API key is configured
             if not self.api_key:
@@ -37,92 +227,161 @@ class StabilityService:
                     "success": False,
                     "error": "Stability AI API key not configured. Please set STABILITY_API_KEY environment variable."
                 }
-            
-            # Log API key status (without exposing the full key)
-            api_key_status = "Configured" if self.api_key else "Not configured"
-            logger.info(f"Stability AI API key status: {api_key_status}")
-            if self.api_key:
-                logger.info(f"API key starts with: {self.api_key[:10]}...")
-            
-            url = f"{self.api_host}/v1/generation/{self.engine_id}/text-to-image"
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
-            # Prepare text prompts
-            text_prompts = [{"text": prompt, "weight": 1.0}]
-            
-            # Add negative prompt if provided
-            if negative_prompt:
-                text_prompts.append({"text": negative_prompt, "weight": -1.0})
-            
-            payload = {
-                "text_prompts": text_prompts,
-                "cfg_scale": cfg_scale,
-                "height": height,
-                "width": width,
-                "samples": samples,
-                "steps": steps,
-            }
-            
+
             logger.info(f"Making request to Stability AI with prompt: {prompt[:50]}...")
             logger.info(f"Dimensions: {width}x{height}, Steps: {steps}, CFG: {cfg_scale}")
-            response = requests.post(url, headers=headers, json=payload)
-            
-            # Handle different HTTP status codes
-            if response.status_code == 401:
-                logger.error("Stability AI API key is invalid or expired")
-                return {
-                    "success": False,
-                    "error": "Invalid or expired Stability AI API key. Please check your API key in the .env file."
-                }
-            elif response.status_code == 429:
-                logger.error("Stability AI rate limit exceeded")
-                return {
-                    "success": False,
-                    "error": "Rate limit exceeded. Please wait a few minutes before trying again."
-                }
-            elif response.status_code != 200:
-                logger.error(f"Stability AI API error: {response.status_code} - {response.text}")
-                return {
-                    "success": False,
-                    "error": f"Stability AI API error: {response.status_code} - {response.text}"
-                }
-            
-            response.raise_for_status()
-            
-            # Extract base64 image from response
-            result = response.json()
-            if "artifacts" in result and len(result["artifacts"]) > 0:
-                logger.info("Image generated successfully")
-                return {
-                    "success": True,
-                    "image_base64": result["artifacts"][0]["base64"],
-                    "seed": result["artifacts"][0].get("seed"),
-                    "finish_reason": result["artifacts"][0].get("finishReason")
-                }
-            
-            return {
-                "success": False,
-                "error": "No image generated"
-            }
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Stability AI request failed: {e}")
+            result = await self._generate_one(
+                prompt, negative_prompt, width, height, cfg_scale, steps,
+                seed=seed, style_preset=style_preset, engine_id=engine_id, use_cache=use_cache
+            )
+            if not result["success"]:
+                return result
+
+            logger.info("Image generated successfully")
             return {
-                "success": False,
-                "error": f"Request failed: {str(e)}"
+                "success": True,
+                "image_base64": base64.b64encode(result["image_bytes"]).decode("ascii"),
+                "seed": result.get("seed"),
+                "finish_reason": result.get("finish_reason"),
+                "cached": result["cached"],
+                "prompt": prompt,
+                "width": width,
+                "height": height,
+                "cfg_scale": cfg_scale,
+                "steps": steps
             }
+
         except Exception as e:
             logger.error(f"Stability AI image generation failed: {e}")
             return {
                 "success": False,
                 "error": str(e)
             }
-    
+
+    async def generate_images(
+        self,
+        prompt: str,
+        count: int,
+        negative_prompt: str = None,
+        width: int = 1024,
+        height: int = 1024,
+        cfg_scale: float = 7.0,
+        steps: int = 30,
+        prompts: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate several images and return them as raw bytes.
+
+        With a single prompt the images come from samples=N requests (split at
+        the API's per-request limit); these are never cached since each sample
+        is a distinct random draw. With `prompts`, one request per prompt is
+        issued concurrently under the service's concurrency cap; these are
+        random-seed draws too, so they are never served from the cache. The result succeeds if at least one image was
+        generated; per-request failures are listed under "errors".
+        """
+        if not self.api_key:
+            logger.error("Stability AI API key not configured")
+            return {
+                "success": False,
+                "images": [],
+                "error": "Stability AI API key not configured. Please set STABILITY_API_KEY environment variable."
+            }
+
+        started = time.monotonic()
+
+        async def run_samples(samples: int) -> Dict[str, Any]:
+            payload = self._build_payload(prompt, negative_prompt, width, height, cfg_scale, steps, samples)
+            result = await self._post_generation(payload)
+            if not result["success"]:
+                return result
+            return {"success": True, "images": self._decode_artifacts(result["artifacts"], prompt)}
+
+        async def run_prompt(variation_prompt: str) -> Dict[str, Any]:
+            result = await self._generate_one(
+                variation_prompt, negative_prompt, width, height, cfg_scale, steps
+            )
+            if not result["success"]:
+                return result
+            result.pop("success")
+            return {"success": True, "images": [result]}
+
+        if prompts:
+            requests = [run_prompt(p) for p in prompts]
+            total = len(prompts)
+        else:
+            sizes = [min(self.max_samples_per_request, count - n) for n in range(0, count, self.max_samples_per_request)]
+            requests = [run_samples(size) for size in sizes]
+            total = count
+
+        logger.info(f"🎨 Generating {total} images in {len(requests)} Stability AI requests ({width}x{height}, {steps} steps)")
+        results = await asyncio.gather(*requests, return_exceptions=True)
+
+        images, errors = [], []
+        for result in results:
+            if isinstance(result, Exception):
+                errors.append(str(result))
+            elif result["success"]:
+                images.extend(result["images"])
+            else:
+                errors.append(result["error"])
+
+        elapsed = time.monotonic() - started
+        logger.info(f"✅ Generated {len(images)} images in {elapsed:.1f}s ({len(errors)} failed requests)")
+        response = {
+            "success": bool(images),
+            "images": images,
+            "errors": errors,
+            "elapsed_seconds": round(elapsed, 2)
+        }
+        if not images:
+            response["error"] = errors[0] if errors else "No image generated"
+        return response
+
+    async def generate_image_with_facebook_optimization(
+        self,
+        prompt: str,
+        post_type: str = "feed",
+        seed: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Generate an image optimized for Facebook posts.
+        
+        Args:
+            prompt: Text description of the image
+            post_type: Type of Facebook post (feed, story, cover)
+            seed: Seed of an earlier render to repeat it (cached); 0 for a new random image
+            
+        Returns:
+            Dict containing generation result
+        """
+        width, height = self.FACEBOOK_DIMENSIONS.get(post_type, self.FACEBOOK_DIMENSIONS["feed"])
+        
+        # Enhance prompt for social media
+        enhanced_prompt = f"High-quality, engaging, professional social media image: {prompt}, vibrant colors, good lighting, visually appealing"
+        
+        # Add negative prompt for better quality
+        negative_prompt = "blurry, low quality, distorted, text overlay, watermark, ugly, bad anatomy"
+        
+        return await self.generate_image(
+            prompt=enhanced_prompt,
+            negative_prompt=negative_prompt,
+            width=width,
+            height=height,
+            cfg_scale=8.0,  # Slightly higher for better prompt adherence
+            steps=40,       # More steps for better quality
+            seed=seed,
+            engine_id=self.facebook_engine_id,
+            use_cache=True
+        )
+
+    def convert_base64_to_bytes(self, base64_string: str) -> bytes:
+        """Convert base64 string to bytes."""
+        return base64.b64decode(base64_string)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit rate, generation time saved and disk usage of the image cache."""
+        return self.cache.get_stats()
+
     def is_configured(self) -> bool:
         """Check if Stability service is properly configured."""
         return bool(self.api_key)
@@ -0,0 +1,225 @@
+"""
+Token health for connected Facebook accounts.
+
+Validation results are cached per account and token with a TTL that shrinks as
+the token approaches `token_expires_at`, so status endpoints can answer from
+the cache instead of calling Graph. A background loop revalidates accounts
+whose cached result is due or that were flagged by an auth error observed
+elsewhere (e.g. a failed publish). Accounts are validated concurrently under a
+small limit, and concurrent requests for the same token share one Graph call.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Iterable
+from app.database import SessionLocal
+from app.models.social_account import SocialAccount
+from app.services.facebook_service import facebook_service
+from app.services.graph_rate_governor import graph_priority, POLL
+
+logger = logging.getLogger(__name__)
+
+
+def _fingerprint(access_token: str) -> str:
+    return hashlib.sha256((access_token or "").encode("utf-8")).hexdigest()[:16]
+
+
+def account_snapshot(account: SocialAccount) -> Dict[str, Any]:
+    """Detach the fields validation needs from an ORM row, so it can outlive the session."""
+    return {
+        "id": account.id,
+        "platform_user_id": account.platform_user_id,
+        "name": account.display_name,
+        "access_token": account.access_token,
+        "token_expires_at": account.token_expires_at
+    }
+
+
+class TokenHealthService:
+    """Cached, scheduled and concurrent validation of Facebook account tokens."""
+
+    def __init__(self):
+        self.is_running = False
+        self.check_interval = 300  # Seconds between background scans
+        self.valid_ttl = 6 * 3600  # Upper bound on how long a valid result is trusted
+        self.min_ttl = 300
+        self.invalid_ttl = 900
+        self.max_concurrent = 5
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._cache: Dict[int, Dict[str, Any]] = {}  # account_id -> entry
+        self._inflight: Dict[str, asyncio.Task] = {}  # token fingerprint -> validation task
+        self._auth_errors: set = set()  # token fingerprints reported as rejected
+        self.stats = {"hits": 0, "misses": 0, "validations": 0, "auth_errors_reported": 0, "scans": 0}
+
+    # ---- cache ----
+
+    def _ttl_for(self, result: Dict[str, Any], expires_at: Optional[datetime]) -> float:
+        if not result.get("valid"):
+            return self.invalid_ttl
+        if expires_at is None:
+            return self.valid_ttl
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        # Check more often as the token approaches its expiry
+        return max(self.min_ttl, min(self.valid_ttl, remaining / 4))
+
+    def record(self, account_id: int, access_token: str, result: Dict[str, Any],
+               expires_at: Optional[datetime] = None):
+        """Store a validation result (also used to seed the cache right after a connect)."""
+        fingerprint = _fingerprint(access_token)
+        self._auth_errors.discard(fingerprint)
+        self._cache[account_id] = {
+            "fingerprint": fingerprint,
+            "result": result,
+            "checked_at": time.time(),
+            "ttl": self._ttl_for(result, expires_at)
+        }
+
+    def get_cached(self, account_id: int, access_token: str) -> Optional[Dict[str, Any]]:
+        """Fresh cached result for this account and token, or None."""
+        entry = self._cache.get(account_id)
+        if not entry or entry["fingerprint"] != _fingerprint(access_token):
+            return None
+        if entry["fingerprint"] in self._auth_errors:
+            return None
+        if time.time() - entry["checked_at"] > entry["ttl"]:
+            return None
+        return entry
+
+    def invalidate(self, account_id: int):
+        self._cache.pop(account_id, None)
+
+    def report_auth_error(self, access_token: str):
+        """Flag a token Graph rejected; affected accounts are revalidated on the next scan."""
+        self._auth_errors.add(_fingerprint(access_token))
+        self.stats["auth_errors_reported"] += 1
+
+    @staticmethod
+    def _status_from_result(result: Dict[str, Any]) -> str:
+        if result.get("valid"):
+            return "valid"
+        if result.get("expired") or result.get("needs_reconnection"):
+            return "expired"
+        return "error"
+
+    def get_status(self, account_id: int, access_token: str) -> Dict[str, Any]:
+        """Cached token status for display; never calls Graph."""
+        entry = self._cache.get(account_id)
+        if not entry or entry["fingerprint"] != _fingerprint(access_token):
+            return {"token_status": "unknown", "checked_at": None}
+        status = self._status_from_result(entry["result"])
+        if entry["fingerprint"] in self._auth_errors:
+            status = "auth_error"
+        return {
+            "token_status": status,
+            "checked_at": datetime.fromtimestamp(entry["checked_at"], timezone.utc).isoformat(),
+            "stale": time.time() - entry["checked_at"] > entry["ttl"]
+        }
+
+    # ---- validation ----
+
+    async def _validate_token(self, access_token: str, expires_at: Optional[datetime]) -> Dict[str, Any]:
+        async with self._semaphore:
+            self.stats["validations"] += 1
+            return await facebook_service.validate_and_refresh_token(access_token, expires_at)
+
+    async def validate_account(self, account: Dict[str, Any], force: bool = False) -> Dict[str, Any]:
+        """
+        Validation result for an account snapshot (see account_snapshot).
+
+        Served from the cache unless force is set, the entry is stale, or the
+        token was reported as rejected.
+        """
+        if not force:
+            entry = self.get_cached(account["id"], account["access_token"])
+            if entry:
+                self.stats["hits"] += 1
+                return {**entry["result"], "cached": True}
+        self.stats["misses"] += 1
+
+        fingerprint = _fingerprint(account["access_token"])
+        task = self._inflight.get(fingerprint)
+        if task is None:
+            task = asyncio.create_task(self._validate_token(account["access_token"], account["token_expires_at"]))
+            self._inflight[fingerprint] = task
+            task.add_done_callback(lambda _: self._inflight.pop(fingerprint, None))
+        try:
+            result = await asyncio.shield(task)
+        except Exception as e:
+            logger.error(f"Error validating token for account {account['id']}: {e}")
+            return {"valid": False, "error": str(e), "cached": False}
+
+        self.record(account["id"], account["access_token"], result, account["token_expires_at"])
+        return {**result, "cached": False}
+
+    async def validate_accounts(self, accounts: Iterable[Dict[str, Any]], force: bool = False) -> List[Dict[str, Any]]:
+        """Validate many account snapshots concurrently; results are in input order."""
+        accounts = list(accounts)
+        return await asyncio.gather(*(self.validate_account(account, force) for account in accounts))
+
+    def schedule(self, accounts: Iterable[Dict[str, Any]]):
+        """Warm the cache in the background for accounts without a fresh result."""
+        due = [a for a in accounts if not self.get_cached(a["id"], a["access_token"])]
+        if due:
+            asyncio.create_task(self.validate_accounts(due))
+
+    # ---- background revalidation ----
+
+    async def start(self):
+        """Revalidate due and flagged tokens on an interval."""
+        self.is_running = True
+        logger.info("🚀 Starting token health service...")
+        while self.is_running:
+            try:
+                with graph_priority(POLL):
+                    await self.revalidate_due_accounts()
+            except Exception as e:
+                logger.error(f"Error in token health service: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def stop(self):
+        self.is_running = False
+        logger.info("🛑 Stopping token health service...")
+
+    async def revalidate_due_accounts(self) -> int:
+        with SessionLocal() as db:
+            accounts = [account_snapshot(a) for a in db.query(SocialAccount).filter(
+                SocialAccount.platform == "facebook",
+                SocialAccount.is_connected == True
+            ).all()]
+
+        due = [a for a in accounts if not self.get_cached(a["id"], a["access_token"])]
+        self.stats["scans"] += 1
+        if not due:
+            return 0
+
+        results = await self.validate_accounts(due)
+        expired_ids = [
+            account["id"] for account, result in zip(due, results)
+            if result.get("expired") or result.get("needs_reconnection")
+        ]
+        if expired_ids:
+            with SessionLocal() as db:
+                db.query(SocialAccount).filter(SocialAccount.id.in_(expired_ids)).update(
+                    {SocialAccount.is_connected: False}, synchronize_session=False
+                )
+                db.commit()
+            logger.warning(f"⚠️ Marked {len(expired_ids)} Facebook accounts as disconnected (token expired)")
+        logger.info(f"🔑 Revalidated {len(due)} Facebook tokens ({len(expired_ids)} expired)")
+        return len(due)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "cached_accounts": len(self._cache),
+            "flagged_tokens": len(self._auth_errors),
+            "inflight": len(self._inflight)
+        }
+
+
+# Create a singleton instance
+token_health_service = TokenHealthService()
@@ -0,0 +1,148 @@
+"""
+Unique indexes behind the bulk upserts.
+
+The connect flows (uq_social_accounts_user_platform_account) and the
+Instagram media sync (uq_posts_social_account_platform_post) upsert with
+INSERT ... ON CONFLICT, which PostgreSQL rejects unless a unique index
+matches the conflict target. The indexes are declared on the models, but
+existing databases predate them and may hold duplicate rows, so `ensure()`
+merges duplicates and creates the indexes. It runs on startup and can be run
+by hand:
+
+    python -m app.services.upsert_index_service
+
+Until an index exists, the upserts raise MissingUpsertIndexError instead of
+failing on the database's ON CONFLICT error.
+"""
+
+import logging
+from typing import Dict, Set
+from sqlalchemy import inspect, text
+from app.database import Base, engine
+
+logger = logging.getLogger(__name__)
+
+SOCIAL_ACCOUNTS_INDEX = "uq_social_accounts_user_platform_account"
+POSTS_INDEX = "uq_posts_social_account_platform_post"
+
+# index name -> (table, columns)
+UPSERT_INDEXES = {
+    SOCIAL_ACCOUNTS_INDEX: ("social_accounts", ("user_id", "platform", "platform_user_id")),
+    POSTS_INDEX: ("posts", ("social_account_id", "platform_post_id")),
+}
+
+# Per-account, per-day counters that would collide when merged; rebuilt by the rollup backfill
+REBUILDABLE_ACCOUNT_TABLES = {"account_daily_stats"}
+
+
+class MissingUpsertIndexError(RuntimeError):
+    """A bulk upsert's unique index has not been created in this database yet."""
+
+    def __init__(self, index_name: str):
+        table, columns = UPSERT_INDEXES[index_name]
+        super().__init__(
+            f"Database is missing the unique index {index_name} on {table} ({', '.join(columns)}). "
+            f"Restart the API or run `python -m app.services.upsert_index_service` to merge duplicate "
+            f"rows and create it."
+        )
+        self.index_name = index_name
+
+
+class UpsertIndexService:
+    """Creates the upsert indexes and guards the upserts until they exist."""
+
+    def __init__(self):
+        self._present: Set[str] = set()
+
+    def require(self, index_name: str):
+        """Raise MissingUpsertIndexError unless the index exists (checked until first found)."""
+        if index_name in self._present:
+            return
+        table, _ = UPSERT_INDEXES[index_name]
+        if index_name not in {index["name"] for index in inspect(engine).get_indexes(table)}:
+            raise MissingUpsertIndexError(index_name)
+        self._present.add(index_name)
+
+    def ensure(self) -> Dict[str, int]:
+        """
+        Merge duplicate rows and create both indexes; returns the rows merged per table.
+
+        Duplicate social accounts are merged into the most recently updated
+        row: rows of other tables that reference a duplicate are moved to it,
+        except rollup counters, which are dropped (run the rollup backfill
+        afterwards). Duplicate posts keep the oldest row, which is the one
+        the app published.
+        """
+        if engine.dialect.name != "postgresql":
+            return {}
+        merged = {}
+        with engine.begin() as connection:
+            merged["social_accounts"] = self._merge_duplicate_accounts(connection)
+            # p is a later copy of keep
+            duplicate_post = (
+                "p.social_account_id = keep.social_account_id "
+                "AND p.platform_post_id = keep.platform_post_id AND p.id > keep.id"
+            )
+            if inspect(connection).has_table("post_metric_snapshots"):
+                connection.execute(text(
+                    f"DELETE FROM post_metric_snapshots s USING posts p, posts keep "
+                    f"WHERE s.post_id = p.id AND {duplicate_post}"
+                ))
+            merged["posts"] = connection.execute(text(
+                f"DELETE FROM posts p USING posts keep WHERE {duplicate_post}"
+            )).rowcount
+            for index_name, (table, columns) in UPSERT_INDEXES.items():
+                connection.execute(text(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})"
+                ))
+        self._present.update(UPSERT_INDEXES)
+        if any(merged.values()):
+            logger.warning(f"🧹 Merged duplicate rows before creating upsert indexes: {merged}")
+        return merged
+
+    @staticmethod
+    def _merge_duplicate_accounts(connection) -> int:
+        connection.execute(text(
+            "CREATE TEMP TABLE duplicate_social_accounts ON COMMIT DROP AS "
+            "SELECT id AS duplicate_id, keeper_id FROM ("
+            "  SELECT id, first_value(id) OVER ("
+            "    PARTITION BY user_id, platform, platform_user_id"
+            "    ORDER BY updated_at DESC NULLS LAST, id DESC"
+            "  ) AS keeper_id FROM social_accounts"
+            ") ranked WHERE id <> keeper_id"
+        ))
+        duplicates = connection.execute(text("SELECT count(*) FROM duplicate_social_accounts")).scalar()
+        if not duplicates:
+            return 0
+
+        import app.models  # noqa: F401  (registers every table that references social_accounts)
+        existing = set(inspect(connection).get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            for fk in table.foreign_keys:
+                if fk.column.table.name != "social_accounts":
+                    continue
+                column = fk.parent.name
+                if table.name in REBUILDABLE_ACCOUNT_TABLES:
+                    connection.execute(text(
+                        f"DELETE FROM {table.name} WHERE {column} IN (SELECT duplicate_id FROM duplicate_social_accounts)"
+                    ))
+                else:
+                    connection.execute(text(
+                        f"UPDATE {table.name} t SET {column} = d.keeper_id FROM duplicate_social_accounts d "
+                        f"WHERE t.{column} = d.duplicate_id"
+                    ))
+        connection.execute(text(
+            "DELETE FROM social_accounts WHERE id IN (SELECT duplicate_id FROM duplicate_social_accounts)"
+        ))
+        return duplicates
+
+
+# Create a singleton instance
+upsert_index_service = UpsertIndexService()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(upsert_index_service.ensure())
@@ -0,0 +1,76 @@
+"""
+Minimal circuit breaker for outbound dependencies.
+
+After `failure_threshold` consecutive failures the breaker opens and calls are
+skipped for `reset_timeout` seconds. It then lets a single trial call through
+(half-open): success closes it again, failure re-opens it.
+"""
+
+import time
+from typing import Dict, Any
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker."""
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go through right now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.stats["opened"] += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a half-open trial slot without recording an outcome (e.g. the call was cancelled)."""
+        self._trial_in_flight = False
+
+    def reset(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def get_status(self) -> Dict[str, Any]:
+        status = {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            **self.stats
+        }
+        if self.state == OPEN:
+            status["retry_in_seconds"] = max(0, round(self.reset_timeout - (time.monotonic() - self.opened_at), 1))
+        return status
@@ -0,0 +1,41 @@
+"""
+Bounded concurrent execution for per-account work.
+
+`run_bounded` runs one coroutine per item with at most `limit` in flight and an
+optional per-item timeout. A timed-out or failed item never fails the batch:
+its slot in the result list is filled by `fallback(item, error)`.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def run_bounded(items: Iterable[T], worker: Callable[[T], Awaitable[Any]],
+                      fallback: Callable[[T, BaseException], Any], limit: int = 5,
+                      timeout: Optional[float] = None,
+                      label: Callable[[T], Any] = lambda item: None) -> List[Any]:
+    """
+    Run worker(item) for every item concurrently; results are in input order.
+
+    `label` names an item in log lines (items may hold tokens, so they are
+    never logged themselves).
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run_one(item: T) -> Any:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(worker(item), timeout)
+            except asyncio.TimeoutError as e:
+                logger.warning(f"Timed out after {timeout}s processing {label(item)}")
+                return fallback(item, e)
+            except Exception as e:
+                logger.error(f"Error processing {label(item)}: {e}")
+                return fallback(item, e)
+
+    return await asyncio.gather(*(run_one(item) for item in items))
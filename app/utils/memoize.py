@@ -0,0 +1,200 @@
+"""
+Memoization for outbound service calls.
+
+`memoize` decorates sync or async functions (including methods) with a
+per-function cache:
+
+- keys come from an explicit key function taking the call's arguments, so
+  `self` and raw access tokens never end up in a key (use `token_key`);
+- successful results live for `ttl` seconds; raised exceptions and results
+  matching `is_negative` are cached for the shorter `negative_ttl`;
+- concurrent misses for the same key share one call (single-flight), with
+  threads waiting on the leader for sync functions and tasks awaiting a
+  shared future for async ones;
+- hit/miss counters per cache are exposed through `get_memo_stats()`.
+
+Cached values are shared between callers and must not be mutated.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+from cachetools import LRUCache
+
+_registry: Dict[str, "MemoCache"] = {}
+
+
+def token_key(access_token: Optional[str]) -> str:
+    """Stable, non-reversible cache key component for an access token."""
+    return hashlib.sha256((access_token or "").encode("utf-8")).hexdigest()[:16]
+
+
+class _Flight:
+    """An in-progress sync call that other threads wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class MemoCache:
+    """Per-function result store with per-entry expiry, single-flight and metrics."""
+
+    def __init__(self, name: str, ttl: float, negative_ttl: float, maxsize: int,
+                 is_negative: Optional[Callable[[Any], bool]], cache_errors: bool):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative
+        self.cache_errors = cache_errors
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)  # key -> (expires_at, is_error, value)
+        self._lock = threading.Lock()
+        self._sync_flights: Dict[Hashable, _Flight] = {}
+        self._async_flights: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "shared": 0, "errors": 0}
+
+    def _lookup(self, key: Hashable):
+        """(found, is_error, value) for a live entry; caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, False, None
+        expires_at, is_error, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return False, False, None
+        negative = is_error or (self.is_negative is not None and self.is_negative(value))
+        self.stats["negative_hits" if negative else "hits"] += 1
+        return True, is_error, value
+
+    def _store(self, key: Hashable, value: Any, is_error: bool = False):
+        if is_error:
+            self.stats["errors"] += 1
+            if not self.cache_errors:
+                return
+        negative = is_error or (self.is_negative is not None and self.is_negative(value))
+        ttl = self.negative_ttl if negative else self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, is_error, value)
+
+    @staticmethod
+    def _unwrap(is_error: bool, value: Any) -> Any:
+        if is_error:
+            raise value
+        return value
+
+    def call_sync(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, is_error, value = self._lookup(key)
+            if not found:
+                flight = self._sync_flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._sync_flights[key] = _Flight()
+                    self.stats["misses"] += 1
+                else:
+                    self.stats["shared"] += 1
+        if found:
+            return self._unwrap(is_error, value)
+
+        if not leader:
+            flight.event.wait()
+            return self._unwrap(flight.error is not None, flight.error or flight.result)
+
+        try:
+            flight.result = fn()
+            self._store(key, flight.result)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            self._store(key, e, is_error=True)
+            raise
+        finally:
+            with self._lock:
+                self._sync_flights.pop(key, None)
+            flight.event.set()
+
+    async def call_async(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, is_error, value = self._lookup(key)
+        if found:
+            return self._unwrap(is_error, value)
+
+        future = self._async_flights.get(key)
+        if future is not None:
+            self.stats["shared"] += 1
+            return await asyncio.shield(future)
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._async_flights[key] = future
+        try:
+            result = await fn()
+        except Exception as e:
+            self._store(key, e, is_error=True)
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        else:
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        finally:
+            self._async_flights.pop(key, None)
+            if not future.done():  # The leader was cancelled; waiters see the cancellation
+                future.cancel()
+
+    def clear(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["negative_hits"] + self.stats["misses"] + self.stats["shared"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "hit_rate": round((self.stats["hits"] + self.stats["negative_hits"]) / lookups, 3) if lookups else None
+        }
+
+
+def memoize(name: str, key: Callable[..., Hashable], ttl: float = 300, negative_ttl: float = 30,
+            maxsize: int = 256, is_negative: Optional[Callable[[Any], bool]] = None,
+            cache_errors: bool = True):
+    """
+    Cache a sync or async function's results.
+
+    `key` is called with the same arguments as the function (including `self`
+    for methods) and must return a hashable key. The decorated function gets
+    a `cache` attribute (the MemoCache) for clearing and stats.
+    """
+    def decorator(func):
+        cache = MemoCache(name, ttl, negative_ttl, maxsize, is_negative, cache_errors)
+        _registry[name] = cache
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await cache.call_async(key(*args, **kwargs), lambda: func(*args, **kwargs))
+            async_wrapper.cache = cache
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cache.call_sync(key(*args, **kwargs), lambda: func(*args, **kwargs))
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def get_memo_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every memoized function, by cache name."""
+    return {name: cache.get_stats() for name, cache in _registry.items()}
@@ -0,0 +1,359 @@
+"""
+Shared failure handling for external providers.
+
+Every outbound dependency (Groq, Stability AI, Cloudinary, IMGBB, the Graph
+API, LinkedIn, SMTP) is registered here as a `Provider` that combines:
+
+- a circuit breaker: once a provider keeps failing, calls fail fast with
+  `ProviderUnavailable` instead of queueing up behind timeouts, until a trial
+  call gets through;
+- jittered exponential backoff between retries ("full jitter", so callers
+  that failed together do not retry together);
+- a retry budget: every call earns a fraction of a retry, so during an outage
+  retries stay a small share of traffic instead of multiplying it;
+- a sliding window of outcomes for the error rate shown by
+  GET /api/admin/providers.
+
+Only failures that say something about the provider's health (timeouts,
+connection errors, 5xx) count against the breaker. Client errors and rate
+limits mean the provider answered; they pass through untouched.
+
+Async code uses `Provider.call` (blocking clients go through
+`asyncio.to_thread` inside it), worker threads use `Provider.call_sync`, and
+httpx clients get the same policy for every request through
+`ResilientTransport`. Calls that are not idempotent are only resent after
+`is_connect_error` failures, where the request never reached the server.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+import httpx
+import requests
+from urllib3.exceptions import NewConnectionError
+from app.utils.circuit_breaker import CircuitBreaker, OPEN
+
+logger = logging.getLogger(__name__)
+
+# Methods that can be resent after a failure without side effects
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "DELETE"}
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, provider: str, retry_in: float):
+        self.provider = provider
+        self.retry_in = retry_in
+        super().__init__(f"{provider} is temporarily unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Whether an exception reflects the provider's health (network trouble or a 5xx)."""
+    if isinstance(error, ProviderUnavailable):
+        return False
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500
+    # requests' ConnectionError/Timeout derive from OSError; httpx's do not
+    return isinstance(error, (OSError, asyncio.TimeoutError, httpx.TransportError))
+
+
+def is_connect_error(error: BaseException) -> bool:
+    """Whether a request failed while connecting, before anything was sent to the server."""
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # requests wraps urllib3's MaxRetryError, whose reason is the underlying error; a
+        # "Connection aborted" / RemoteDisconnected error may come after the body was sent
+        reason = error.args[0] if error.args else None
+        return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+    return False
+
+
+def jitter(value: float, spread: float = 0.2) -> float:
+    """`value` scaled by a random factor in [1 - spread, 1 + spread], to spread out retries scheduled together."""
+    return value * random.uniform(1 - spread, 1 + spread)
+
+
+class RetryBudget:
+    """Token bucket refilled by calls: each call earns `ratio` retries, up to `max_tokens`."""
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Provider:
+    """Circuit breaker, retry policy and error-rate window for one external provider."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0,
+                 retry_ratio: float = 0.2, window_seconds: float = 300.0):
+        self.name = name
+        self.breaker = CircuitBreaker(name, failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = RetryBudget(retry_ratio)
+        self.window_seconds = window_seconds
+        self._outcomes: deque = deque()  # (monotonic time, ok)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "retries_denied": 0}
+
+    def is_available(self) -> bool:
+        """Whether the circuit would let a call through, without claiming a half-open trial."""
+        breaker = self.breaker
+        return breaker.state != OPEN or time.monotonic() - breaker.opened_at >= breaker.reset_timeout
+
+    def before_call(self):
+        """Admit one attempt or raise ProviderUnavailable."""
+        with self._lock:
+            if not self.breaker.allow():
+                retry_in = self.breaker.get_status().get("retry_in_seconds", self.breaker.reset_timeout)
+                raise ProviderUnavailable(self.name, retry_in)
+            self.stats["calls"] += 1
+            self.budget.deposit()
+
+    def _record(self, ok: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def record_success(self):
+        with self._lock:
+            self.breaker.record_success()
+            self._record(True)
+
+    def record_failure(self):
+        with self._lock:
+            self.breaker.record_failure()
+            self._record(False)
+
+    def release(self):
+        """End an attempt without a verdict (e.g. it was cancelled)."""
+        with self._lock:
+            self.breaker.release()
+
+    def should_retry(self, attempt: int) -> bool:
+        """Whether failed attempt number `attempt` (0-based) may be retried; spends budget if so."""
+        if attempt >= self.max_retries:
+            return False
+        with self._lock:
+            if self.budget.try_spend():
+                self.stats["retries"] += 1
+                return True
+            self.stats["retries_denied"] += 1
+        return False
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (0-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _retryable(self, error: Exception, failure: bool, idempotent: bool,
+                   retry_on: Optional[Callable[[Exception], bool]]) -> bool:
+        if not idempotent:
+            return False
+        return retry_on(error) if retry_on is not None else failure
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], *, idempotent: bool = True,
+                   is_failure: Callable[[Exception], bool] = is_provider_failure,
+                   retry_on: Optional[Callable[[Exception], bool]] = None) -> Any:
+        """
+        Await fn() behind the breaker, retrying with jittered backoff within the budget.
+
+        Failures matching `is_failure` count against the breaker; `retry_on`
+        (default: the same predicate) picks the errors worth retrying. Calls
+        that are not idempotent are never retried.
+        """
+        attempt = 0
+        while True:
+            self.before_call()
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self.release()
+                raise
+            except Exception as e:
+                failure = is_failure(e)
+                if failure:
+                    self.record_failure()
+                else:
+                    self.record_success()
+                if not self._retryable(e, failure, idempotent, retry_on) or not self.should_retry(attempt):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"🔁 {self.name} call failed ({e}), retrying in {delay:.2f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.record_success()
+            return result
+
+    def call_sync(self, fn: Callable[[], Any], *, idempotent: bool = True,
+                  is_failure: Callable[[Exception], bool] = is_provider_failure,
+                  retry_on: Optional[Callable[[Exception], bool]] = None) -> Any:
+        """
+        Blocking counterpart of `call`, for code that runs in worker threads.
+
+        It sleeps between retries, so never call it from the event loop; wrap
+        the blocking call in `asyncio.to_thread` and use `call` instead.
+        """
+        attempt = 0
+        while True:
+            self.before_call()
+            try:
+                result = fn()
+            except Exception as e:
+                failure = is_failure(e)
+                if failure:
+                    self.record_failure()
+                else:
+                    self.record_success()
+                if not self._retryable(e, failure, idempotent, retry_on) or not self.should_retry(attempt):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"🔁 {self.name} call failed ({e}), retrying in {delay:.2f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.record_success()
+            return result
+
+    def reset(self):
+        with self._lock:
+            self.breaker.reset()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            recent = [ok for ts, ok in self._outcomes if now - ts <= self.window_seconds]
+        failures = recent.count(False)
+        return {
+            "circuit": self.breaker.get_status(),
+            **self.stats,
+            "retry_budget": round(self.budget.tokens, 2),
+            "window_seconds": self.window_seconds,
+            "recent_calls": len(recent),
+            "recent_failures": failures,
+            "error_rate": round(failures / len(recent), 3) if recent else None
+        }
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that sends every request of a client through a Provider.
+
+    Transport errors and 5xx responses count against the breaker. Idempotent
+    requests are retried within the provider's budget; other requests only
+    when the connection was never established, since the server cannot have
+    acted on them.
+    """
+
+    def __init__(self, provider: Provider, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.provider = provider
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        provider = self.provider
+        idempotent = request.method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            provider.before_call()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except asyncio.CancelledError:
+                provider.release()
+                raise
+            except httpx.TransportError as e:
+                provider.record_failure()
+                if not (idempotent or is_connect_error(e)) or not provider.should_retry(attempt):
+                    raise
+                error = str(e) or type(e).__name__
+            else:
+                if response.status_code < 500:
+                    provider.record_success()
+                    return response
+                provider.record_failure()
+                if not idempotent or not provider.should_retry(attempt):
+                    return response
+                await response.aclose()
+                error = f"HTTP {response.status_code}"
+            delay = provider.backoff(attempt)
+            logger.warning(f"🔁 {provider.name} {request.method} {request.url.path} failed ({error}), "
+                           f"retrying in {delay:.2f}s (attempt {attempt + 1}/{provider.max_retries})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+# Per-provider policy; providers with their own retry logic (Stability's 429
+# handling, media hosting's hedging) get no extra retries here.
+PROVIDER_POLICIES: Dict[str, Dict[str, Any]] = {
+    "graph": {"failure_threshold": 8, "reset_timeout": 30.0, "max_retries": 2},
+    "linkedin": {"failure_threshold": 5, "reset_timeout": 30.0, "max_retries": 2},
+    "groq": {"failure_threshold": 5, "reset_timeout": 30.0, "max_retries": 2},
+    "stability": {"failure_threshold": 3, "reset_timeout": 60.0, "max_retries": 0},
+    "cloudinary": {"failure_threshold": 3, "reset_timeout": 60.0, "max_retries": 0},
+    "imgbb": {"failure_threshold": 3, "reset_timeout": 60.0, "max_retries": 0},
+    "smtp": {"failure_threshold": 3, "reset_timeout": 120.0, "max_retries": 1, "base_delay": 1.0},
+}
+
+_providers: Dict[str, Provider] = {}
+_registry_lock = threading.Lock()
+
+
+def get_provider(name: str) -> Provider:
+    """The shared Provider for `name`, created on first use."""
+    with _registry_lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = _providers[name] = Provider(name, **PROVIDER_POLICIES.get(name, {}))
+        return provider
+
+
+def resilient_transport(name: str) -> ResilientTransport:
+    """A fresh transport for an httpx client talking to provider `name`."""
+    return ResilientTransport(get_provider(name))
+
+
+def reset_provider(name: str) -> bool:
+    """Close a provider's circuit by hand. Returns False for unknown providers."""
+    provider = _providers.get(name)
+    if provider is None:
+        return False
+    provider.reset()
+    return True
+
+
+def get_resilience_stats() -> Dict[str, Dict[str, Any]]:
+    """Breaker state, retry usage and recent error rate per provider."""
+    for name in PROVIDER_POLICIES:
+        get_provider(name)
+    return {name: provider.get_stats() for name, provider in sorted(_providers.items())}
@@ -0,0 +1,85 @@
+"""
+Streaming helpers for multipart uploads.
+
+Uploaded media is copied to a temp file in fixed-size chunks and hashed while
+it streams, so the size of an upload never determines how much of it is held
+in memory. Uploaders then receive a file path instead of bytes.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Dict, Any, Optional
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+async def spool_upload(
+    file: UploadFile,
+    directory: Optional[str] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Copy an upload to a temp file chunk by chunk, hashing it on the way.
+
+    Args:
+        file: Incoming multipart file
+        directory: Where to create the temp file (system temp dir if None)
+        chunk_size: Bytes read and written per step
+        max_bytes: Reject uploads larger than this with a 413 (defaults to settings.max_upload_bytes)
+
+    Returns:
+        Dict with file_path, filename, original_filename, size and sha256
+    """
+    max_bytes = max_bytes or settings.max_upload_bytes
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, file_path = tempfile.mkstemp(suffix=suffix, dir=directory)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum upload size is {max_bytes // (1024 * 1024)} MB"
+                    )
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        remove_spooled_file(file_path)
+        raise
+    finally:
+        await file.close()
+
+    logger.info(f"Spooled upload {file.filename} to {file_path} ({size} bytes)")
+    return {
+        "file_path": file_path,
+        "filename": os.path.basename(file_path),
+        "original_filename": file.filename,
+        "size": size,
+        "sha256": digest.hexdigest()
+    }
+
+
+def remove_spooled_file(file_path: str):
+    """Best-effort removal of a spooled upload."""
+    try:
+        os.unlink(file_path)
+    except OSError:
+        pass
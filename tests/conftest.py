@@ -0,0 +1,144 @@
+"""
+Shared fixtures.
+
+The app is imported against TEST_DATABASE_URL when it is set (a disposable
+PostgreSQL database, needed for the Postgres-only sync tests), otherwise
+against a throwaway SQLite file. Only the tables the tests touch are created,
+since some models use PostgreSQL-only column types.
+"""
+
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or (
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='sma-tests-'), 'test.db')}"
+)
+
+from contextlib import contextmanager
+from itertools import count
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import Base, SessionLocal, engine
+from app.main import app
+from app.api.auth import get_current_user
+from app.models.auto_reply_backfill_job import AutoReplyBackfillJob
+from app.models.instagram_auto_reply_log import InstagramAutoReplyLog
+from app.models.media_handle import MediaHandle
+from app.models.post import Post
+from app.models.scheduled_post import ScheduledPost
+from app.models.social_account import SocialAccount
+from app.models.user import User
+
+TABLES = [User.__table__, SocialAccount.__table__, Post.__table__, InstagramAutoReplyLog.__table__,
+          AutoReplyBackfillJob.__table__, ScheduledPost.__table__, MediaHandle.__table__]
+
+_ids = count(1)
+
+
+class FakeClock:
+    """Stands in for the `time` module of the code under test; only moves when told to."""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    Base.metadata.create_all(engine, tables=TABLES)
+    yield engine
+    Base.metadata.drop_all(engine, tables=list(reversed(TABLES)))
+
+
+@pytest.fixture
+def clock(request, monkeypatch) -> FakeClock:
+    """
+    A FakeClock patched in as `time` of the modules named by the test's clock marker.
+
+        pytestmark = pytest.mark.clock(memoize_module)
+    """
+    fake = FakeClock()
+    marker = request.node.get_closest_marker("clock")
+    for module in (marker.args if marker else ()):
+        monkeypatch.setattr(module, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def postgres():
+    """Skip tests that exercise PostgreSQL-only SQL when running against SQLite."""
+    if engine.dialect.name != "postgresql":
+        pytest.skip("needs PostgreSQL (set TEST_DATABASE_URL)")
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    """Create a user (committed) and return it detached, ready for a get_current_user override."""
+    def factory(**fields) -> User:
+        n = next(_ids)
+        user = User(email=f"user{n}@example.com", username=f"user{n}", hashed_password="x", **fields)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+    return factory
+
+
+@pytest.fixture
+def client():
+    """Test client without the startup hooks (no background loops or Postgres checks)."""
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.fixture
+def login():
+    """Authenticate subsequent requests as `user`."""
+    def as_user(user: User):
+        app.dependency_overrides[get_current_user] = lambda: user
+    return as_user
+
+
+@pytest.fixture
+def count_queries():
+    """Context manager collecting the SQL statements executed on the app's engine."""
+    @contextmanager
+    def counter():
+        statements: List[str] = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return counter
@@ -0,0 +1,27 @@
+"""Access control of the provider admin endpoints."""
+
+import pytest
+
+ENDPOINTS = [("get", "/api/admin/providers"), ("post", "/api/admin/providers/groq/reset")]
+
+
+@pytest.mark.parametrize("method, path", ENDPOINTS)
+def test_requires_authentication(client, method, path):
+    assert getattr(client, method)(path).status_code in (401, 403)
+
+
+@pytest.mark.parametrize("method, path", ENDPOINTS)
+def test_rejects_regular_users(client, login, make_user, method, path):
+    login(make_user())
+    assert getattr(client, method)(path).status_code == 403
+
+
+def test_superusers_can_inspect_and_reset(client, login, make_user):
+    login(make_user(is_superuser=True))
+
+    status = client.get("/api/admin/providers")
+    assert status.status_code == 200
+    assert "groq" in status.json()["providers"]
+
+    assert client.post("/api/admin/providers/groq/reset").json() == {"success": True, "provider": "groq"}
+    assert client.post("/api/admin/providers/nope/reset").json()["success"] is False
@@ -0,0 +1,83 @@
+"""Incremental rollups and backfill count published posts the same way (PostgreSQL, set TEST_DATABASE_URL)."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine
+from app.models.account_daily_stat import AccountDailyStat
+from app.models.post import Post, PostStatus, PostType
+from app.models.single_instagram_post import SingleInstagramPost
+from app.models.social_account import SocialAccount
+from app.services.analytics_rollup_service import AnalyticsRollupService
+from app.services.instagram_media_sync_service import instagram_media_sync_service
+
+pytestmark = pytest.mark.usefixtures("postgres")  # Rollup upserts use ON CONFLICT; single posts use ARRAY
+
+ROLLUP_TABLES = [AccountDailyStat.__table__, SingleInstagramPost.__table__]
+
+
+@pytest.fixture
+def rollups():
+    """A rollup service with its flush hooks installed for the test only."""
+    Base.metadata.create_all(engine, tables=ROLLUP_TABLES)
+    service = AnalyticsRollupService()
+    service.install()
+    yield service
+    event.remove(Session, "before_flush", service._before_flush)
+    event.remove(Session, "after_flush", service._after_flush)
+    Base.metadata.drop_all(engine, tables=list(reversed(ROLLUP_TABLES)))
+
+
+@pytest.fixture
+def account(db, make_user, rollups):
+    user = make_user()
+    account = SocialAccount(user_id=user.id, platform="instagram", platform_user_id=f"ig-{user.id}",
+                            access_token="token", is_connected=True)
+    db.add(account)
+    db.commit()
+    yield account
+    for model in (Post, SingleInstagramPost, AccountDailyStat):
+        db.query(model).filter(model.social_account_id == account.id).delete()
+    db.query(SocialAccount).filter(SocialAccount.id == account.id).delete()
+    db.commit()
+
+
+def _totals(service: AnalyticsRollupService, account) -> dict:
+    today = datetime.now(timezone.utc).date()
+    result = service.get_range(account.user_id, today - timedelta(days=6), today, social_account_id=account.id)
+    return {"totals": result["totals"], "days": result["days"]}
+
+
+def test_incremental_totals_match_backfill(db, rollups, account):
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    owner = {"user_id": account.user_id, "social_account_id": account.id}
+    # Published from the app: a reel with its publish time, a carousel saved without one, and a failure
+    db.add(Post(**owner, content="reel", post_type=PostType.REEL, status=PostStatus.PUBLISHED,
+                platform_post_id="reel-1", published_at=yesterday))
+    db.add(Post(**owner, content="carousel", post_type=PostType.CAROUSEL, status=PostStatus.PUBLISHED,
+                platform_post_id="carousel-1"))
+    db.add(Post(**owner, content="failed", post_type=PostType.IMAGE, status=PostStatus.FAILED))
+    db.add(SingleInstagramPost(**owner, post_type="photo", media_url=["https://cdn.example.com/p.jpg"],
+                               platform_post_id="photo-1", status="published"))
+    db.commit()
+
+    # A later media sync sees the app's posts plus media published outside the app
+    sync_rows = [
+        instagram_media_sync_service._row_for(
+            {"id": media_id, "media_type": "IMAGE", "timestamp": yesterday.strftime("%Y-%m-%dT%H:%M:%S%z")},
+            account.user_id, account.id
+        )
+        for media_id in ("reel-1", "photo-1", "external-1")
+    ]
+    instagram_media_sync_service.upsert_page(sync_rows)
+
+    incremental = _totals(rollups, account)
+    rollups.backfill(days=7)
+    rebuilt = _totals(rollups, account)
+
+    assert incremental == rebuilt
+    assert incremental["totals"]["posts_published"] == 3
+    assert incremental["totals"]["posts_failed"] == 1
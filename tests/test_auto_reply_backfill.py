@@ -0,0 +1,93 @@
+"""Failure handling of auto-reply backfill jobs."""
+
+import asyncio
+
+import pytest
+
+from app.models.auto_reply_backfill_job import AutoReplyBackfillJob, BackfillJobStatus
+from app.services import auto_reply_backfill_service as backfill_module
+from app.services.auto_reply_backfill_service import AutoReplyBackfillService
+from app.services.graph_rate_governor import POLL, graph_rate_governor
+from app.services.instagram_auto_reply_service import comment_reply_batcher
+from app.services.instagram_service import instagram_service
+
+MEDIA_IDS = ["m1", "m2", "m3", "m4", "m5"]
+
+
+@pytest.fixture
+def job(db, make_user):
+    user = make_user()
+    job = AutoReplyBackfillJob(user_id=user.id, instagram_user_id=f"ig-{user.id}",
+                               status=BackfillJobStatus.RUNNING.value, completed_media_ids=[])
+    db.add(job)
+    db.commit()
+    return job
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    """Fake media and comments; replying to media "m2" fails after the others have started."""
+    events = []
+    monkeypatch.setattr(backfill_module, "get_access_token_for_user", lambda instagram_user_id: "token")
+    monkeypatch.setattr(instagram_service, "get_user_media",
+                        lambda instagram_user_id, token, limit=100: [{"id": media_id} for media_id in MEDIA_IDS])
+
+    async def get_comments(instagram_user_id, token, media_id=None, limit=25):
+        return [{"id": f"{media_id}-c", "from": {"id": "someone"}, "media": media_id}]
+
+    async def reply_to_batch(instagram_user_id, token, comments):
+        media_id = comments[0]["media"]
+        await asyncio.sleep(0.05 if media_id == "m2" else 0.1)
+        if media_id == "m2":
+            raise RuntimeError("Groq unavailable")
+        events.append(media_id)
+        return len(comments)
+
+    monkeypatch.setattr(instagram_service, "get_comments", get_comments)
+    monkeypatch.setattr(comment_reply_batcher, "reply_to_batch", reply_to_batch)
+    return events
+
+
+def test_failed_media_fails_the_job_only_after_siblings_finish(db, job, graph):
+    service = AutoReplyBackfillService()
+    service.max_parallel_media = 3
+
+    asyncio.run(service._run_job(job.id))
+
+    db.refresh(job)
+    assert job.status == BackfillJobStatus.FAILED.value
+    assert "1 of 5 media failed" in job.error_message and "m2" in job.error_message
+    # Siblings ran to completion and were checkpointed before the status was written
+    assert sorted(graph) == ["m1", "m3", "m4", "m5"]
+    assert sorted(job.completed_media_ids) == ["m1", "m3", "m4", "m5"]
+    assert job.replied_comments == 4
+
+
+def test_job_completes_when_every_media_succeeds(db, job, graph, monkeypatch):
+    monkeypatch.setattr(instagram_service, "get_user_media",
+                        lambda instagram_user_id, token, limit=100: [{"id": "m1"}, {"id": "m3"}])
+
+    asyncio.run(AutoReplyBackfillService()._run_job(job.id))
+
+    db.refresh(job)
+    assert job.status == BackfillJobStatus.COMPLETED.value
+    assert sorted(job.completed_media_ids) == ["m1", "m3"]
+
+
+def test_media_listing_thread_keeps_poll_priority(db, job, graph, monkeypatch):
+    priorities = []
+
+    def get_user_media(instagram_user_id, token, limit=100):
+        priorities.append(graph_rate_governor.resolve_priority("GET", "https://graph.facebook.com/me/media"))
+        return [{"id": "m1"}]
+
+    monkeypatch.setattr(instagram_service, "get_user_media", get_user_media)
+
+    async def run():
+        service = AutoReplyBackfillService()
+        service._launch(job.id)
+        await service._tasks[job.id]
+
+    asyncio.run(run())
+
+    assert priorities == [POLL]
@@ -0,0 +1,75 @@
+"""Byte-budget (LRU) and TTL eviction of the in-memory conversation context store."""
+
+import pytest
+
+from app.services import conversation_context_store as store_module
+from app.services.conversation_context_store import LINE_OVERHEAD_BYTES, ConversationContextStore
+
+pytestmark = pytest.mark.clock(store_module)
+
+# One exchange of a 10-byte question ("question-x") and a 9-byte answer ("answer-xx")
+EXCHANGE_BYTES = 10 + 9 + 2 * LINE_OVERHEAD_BYTES
+
+
+def _store(max_exchanges: int = 10, ttl_seconds: int = 3600, max_lines: int = 20) -> ConversationContextStore:
+    return ConversationContextStore(max_bytes=max_exchanges * EXCHANGE_BYTES, ttl_seconds=ttl_seconds,
+                                    max_lines=max_lines)
+
+
+def test_byte_budget_evicts_least_recently_used(clock):
+    store = _store(max_exchanges=2)
+    store.append_exchange("a", "question-a", "answer-aa")
+    store.append_exchange("b", "question-b", "answer-bb")
+    assert store.get_lines("a")  # "a" is now the most recently used
+    store.append_exchange("c", "question-c", "answer-cc")
+
+    assert store.get_lines("b") == []
+    assert store.get_lines("a") == ["User: question-a", "AI: answer-aa"]
+    assert store.get_lines("c") == ["User: question-c", "AI: answer-cc"]
+    stats = store.get_stats()
+    assert stats["lru_evictions"] == 1
+    assert stats["bytes_used"] == 2 * EXCHANGE_BYTES <= stats["max_bytes"]
+
+
+def test_ring_buffer_keeps_byte_count_exact(clock):
+    store = _store(max_lines=4)
+    for i in range(5):
+        store.append_exchange("a", f"question-{i}", f"answer-{i}a")
+
+    assert store.get_lines("a") == ["User: question-3", "AI: answer-3a", "User: question-4", "AI: answer-4a"]
+    assert store.get_stats()["bytes_used"] == 2 * EXCHANGE_BYTES
+
+
+def test_expired_conversation_is_dropped_on_read(clock):
+    store = _store(ttl_seconds=60)
+    store.append_exchange("a", "question-a", "answer-aa")
+    clock.advance(61)
+
+    assert store.get_lines("a") == []
+    stats = store.get_stats()
+    assert stats["ttl_evictions"] == 1
+    assert stats["conversations"] == 0 and stats["bytes_used"] == 0
+
+
+def test_expired_conversations_are_evicted_before_live_ones(clock):
+    store = _store(max_exchanges=2, ttl_seconds=60)
+    store.append_exchange("old", "question-o", "answer-oo")
+    clock.advance(30)
+    store.append_exchange("live", "question-l", "answer-ll")
+    clock.advance(31)
+    store.append_exchange("new", "question-n", "answer-nn")
+
+    assert store.get_lines("live") == ["User: question-l", "AI: answer-ll"]
+    assert store.get_lines("new") == ["User: question-n", "AI: answer-nn"]
+    stats = store.get_stats()
+    assert stats["ttl_evictions"] == 1 and stats["lru_evictions"] == 0
+
+
+def test_appending_to_expired_conversation_starts_fresh(clock):
+    store = _store(ttl_seconds=60)
+    store.append_exchange("a", "question-1", "answer-1a")
+    clock.advance(61)
+    store.append_exchange("a", "question-2", "answer-2a")
+
+    assert store.get_lines("a") == ["User: question-2", "AI: answer-2a"]
+    assert store.get_stats()["bytes_used"] == EXCHANGE_BYTES
@@ -0,0 +1,133 @@
+"""Admission decisions of the Graph rate governor."""
+
+import json
+import threading
+
+import pytest
+
+from app.services import graph_rate_governor as governor_module
+from app.services.graph_rate_governor import (
+    GraphRateGovernor, GraphRateLimited, INTERACTIVE, POLL, PUBLISH
+)
+
+pytestmark = pytest.mark.clock(governor_module)
+
+TOKEN = "page-token"
+
+
+@pytest.fixture
+def governor(clock):
+    return GraphRateGovernor()
+
+
+def _app_usage(governor, percent):
+    governor.observe(TOKEN, 200, {"x-app-usage": json.dumps({"call_count": percent})})
+
+
+def test_admits_and_takes_budget_when_idle(governor):
+    assert governor._admit(TOKEN, INTERACTIVE, 0) == 0
+    assert governor.stats["admitted"]["interactive"] == 1
+    assert governor._bucket("app").tokens == governor.app_bucket[0] - 1
+    assert governor._bucket(governor.scope_for(TOKEN)).tokens == governor.scope_bucket[0] - 1
+
+
+def test_priorities_stop_at_their_utilization_threshold(governor):
+    _app_usage(governor, 80)
+
+    assert governor._admit(TOKEN, INTERACTIVE, 0) == 0
+    with pytest.raises(GraphRateLimited) as shed:
+        governor._admit(TOKEN, POLL, 0)
+    assert shed.value.retry_after == pytest.approx(governor.usage_ttl)
+    assert governor.stats["shed"]["poll"] == 1
+
+    _app_usage(governor, 90)
+    with pytest.raises(GraphRateLimited):
+        governor._admit(TOKEN, INTERACTIVE, 0)
+    assert governor._admit(TOKEN, PUBLISH, 0) == 0
+
+
+def test_publish_waits_instead_of_being_shed_then_goes_anyway(governor):
+    _app_usage(governor, 99)
+
+    assert governor._admit(TOKEN, PUBLISH, 0) == 1.0
+    assert governor.stats["delayed"]["publish"] == 1
+    assert governor.stats["shed"]["publish"] == 0
+    # Past its max wait a publish proceeds even though the app is still hot
+    assert governor._admit(TOKEN, PUBLISH, governor.max_wait[PUBLISH]) == 0
+    assert governor.stats["admitted"]["publish"] == 1
+
+
+def test_polls_leave_a_bucket_reserve_for_interactive_calls(governor, clock):
+    capacity, rate = governor.scope_bucket
+    poll_allowance = int(capacity * (1 - governor.reserves[POLL]))
+    for _ in range(poll_allowance):
+        assert governor._admit(TOKEN, POLL, 0) == 0
+
+    assert governor._admit(TOKEN, POLL, 0) == pytest.approx(1 / rate)
+    assert governor._admit(TOKEN, INTERACTIVE, 0) == 0
+
+    clock.advance(2 / rate)
+    assert governor._admit(TOKEN, POLL, 0) == 0
+
+
+def test_throttle_error_blocks_only_that_tokens_scope(governor, clock):
+    body = json.dumps({"error": {"code": 32, "message": "Page request limit reached"}}).encode()
+    governor.observe(TOKEN, 400, {}, body)
+
+    with pytest.raises(GraphRateLimited) as shed:
+        governor._admit(TOKEN, INTERACTIVE, 0)
+    assert shed.value.retry_after == pytest.approx(governor.default_block_seconds)
+    assert governor.retry_after(TOKEN) == pytest.approx(governor.default_block_seconds)
+    assert governor._admit("other-token", INTERACTIVE, 0) == 0
+
+    clock.advance(governor.default_block_seconds)
+    assert governor._admit(TOKEN, INTERACTIVE, 0) == 0
+
+
+def test_app_level_throttle_blocks_every_token(governor):
+    body = json.dumps({"error": {"code": 4}}).encode()
+    governor.observe(TOKEN, 400, {}, body)
+
+    with pytest.raises(GraphRateLimited):
+        governor._admit("other-token", INTERACTIVE, 0)
+
+
+def test_business_use_case_regain_time_blocks_the_scope(governor):
+    usage = {"17841400000000000": [{"call_count": 40, "estimated_time_to_regain_access": 3}]}
+    governor.observe(TOKEN, 200, {"x-business-use-case-usage": json.dumps(usage)})
+
+    assert governor.retry_after(TOKEN) == pytest.approx(180)
+    with pytest.raises(GraphRateLimited):
+        governor._admit(TOKEN, INTERACTIVE, 0)
+    # A publish waits out the block in one-second steps rather than being shed
+    assert governor._admit(TOKEN, PUBLISH, 0) == 1.0
+
+
+def test_priority_defaults_from_method_and_edge(governor):
+    assert governor.resolve_priority("POST", "https://graph.facebook.com/v18.0/123/media_publish") == PUBLISH
+    assert governor.resolve_priority("POST", "https://graph.facebook.com/v18.0/123/replies") == INTERACTIVE
+    assert governor.resolve_priority("GET", "https://graph.facebook.com/v18.0/123/media") == INTERACTIVE
+    with governor_module.graph_priority(POLL):
+        assert governor.resolve_priority("POST", "https://graph.facebook.com/v18.0/123/feed") == POLL
+
+
+def test_worker_threads_share_scope_state_safely(governor):
+    errors = []
+
+    def observe_tokens(worker):
+        try:
+            for i in range(200):
+                usage = {f"{worker}{i}": [{"call_count": 10}]}
+                governor.observe(f"token-{worker}-{i}", 200, {"x-business-use-case-usage": json.dumps(usage)})
+                governor.get_stats()
+        except Exception as exc:  # e.g. "dictionary changed size during iteration"
+            errors.append(exc)
+
+    workers = [threading.Thread(target=observe_tokens, args=(n,)) for n in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    assert len(governor._scopes) == 8 * 200
@@ -0,0 +1,122 @@
+"""Container polling and carousel publishing against a fake Graph API."""
+
+import asyncio
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import pytest
+
+from app.services import instagram_service as instagram_module
+from app.services.instagram_service import instagram_service
+
+pytestmark = pytest.mark.clock(instagram_module)
+
+real_sleep = asyncio.sleep
+
+
+class FakeGraph:
+    """Replays a status_code sequence per container and records request concurrency."""
+
+    def __init__(self, statuses):
+        self.statuses = {cid: list(sequence) for cid, sequence in statuses.items()}
+        self.rounds = []
+        self.posts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._next_id = 0
+
+    async def request(self, method, url, params=None, data=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await real_sleep(0)  # Let concurrently started requests overlap
+        self.in_flight -= 1
+
+        path = urlparse(url).path.rsplit("/", 1)[-1]
+        if method == "GET":
+            sequence = self.statuses[path]
+            status_code = sequence.pop(0) if len(sequence) > 1 else sequence[0]
+            # A container polled again means a new polling round has started
+            if self.rounds and path not in self.rounds[-1]:
+                self.rounds[-1].append(path)
+            else:
+                self.rounds.append([path])
+            return SimpleNamespace(json=lambda: {"id": path, "status_code": status_code})
+        self.posts.append((path, data))
+        self._next_id += 1
+        created = f"container-{self._next_id}" if path == "media" else "published-1"
+        self.statuses.setdefault(created, ["FINISHED"])
+        return SimpleNamespace(json=lambda: {"id": created})
+
+
+@pytest.fixture
+def sleeps(clock, monkeypatch):
+    """asyncio.sleep calls made by the polling loop; each advances the fake clock."""
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+        clock.advance(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(instagram_module, "asyncio", SimpleNamespace(gather=asyncio.gather, sleep=sleep))
+    return delays
+
+
+def _wait(graph, monkeypatch, container_ids, **kwargs):
+    monkeypatch.setattr(instagram_service, "_make_request_async", graph.request)
+    return asyncio.run(instagram_service._wait_for_containers(container_ids, "token", **kwargs))
+
+
+def test_polls_pending_containers_concurrently_with_backoff(monkeypatch, sleeps):
+    graph = FakeGraph({
+        "c1": ["IN_PROGRESS", "FINISHED"],
+        "c2": ["FINISHED"],
+        "c3": ["IN_PROGRESS", "IN_PROGRESS", "FINISHED"],
+    })
+
+    assert _wait(graph, monkeypatch, ["c1", "c2", "c3"]) == {"success": True}
+    # Finished containers drop out; each round polls the rest at once
+    assert [sorted(r) for r in graph.rounds] == [["c1", "c2", "c3"], ["c1", "c3"], ["c3"]]
+    assert graph.max_in_flight == 3
+    assert sleeps == [1, 2]
+
+
+def test_a_failed_container_stops_polling(monkeypatch, sleeps):
+    graph = FakeGraph({"c1": ["IN_PROGRESS", "FINISHED"], "c2": ["IN_PROGRESS", "ERROR"]})
+
+    result = _wait(graph, monkeypatch, ["c1", "c2"])
+
+    assert result["success"] is False
+    assert "c2" in result["error"] and "ERROR" in result["error"]
+    assert len(graph.rounds) == 2
+
+
+def test_gives_up_after_the_timeout(monkeypatch, sleeps, clock):
+    graph = FakeGraph({"c1": ["FINISHED"], "c2": ["IN_PROGRESS"]})
+    started = clock.now
+
+    result = _wait(graph, monkeypatch, ["c1", "c2"])
+
+    assert result == {"success": False, "error": "Media containers not ready after 120s: c2"}
+    assert sleeps[:5] == [1, 2, 4, 8, 10]
+    assert max(sleeps) == 10
+    # It stops before a sleep that would overrun the deadline
+    assert clock.now - started <= 120 < clock.now - started + 10
+
+
+def test_carousel_creates_children_concurrently_and_publishes_in_order(monkeypatch, sleeps):
+    graph = FakeGraph({})
+    monkeypatch.setattr(instagram_service, "_make_request_async", graph.request)
+    urls = [f"https://cdn.example.com/{i}.jpg" for i in range(3)]
+
+    result = asyncio.run(instagram_service.create_carousel_post("ig-1", "token", "caption", urls))
+
+    assert result["success"] is True
+    assert result["post_id"] == "published-1"
+    assert set(result["timings"]) == {"create_children", "children_ready", "create_parent", "parent_ready", "publish"}
+    children = [data for path, data in graph.posts if data.get("is_carousel_item")]
+    assert [data["image_url"] for data in children] == urls
+    parent = next(data for path, data in graph.posts if data.get("media_type") == "CAROUSEL")
+    assert [parent[f"children[{i}]"] for i in range(3)] == ["container-1", "container-2", "container-3"]
+    assert graph.posts[-1][0] == "media_publish"
+    assert graph.max_in_flight == 3
@@ -0,0 +1,93 @@
+"""Instagram media sync against a real PostgreSQL database (set TEST_DATABASE_URL)."""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.post import Post
+from app.models.social_account import SocialAccount
+from app.services.instagram_media_sync_service import instagram_media_sync_service
+from app.services.instagram_service import instagram_service
+
+pytestmark = pytest.mark.usefixtures("postgres")  # Upserts use ON CONFLICT ... RETURNING xmax
+
+MEDIA_COUNT = 10_000
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _media(i: int):
+    return {
+        "id": f"media-{i}",
+        "caption": f"caption {i}",
+        "media_type": "IMAGE",
+        "media_url": f"https://cdn.example.com/{i}.jpg",
+        "timestamp": (EPOCH + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+@pytest.fixture
+def graph_media(monkeypatch):
+    """Fake Graph media edge: newest first, paged, stopping at `since` like the real iterator."""
+    media = [_media(i) for i in range(MEDIA_COUNT)]
+
+    async def iter_user_media_pages(instagram_user_id, page_access_token, page_size=100, since=None):
+        newest_first = sorted(media, key=lambda m: m["timestamp"], reverse=True)
+        for start in range(0, len(newest_first), page_size):
+            page = newest_first[start:start + page_size]
+            if since is not None:
+                page = [m for m in page if datetime.strptime(m["timestamp"], "%Y-%m-%dT%H:%M:%S%z") > since]
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+
+    monkeypatch.setattr(instagram_service, "iter_user_media_pages", iter_user_media_pages)
+    return media
+
+
+@pytest.fixture
+def account(db, make_user):
+    user = make_user()
+    account = SocialAccount(user_id=user.id, platform="instagram", platform_user_id=f"ig-{user.id}",
+                            access_token="token", is_connected=True)
+    db.add(account)
+    db.commit()
+    yield account
+    db.query(Post).filter(Post.social_account_id == account.id).delete()
+    db.delete(account)
+    db.commit()
+
+
+def _sync(account, full: bool = False):
+    return asyncio.run(instagram_media_sync_service.sync_account(
+        account.user_id, account.id, account.platform_user_id, "token", full=full
+    ))
+
+
+def test_sync_10k_media_writes_one_statement_per_page(db, account, graph_media, count_queries, record_property):
+    started = time.monotonic()
+    with count_queries() as statements:
+        result = _sync(account)
+    elapsed = time.monotonic() - started
+    record_property("first_sync_seconds", round(elapsed, 2))
+
+    assert result["mode"] == "full"
+    assert (result["fetched"], result["inserted"], result["updated"]) == (MEDIA_COUNT, MEDIA_COUNT, 0)
+    assert result["pages"] == MEDIA_COUNT // 100
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT INTO POSTS")]
+    assert len(inserts) == result["pages"]
+    assert db.query(Post).filter(Post.social_account_id == account.id).count() == MEDIA_COUNT
+
+    # Only media newer than the cursor is fetched on the next run
+    graph_media.extend(_media(i) for i in range(MEDIA_COUNT, MEDIA_COUNT + 50))
+    result = _sync(account)
+    assert result["mode"] == "incremental"
+    assert (result["fetched"], result["inserted"], result["pages"]) == (50, 50, 1)
+
+    # A full resync refreshes every row in place
+    started = time.monotonic()
+    result = _sync(account, full=True)
+    record_property("full_resync_seconds", round(time.monotonic() - started, 2))
+    assert (result["inserted"], result["updated"]) == (0, MEDIA_COUNT + 50)
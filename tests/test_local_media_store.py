@@ -0,0 +1,95 @@
+"""Budget eviction in the local media store spares files that pending posts and live handles reference."""
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import count
+
+import pytest
+
+from app.config import get_settings
+from app.models.media_handle import MediaHandle
+from app.models.scheduled_post import ScheduledPost
+from app.models.social_account import SocialAccount
+from app.services.local_media_store import LocalMediaStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalMediaStore(root=str(tmp_path / "temp_images"))
+    store.min_age_seconds = 0
+    store.pin_refresh_interval = 0
+    return store
+
+
+@pytest.fixture
+def account(db, make_user):
+    user = make_user()
+    account = SocialAccount(user_id=user.id, platform="instagram", platform_user_id=f"ig-{user.id}",
+                            access_token="token", is_connected=True)
+    db.add(account)
+    db.commit()
+    yield account
+    db.query(ScheduledPost).filter(ScheduledPost.user_id == user.id).delete()
+    db.query(MediaHandle).filter(MediaHandle.user_id == user.id).delete()
+    db.query(SocialAccount).filter(SocialAccount.id == account.id).delete()
+    db.commit()
+
+
+_mtimes = count(int(time.time()) - 3600)
+
+
+def _write(store, name):
+    """Store a file with an mtime one second after the previous one, so LRU order is write order."""
+    path = store.write_bytes(b"x" * 10, name)
+    mtime = next(_mtimes)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_referenced_files_survive_budget_eviction(store, db, account):
+    scheduled_path = _write(store, "scheduled.png")
+    db.add(ScheduledPost(user_id=account.user_id, social_account_id=account.id, prompt="p", post_time="09:00",
+                         image_url=store.url_for_path(scheduled_path), status="scheduled", is_active=True))
+    db.commit()
+    handle_path = _write(store, "handle.png")
+    db.add(MediaHandle(handle="pinned-handle", user_id=account.user_id, local_path=handle_path,
+                       expires_at=datetime.now(timezone.utc) + timedelta(hours=1)))
+    db.commit()
+
+    unreferenced_path = _write(store, "unreferenced.png")
+    newest_path = _write(store, "newest.png")
+    store.max_files = 3
+    store.run_janitor()
+
+    assert os.path.exists(scheduled_path)
+    assert os.path.exists(handle_path)
+    assert not os.path.exists(unreferenced_path)
+    assert os.path.exists(newest_path)
+    assert store.get_stats()["pinned_files"] == 2
+
+
+def test_published_or_expired_references_do_not_pin(store, db, account):
+    posted_path = _write(store, "posted.png")
+    db.add(ScheduledPost(user_id=account.user_id, social_account_id=account.id, prompt="p", post_time="09:00",
+                         image_url=store.url_for_path(posted_path), status="posted", is_active=True))
+    db.commit()
+    expired_path = _write(store, "expired.png")
+    db.add(MediaHandle(handle="expired-handle", user_id=account.user_id, local_path=expired_path,
+                       expires_at=datetime.now(timezone.utc) - timedelta(hours=1)))
+    db.commit()
+
+    newest_path = _write(store, "newest.png")
+    store.max_files = 1
+    store.run_janitor()
+
+    assert not os.path.exists(posted_path)
+    assert not os.path.exists(expired_path)
+    assert os.path.exists(newest_path)
+
+
+def test_url_references_resolve_to_stored_filenames():
+    base = get_settings().backend_base_url
+    assert LocalMediaStore._referenced_filenames(
+        [f"{base}/temp_images/3f/a.png?v=1", "/srv/app/temp_images/b.mp4", "https://res.cloudinary.com/c.png", None]
+    ) == {"a.png", "b.mp4"}
@@ -0,0 +1,108 @@
+"""Hedged, circuit-broken media hosting against stubbed upload servers."""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.config import get_settings
+from app.services import media_hosting_service as hosting_module
+from app.services.local_media_store import LocalMediaStore
+from app.services.media_hosting_service import ImgbbProvider, MediaHostingService
+from app.utils.resilience import Provider, ResilientTransport
+
+# The configured hedge delay is 1.5s; the stubs run the same race ten times faster
+SCALE = 0.1
+
+
+class StubHost:
+    """An IMGBB-compatible upload server answering after `latency` seconds with `status`."""
+
+    def __init__(self, name: str, latency: float = 0.0, status: int = 200):
+        self.name = name
+        self.latency = latency
+        self.status = status
+        self.requests = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if self.status != 200:
+            return httpx.Response(self.status, text="upstream error")
+        return httpx.Response(200, json={"success": True, "data": {"display_url": f"https://{self.name}.test/a.png"}})
+
+
+def _provider(host: StubHost, resilience: Provider) -> ImgbbProvider:
+    provider = ImgbbProvider()
+    provider.name = host.name
+    provider.api_key = "test-key"
+    provider.client = httpx.AsyncClient(transport=ResilientTransport(resilience, httpx.MockTransport(host.handler)))
+    return provider
+
+
+@pytest.fixture
+def local_store(tmp_path, monkeypatch):
+    store = LocalMediaStore(root=str(tmp_path / "temp_images"))
+    monkeypatch.setattr(hosting_module, "local_media_store", store)
+    return store
+
+
+def _service(*hosts: StubHost) -> MediaHostingService:
+    service = MediaHostingService()
+    service.hedge_delay = get_settings().media_hosting_hedge_ms / 1000 * SCALE
+    service.resilience = {host.name: Provider(host.name, failure_threshold=1, max_retries=0) for host in hosts}
+    service.providers = [_provider(host, service.resilience[host.name]) for host in hosts]
+    service.stats = {name: {"wins": 0, "attempts": 0, "total_latency": 0.0} for name in [*service.resilience, "local"]}
+    service.stats_hedges = 0
+    return service
+
+
+def _host(service: MediaHostingService):
+    async def run():
+        started = time.monotonic()
+        try:
+            return await service.host_image(b"png-bytes", "a.png"), time.monotonic() - started
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+
+def test_hedged_provider_wins_when_primary_is_slow(local_store):
+    slow, fast = StubHost("primary", latency=30 * SCALE), StubHost("secondary", latency=0.1 * SCALE)
+    service = _service(slow, fast)
+
+    result, elapsed = _host(service)
+
+    assert result["success"] and result["is_public"]
+    assert result["provider"] == "secondary"
+    assert service.hedge_delay <= elapsed < service.hedge_delay + 5 * SCALE
+    assert service.stats_hedges == 1
+    assert service.get_stats()["providers"]["secondary"]["wins"] == 1
+
+
+def test_failing_provider_fails_over_without_waiting_for_hedge(local_store):
+    broken, healthy = StubHost("primary", status=500), StubHost("secondary")
+    service = _service(broken, healthy)
+
+    result, elapsed = _host(service)
+
+    assert result["provider"] == "secondary"
+    assert elapsed < service.hedge_delay
+    assert service.stats_hedges == 0
+    assert service.resilience["primary"].breaker.get_status()["state"] == "open"
+
+
+def test_local_fallback_when_every_breaker_is_open(local_store):
+    first, second = StubHost("primary"), StubHost("secondary")
+    service = _service(first, second)
+    for provider in service.resilience.values():
+        provider.record_failure()
+
+    result, _ = _host(service)
+
+    assert result["success"] and not result["is_public"]
+    assert result["provider"] == "local"
+    assert result["remote_errors"]["primary"] == result["remote_errors"]["secondary"] == "circuit open"
+    assert result["url"] == local_store.url_for_path(local_store.path_for("a.png"))
+    assert first.requests == second.requests == 0
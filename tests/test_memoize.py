@@ -0,0 +1,156 @@
+"""Single-flight and TTL behaviour of app.utils.memoize."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.utils import memoize as memoize_module
+from app.utils.memoize import memoize
+
+pytestmark = pytest.mark.clock(memoize_module)
+
+
+def test_sync_concurrent_misses_share_one_call():
+    calls = []
+    release = threading.Event()
+
+    @memoize("test.sync_single_flight", key=lambda x: x)
+    def slow(x):
+        calls.append(x)
+        release.wait(5)
+        return x * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow(21))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    # Let every thread reach the cache before the leader finishes
+    deadline = time.monotonic() + 5
+    while slow.cache.stats["shared"] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [42] * 8
+    assert calls == [21]
+    assert slow.cache.stats["misses"] == 1
+    assert slow.cache.stats["shared"] == 7
+
+
+def test_sync_waiters_see_the_leaders_error():
+    release = threading.Event()
+
+    @memoize("test.sync_single_flight_error", key=lambda: "k", cache_errors=False)
+    def failing():
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            failing()
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while failing.cache.stats["shared"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 4
+    assert len({id(e) for e in errors}) == 1
+
+
+def test_async_concurrent_misses_share_one_call():
+    calls = []
+
+    @memoize("test.async_single_flight", key=lambda x: x)
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x * 2
+
+    async def main():
+        return await asyncio.gather(*(slow(21) for _ in range(8)))
+
+    assert asyncio.run(main()) == [42] * 8
+    assert calls == [21]
+    assert slow.cache.stats["shared"] == 7
+
+
+def test_async_waiters_survive_a_cancelled_caller():
+    @memoize("test.async_shielded", key=lambda: "k")
+    async def slow():
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        leader = asyncio.create_task(slow())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(slow())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        return await leader, waiter
+
+    result, waiter = asyncio.run(main())
+    assert result == "value"
+    assert waiter.cancelled()
+
+
+def test_negative_results_expire_after_negative_ttl(clock):
+    responses = [[], ["media"]]
+
+    @memoize("test.negative_ttl", key=lambda: "k", ttl=60, negative_ttl=5, is_negative=lambda value: not value)
+    def fetch():
+        return responses.pop(0)
+
+    assert fetch() == []
+    clock.advance(4)
+    assert fetch() == []  # Still cached
+    assert fetch.cache.stats["negative_hits"] == 1
+    clock.advance(1)
+    assert fetch() == ["media"]
+    clock.advance(59)
+    assert fetch() == ["media"]  # Positive results use the full ttl
+    assert fetch.cache.stats["hits"] == 1
+
+
+def test_errors_are_cached_for_negative_ttl(clock):
+    calls = []
+
+    @memoize("test.error_ttl", key=lambda: "k", ttl=60, negative_ttl=10)
+    def fetch():
+        calls.append(1)
+        raise RuntimeError("graph down")
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            fetch()
+    assert len(calls) == 1
+
+    clock.advance(10)
+    with pytest.raises(RuntimeError):
+        fetch()
+    assert len(calls) == 2
+
+
+def test_zero_negative_ttl_disables_negative_caching():
+    calls = []
+
+    @memoize("test.no_negative", key=lambda: "k", negative_ttl=0, is_negative=lambda value: value is None)
+    def fetch():
+        calls.append(1)
+        return None
+
+    fetch()
+    fetch()
+    assert len(calls) == 2
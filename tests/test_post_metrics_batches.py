@@ -0,0 +1,83 @@
+"""How post metrics batches react to Graph errors: bisect object errors, stop on token errors."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import post_metrics_service as metrics_module
+from app.services.post_metrics_service import GraphBatchError, PostMetricsService
+
+IDS = [f"1784{i:04d}" for i in range(8)]
+
+
+class StubGraph:
+    """Multi-ID lookups that fail with `error` whenever the batch contains one of `bad_ids`."""
+
+    def __init__(self, error=None, bad_ids=()):
+        self.error = error
+        self.bad_ids = set(bad_ids)
+        self.batches = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        ids = request.url.params["ids"].split(",")
+        self.batches.append(ids)
+        if self.error and (not self.bad_ids or self.bad_ids & set(ids)):
+            return httpx.Response(400, json={"error": {"code": self.error, "message": "stub error"}})
+        return httpx.Response(200, json={i: {"id": i, "like_count": 1, "comments_count": 0} for i in ids})
+
+
+@pytest.fixture
+def reported(monkeypatch):
+    tokens = []
+    monkeypatch.setattr(metrics_module.token_health_service, "report_auth_error", tokens.append)
+    return tokens
+
+
+def _fetch(graph: StubGraph, batches=1):
+    service = PostMetricsService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(graph.handler))
+
+    async def run():
+        semaphore, rejected = asyncio.Semaphore(1), set()
+        try:
+            return await asyncio.gather(
+                *(service._fetch_batch("instagram", "token", IDS, semaphore, rejected) for _ in range(batches)),
+                return_exceptions=True
+            )
+        finally:
+            await service.close()
+    return service, asyncio.run(run())
+
+
+def test_object_error_is_isolated_by_bisecting(reported):
+    graph = StubGraph(error=100, bad_ids=[IDS[5]])
+
+    service, [result] = _fetch(graph)
+
+    assert set(result) == set(IDS) - {IDS[5]}
+    assert set(service._unavailable) == {IDS[5]}
+    assert reported == []
+
+
+@pytest.mark.parametrize("code", [190, 10, 200])
+def test_token_error_stops_the_group_and_leaves_posts_due(reported, code):
+    graph = StubGraph(error=code)
+
+    service, results = _fetch(graph, batches=3)
+
+    assert all(isinstance(result, GraphBatchError) for result in results)
+    assert len(graph.batches) == 1  # Neither bisected nor retried by the other batches of this token
+    assert reported == ["token"]
+    assert service._unavailable == {}
+
+
+def test_other_errors_fail_the_batch_without_blacklisting(reported):
+    graph = StubGraph(error=4)  # Application rate limit
+
+    service, [result] = _fetch(graph)
+
+    assert isinstance(result, GraphBatchError) and result.code == 4
+    assert len(graph.batches) == 1
+    assert service._unavailable == {}
+    assert reported == []
@@ -0,0 +1,55 @@
+"""Replied-comment index at auto-reply scale, against PostgreSQL (set TEST_DATABASE_URL)."""
+
+import time
+
+import pytest
+
+from app.models.instagram_auto_reply_log import InstagramAutoReplyLog
+from app.services.replied_comment_index import RepliedCommentIndex
+
+pytestmark = pytest.mark.usefixtures("postgres")
+
+COMMENT_COUNT = 100_000
+INSTAGRAM_USER_ID = "ig-benchmark"
+
+
+@pytest.fixture
+def index(db):
+    yield RepliedCommentIndex()
+    db.query(InstagramAutoReplyLog).filter(InstagramAutoReplyLog.instagram_user_id == INSTAGRAM_USER_ID).delete()
+    db.commit()
+
+
+def test_100k_comments_are_checked_in_chunked_queries(db, index, count_queries, record_property):
+    comments = [{"id": f"bench-comment-{i}", "text": "nice"} for i in range(COMMENT_COUNT)]
+    already_replied = [c["id"] for c in comments[::2]]
+
+    started = time.monotonic()
+    with count_queries() as statements:
+        index.mark_replied(already_replied, INSTAGRAM_USER_ID, db)
+    record_property("mark_50k_seconds", round(time.monotonic() - started, 2))
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT INTO INSTAGRAM_AUTO_REPLY_LOG")]
+    assert len(inserts) == len(already_replied) // index.chunk_size
+
+    # Cold front: every ID is resolved against the log table
+    index.reset()
+    started = time.monotonic()
+    with count_queries() as statements:
+        unreplied = index.filter_unreplied(comments, INSTAGRAM_USER_ID, db)
+    record_property("cold_filter_100k_seconds", round(time.monotonic() - started, 2))
+    assert len(unreplied) == COMMENT_COUNT - len(already_replied)
+    assert {c["id"] for c in unreplied}.isdisjoint(already_replied)
+    assert len(statements) == COMMENT_COUNT // index.chunk_size
+
+    # Warm front: replied IDs come from the LRU, only the unreplied ones hit the table
+    started = time.monotonic()
+    with count_queries() as statements:
+        assert len(index.filter_unreplied(comments, INSTAGRAM_USER_ID, db)) == len(unreplied)
+    record_property("warm_filter_100k_seconds", round(time.monotonic() - started, 2))
+    assert len(statements) == len(unreplied) // index.chunk_size
+    assert index.stats["cache_hits"] == len(already_replied)
+
+    # Marking again is a no-op for IDs the front already knows
+    with count_queries() as statements:
+        index.mark_replied(already_replied[:1000], INSTAGRAM_USER_ID, db)
+    assert statements == []
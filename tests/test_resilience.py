@@ -0,0 +1,204 @@
+"""Circuit breaker, retry budget and retry policy of app.utils.resilience."""
+
+import asyncio
+import http.client
+
+import httpx
+import pytest
+import requests
+import urllib3
+
+from app.utils import circuit_breaker as breaker_module
+from app.utils import resilience as resilience_module
+from app.utils.resilience import Provider, ProviderUnavailable, ResilientTransport, is_connect_error
+
+pytestmark = pytest.mark.clock(breaker_module, resilience_module)
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class ClientError(Exception):
+    status_code = 400
+
+
+def _provider(**policy) -> Provider:
+    # No backoff delays in tests
+    return Provider("test", base_delay=0, **policy)
+
+
+def _failing(error: Exception, calls: list):
+    def fn():
+        calls.append(1)
+        raise error
+    return fn
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_a_trial(clock):
+    provider = _provider(failure_threshold=3, reset_timeout=30, max_retries=0)
+    calls = []
+    for _ in range(3):
+        with pytest.raises(ServerError):
+            provider.call_sync(_failing(ServerError(), calls))
+
+    with pytest.raises(ProviderUnavailable) as unavailable:
+        provider.call_sync(lambda: "ok")
+    assert unavailable.value.retry_in == pytest.approx(30)
+    assert len(calls) == 3
+    assert not provider.is_available()
+
+    clock.advance(30)
+    assert provider.is_available()
+    assert provider.call_sync(lambda: "ok") == "ok"
+    assert provider.breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    provider = _provider(failure_threshold=1, reset_timeout=10, max_retries=0)
+    with pytest.raises(ServerError):
+        provider.call_sync(_failing(ServerError(), []))
+
+    clock.advance(10)
+    with pytest.raises(ServerError):
+        provider.call_sync(_failing(ServerError(), []))
+    with pytest.raises(ProviderUnavailable):
+        provider.call_sync(lambda: "ok")
+
+
+def test_client_errors_do_not_trip_the_breaker_or_retry(clock):
+    provider = _provider(failure_threshold=1, max_retries=2)
+    calls = []
+    for _ in range(3):
+        with pytest.raises(ClientError):
+            provider.call_sync(_failing(ClientError(), calls))
+    assert len(calls) == 3
+    assert provider.breaker.state == "closed"
+    assert provider.stats["retries"] == 0
+
+
+def test_reset_closes_an_open_breaker(clock):
+    provider = _provider(failure_threshold=1, max_retries=0)
+    with pytest.raises(ServerError):
+        provider.call_sync(_failing(ServerError(), []))
+    provider.reset()
+    assert provider.call_sync(lambda: "ok") == "ok"
+
+
+def test_retries_until_success_within_max_retries(clock):
+    provider = _provider(max_retries=2)
+    outcomes = [ServerError(), ServerError(), "ok"]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert provider.call_sync(flaky) == "ok"
+    assert provider.stats["retries"] == 2
+
+
+def test_retry_budget_caps_retries_during_an_outage(clock):
+    provider = _provider(failure_threshold=1000, max_retries=2, retry_ratio=0.1)
+    provider.budget.tokens = 2
+    calls = []
+    for _ in range(5):
+        with pytest.raises(ServerError):
+            provider.call_sync(_failing(ServerError(), calls))
+
+    # The first call spends both tokens on its retries; the 0.1 earned per attempt
+    # never adds up to another token, so the other four calls are not retried
+    assert len(calls) == 7
+    assert provider.stats["retries"] == 2
+    assert provider.stats["retries_denied"] == 4
+
+
+def test_non_idempotent_calls_are_never_retried(clock):
+    provider = _provider(max_retries=2)
+    calls = []
+    with pytest.raises(ServerError):
+        provider.call_sync(_failing(ServerError(), calls), idempotent=False)
+    assert len(calls) == 1
+
+
+def test_async_call_retries_and_releases_trial_on_cancel(clock):
+    provider = _provider(max_retries=1)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ServerError()
+        return "ok"
+
+    assert asyncio.run(provider.call(flaky)) == "ok"
+
+    provider.breaker.state, provider.breaker.opened_at = "open", clock.now - provider.breaker.reset_timeout
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(provider.call(cancelled))
+    # The half-open trial slot was given back, so the next call may try
+    assert asyncio.run(provider.call(lambda: asyncio.sleep(0, "ok"))) == "ok"
+
+
+def test_connect_errors_are_told_apart_from_dropped_connections():
+    refused = requests.exceptions.ConnectionError(
+        urllib3.exceptions.MaxRetryError(None, "/", urllib3.exceptions.NewConnectionError(None, "refused"))
+    )
+    aborted = requests.exceptions.ConnectionError(
+        urllib3.exceptions.ProtocolError("Connection aborted.", http.client.RemoteDisconnected("closed"))
+    )
+    assert is_connect_error(refused)
+    assert is_connect_error(requests.exceptions.ConnectTimeout())
+    assert is_connect_error(httpx.ConnectError("refused"))
+    assert not is_connect_error(aborted)
+    assert not is_connect_error(requests.exceptions.ReadTimeout())
+    assert not is_connect_error(httpx.ReadError("reset"))
+
+
+def _transport_client(provider, handler):
+    return httpx.AsyncClient(transport=ResilientTransport(provider, httpx.MockTransport(handler)),
+                             base_url="https://api.example.com")
+
+
+@pytest.mark.parametrize("error, attempts", [
+    (httpx.ConnectError("refused"), 2),  # Never reached the server: safe to resend
+    (httpx.ReadError("reset"), 1),  # May have been processed: not resent
+])
+def test_transport_resends_posts_only_after_connect_errors(clock, error, attempts):
+    provider = _provider(max_retries=1)
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if len(calls) == 1:
+            raise error
+        return httpx.Response(200)
+
+    async def post():
+        async with _transport_client(provider, handler) as client:
+            return await client.post("/publish", json={})
+
+    if attempts == 2:
+        assert asyncio.run(post()).status_code == 200
+    else:
+        with pytest.raises(type(error)):
+            asyncio.run(post())
+    assert calls == ["POST"] * attempts
+
+
+def test_transport_retries_idempotent_5xx(clock):
+    provider = _provider(max_retries=2)
+    statuses = [502, 503, 200]
+
+    async def get():
+        async with _transport_client(provider, lambda request: httpx.Response(statuses.pop(0))) as client:
+            return await client.get("/status")
+
+    assert asyncio.run(get()).status_code == 200
+    assert provider.stats["retries"] == 2
+    assert provider.get_stats()["recent_failures"] == 2
@@ -0,0 +1,38 @@
+"""Query-count regressions for the social account listing."""
+
+from app.models.post import Post, PostStatus
+from app.models.social_account import SocialAccount
+
+
+def _add_accounts(db, user, accounts: int, published_per_account: int = 2):
+    for i in range(accounts):
+        account = SocialAccount(
+            user_id=user.id, platform="instagram", platform_user_id=f"{user.id}-{i}",
+            username=f"account{i}", access_token="token", is_connected=True
+        )
+        db.add(account)
+        db.flush()
+        for j in range(published_per_account):
+            db.add(Post(user_id=user.id, social_account_id=account.id, content=f"post {j}",
+                        status=PostStatus.PUBLISHED, platform_post_id=f"{account.id}-{j}"))
+        db.add(Post(user_id=user.id, social_account_id=account.id, content="draft", status=PostStatus.DRAFT))
+    db.commit()
+
+
+def test_social_accounts_query_count_does_not_grow_with_accounts(db, client, login, make_user, count_queries):
+    query_counts = {}
+    for accounts in (1, 12):
+        user = make_user()
+        _add_accounts(db, user, accounts)
+        login(user)
+
+        with count_queries() as statements:
+            response = client.get("/api/social/accounts")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body) == accounts
+        assert all(account["media_count"] == 2 for account in body)
+        query_counts[accounts] = len(statements)
+
+    assert query_counts[1] == query_counts[12], query_counts
@@ -0,0 +1,95 @@
+"""Concurrent vs serial Stability AI generation over a stubbed transport with fixed latency."""
+
+import asyncio
+import base64
+import json
+import time
+
+import httpx
+import pytest
+
+from app.services.stability_service import StabilityService
+from app.utils.resilience import Provider, ResilientTransport
+
+IMAGE_COUNT = 7
+LATENCY = 0.05  # Seconds per stubbed generation request
+
+
+class StubStability:
+    """Answers text-to-image requests after LATENCY with `samples` tiny artifacts."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(LATENCY)
+        finally:
+            self.in_flight -= 1
+        payload = json.loads(request.content)
+        artifacts = [
+            {"base64": base64.b64encode(b"png-%d" % i).decode(), "seed": 1000 + i, "finishReason": "SUCCESS"}
+            for i in range(payload["samples"])
+        ]
+        return httpx.Response(200, json={"artifacts": artifacts})
+
+
+@pytest.fixture
+def stub():
+    return StubStability()
+
+
+@pytest.fixture
+def service(stub):
+    service = StabilityService()
+    service.api_key = "test-key"
+    service._client = httpx.AsyncClient(
+        base_url=service.api_host,
+        transport=ResilientTransport(Provider("stability-test", max_retries=0), httpx.MockTransport(stub.handler))
+    )
+    return service
+
+
+def _timed(coroutine_factory):
+    async def run():
+        started = time.monotonic()
+        result = await coroutine_factory()
+        return result, time.monotonic() - started
+    return asyncio.run(run())
+
+
+def test_7_prompt_variations_concurrent_vs_serial(service, stub, record_property):
+    prompts = [f"a lighthouse at dusk, variation {i}" for i in range(IMAGE_COUNT)]
+
+    async def serial():
+        return [await service.generate_image(prompt) for prompt in prompts]
+
+    serial_results, serial_seconds = _timed(serial)
+    assert all(result["success"] for result in serial_results)
+    assert stub.max_in_flight == 1
+
+    stub.requests = stub.max_in_flight = 0
+    result, concurrent_seconds = _timed(lambda: service.generate_images(prompts[0], IMAGE_COUNT, prompts=prompts))
+
+    record_property("serial_seconds", round(serial_seconds, 3))
+    record_property("concurrent_seconds", round(concurrent_seconds, 3))
+    assert result["success"] and len(result["images"]) == IMAGE_COUNT
+    assert [image["prompt"] for image in result["images"]] == prompts
+    assert stub.requests == IMAGE_COUNT
+    assert stub.max_in_flight == service.max_concurrent_requests
+    # 7 requests in waves of 3 take ~3 latencies instead of 7
+    assert concurrent_seconds < serial_seconds * 0.7
+
+
+def test_7_images_of_one_prompt_use_a_single_samples_request(service, stub, record_property):
+    result, seconds = _timed(lambda: service.generate_images("a lighthouse at dusk", IMAGE_COUNT))
+
+    record_property("samples_seconds", round(seconds, 3))
+    assert result["success"] and len(result["images"]) == IMAGE_COUNT
+    assert stub.requests == 1
+    assert seconds < LATENCY * 3
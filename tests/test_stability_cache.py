@@ -0,0 +1,66 @@
+"""Preview regeneration by seed is served from the Stability image cache."""
+
+import asyncio
+import base64
+import json
+
+import httpx
+import pytest
+
+from app.services.image_generation_cache import ImageGenerationCache
+from app.services.stability_service import StabilityService
+from app.utils.resilience import Provider, ResilientTransport
+
+
+class StubStability:
+    """Renders with the requested seed, or picks one when the payload has none."""
+
+    def __init__(self):
+        self.requests = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        seed = json.loads(request.content).get("seed", 4242)
+        artifact = {"base64": base64.b64encode(b"png-%d" % seed).decode(), "seed": seed, "finishReason": "SUCCESS"}
+        return httpx.Response(200, json={"artifacts": [artifact]})
+
+
+@pytest.fixture
+def stub():
+    return StubStability()
+
+
+@pytest.fixture
+def service(stub, tmp_path):
+    service = StabilityService()
+    service.api_key = "test-key"
+    service.cache = ImageGenerationCache(str(tmp_path), 1024 * 1024)
+    service._client = httpx.AsyncClient(
+        base_url=service.api_host,
+        transport=ResilientTransport(Provider("stability-cache-test", max_retries=0), httpx.MockTransport(stub.handler))
+    )
+    return service
+
+
+def test_regenerating_with_returned_seed_hits_cache(service, stub):
+    async def run():
+        first = await service.generate_image_with_facebook_optimization("a lighthouse at dusk")
+        again = await service.generate_image_with_facebook_optimization("a lighthouse at dusk", seed=first["seed"])
+        return first, again
+
+    first, again = asyncio.run(run())
+
+    assert first["cached"] is False and first["seed"] == 4242
+    assert again["cached"] is True
+    assert again["image_base64"] == first["image_base64"]
+    assert stub.requests == 1
+
+
+def test_random_seed_requests_always_render(service, stub):
+    async def run():
+        return [await service.generate_image_with_facebook_optimization("a lighthouse at dusk") for _ in range(2)]
+
+    results = asyncio.run(run())
+
+    assert [result["cached"] for result in results] == [False, False]
+    assert stub.requests == 2
@@ -0,0 +1,72 @@
+"""Upsert conflict-target indexes: a clear error while missing, and dedupe-then-create."""
+
+import pytest
+from sqlalchemy import text
+
+from app.database import engine
+from app.models.post import Post, PostStatus
+from app.models.social_account import SocialAccount
+from app.services import social_account_service as social_account_module
+from app.services.social_account_service import social_account_service
+from app.services.upsert_index_service import (
+    POSTS_INDEX, SOCIAL_ACCOUNTS_INDEX, UPSERT_INDEXES, MissingUpsertIndexError, UpsertIndexService
+)
+
+
+@pytest.fixture
+def without_index(request):
+    """Drop an upsert index for the test and restore it afterwards."""
+    index_name = request.param
+    table, columns = UPSERT_INDEXES[index_name]
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP INDEX {index_name}" if engine.dialect.name != "postgresql"
+                                else f"DROP INDEX IF EXISTS {index_name}"))
+    yield index_name
+    with engine.begin() as connection:
+        connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})"))
+
+
+def test_require_passes_when_index_exists():
+    service = UpsertIndexService()
+    for index_name in UPSERT_INDEXES:
+        service.require(index_name)
+
+
+@pytest.mark.parametrize("without_index", [SOCIAL_ACCOUNTS_INDEX], indirect=True)
+def test_bulk_upsert_names_the_missing_index(db, make_user, monkeypatch, without_index):
+    monkeypatch.setattr(social_account_module, "upsert_index_service", UpsertIndexService())
+    user = make_user()
+    rows = [{"user_id": user.id, "platform": "facebook", "platform_user_id": "page-1", "is_connected": True}]
+
+    with pytest.raises(MissingUpsertIndexError, match=SOCIAL_ACCOUNTS_INDEX):
+        social_account_service.bulk_upsert(db, rows, update_columns=["is_connected"])
+
+
+def test_ensure_merges_duplicates_then_creates_indexes(db, make_user, postgres):
+    user = make_user()
+    for index_name in UPSERT_INDEXES:
+        db.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+    older, newer = (
+        SocialAccount(user_id=user.id, platform="instagram", platform_user_id="ig-dup", access_token=token)
+        for token in ("old-token", "new-token")
+    )
+    db.add_all([older, newer])
+    db.flush()
+    db.execute(text("UPDATE social_accounts SET updated_at = now() - interval '1 day' WHERE id = :id"),
+               {"id": older.id})
+    for account in (older, newer):
+        db.add(Post(user_id=user.id, social_account_id=account.id, content="same media",
+                    status=PostStatus.PUBLISHED, platform_post_id="media-1"))
+    db.commit()
+
+    merged = UpsertIndexService().ensure()
+
+    assert merged == {"social_accounts": 1, "posts": 1}
+    accounts = db.query(SocialAccount).filter(SocialAccount.platform_user_id == "ig-dup").all()
+    assert [account.access_token for account in accounts] == ["new-token"]
+    assert db.query(Post).filter(Post.platform_post_id == "media-1").count() == 1
+    UpsertIndexService().require(POSTS_INDEX)
+    UpsertIndexService().require(SOCIAL_ACCOUNTS_INDEX)
+    db.query(Post).filter(Post.social_account_id == accounts[0].id).delete()
+    db.query(SocialAccount).filter(SocialAccount.id == accounts[0].id).delete()
+    db.commit()